@@ -0,0 +1,151 @@
+"""partition_negotiations_by_month
+
+Revision ID: 2c7a9e5d13f8
+Revises: 8b1e4f7c2d90
+Create Date: 2026-10-18 18:41:12.527603
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c7a9e5d13f8'
+down_revision = '8b1e4f7c2d90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+    alter table negotiations rename to unpartitioned_negotiations;
+    alter table conversation_branches rename to unpartitioned_conversation_branches;
+    alter table messages rename to unpartitioned_messages;
+    alter index negotiations_pkey rename to unpartitioned_negotiations_pkey;
+    alter index conversation_branches_pkey rename to unpartitioned_conversation_branches_pkey;
+    alter index messages_pkey rename to unpartitioned_messages_pkey;
+    drop index negotiations_final_price_idx;
+    drop index conversation_branches_negotiation_id_idx;
+    drop index messages_negotiation_id_message_order_idx;
+    drop index messages_branch_id_message_order_idx;
+
+    -- Branches and messages are partitioned by their negotiation's creation time rather than their own, so a
+    -- conversation always lives in a single month and a month can be archived without splitting one.
+    -- The head pointer has no foreign key: it would make a month's branches and negotiations impossible to detach.
+    create table negotiations (
+        id                 uuid default gen_random_uuid() not null,
+        created_at         timestamp not null default now(),
+        final_price        int,
+        resolved_at        timestamp,
+        head_branch_id     uuid,
+        head_message_order int,
+        primary key (id, created_at)
+    ) partition by range (created_at);
+
+    create table conversation_branches (
+        id                     uuid default gen_random_uuid() not null,
+        negotiation_id         uuid not null,
+        negotiation_created_at timestamp not null,
+        parent_branch_id       uuid,
+        fork_message_order     int,
+        created_at             timestamp not null default now(),
+        primary key (id, negotiation_created_at),
+        foreign key (negotiation_id, negotiation_created_at)
+            references negotiations (id, created_at) on delete cascade,
+        foreign key (parent_branch_id, negotiation_created_at)
+            references conversation_branches (id, negotiation_created_at) on delete cascade
+    ) partition by range (negotiation_created_at);
+
+    create table messages (
+        id                     uuid default gen_random_uuid() not null,
+        negotiation_id         uuid,
+        negotiation_created_at timestamp not null,
+        branch_id              uuid,
+        role                   text not null,
+        content                text not null,
+        message_order          int not null default nextval('message_order'),
+        created_at             timestamp not null default now(),
+        primary key (id, negotiation_created_at),
+        foreign key (negotiation_id, negotiation_created_at) references negotiations (id, created_at),
+        foreign key (branch_id, negotiation_created_at) references conversation_branches (id, negotiation_created_at)
+    ) partition by range (negotiation_created_at);
+
+    create index negotiations_final_price_idx on negotiations (final_price, resolved_at)
+        where final_price is not null;
+    create index conversation_branches_negotiation_id_idx on conversation_branches (negotiation_id);
+    create index messages_negotiation_id_message_order_idx on messages (negotiation_id, message_order);
+    create index messages_branch_id_message_order_idx on messages (branch_id, message_order);
+
+    -- Creates the month's partition of each table, for the migration and for the maintenance command to run ahead
+    create function create_negotiation_partitions(month date) returns void
+        language plpgsql
+    as $$
+    declare
+        starts date := date_trunc('month', month);
+        ends date := date_trunc('month', month) + interval '1 month';
+        suffix text := to_char(month, 'YYYY_MM');
+    begin
+        execute format('create table if not exists %I partition of negotiations for values from (%L) to (%L)',
+            'negotiations_' || suffix, starts, ends);
+        execute format('create table if not exists %I partition of conversation_branches for values from (%L) to (%L)',
+            'conversation_branches_' || suffix, starts, ends);
+        execute format('create table if not exists %I partition of messages for values from (%L) to (%L)',
+            'messages_' || suffix, starts, ends);
+    end
+    $$;
+
+    select create_negotiation_partitions(cast(month as date))
+        from generate_series(
+            date_trunc('month', coalesce((select min(created_at) from unpartitioned_negotiations), now())),
+            date_trunc('month', now()) + interval '3 months',
+            interval '1 month'
+        ) as month;
+
+    -- Only catches rows when the maintenance command has not run for months; it should stay empty
+    create table negotiations_default partition of negotiations default;
+    create table conversation_branches_default partition of conversation_branches default;
+    create table messages_default partition of messages default;
+
+    insert into negotiations (id, created_at, final_price, resolved_at, head_branch_id, head_message_order)
+        select id, created_at, final_price, resolved_at, head_branch_id, head_message_order
+            from unpartitioned_negotiations;
+    insert into conversation_branches
+        (id, negotiation_id, negotiation_created_at, parent_branch_id, fork_message_order, created_at)
+        select b.id, b.negotiation_id, n.created_at, b.parent_branch_id, b.fork_message_order, b.created_at
+            from unpartitioned_conversation_branches b
+            join unpartitioned_negotiations n on n.id = b.negotiation_id;
+    insert into messages
+        (id, negotiation_id, negotiation_created_at, branch_id, role, content, message_order, created_at)
+        select m.id, m.negotiation_id, n.created_at, m.branch_id, m.role, m.content, m.message_order, m.created_at
+            from unpartitioned_messages m
+            join unpartitioned_negotiations n on n.id = m.negotiation_id;
+
+    alter table negotiation_summaries add column negotiation_created_at timestamp;
+    update negotiation_summaries s set negotiation_created_at = n.created_at
+        from unpartitioned_negotiations n
+        where n.id = s.negotiation_id;
+
+    drop table unpartitioned_messages, unpartitioned_conversation_branches, unpartitioned_negotiations cascade;
+
+    -- Autovacuum analyzes the partitions but never the partitioned tables themselves
+    analyze negotiations, conversation_branches, messages;
+
+    alter table negotiation_summaries alter column negotiation_created_at set not null;
+    alter table negotiation_summaries add foreign key (negotiation_id, negotiation_created_at)
+        references negotiations (id, created_at) on delete cascade;
+
+    -- One row per archived negotiation holding its active transcript. Storing the transcript as a single jsonb value
+    -- lets TOAST compress it, and the low tuple target compresses all but the shortest negotiations.
+    create table archived_negotiations (
+        id          uuid not null primary key,
+        created_at  timestamp not null,
+        final_price int,
+        resolved_at timestamp,
+        messages    jsonb not null,
+        archived_at timestamp not null default now()
+    ) with (toast_tuple_target = 128);
+
+    create index archived_negotiations_created_at_idx on archived_negotiations (created_at);
+    create index archived_negotiations_final_price_idx on archived_negotiations (final_price, resolved_at)
+        where final_price is not null;
+    """)
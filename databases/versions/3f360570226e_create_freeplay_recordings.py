@@ -0,0 +1,30 @@
+"""create_freeplay_recordings
+
+Revision ID: 3f360570226e
+Revises: e579fd027a10
+Create Date: 2026-10-18 09:12:41.418203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f360570226e'
+down_revision = 'e579fd027a10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+    create table freeplay_recordings (
+        id              uuid default gen_random_uuid() not null primary key,
+        payload         jsonb not null,
+        attempts        int not null default 0,
+        next_attempt_at timestamp not null default now(),
+        created_at      timestamp not null default now()
+    );
+
+    create index freeplay_recordings_next_attempt_at_idx on freeplay_recordings (next_attempt_at);
+    """)
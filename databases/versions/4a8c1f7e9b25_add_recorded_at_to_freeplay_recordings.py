@@ -0,0 +1,26 @@
+"""add_recorded_at_to_freeplay_recordings
+
+Revision ID: 4a8c1f7e9b25
+Revises: d93a6e0f52b8
+Create Date: 2026-10-18 23:41:07.215384
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4a8c1f7e9b25'
+down_revision = 'd93a6e0f52b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+    -- Set once Freeplay has the call, so a retry after the trace output failed only records the output
+    alter table freeplay_recordings add column recorded_at timestamptz;
+
+    -- The outbox now deletes recordings when it gives up on them; these ran out of attempts before it did
+    delete from freeplay_recordings where attempts >= 10;
+    """)
@@ -0,0 +1,27 @@
+"""create_negotiation_summaries
+
+Revision ID: 5d2f8a6c91e4
+Revises: c41e7b9d05f3
+Create Date: 2026-10-18 14:22:07.814520
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2f8a6c91e4'
+down_revision = 'c41e7b9d05f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+    create table negotiation_summaries (
+        negotiation_id     uuid not null primary key references negotiations(id) on delete cascade,
+        content            text not null,
+        through_message_id uuid not null,
+        updated_at         timestamp not null default now()
+    );
+    """)
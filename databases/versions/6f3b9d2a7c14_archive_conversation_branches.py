@@ -0,0 +1,29 @@
+"""archive_conversation_branches
+
+Revision ID: 6f3b9d2a7c14
+Revises: 2c7a9e5d13f8
+Create Date: 2026-10-18 21:12:36.904417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6f3b9d2a7c14'
+down_revision = '2c7a9e5d13f8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+    -- Every branch of an archived negotiation, each with all of its messages, so the ones left behind by resets
+    -- stay readable after their partitions are dropped. messages keeps the active transcript for the read path.
+    alter table archived_negotiations add column head_branch_id uuid;
+    alter table archived_negotiations add column head_message_order int;
+    alter table archived_negotiations add column branches jsonb not null default '[]';
+
+    -- Finds the archived negotiation a branch belongs to from the branch id alone
+    create index archived_negotiations_branches_idx on archived_negotiations using gin (branches jsonb_path_ops);
+    """)
@@ -0,0 +1,56 @@
+"""add_conversation_branches
+
+Revision ID: 8b1e4f7c2d90
+Revises: 5d2f8a6c91e4
+Create Date: 2026-10-18 16:05:44.301958
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b1e4f7c2d90'
+down_revision = '5d2f8a6c91e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+    create table conversation_branches (
+        id                 uuid default gen_random_uuid() not null primary key,
+        negotiation_id     uuid not null references negotiations(id) on delete cascade,
+        parent_branch_id   uuid references conversation_branches(id) on delete cascade,
+        fork_message_order int,
+        created_at         timestamp not null default now()
+    );
+    create index conversation_branches_negotiation_id_idx on conversation_branches (negotiation_id);
+
+    alter table negotiations add column head_branch_id uuid references conversation_branches(id);
+    alter table negotiations add column head_message_order int;
+    alter table messages add column branch_id uuid references conversation_branches(id);
+
+    insert into conversation_branches (negotiation_id) select id from negotiations;
+    update negotiations n set head_branch_id = b.id from conversation_branches b where b.negotiation_id = n.id;
+    update messages m set branch_id = n.head_branch_id from negotiations n where n.id = m.negotiation_id;
+
+    create index messages_branch_id_message_order_idx on messages (branch_id, message_order);
+
+    -- The branches from the given one back to the root, each with the last message_order it contributes
+    create function branch_path(branch uuid, through_message_order int)
+        returns table (branch_id uuid, through_message_order int)
+        language sql stable
+    as $$
+        with recursive path (branch_id, parent_branch_id, fork_message_order, through_message_order) as (
+            select b.id, b.parent_branch_id, b.fork_message_order, branch_path.through_message_order
+                from conversation_branches b
+                where b.id = branch_path.branch
+            union all
+            select b.id, b.parent_branch_id, b.fork_message_order, path.fork_message_order
+                from path
+                join conversation_branches b on b.id = path.parent_branch_id
+        )
+        select branch_id, coalesce(through_message_order, 2147483647) from path
+    $$;
+    """)
@@ -0,0 +1,31 @@
+"""add_resolutions_to_negotiations
+
+Revision ID: a8d5c2e41b97
+Revises: 3f360570226e
+Create Date: 2026-10-18 11:02:17.552093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8d5c2e41b97'
+down_revision = '3f360570226e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+    alter table negotiations add column final_price int;
+    alter table negotiations add column resolved_at timestamp;
+
+    create index negotiations_final_price_idx on negotiations (final_price, resolved_at)
+        where final_price is not null;
+
+    create table final_price_counts (
+        final_price  int not null primary key,
+        negotiations int not null
+    );
+    """)
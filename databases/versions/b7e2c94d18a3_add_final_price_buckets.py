@@ -0,0 +1,60 @@
+"""add_final_price_buckets
+
+Revision ID: b7e2c94d18a3
+Revises: 6f3b9d2a7c14
+Create Date: 2026-10-18 21:48:03.117245
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2c94d18a3'
+down_revision = '6f3b9d2a7c14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+    -- The first price of the 1,000 wide bucket a price falls in
+    create function final_price_bucket(final_price int) returns int
+        language sql immutable
+    as $$
+        select cast(floor(final_price / 1000.0) as int) * 1000
+    $$;
+
+    -- Totals of final_price_counts per bucket, so a rank reads a few bucket rows and one bucket of prices
+    -- instead of every distinct price
+    create table final_price_buckets (
+        bucket       int not null primary key,
+        negotiations int not null
+    );
+
+    insert into final_price_buckets (bucket, negotiations)
+        select final_price_bucket(final_price), sum(negotiations) from final_price_counts
+            group by final_price_bucket(final_price);
+
+    -- Every change to final_price_counts, from resolutions, partition maintenance and retention, reaches the buckets
+    create function count_final_price_bucket() returns trigger
+        language plpgsql
+    as $$
+    begin
+        if tg_op in ('UPDATE', 'DELETE') then
+            update final_price_buckets set negotiations = negotiations - old.negotiations
+                where bucket = final_price_bucket(old.final_price);
+        end if;
+        if tg_op in ('INSERT', 'UPDATE') then
+            insert into final_price_buckets (bucket, negotiations)
+                values (final_price_bucket(new.final_price), new.negotiations)
+                on conflict (bucket)
+                do update set negotiations = final_price_buckets.negotiations + excluded.negotiations;
+        end if;
+        return null;
+    end
+    $$;
+
+    create trigger final_price_counts_buckets after insert or update or delete on final_price_counts
+        for each row execute function count_final_price_bucket();
+    """)
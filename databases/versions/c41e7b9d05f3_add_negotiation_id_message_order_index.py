@@ -0,0 +1,22 @@
+"""add_negotiation_id_message_order_index
+
+Revision ID: c41e7b9d05f3
+Revises: a8d5c2e41b97
+Create Date: 2026-10-18 13:40:51.218364
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41e7b9d05f3'
+down_revision = 'a8d5c2e41b97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+    create index messages_negotiation_id_message_order_idx on messages (negotiation_id, message_order);
+    """)
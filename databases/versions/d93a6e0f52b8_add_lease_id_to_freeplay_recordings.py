@@ -0,0 +1,23 @@
+"""add_lease_id_to_freeplay_recordings
+
+Revision ID: d93a6e0f52b8
+Revises: b7e2c94d18a3
+Create Date: 2026-10-18 22:20:51.630918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd93a6e0f52b8'
+down_revision = 'b7e2c94d18a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+    -- Changes every time a recording is claimed, so a worker can only renew a lease that nobody has taken over
+    alter table freeplay_recordings add column lease_id uuid;
+    """)
@@ -0,0 +1,20 @@
+import os
+import tempfile
+from pathlib import Path
+
+from gunicorn.arbiter import Arbiter
+from gunicorn.workers.base import Worker
+
+# Workers are forked from this process, so the directory has to be set before prometheus_client is imported
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', tempfile.mkdtemp(prefix='negotiator-metrics-'))
+
+from prometheus_client import multiprocess  # noqa: E402
+
+
+def on_starting(server: Arbiter) -> None:
+    for path in Path(os.environ['PROMETHEUS_MULTIPROC_DIR']).glob('*.db'):
+        path.unlink()
+
+
+def child_exit(server: Arbiter, worker: Worker) -> None:
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,13 +1,198 @@
+import argparse
+import dataclasses
+import datetime
+import json
 import logging
 import os
+import sys
+import uuid
 
-from negotiator.app import create_app
-from negotiator.environment import Environment
+import sqlalchemy
+
+from negotiator.database_support.database_template import DatabaseTemplate
+from negotiator.export.negotiation_export import NegotiationExportRepository, ndjson_lines
+from negotiator.negotiation.partition_maintenance import PartitionMaintenance
 
 logging.basicConfig(level=os.environ.get('ROOT_LOG_LEVEL', 'INFO'))
 logging.getLogger('negotiator').setLevel(level=os.environ.get('NEGOTIATOR_LOG_LEVEL', 'INFO'))
 
-env = Environment.from_env()
 
-if __name__ == '__main__':
+def export(arguments: argparse.Namespace) -> None:
+    db_template = DatabaseTemplate(sqlalchemy.create_engine(os.environ['DATABASE_URL'], pool_size=1))
+    negotiations = NegotiationExportRepository(db_template).stream(
+        arguments.created_from,
+        arguments.created_to,
+        arguments.after,
+    )
+
+    for line in ndjson_lines(negotiations):
+        sys.stdout.write(line)
+
+
+def maintain_partitions(arguments: argparse.Namespace) -> None:
+    db_template = DatabaseTemplate(sqlalchemy.create_engine(os.environ['DATABASE_URL'], pool_size=1))
+    PartitionMaintenance(
+        db_template,
+        archive_after_months=arguments.archive_after_months,
+        retention_months=arguments.retention_months,
+        months_ahead=arguments.months_ahead,
+    ).run(datetime.date.today())
+
+
+def serve(_: argparse.Namespace) -> None:
+    # Importing the app reads the full environment, which the export command does not need
+    from negotiator.app import create_app
+    from negotiator.environment import Environment
+
+    env = Environment.from_env()
     create_app(env).run(debug=env.use_flask_debug_mode, host="0.0.0.0", port=env.port)
+
+
+def load_test(arguments: argparse.Namespace) -> None:
+    from negotiator.load_test.fake_servers import FakeOpenAI, FakeFreeplay, Latency
+    from negotiator.load_test.load_test import LoadTest, LoadTestSettings, AppServer
+
+    # Request logs from the app's HTTP clients would drown out the report
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    fake_openai = FakeOpenAI(
+        Latency(arguments.openai_median_ms / 1000, arguments.openai_p99_ms / 1000),
+        arguments.tool_call_rate,
+        port=arguments.openai_port,
+        seed=arguments.seed,
+    ).start()
+    fake_freeplay = FakeFreeplay(
+        Latency(arguments.freeplay_median_ms / 1000, arguments.freeplay_p99_ms / 1000),
+        port=arguments.freeplay_port,
+        seed=arguments.seed,
+    ).start()
+    logging.info('Fake OpenAI at %s, fake Freeplay at %s', fake_openai.base_url, fake_freeplay.api_base)
+
+    app_server = None
+    target_url = arguments.target_url
+    if target_url is None:
+        from negotiator.app import create_app
+        from negotiator.environment import Environment
+
+        env = dataclasses.replace(
+            Environment.from_env(),
+            openai_base_url=fake_openai.base_url,
+            freeplay_api_base=fake_freeplay.api_base,
+            freeplay_api_key='load-test',
+            freeplay_project_id='load-test',
+        )
+        app_server = AppServer(create_app(env)).start()
+        target_url = app_server.url
+
+    report = LoadTest(target_url, LoadTestSettings(
+        concurrency=arguments.concurrency,
+        negotiations=arguments.negotiations,
+        turns=arguments.turns,
+        stream_ratio=arguments.stream_ratio,
+        seed=arguments.seed,
+    )).run()
+
+    if app_server is not None:
+        app_server.stop()
+    fake_openai.stop()
+    fake_freeplay.stop()
+
+    if arguments.json:
+        sys.stdout.write(json.dumps(dataclasses.asdict(report), indent=2) + '\n')
+    else:
+        sys.stdout.write(report.table() + '\n')
+
+
+def evaluate(arguments: argparse.Namespace) -> None:
+    from negotiator.environment import Environment
+    from negotiator.evaluation.prompt_evaluation import PromptEvaluation, EvaluationSettings, UsageCounter, \
+        load_personas
+    from negotiator.negotiation.response_cache import ResponseCache
+    from negotiator.services import create_services
+
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    env = Environment.from_env()
+    # Evaluation negotiations are resolved like any other, so in the app's database they would join the leaderboard
+    database_url = os.environ.get('EVALUATION_DATABASE_URL', '')
+    if database_url in ['', env.database_url]:
+        sys.exit('Set EVALUATION_DATABASE_URL to a database other than DATABASE_URL')
+
+    personas = load_personas(arguments.personas)
+    services = create_services(env, database_url, pool_size=arguments.concurrency)
+    usage_counter = UsageCounter(services.call_llm)
+    # Every version gets its own replies; a cached one would hide the difference between prompts
+    llm_services = {
+        version: services.llm_service_with(usage_counter, ResponseCache(0), version)
+        for version in arguments.versions.split(',')
+    }
+
+    report = PromptEvaluation(services.negotiation_service, llm_services, usage_counter, EvaluationSettings(
+        concurrency=arguments.concurrency,
+        turns_per_second=arguments.turns_per_second,
+        runs_per_persona=arguments.runs_per_persona,
+    )).run(personas)
+    services.recording_outbox.stop()
+
+    if arguments.json:
+        sys.stdout.write(json.dumps(dataclasses.asdict(report), indent=2, default=str) + '\n')
+    else:
+        sys.stdout.write(report.table() + '\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='negotiator')
+    parser.set_defaults(command=serve)
+    commands = parser.add_subparsers()
+
+    export_parser = commands.add_parser('export', help='write negotiations and their messages to stdout as NDJSON')
+    export_parser.add_argument('--created-from', type=datetime.datetime.fromisoformat)
+    export_parser.add_argument('--created-to', type=datetime.datetime.fromisoformat)
+    export_parser.add_argument('--after', type=uuid.UUID, help='resume after this negotiation id')
+    export_parser.set_defaults(command=export)
+
+    maintain_parser = commands.add_parser(
+        'maintain-partitions',
+        help='create upcoming monthly partitions, archive old months and delete negotiations past retention')
+    maintain_parser.add_argument('--archive-after-months', type=int, default=3,
+                                 help='months kept in the partitioned tables, including the current one')
+    maintain_parser.add_argument('--retention-months', type=int, default=0,
+                                 help='delete negotiations older than this, 0 keeps them archived forever')
+    maintain_parser.add_argument('--months-ahead', type=int, default=3, help='future months to create partitions for')
+    maintain_parser.set_defaults(command=maintain_partitions)
+
+    load_test_parser = commands.add_parser(
+        'load-test', help='drive the app with fake OpenAI and Freeplay servers and report latency per stage')
+    load_test_parser.add_argument('--concurrency', type=int, default=10)
+    load_test_parser.add_argument('--negotiations', type=int, default=100)
+    load_test_parser.add_argument('--turns', type=int, default=5, help='user messages per negotiation')
+    load_test_parser.add_argument('--stream-ratio', type=float, default=0.0, help='share of turns sent to the stream')
+    load_test_parser.add_argument('--openai-median-ms', type=float, default=800)
+    load_test_parser.add_argument('--openai-p99-ms', type=float, default=3000)
+    load_test_parser.add_argument('--tool-call-rate', type=float, default=0.05,
+                                  help='share of completions that resolve the negotiation')
+    load_test_parser.add_argument('--freeplay-median-ms', type=float, default=50)
+    load_test_parser.add_argument('--freeplay-p99-ms', type=float, default=300)
+    load_test_parser.add_argument('--openai-port', type=int, default=0)
+    load_test_parser.add_argument('--freeplay-port', type=int, default=0)
+    load_test_parser.add_argument('--target-url', help='drive an app that is already running instead of starting one')
+    load_test_parser.add_argument('--seed', type=int)
+    load_test_parser.add_argument('--json', action='store_true', help='write the report as JSON')
+    load_test_parser.set_defaults(command=load_test)
+
+    evaluate_parser = commands.add_parser(
+        'evaluate', help='play scripted buyer personas against prompt versions and compare the outcomes')
+    evaluate_parser.add_argument('--personas', default='negotiator/evaluation/buyer_personas.json',
+                                 help='JSON list of personas, each with a name and the messages the buyer sends')
+    evaluate_parser.add_argument('--versions', default='latest',
+                                 help='comma separated Freeplay environments holding the prompt versions to compare')
+    evaluate_parser.add_argument('--runs-per-persona', type=int, default=10,
+                                 help='negotiations per persona and version')
+    evaluate_parser.add_argument('--concurrency', type=int, default=10)
+    evaluate_parser.add_argument('--turns-per-second', type=float, default=0.0,
+                                 help='limit on chat turns started per second, 0 for no limit')
+    evaluate_parser.add_argument('--json', action='store_true', help='write the report and every run as JSON')
+    evaluate_parser.set_defaults(command=evaluate)
+
+    parsed = parser.parse_args()
+    parsed.command(parsed)
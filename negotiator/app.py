@@ -1,18 +1,19 @@
 import logging
 
-import openai
-import sqlalchemy
 from flask import Flask
-from freeplay import Freeplay
 
-from negotiator.database_support.database_template import DatabaseTemplate
 from negotiator.environment import Environment
+from negotiator.export.export_api import export_api
+from negotiator.export.negotiation_export import NegotiationExportRepository
 from negotiator.health_api import health_api
+from negotiator.health_support.readiness import ReadinessMonitor, ReadinessCheck, database_check, http_check
+from negotiator.http_support.http_clients import warm_up_in_background
 from negotiator.index_page import index_page
-from negotiator.negotiation.message_repository import MessageRepository
-from negotiator.negotiation.negotiation_repository import NegotiationRepository
-from negotiator.negotiation.negotiation_page import negotiation_page, LLMService
-from negotiator.negotiation.negotiation_service import NegotiationService
+from negotiator.metrics_api import metrics_api
+from negotiator.negotiation.leaderboard_api import leaderboard_api
+from negotiator.negotiation.negotiation_page import negotiation_page
+from negotiator.profiling_support.request_profiler import ProfileSettings, request_profiler
+from negotiator.services import create_services
 
 logger = logging.getLogger(__name__)
 
@@ -21,19 +22,48 @@ def create_app(env: Environment = Environment.from_env()) -> Flask:
     app = Flask(__name__)
     app.secret_key = env.secret_key
     app.config["SQLALCHEMY_DATABASE_URI"] = env.database_url
-    openai.api_key = env.openai_api_key
 
-    db = sqlalchemy.create_engine(env.database_url, pool_size=4)
-    db_template = DatabaseTemplate(db)
+    profile_settings = ProfileSettings.from_environment(env)
+    if profile_settings.enabled:
+        app.register_blueprint(request_profiler(profile_settings))
 
-    freeplay_client = Freeplay(env.freeplay_api_key, 'https://app.freeplay.ai/api')
+    services = create_services(env, env.database_url)
+    db_template = services.db_template
+    openai_http_client = services.openai_http_client
+    openai_base_url = str(services.openai_client.base_url)
+    freeplay_session = services.freeplay_session
+    warm_up_in_background(openai_http_client, openai_base_url)
+    warm_up_in_background(freeplay_session, env.freeplay_api_base)
 
-    negotiation_repository = NegotiationRepository(db_template)
-    message_repository = MessageRepository(db_template)
-    negotiation_service = NegotiationService(db_template, negotiation_repository, message_repository)
-    llm_service = LLMService(negotiation_service, freeplay_client, openai.chat.completions.create, env.freeplay_project_id)
     app.register_blueprint(index_page())
-    app.register_blueprint(negotiation_page(negotiation_service, llm_service))
-    app.register_blueprint(health_api())
+    app.register_blueprint(negotiation_page(services.negotiation_service, services.llm_service))
+    app.register_blueprint(leaderboard_api(services.negotiation_service))
+    app.register_blueprint(export_api(NegotiationExportRepository(db_template), env.export_api_token))
+    app.register_blueprint(metrics_api())
+    required_checks = {name.strip() for name in env.ready_required_checks.split(',')}
+    check_timeout = env.ready_check_timeout_seconds
+    readiness = ReadinessMonitor(
+        [
+            ReadinessCheck('database', database_check(db_template, check_timeout), 'database' in required_checks),
+            ReadinessCheck(
+                'openai',
+                http_check(openai_http_client, openai_base_url, check_timeout),
+                'openai' in required_checks,
+            ),
+            ReadinessCheck(
+                'freeplay',
+                http_check(freeplay_session, env.freeplay_api_base, check_timeout),
+                'freeplay' in required_checks,
+            ),
+        ],
+        env.ready_check_interval_seconds,
+        stale_after_seconds=env.ready_check_interval_seconds * 2 + check_timeout,
+        pool_stats=lambda: {'database': db_template.pool_stats()},
+    )
+    readiness.start()
+    app.register_blueprint(health_api(lambda: {
+        'openai': services.openai_connections.stats(),
+        'freeplay': freeplay_session.stats(),
+    }, readiness))
 
     return app
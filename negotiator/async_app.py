@@ -0,0 +1,103 @@
+import logging
+
+from quart import Quart
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from negotiator.database_support.database_template import AsyncDatabaseTemplate, async_database_url
+from negotiator.environment import Environment
+from negotiator.health_api import async_health_api
+from negotiator.health_support.readiness import ReadinessMonitor, ReadinessCheck, database_check, http_check
+from negotiator.http_support.http_clients import HttpClientSettings, ConnectionCounter, async_http_client, \
+    pooled_async_openai_client, warm_up_in_background, async_warm_up
+from negotiator.index_page import async_index_page
+from negotiator.metrics_api import async_metrics_api
+from negotiator.negotiation.async_leaderboard_api import async_leaderboard_api
+from negotiator.negotiation.async_llm_service import AsyncLLMService
+from negotiator.negotiation.async_negotiation_page import async_negotiation_page
+from negotiator.negotiation.llm_resilience import AsyncResilientLLMCall
+from negotiator.negotiation.message_repository import AsyncMessageRepository
+from negotiator.negotiation.negotiation_cache import AsyncCachedNegotiationService
+from negotiator.negotiation.negotiation_repository import AsyncNegotiationRepository
+from negotiator.recording.recording_repository import AsyncRecordingRepository
+from negotiator.services import create_services
+
+logger = logging.getLogger(__name__)
+
+
+def create_async_app(env: Environment = Environment.from_env()) -> Quart:
+    app = Quart(__name__)
+    app.secret_key = env.secret_key
+
+    services = create_services(env, env.database_url)
+    db_template = services.db_template
+    async_db = create_async_engine(async_database_url(env.database_url), pool_size=env.async_database_pool_size)
+    async_db_template = AsyncDatabaseTemplate(async_db)
+
+    http_settings = HttpClientSettings.from_environment(env)
+    async_openai_connections = ConnectionCounter()
+    openai_http_client = services.openai_http_client
+    openai_base_url = str(services.openai_client.base_url)
+    async_openai_http_client = async_http_client(http_settings, async_openai_connections)
+    async_openai_client = pooled_async_openai_client(
+        env.openai_api_key, async_openai_http_client, env.openai_base_url)
+    freeplay_session = services.freeplay_session
+    warm_up_in_background(openai_http_client, openai_base_url)
+    warm_up_in_background(freeplay_session, env.freeplay_api_base)
+
+    @app.before_serving
+    async def warm_up_async_clients() -> None:
+        await async_warm_up(async_openai_http_client, str(async_openai_client.base_url))
+
+    @app.after_serving
+    async def close_async_clients() -> None:
+        await async_openai_http_client.aclose()
+
+    async_negotiation_service = AsyncCachedNegotiationService(
+        async_db_template,
+        AsyncNegotiationRepository(async_db_template),
+        AsyncMessageRepository(async_db_template),
+        services.negotiation_cache,
+    )
+    async_llm_service = AsyncLLMService(
+        services.llm_service,
+        AsyncResilientLLMCall(
+            async_openai_client.chat.completions.create, services.llm_breaker, services.llm_retry_policy),
+        async_db_template,
+        async_negotiation_service,
+        AsyncRecordingRepository(async_db_template),
+    )
+    app.register_blueprint(async_index_page())
+    app.register_blueprint(async_negotiation_page(async_negotiation_service, async_llm_service))
+    app.register_blueprint(async_leaderboard_api(services.negotiation_service))
+    app.register_blueprint(async_metrics_api())
+    required_checks = {name.strip() for name in env.ready_required_checks.split(',')}
+    check_timeout = env.ready_check_timeout_seconds
+    readiness = ReadinessMonitor(
+        [
+            ReadinessCheck('database', database_check(db_template, check_timeout), 'database' in required_checks),
+            ReadinessCheck(
+                'openai',
+                http_check(openai_http_client, openai_base_url, check_timeout),
+                'openai' in required_checks,
+            ),
+            ReadinessCheck(
+                'freeplay',
+                http_check(freeplay_session, env.freeplay_api_base, check_timeout),
+                'freeplay' in required_checks,
+            ),
+        ],
+        env.ready_check_interval_seconds,
+        stale_after_seconds=env.ready_check_interval_seconds * 2 + check_timeout,
+        pool_stats=lambda: {
+            'database': db_template.pool_stats(),
+            'async_database': async_db_template.pool_stats(),
+        },
+    )
+    readiness.start()
+    app.register_blueprint(async_health_api(lambda: {
+        'openai': services.openai_connections.stats(),
+        'openai_async': async_openai_connections.stats(),
+        'freeplay': freeplay_session.stats(),
+    }, readiness))
+
+    return app
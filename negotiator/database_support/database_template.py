@@ -1,24 +1,289 @@
-from contextlib import contextmanager
-from typing import Optional, Any, TypeVar
+import collections
+import hashlib
+import re
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+from dataclasses import dataclass
+from typing import Optional, Any, TypeVar, AsyncIterator, Dict, List, Iterator
 
 import sqlalchemy
-from sqlalchemy import Engine, Connection, CursorResult
+from sqlalchemy import Engine, Connection, CursorResult, TextClause, Row, Result, Pool, QueuePool
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncConnection
+
+from negotiator.metrics_support.metrics import db_pool_checkout_seconds
 
 T = TypeVar('T')
 
+bind_parameter_pattern = re.compile(r'(?<![:\w\\]):(\w+)(?!:)')
+
+
+@dataclass
+class StatementCacheStats:
+    hits: int = 0
+    misses: int = 0
+    prepared_executions: int = 0
+    prepares: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+@dataclass
+class PreparedStatement:
+    name: str
+    prepare: str
+    execute: TextClause
+
+
+class StatementCache:
+    def __init__(self) -> None:
+        self.__statements: Dict[str, TextClause] = {}
+        self.__prepared: Dict[str, PreparedStatement] = {}
+        self.__stats = StatementCacheStats()
+        self.__lock = threading.Lock()
+
+    def text(self, statement: str) -> TextClause:
+        clause = self.__statements.get(statement)
+        with self.__lock:
+            if clause is not None:
+                self.__stats.hits += 1
+                return clause
+            self.__stats.misses += 1
+
+        clause = sqlalchemy.text(statement)
+        self.__statements[statement] = clause
+        return clause
+
+    def prepared(self, statement: str) -> PreparedStatement:
+        prepared = self.__prepared.get(statement)
+        if prepared is None:
+            prepared = prepared_statement(statement)
+            self.__prepared[statement] = prepared
+
+        return prepared
+
+    def record_prepared_execution(self, prepared: bool) -> None:
+        with self.__lock:
+            self.__stats.prepared_executions += 1
+            if prepared:
+                self.__stats.prepares += 1
+
+    def stats(self) -> StatementCacheStats:
+        with self.__lock:
+            return StatementCacheStats(**vars(self.__stats))
+
+
+@dataclass
+class PoolStats:
+    size: int
+    checked_out: int
+    overflow: int
+    max_overflow: int
+    checkouts: int
+    wait_seconds_total: float
+    recent_wait_seconds_mean: float
+    recent_wait_seconds_max: float
+
+    @property
+    def exhausted(self) -> bool:
+        return self.max_overflow >= 0 and self.checked_out >= self.size + self.max_overflow
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'size': self.size,
+            'checked_out': self.checked_out,
+            'overflow': self.overflow,
+            'max_overflow': self.max_overflow,
+            'exhausted': self.exhausted,
+            'checkouts': self.checkouts,
+            'wait_ms_total': self.wait_seconds_total * 1000,
+            'recent_wait_ms_mean': self.recent_wait_seconds_mean * 1000,
+            'recent_wait_ms_max': self.recent_wait_seconds_max * 1000,
+        }
+
+
+# Keeps totals for the life of the pool and the most recent waits, which say whether the pool is struggling now
+class CheckoutWaits:
+    def __init__(self, recent: int = 1_000) -> None:
+        self.__checkouts = 0
+        self.__total_seconds = 0.0
+        self.__recent: collections.deque[float] = collections.deque(maxlen=recent)
+        self.__lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        db_pool_checkout_seconds.observe(seconds)
+        with self.__lock:
+            self.__checkouts += 1
+            self.__total_seconds += seconds
+            self.__recent.append(seconds)
+
+    def pool_stats(self, pool: Pool) -> PoolStats:
+        with self.__lock:
+            checkouts, total_seconds, recent = self.__checkouts, self.__total_seconds, list(self.__recent)
+
+        queue_pool = pool if isinstance(pool, QueuePool) else None
+        return PoolStats(
+            size=queue_pool.size() if queue_pool else 0,
+            checked_out=queue_pool.checkedout() if queue_pool else 0,
+            overflow=max(0, queue_pool.overflow()) if queue_pool else 0,
+            max_overflow=getattr(queue_pool, '_max_overflow', 0) if queue_pool else -1,
+            checkouts=checkouts,
+            wait_seconds_total=total_seconds,
+            recent_wait_seconds_mean=sum(recent) / len(recent) if recent else 0.0,
+            recent_wait_seconds_max=max(recent, default=0.0),
+        )
+
 
 class DatabaseTemplate:
-    def __init__(self, engine: Engine) -> None:
+    def __init__(self, engine: Engine, prepare_statements: bool = False) -> None:
         self.__engine = engine
+        self.__prepare_statements = prepare_statements
+        self.__statements = StatementCache()
+        self.__checkout_waits = CheckoutWaits()
 
     @contextmanager
-    def transaction(self):
-        with self.__engine.begin() as connection:
+    def transaction(self, statement_timeout_seconds: Optional[float] = None) -> Iterator[Connection]:
+        start = time.perf_counter()
+        with self.__engine.connect() as connection, connection.begin():
+            self.__checkout_waits.record(time.perf_counter() - start)
+            if statement_timeout_seconds is not None:
+                connection.execute(
+                    self.__statements.text("select set_config('statement_timeout', :timeout, true)"),
+                    {'timeout': f'{max(1, int(statement_timeout_seconds * 1000))}ms'},
+                )
             yield connection
 
-    def query(self, statement: str, connection: Optional[Connection] = None, **kwargs: Any) -> CursorResult:
+    def query(self, statement: str, connection: Optional[Connection] = None, **kwargs: Any) -> Result[Any]:
         if connection is None:
             with self.transaction() as connection:
-                return connection.execute(sqlalchemy.text(statement), kwargs)
+                return buffered(connection.execute(self.__statements.text(statement), kwargs))
         else:
-            return connection.execute(sqlalchemy.text(statement), kwargs)
+            return connection.execute(self.__statements.text(statement), kwargs)
+
+    # Server side prepared statements live on the pooled connection, so each connection prepares once
+    def query_prepared(self, statement: str, connection: Optional[Connection] = None, **kwargs: Any) -> Result[Any]:
+        if not self.__prepare_statements:
+            return self.query(statement, connection, **kwargs)
+
+        if connection is None:
+            with self.transaction() as connection:
+                return buffered(self.__execute_prepared(statement, connection, kwargs))
+        else:
+            return self.__execute_prepared(statement, connection, kwargs)
+
+    # Rows come from a server side cursor in batches, so the transaction stays open until the caller finishes
+    def query_stream(
+            self,
+            statement: str,
+            connection: Optional[Connection] = None,
+            batch_size: int = 500,
+            **kwargs: Any
+    ) -> Iterator[Row[Any]]:
+        if connection is None:
+            with self.transaction() as connection:
+                yield from self.__stream(statement, connection, batch_size, kwargs)
+        else:
+            yield from self.__stream(statement, connection, batch_size, kwargs)
+
+    def statement_stats(self) -> StatementCacheStats:
+        return self.__statements.stats()
+
+    def pool_stats(self) -> PoolStats:
+        return self.__checkout_waits.pool_stats(self.__engine.pool)
+
+    def __stream(
+            self,
+            statement: str,
+            connection: Connection,
+            batch_size: int,
+            parameters: Dict[str, Any]
+    ) -> Iterator[Row[Any]]:
+        result = connection.execute(
+            self.__statements.text(statement), parameters, execution_options={'yield_per': batch_size})
+        for partition in result.partitions():
+            yield from partition
+
+    def __execute_prepared(self, statement: str, connection: Connection, parameters: Dict[str, Any]) -> CursorResult:
+        prepared = self.__statements.prepared(statement)
+        prepared_names = connection.connection.info.setdefault('prepared_statements', set())
+
+        needs_prepare = prepared.name not in prepared_names
+        if needs_prepare:
+            connection.exec_driver_sql(prepared.prepare)
+            prepared_names.add(prepared.name)
+        self.__statements.record_prepared_execution(needs_prepare)
+
+        return connection.execute(prepared.execute, parameters)
+
+
+class AsyncDatabaseTemplate:
+    def __init__(self, engine: AsyncEngine) -> None:
+        self.__engine = engine
+        self.__statements = StatementCache()
+        self.__checkout_waits = CheckoutWaits()
+
+    @asynccontextmanager
+    async def transaction(self, statement_timeout_seconds: Optional[float] = None) -> AsyncIterator[AsyncConnection]:
+        start = time.perf_counter()
+        async with self.__engine.connect() as connection, connection.begin():
+            self.__checkout_waits.record(time.perf_counter() - start)
+            if statement_timeout_seconds is not None:
+                await connection.execute(
+                    self.__statements.text("select set_config('statement_timeout', :timeout, true)"),
+                    {'timeout': f'{max(1, int(statement_timeout_seconds * 1000))}ms'},
+                )
+            yield connection
+
+    async def query(self, statement: str, connection: Optional[AsyncConnection] = None, **kwargs: Any) -> CursorResult:
+        if connection is None:
+            async with self.transaction() as connection:
+                return await connection.execute(self.__statements.text(statement), kwargs)
+        else:
+            return await connection.execute(self.__statements.text(statement), kwargs)
+
+    # asyncpg already prepares and caches every statement per connection
+    async def query_prepared(
+            self,
+            statement: str,
+            connection: Optional[AsyncConnection] = None,
+            **kwargs: Any
+    ) -> CursorResult:
+        return await self.query(statement, connection, **kwargs)
+
+    def statement_stats(self) -> StatementCacheStats:
+        return self.__statements.stats()
+
+    def pool_stats(self) -> PoolStats:
+        return self.__checkout_waits.pool_stats(self.__engine.pool)
+
+
+# The connection goes back to the pool when the transaction ends, and overflow connections are closed on the way,
+# so rows are read before that happens
+def buffered(result: CursorResult) -> Result[Any]:
+    return result.freeze()() if result.returns_rows else result
+
+
+def prepared_statement(statement: str) -> PreparedStatement:
+    names: List[str] = []
+
+    def positional(match: re.Match) -> str:
+        if match.group(1) not in names:
+            names.append(match.group(1))
+        return f'${names.index(match.group(1)) + 1}'
+
+    sql = bind_parameter_pattern.sub(positional, statement)
+    name = 'negotiator_' + hashlib.sha1(statement.encode()).hexdigest()[:16]
+    arguments = ', '.join(f':{parameter}' for parameter in names)
+
+    return PreparedStatement(
+        name=name,
+        prepare=f'prepare {name} as {sql}'.replace('%', '%%'),
+        execute=sqlalchemy.text(f'execute {name}({arguments})' if names else f'execute {name}'),
+    )
+
+
+def async_database_url(database_url: str) -> str:
+    return database_url.replace('postgresql://', 'postgresql+asyncpg://', 1)
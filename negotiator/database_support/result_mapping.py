@@ -1,20 +1,37 @@
-from typing import TypeVar, Callable, Optional, List, cast
+from typing import TypeVar, Callable, Optional, List, Iterable, Iterator, Any
 
-from sqlalchemy import CursorResult, Row, RowMapping
+from sqlalchemy import Result, Row, RowMapping
 
 T = TypeVar('T')
 
 
-def map_one_result(result: CursorResult, mapping: Callable[[RowMapping], T]) -> Optional[T]:
-    number_of_results = cast(int, result.rowcount)
-    if number_of_results > 1:
-        raise Exception(f'Expected one result but got {number_of_results}')
+def map_one_result(result: Result[Any], mapping: Callable[[RowMapping], T]) -> Optional[T]:
+    row = one_row(result)
+    return None if row is None else mapping(row._mapping)
 
-    for row in result:
-        return mapping(row._mapping)
 
-    return None
+def map_results(result: Result[Any], mapping: Callable[[RowMapping], T]) -> List[T]:
+    return [mapping(row._mapping) for row in result]
 
 
-def map_results(result: CursorResult, mapping: Callable[[RowMapping], T]) -> List[T]:
-    return [mapping(row._mapping) for row in result]
+def map_one_row(result: Result[Any], mapping: Callable[[Row[Any]], T]) -> Optional[T]:
+    row = one_row(result)
+    return None if row is None else mapping(row)
+
+
+def map_rows(result: Result[Any], mapping: Callable[[Row[Any]], T]) -> List[T]:
+    return [mapping(row) for row in result]
+
+
+def stream_rows(rows: Iterable[Row[Any]], mapping: Callable[[Row[Any]], T]) -> Iterator[T]:
+    for row in rows:
+        yield mapping(row)
+
+
+# rowcount is not the number of selected rows on every driver, so look for a second row instead
+def one_row(result: Result[Any]) -> Optional[Row[Any]]:
+    rows = result.fetchmany(2)
+    if len(rows) > 1:
+        raise Exception('Expected one result but got more')
+
+    return rows[0] if rows else None
@@ -7,7 +7,11 @@ class Environment:
     port: int
     secret_key: str
     database_url: str
+    database_prepared_statements: bool
+    database_pool_size: int
+    async_database_pool_size: int
     openai_api_key: str
+    openai_base_url: str
     client_id: str
     client_secret: str
     host_url: str
@@ -16,6 +20,34 @@ class Environment:
     use_flask_debug_mode: bool
     freeplay_api_key: str
     freeplay_project_id: str
+    freeplay_api_base: str
+    prompt_cache_ttl_seconds: float
+    negotiation_cache_size: int
+    export_api_token: str
+    context_token_budget: int
+    summary_model: str
+    response_cache_size: int
+    response_cache_ttl_seconds: float
+    response_cache_all_temperatures: bool
+    llm_turn_timeout_seconds: float
+    llm_max_attempts: int
+    llm_hedge_after_seconds: float
+    llm_breaker_failures: int
+    llm_breaker_reset_seconds: float
+    http_max_connections: int
+    http_max_keepalive_connections: int
+    http_keepalive_expiry_seconds: float
+    http_connect_timeout_seconds: float
+    http_read_timeout_seconds: float
+    http2: bool
+    profile_token: str
+    profile_sample_rate: float
+    profile_directory: str
+    profile_interval_ms: float
+    profile_format: str
+    ready_check_interval_seconds: float
+    ready_check_timeout_seconds: float
+    ready_required_checks: str
 
     @classmethod
     def from_env(cls) -> 'Environment':
@@ -23,7 +55,11 @@ class Environment:
             port=int(os.environ.get('PORT', 8081)),
             secret_key=cls.__require_env('SECRET_KEY'),
             database_url=cls.__require_env('DATABASE_URL'),
+            database_prepared_statements=os.environ.get('DATABASE_PREPARED_STATEMENTS', 'false') == 'true',
+            database_pool_size=int(os.environ.get('DATABASE_POOL_SIZE', 4)),
+            async_database_pool_size=int(os.environ.get('ASYNC_DATABASE_POOL_SIZE', 10)),
             openai_api_key=cls.__require_env('OPENAI_API_KEY'),
+            openai_base_url=os.environ.get('OPENAI_BASE_URL', 'https://api.openai.com/v1'),
             client_id=cls.__require_env('CLIENT_ID'),
             client_secret=cls.__require_env('CLIENT_SECRET'),
             host_url=cls.__require_env('HOST_URL'),
@@ -32,6 +68,34 @@ class Environment:
             use_flask_debug_mode=os.environ.get('USE_FLASK_DEBUG_MODE', 'false') == 'true',
             freeplay_api_key=os.environ.get('FREEPLAY_API_KEY', ''),
             freeplay_project_id=os.environ.get('FREEPLAY_PROJECT_ID', ''),
+            freeplay_api_base=os.environ.get('FREEPLAY_API_BASE', 'https://app.freeplay.ai/api'),
+            prompt_cache_ttl_seconds=float(os.environ.get('PROMPT_CACHE_TTL_SECONDS', 300)),
+            negotiation_cache_size=int(os.environ.get('NEGOTIATION_CACHE_SIZE', 1000)),
+            export_api_token=os.environ.get('EXPORT_API_TOKEN', ''),
+            context_token_budget=int(os.environ.get('CONTEXT_TOKEN_BUDGET', 3000)),
+            summary_model=os.environ.get('SUMMARY_MODEL', 'gpt-4o-mini'),
+            response_cache_size=int(os.environ.get('RESPONSE_CACHE_SIZE', 1000)),
+            response_cache_ttl_seconds=float(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', 3600)),
+            response_cache_all_temperatures=os.environ.get('RESPONSE_CACHE_ALL_TEMPERATURES', 'false') == 'true',
+            llm_turn_timeout_seconds=float(os.environ.get('LLM_TURN_TIMEOUT_SECONDS', 30)),
+            llm_max_attempts=int(os.environ.get('LLM_MAX_ATTEMPTS', 3)),
+            llm_hedge_after_seconds=float(os.environ.get('LLM_HEDGE_AFTER_SECONDS', 0)),
+            llm_breaker_failures=int(os.environ.get('LLM_BREAKER_FAILURES', 5)),
+            llm_breaker_reset_seconds=float(os.environ.get('LLM_BREAKER_RESET_SECONDS', 30)),
+            http_max_connections=int(os.environ.get('HTTP_MAX_CONNECTIONS', 20)),
+            http_max_keepalive_connections=int(os.environ.get('HTTP_MAX_KEEPALIVE_CONNECTIONS', 10)),
+            http_keepalive_expiry_seconds=float(os.environ.get('HTTP_KEEPALIVE_EXPIRY_SECONDS', 60)),
+            http_connect_timeout_seconds=float(os.environ.get('HTTP_CONNECT_TIMEOUT_SECONDS', 5)),
+            http_read_timeout_seconds=float(os.environ.get('HTTP_READ_TIMEOUT_SECONDS', 60)),
+            http2=os.environ.get('HTTP2', 'true') == 'true',
+            profile_token=os.environ.get('PROFILE_TOKEN', ''),
+            profile_sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+            profile_directory=os.environ.get('PROFILE_DIRECTORY', 'profiles'),
+            profile_interval_ms=float(os.environ.get('PROFILE_INTERVAL_MS', 5)),
+            profile_format=os.environ.get('PROFILE_FORMAT', 'speedscope'),
+            ready_check_interval_seconds=float(os.environ.get('READY_CHECK_INTERVAL_SECONDS', 5)),
+            ready_check_timeout_seconds=float(os.environ.get('READY_CHECK_TIMEOUT_SECONDS', 2)),
+            ready_required_checks=os.environ.get('READY_REQUIRED_CHECKS', 'database'),
         )
 
     @classmethod
@@ -0,0 +1,239 @@
+import concurrent.futures
+import json
+import logging
+import statistics
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from negotiator.load_test.load_test import percentile
+from negotiator.negotiation.llm_service import LLMService, ResolvedNegotiation
+from negotiator.negotiation.negotiation_service import NegotiationService, Message
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BuyerPersona:
+    name: str
+    messages: List[str]
+
+
+def load_personas(path: str) -> List[BuyerPersona]:
+    with open(path) as file:
+        personas = [BuyerPersona(entry['name'], list(entry['messages'])) for entry in json.load(file)]
+
+    for persona in personas:
+        if not persona.messages:
+            raise ValueError(f'persona {persona.name} has no messages')
+    return personas
+
+
+@dataclass
+class EvaluationRun:
+    version: str
+    persona: str
+    negotiation_id: Optional[UUID] = None
+    final_price: Optional[int] = None
+    turns: int = 0
+    turn_seconds: List[float] = field(default_factory=list)
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class VersionSummary:
+    version: str
+    persona: str
+    runs: int
+    resolved: int
+    errors: int
+    median_price: Optional[float]
+    mean_price: Optional[float]
+    mean_turns: float
+    p50_turn_ms: float
+    p95_turn_ms: float
+    mean_prompt_tokens: float
+    mean_completion_tokens: float
+
+
+@dataclass
+class EvaluationReport:
+    elapsed_seconds: float
+    summaries: List[VersionSummary]
+    runs: List[EvaluationRun]
+
+    def table(self) -> str:
+        lines = [
+            f'{"persona":<16} {"version":<16} {"runs":>5} {"resolved":>8} {"errors":>6} {"median $":>9} '
+            f'{"mean $":>9} {"turns":>6} {"p50 ms":>8} {"p95 ms":>8} {"prompt tok":>10} {"compl tok":>9}'
+        ]
+        for s in self.summaries:
+            lines.append(
+                f'{s.persona:<16} {s.version:<16} {s.runs:>5} {s.resolved:>8} {s.errors:>6} '
+                f'{format_price(s.median_price):>9} {format_price(s.mean_price):>9} {s.mean_turns:>6.1f} '
+                f'{s.p50_turn_ms:>8.0f} {s.p95_turn_ms:>8.0f} {s.mean_prompt_tokens:>10.0f} '
+                f'{s.mean_completion_tokens:>9.0f}'
+            )
+        lines.append(f'{len(self.runs)} negotiations in {self.elapsed_seconds:.1f}s')
+        return '\n'.join(lines)
+
+
+def format_price(price: Optional[float]) -> str:
+    return '-' if price is None else f'{price:,.0f}'
+
+
+def summarize(runs: List[EvaluationRun]) -> List[VersionSummary]:
+    groups: Dict[Tuple[str, str], List[EvaluationRun]] = {}
+    for run in runs:
+        groups.setdefault((run.persona, run.version), []).append(run)
+    for run in runs:
+        groups.setdefault(('all', run.version), []).append(run)
+
+    return [summary(persona, version, group) for (persona, version), group in groups.items()]
+
+
+def summary(persona: str, version: str, runs: List[EvaluationRun]) -> VersionSummary:
+    prices = [run.final_price for run in runs if run.final_price is not None]
+    turn_seconds = sorted(seconds for run in runs for seconds in run.turn_seconds)
+    return VersionSummary(
+        version=version,
+        persona=persona,
+        runs=len(runs),
+        resolved=len(prices),
+        errors=len([run for run in runs if run.error is not None]),
+        median_price=statistics.median(prices) if prices else None,
+        mean_price=statistics.mean(prices) if prices else None,
+        mean_turns=statistics.mean(run.turns for run in runs),
+        p50_turn_ms=percentile(turn_seconds, 0.50) * 1000,
+        p95_turn_ms=percentile(turn_seconds, 0.95) * 1000,
+        mean_prompt_tokens=statistics.mean(run.prompt_tokens for run in runs),
+        mean_completion_tokens=statistics.mean(run.completion_tokens for run in runs),
+    )
+
+
+# Spaces out acquisitions across all threads; a rate of 0 does not limit
+class RateLimiter:
+    def __init__(
+            self,
+            per_second: float,
+            clock: Callable[[], float] = time.monotonic,
+            sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.__interval = 1 / per_second if per_second > 0 else 0.0
+        self.__clock = clock
+        self.__sleep = sleep
+        self.__next_slot = 0.0
+        self.__lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.__interval == 0:
+            return
+
+        with self.__lock:
+            now = self.__clock()
+            slot = max(now, self.__next_slot)
+            self.__next_slot = slot + self.__interval
+
+        if slot > now:
+            self.__sleep(slot - now)
+
+
+# Wraps the LLM call to count tokens for the negotiation the calling thread is running
+class UsageCounter:
+    def __init__(self, call_llm: Any) -> None:
+        self.__call_llm = call_llm
+        self.__local = threading.local()
+
+    def __call__(self, **kwargs: Any) -> Any:
+        completion = self.__call_llm(**kwargs)
+        usage = getattr(completion, 'usage', None)
+        if usage is not None:
+            self.__local.prompt_tokens = self.__tokens()[0] + usage.prompt_tokens
+            self.__local.completion_tokens = self.__tokens()[1] + usage.completion_tokens
+        return completion
+
+    def reset(self) -> None:
+        self.__local.prompt_tokens = 0
+        self.__local.completion_tokens = 0
+
+    def tokens(self) -> Tuple[int, int]:
+        return self.__tokens()
+
+    def __tokens(self) -> Tuple[int, int]:
+        return getattr(self.__local, 'prompt_tokens', 0), getattr(self.__local, 'completion_tokens', 0)
+
+
+@dataclass
+class EvaluationSettings:
+    concurrency: int = 10
+    turns_per_second: float = 0.0
+    runs_per_persona: int = 10
+
+
+# Each worker plays whole negotiations, one scripted message per turn until the negotiator resolves it.
+# Runs of every version are interleaved, so a slow period of the model affects each version alike.
+class PromptEvaluation:
+    def __init__(
+            self,
+            negotiation_service: NegotiationService,
+            llm_services: Dict[str, LLMService],
+            usage_counter: UsageCounter,
+            settings: EvaluationSettings = EvaluationSettings(),
+    ) -> None:
+        self.__negotiation_service = negotiation_service
+        self.__llm_services = llm_services
+        self.__usage_counter = usage_counter
+        self.__settings = settings
+        self.__rate_limiter = RateLimiter(settings.turns_per_second)
+
+    def run(self, personas: List[BuyerPersona]) -> EvaluationReport:
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(self.__settings.concurrency, 'evaluation') as executor:
+            futures = [
+                executor.submit(self.__negotiate, version, persona)
+                for persona in personas
+                for _ in range(self.__settings.runs_per_persona)
+                for version in self.__llm_services
+            ]
+            runs = [future.result() for future in futures]
+        elapsed = time.perf_counter() - start
+
+        return EvaluationReport(elapsed, summarize(runs), runs)
+
+    def __negotiate(self, version: str, persona: BuyerPersona) -> EvaluationRun:
+        llm_service = self.__llm_services[version]
+        self.__usage_counter.reset()
+        run = EvaluationRun(version, persona.name)
+
+        try:
+            run.negotiation_id = self.__negotiation_service.create()
+            for content in persona.messages:
+                negotiation = self.__negotiation_service.find(run.negotiation_id) if run.negotiation_id else None
+                if negotiation is None:
+                    run.error = 'negotiation not found'
+                    break
+
+                self.__rate_limiter.acquire()
+                turn_start = time.perf_counter()
+                reply = llm_service.call_and_record_negotiator_chat_turn(
+                    negotiation, Message(id=uuid.uuid4(), role='user', content=content))
+                run.turn_seconds.append(time.perf_counter() - turn_start)
+                run.turns += 1
+
+                if isinstance(reply, ResolvedNegotiation):
+                    run.final_price = reply.final_price
+                    break
+                if not reply.resettable:
+                    run.error = 'language model unavailable'
+                    break
+        except Exception as e:
+            logger.warning('Evaluation of %s with %s failed', version, persona.name, exc_info=True)
+            run.error = str(e) or type(e).__name__
+
+        run.prompt_tokens, run.completion_tokens = self.__usage_counter.tokens()
+        return run
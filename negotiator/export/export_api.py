@@ -0,0 +1,41 @@
+import datetime
+import hmac
+from typing import Optional
+from uuid import UUID
+
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from flask.typing import ResponseReturnValue
+
+from negotiator.export.negotiation_export import NegotiationExportRepository, ndjson_lines
+
+
+def export_api(export_repository: NegotiationExportRepository, api_token: str) -> Blueprint:
+    api = Blueprint('export_api', __name__)
+
+    @api.get('/export/negotiations.ndjson')
+    def export_negotiations() -> ResponseReturnValue:
+        if api_token == '':
+            return jsonify({'error': 'export is disabled'}), 404
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {api_token}'):
+            return jsonify({'error': 'unauthorized'}), 401
+
+        try:
+            created_from = read_timestamp(request.args.get('created_from'))
+            created_to = read_timestamp(request.args.get('created_to'))
+            after = None if request.args.get('after') is None else UUID(request.args['after'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        negotiations = export_repository.stream(created_from, created_to, after)
+
+        return Response(
+            stream_with_context(ndjson_lines(negotiations)),
+            mimetype='application/x-ndjson',
+            headers={'X-Accel-Buffering': 'no'},
+        )
+
+    return api
+
+
+def read_timestamp(value: Optional[str]) -> Optional[datetime.datetime]:
+    return None if value is None else datetime.datetime.fromisoformat(value)
@@ -0,0 +1,129 @@
+import datetime
+import heapq
+from dataclasses import dataclass
+from typing import Optional, Iterator, Iterable, Any, List, cast
+from uuid import UUID
+
+from sqlalchemy import Row
+
+from negotiator.database_support.database_template import DatabaseTemplate
+from negotiator.web_support import json_support
+
+# Each negotiation's messages come from its active branch, the same transcript the negotiation page shows.
+# Both parts of history are read in negotiation id order, which the primary keys give without a sort of the
+# whole export; only each negotiation's own messages are sorted.
+partitioned_export_statement = """
+                               select n.id as negotiation_id, n.created_at, n.final_price, n.resolved_at, m.id,
+                                      m.role, m.content, cast(m.message_order as bigint) as position
+                                 from negotiations n
+                                 left join lateral (
+                                     select m.id, m.role, m.content, m.message_order
+                                       from branch_path(n.head_branch_id, n.head_message_order) p
+                                       join messages m on m.branch_id = p.branch_id
+                                         and m.negotiation_created_at = n.created_at
+                                         and m.message_order <= p.through_message_order
+                                 ) m on true
+                                 where (cast(:created_from as timestamp) is null or n.created_at >= :created_from)
+                                 and (cast(:created_to as timestamp) is null or n.created_at < :created_to)
+                                 and (cast(:after as uuid) is null or n.id > :after)
+                                 order by n.id, position
+                               """
+
+archived_export_statement = """
+                            select a.id as negotiation_id, a.created_at, a.final_price, a.resolved_at, m.id, m.role,
+                                   m.content, cast(m.position as bigint) as position
+                              from archived_negotiations a
+                              left join rows from (
+                                  jsonb_to_recordset(a.messages) as (id uuid, role text, content text)
+                              ) with ordinality as m (id, role, content, position) on true
+                              where (cast(:created_from as timestamp) is null or a.created_at >= :created_from)
+                              and (cast(:created_to as timestamp) is null or a.created_at < :created_to)
+                              and (cast(:after as uuid) is null or a.id > :after)
+                              order by a.id, position
+                            """
+
+# Both cursors read the same snapshot, so a month archived during the export is neither skipped nor repeated
+repeatable_read_statement = """
+                            set transaction isolation level repeatable read
+                            """
+
+
+@dataclass
+class ExportedMessage:
+    id: UUID
+    role: str
+    content: str
+
+
+@dataclass
+class ExportedNegotiation:
+    id: UUID
+    created_at: datetime.datetime
+    final_price: Optional[int]
+    resolved_at: Optional[datetime.datetime]
+    messages: List[ExportedMessage]
+
+
+class NegotiationExportRepository:
+    def __init__(self, db: DatabaseTemplate, batch_size: int = 1_000) -> None:
+        self.__db = db
+        self.__batch_size = batch_size
+
+    def stream(
+            self,
+            created_from: Optional[datetime.datetime] = None,
+            created_to: Optional[datetime.datetime] = None,
+            after: Optional[UUID] = None,
+    ) -> Iterator[ExportedNegotiation]:
+        with self.__db.transaction() as connection:
+            self.__db.query(repeatable_read_statement, connection)
+            partitioned, archived = [
+                self.__db.query_stream(
+                    statement,
+                    connection,
+                    self.__batch_size,
+                    created_from=created_from,
+                    created_to=created_to,
+                    after=after,
+                )
+                for statement in [partitioned_export_statement, archived_export_statement]
+            ]
+
+            yield from group_negotiations(heapq.merge(partitioned, archived, key=lambda row: cast(UUID, row[0])))
+
+
+def group_negotiations(rows: Iterable[Row[Any]]) -> Iterator[ExportedNegotiation]:
+    negotiation: Optional[ExportedNegotiation] = None
+
+    for row in rows:
+        if negotiation is None or negotiation.id != row[0]:
+            if negotiation is not None:
+                yield negotiation
+            negotiation = ExportedNegotiation(
+                id=cast(UUID, row[0]),
+                created_at=cast(datetime.datetime, row[1]),
+                final_price=cast(Optional[int], row[2]),
+                resolved_at=cast(Optional[datetime.datetime], row[3]),
+                messages=[],
+            )
+
+        if row[4] is not None:
+            negotiation.messages.append(ExportedMessage(
+                id=cast(UUID, row[4]),
+                role=cast(str, row[5]),
+                content=cast(str, row[6]),
+            ))
+
+    if negotiation is not None:
+        yield negotiation
+
+
+# Long negotiations are written in chunks, the last of which ends the line
+def ndjson_lines(negotiations: Iterable[ExportedNegotiation]) -> Iterator[str]:
+    for negotiation in negotiations:
+        chunks = json_support.encode_chunks(negotiation)
+        previous = next(chunks)
+        for chunk in chunks:
+            yield previous
+            previous = chunk
+        yield previous + '\n'
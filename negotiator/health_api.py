@@ -1,12 +1,70 @@
+from typing import Any, Callable, Optional
+
+import quart
 from flask import Blueprint, jsonify
 from flask.typing import ResponseReturnValue
 
+from negotiator.health_support.readiness import ReadinessMonitor
+from negotiator.http_support.http_clients import ConnectionStats
+
+ConnectionStatsSource = Callable[[], dict[str, ConnectionStats]]
+
 
-def health_api() -> Blueprint:
+def health_api(
+        connection_stats: Optional[ConnectionStatsSource] = None,
+        readiness: Optional[ReadinessMonitor] = None,
+) -> Blueprint:
     api = Blueprint('health_api', __name__)
 
     @api.get('/health')
     def health() -> ResponseReturnValue:
         return jsonify({'status': 'UP'})
 
+    @api.get('/ready')
+    def ready() -> ResponseReturnValue:
+        body, status = readiness_response(readiness)
+        return jsonify(body), status
+
+    @api.get('/health/connections')
+    def connections() -> ResponseReturnValue:
+        return jsonify(connections_dict(connection_stats))
+
     return api
+
+
+def async_health_api(
+        connection_stats: Optional[ConnectionStatsSource] = None,
+        readiness: Optional[ReadinessMonitor] = None,
+) -> quart.Blueprint:
+    api = quart.Blueprint('health_api', __name__)
+
+    @api.get('/health')
+    async def health() -> quart.typing.ResponseReturnValue:
+        return quart.jsonify({'status': 'UP'})
+
+    @api.get('/ready')
+    async def ready() -> quart.typing.ResponseReturnValue:
+        body, status = readiness_response(readiness)
+        return quart.jsonify(body), status
+
+    @api.get('/health/connections')
+    async def connections() -> quart.typing.ResponseReturnValue:
+        return quart.jsonify(connections_dict(connection_stats))
+
+    return api
+
+
+def connections_dict(connection_stats: Optional[ConnectionStatsSource]) -> dict[str, dict]:
+    if connection_stats is None:
+        return {}
+
+    return {name: stats.to_dict() for name, stats in connection_stats().items()}
+
+
+# Checks run in the background, so this only reads their latest results
+def readiness_response(readiness: Optional[ReadinessMonitor]) -> tuple[dict[str, Any], int]:
+    if readiness is None:
+        return {'status': 'READY', 'checks': {}, 'pools': {}}, 200
+
+    report = readiness.report()
+    return report.to_dict(), 200 if report.ready else 503
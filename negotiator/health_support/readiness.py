@@ -0,0 +1,152 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Any
+
+import httpx
+import requests
+
+from negotiator.database_support.database_template import DatabaseTemplate, PoolStats
+
+logger = logging.getLogger(__name__)
+
+PoolStatsSource = Callable[[], Dict[str, PoolStats]]
+
+
+@dataclass
+class ReadinessCheck:
+    name: str
+    check: Callable[[], None]
+    # Optional dependencies are reported without taking the instance out of rotation
+    required: bool = True
+
+
+@dataclass
+class CheckResult:
+    ok: bool
+    checked_at: float
+    duration_seconds: float
+    error: Optional[str] = None
+
+
+@dataclass
+class ReadinessReport:
+    ready: bool
+    checks: Dict[str, Dict[str, Any]]
+    pools: Dict[str, PoolStats]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'status': 'READY' if self.ready else 'NOT_READY',
+            'checks': self.checks,
+            'pools': {name: stats.to_dict() for name, stats in self.pools.items()},
+        }
+
+
+# Each check runs on its own thread, so a hung dependency only stops its own result from refreshing.
+# A result that has not refreshed within stale_after_seconds counts as a failure.
+class ReadinessMonitor:
+    def __init__(
+            self,
+            checks: List[ReadinessCheck],
+            interval_seconds: float = 5.0,
+            stale_after_seconds: Optional[float] = None,
+            pool_stats: Optional[PoolStatsSource] = None,
+            clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.__checks = checks
+        self.__interval_seconds = interval_seconds
+        self.__stale_after_seconds = stale_after_seconds if stale_after_seconds is not None else interval_seconds * 3
+        self.__pool_stats = pool_stats
+        self.__clock = clock
+        self.__results: Dict[str, CheckResult] = {}
+        self.__lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.__threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        if self.__threads:
+            return
+
+        for check in self.__checks:
+            thread = threading.Thread(target=self.__run, args=(check,), name=f'readiness-{check.name}', daemon=True)
+            thread.start()
+            self.__threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self.__stopped.set()
+        for thread in self.__threads:
+            thread.join(timeout)
+        self.__threads = []
+
+    def check_now(self) -> None:
+        for check in self.__checks:
+            self.__check(check)
+
+    def report(self) -> ReadinessReport:
+        with self.__lock:
+            results = dict(self.__results)
+
+        now = self.__clock()
+        ready = True
+        checks = {}
+        for check in self.__checks:
+            result = results.get(check.name)
+            status = self.__status(result, now)
+            ready = ready and (status == 'UP' or not check.required)
+            checks[check.name] = {
+                'status': status,
+                'required': check.required,
+                'duration_ms': None if result is None else result.duration_seconds * 1000,
+                'age_seconds': None if result is None else now - result.checked_at,
+                'error': None if result is None else result.error,
+            }
+
+        pools = {} if self.__pool_stats is None else self.__pool_stats()
+        return ReadinessReport(ready, checks, pools)
+
+    def __status(self, result: Optional[CheckResult], now: float) -> str:
+        if result is None:
+            return 'UNKNOWN'
+        if now - result.checked_at > self.__stale_after_seconds:
+            return 'STALE'
+        return 'UP' if result.ok else 'DOWN'
+
+    def __run(self, check: ReadinessCheck) -> None:
+        while not self.__stopped.is_set():
+            self.__check(check)
+            self.__stopped.wait(self.__interval_seconds)
+
+    def __check(self, check: ReadinessCheck) -> None:
+        start = self.__clock()
+        try:
+            check.check()
+            error = None
+        except Exception as e:
+            logger.warning('Readiness check %s failed: %s', check.name, e)
+            error = str(e) or type(e).__name__
+        end = self.__clock()
+
+        result = CheckResult(error is None, end, end - start, error)
+
+        with self.__lock:
+            self.__results[check.name] = result
+
+
+def database_check(db: DatabaseTemplate, timeout_seconds: float) -> Callable[[], None]:
+    def check() -> None:
+        with db.transaction(timeout_seconds) as connection:
+            connection.exec_driver_sql('select 1')
+
+    return check
+
+
+# Any response short of a server error means the dependency is reachable
+def http_check(client: httpx.Client | requests.Session, url: str, timeout_seconds: float) -> Callable[[], None]:
+    def check() -> None:
+        response = client.head(url, timeout=timeout_seconds)
+        if response.status_code >= 500:
+            raise Exception(f'{url} responded with {response.status_code}')
+
+    return check
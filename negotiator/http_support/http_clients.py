@@ -0,0 +1,228 @@
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Mapping, Optional
+
+import httpx
+import openai
+import requests
+from freeplay import Freeplay, api_support
+from requests.adapters import HTTPAdapter
+
+from negotiator.environment import Environment
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class HttpClientSettings:
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry_seconds: float = 60.0
+    connect_timeout_seconds: float = 5.0
+    read_timeout_seconds: float = 60.0
+    http2: bool = True
+
+    @classmethod
+    def from_environment(cls, env: Environment) -> 'HttpClientSettings':
+        return cls(
+            max_connections=env.http_max_connections,
+            max_keepalive_connections=env.http_max_keepalive_connections,
+            keepalive_expiry_seconds=env.http_keepalive_expiry_seconds,
+            connect_timeout_seconds=env.http_connect_timeout_seconds,
+            read_timeout_seconds=env.http_read_timeout_seconds,
+            http2=env.http2,
+        )
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry_seconds,
+        )
+
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(self.read_timeout_seconds, connect=self.connect_timeout_seconds)
+
+
+@dataclass
+class ConnectionStats:
+    requests: int
+    new_connections: int
+
+    @property
+    def reused_connections(self) -> int:
+        return max(0, self.requests - self.new_connections)
+
+    @property
+    def reuse_ratio(self) -> float:
+        return self.reused_connections / self.requests if self.requests else 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            'requests': self.requests,
+            'new_connections': self.new_connections,
+            'reused_connections': self.reused_connections,
+            'reuse_ratio': self.reuse_ratio,
+        }
+
+
+# Counts responses and the TCP connects httpcore reports through its trace extension
+class ConnectionCounter:
+    def __init__(self) -> None:
+        self.__requests = 0
+        self.__new_connections = 0
+        self.__lock = threading.Lock()
+
+    def on_request(self, request: httpx.Request) -> None:
+        request.extensions['trace'] = self.__trace
+
+    def on_response(self, response: httpx.Response) -> None:
+        with self.__lock:
+            self.__requests += 1
+
+    async def on_async_request(self, request: httpx.Request) -> None:
+        request.extensions['trace'] = self.__async_trace
+
+    async def on_async_response(self, response: httpx.Response) -> None:
+        self.on_response(response)
+
+    def stats(self) -> ConnectionStats:
+        with self.__lock:
+            return ConnectionStats(self.__requests, self.__new_connections)
+
+    def __trace(self, event_name: str, info: Mapping[str, Any]) -> None:
+        if event_name == 'connection.connect_tcp.complete':
+            with self.__lock:
+                self.__new_connections += 1
+
+    async def __async_trace(self, event_name: str, info: Mapping[str, Any]) -> None:
+        self.__trace(event_name, info)
+
+
+def http_client(settings: HttpClientSettings, counter: ConnectionCounter) -> httpx.Client:
+    return httpx.Client(
+        limits=settings.limits(),
+        timeout=settings.timeout(),
+        http2=settings.http2,
+        event_hooks={'request': [counter.on_request], 'response': [counter.on_response]},
+    )
+
+
+def async_http_client(settings: HttpClientSettings, counter: ConnectionCounter) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        limits=settings.limits(),
+        timeout=settings.timeout(),
+        http2=settings.http2,
+        event_hooks={'request': [counter.on_async_request], 'response': [counter.on_async_response]},
+    )
+
+
+# Retries are left to ResilientLLMCall, so the SDK's own retries are turned off
+def pooled_openai_client(api_key: str, client: httpx.Client, base_url: Optional[str] = None) -> openai.OpenAI:
+    return openai.OpenAI(api_key=api_key, base_url=base_url, http_client=client, max_retries=0)
+
+
+def pooled_async_openai_client(
+        api_key: str,
+        client: httpx.AsyncClient,
+        base_url: Optional[str] = None,
+) -> openai.AsyncOpenAI:
+    return openai.AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=client, max_retries=0)
+
+
+class FreeplaySession(requests.Session):
+    def __init__(self, settings: HttpClientSettings) -> None:
+        super().__init__()
+        self.__timeout = (settings.connect_timeout_seconds, settings.read_timeout_seconds)
+        self.__adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.max_keepalive_connections)
+        self.mount('https://', self.__adapter)
+        self.mount('http://', self.__adapter)
+
+    def request(self, method: str | bytes, url: str | bytes, *args: Any, **kwargs: Any) -> requests.Response:
+        kwargs.setdefault('timeout', self.__timeout)
+        return super().request(method, url, *args, **kwargs)
+
+    def stats(self) -> ConnectionStats:
+        pools = self.__adapter.poolmanager.pools
+        with pools.lock:
+            connection_pools = [pools[key] for key in pools.keys()]
+
+        return ConnectionStats(
+            requests=sum(pool.num_requests for pool in connection_pools),
+            new_connections=sum(pool.num_connections for pool in connection_pools),
+        )
+
+
+# Stands in for the requests module inside the Freeplay SDK. Its HTTP calls go through the pooled session; everything
+# else, exceptions included, still comes from requests.
+class FreeplayRequests:
+    def __init__(self, session: FreeplaySession) -> None:
+        self.session = session
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.session.get(url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.session.post(url, **kwargs)
+
+    def put(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.session.put(url, **kwargs)
+
+    def patch(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.session.patch(url, **kwargs)
+
+    def delete(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.session.delete(url, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(requests, name)
+
+
+freeplay_lock = threading.Lock()
+
+
+# The Freeplay SDK calls requests.get and requests.post directly, which opens a new connection per call, and takes no
+# session. Its module-level requests is replaced once per process; later calls get the session installed first, so
+# stats and readiness checks always report on the session Freeplay actually uses.
+def shared_freeplay_session(settings: HttpClientSettings) -> FreeplaySession:
+    with freeplay_lock:
+        current = getattr(api_support, 'requests', None)
+        if isinstance(current, FreeplayRequests):
+            return current.session
+        if current is not requests:
+            raise RuntimeError('freeplay.api_support no longer calls the requests module, so it cannot be pooled')
+
+        session = FreeplaySession(settings)
+        setattr(api_support, 'requests', FreeplayRequests(session))
+        return session
+
+
+def pooled_freeplay_client(api_key: str, session: FreeplaySession, api_base: str) -> Freeplay:
+    current = getattr(api_support, 'requests', None)
+    if not isinstance(current, FreeplayRequests) or current.session is not session:
+        raise ValueError('Freeplay only sends requests through the session from shared_freeplay_session')
+    return Freeplay(api_key, api_base)
+
+
+def warm_up(client: httpx.Client | requests.Session, url: str) -> None:
+    try:
+        client.head(url)
+    except Exception as e:
+        logger.warning('Unable to warm up a connection to %s: %s', url, e)
+
+
+async def async_warm_up(client: httpx.AsyncClient, url: str) -> None:
+    try:
+        await client.head(url)
+    except Exception as e:
+        logger.warning('Unable to warm up a connection to %s: %s', url, e)
+
+
+def warm_up_in_background(client: httpx.Client | requests.Session, url: str) -> threading.Thread:
+    thread = threading.Thread(target=warm_up, args=(client, url), name='http-warm-up', daemon=True)
+    thread.start()
+    return thread
@@ -1,3 +1,4 @@
+import quart
 from flask import Blueprint, render_template
 from flask.typing import ResponseReturnValue
 
@@ -10,3 +11,13 @@ def index_page() -> Blueprint:
         return render_template('index.html')
 
     return page
+
+
+def async_index_page() -> quart.Blueprint:
+    page = quart.Blueprint('index_page', __name__)
+
+    @page.get('/')
+    async def index() -> quart.typing.ResponseReturnValue:
+        return await quart.render_template('index.html')
+
+    return page
@@ -0,0 +1,278 @@
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator, Optional, Self
+
+from negotiator.negotiation.llm_service import RESOLVE_NEGOTIATION_TOOL_NAME
+
+# The z-score of the 99th percentile of a normal distribution
+p99_z_score = 2.326
+
+fake_usage = {'prompt_tokens': 100, 'completion_tokens': 20, 'total_tokens': 120}
+
+
+@dataclass
+class Latency:
+    median_seconds: float = 0.0
+    p99_seconds: float = 0.0
+
+    # A log-normal distribution with the given median and 99th percentile, which has the long tail of real APIs
+    def sample(self, rng: random.Random) -> float:
+        if self.median_seconds <= 0:
+            return 0.0
+        if self.p99_seconds <= self.median_seconds:
+            return self.median_seconds
+
+        sigma = math.log(self.p99_seconds / self.median_seconds) / p99_z_score
+        return rng.lognormvariate(math.log(self.median_seconds), sigma)
+
+
+class FakeServer:
+    def __init__(self, port: int = 0, seed: Optional[int] = None) -> None:
+        handler = type('Handler', (FakeRequestHandler,), {'fake': self})
+        self.__server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+        self.__server.daemon_threads = True
+        self.__thread: Optional[threading.Thread] = None
+        self.__rng = random.Random(seed)
+        self.__lock = threading.Lock()
+        self.__requests = 0
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.__server.server_address[1]}'
+
+    @property
+    def requests(self) -> int:
+        return self.__requests
+
+    def start(self) -> Self:
+        self.__thread = threading.Thread(target=self.__server.serve_forever, name='fake-server', daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.__server.shutdown()
+        self.__server.server_close()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def random(self) -> float:
+        with self.__lock:
+            return self.__rng.random()
+
+    def sleep(self, latency: Latency) -> None:
+        with self.__lock:
+            seconds = latency.sample(self.__rng)
+        time.sleep(seconds)
+
+    def dispatch(self, method: str, path: str, body: Any) -> 'FakeResponse':
+        with self.__lock:
+            self.__requests += 1
+        return self.handle(method, path, body)
+
+    def handle(self, method: str, path: str, body: Any) -> 'FakeResponse':
+        return FakeResponse(404, {'message': f'No fake for {method} {path}'})
+
+
+@dataclass
+class FakeResponse:
+    status: int
+    body: Any = None
+    events: Optional[Iterator[Any]] = None
+
+
+class FakeRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    fake: FakeServer
+
+    def do_GET(self) -> None:
+        self.__respond('GET')
+
+    def do_POST(self) -> None:
+        self.__respond('POST')
+
+    def do_HEAD(self) -> None:
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def __respond(self, method: str) -> None:
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length)) if length else None
+        response = self.fake.dispatch(method, self.path.split('?')[0], body)
+
+        if response.events is not None:
+            self.send_response(response.status)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for event in response.events:
+                self.__write_chunk(f'data: {json.dumps(event)}\n\n'.encode())
+            self.__write_chunk(b'data: [DONE]\n\n')
+            self.__write_chunk(b'')
+            return
+
+        content = json.dumps(response.body).encode()
+        self.send_response(response.status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def __write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+        self.wfile.flush()
+
+
+class FakeOpenAI(FakeServer):
+    def __init__(
+            self,
+            latency: Latency = Latency(),
+            tool_call_rate: float = 0.0,
+            stream_chunks: int = 10,
+            port: int = 0,
+            seed: Optional[int] = None,
+    ) -> None:
+        super().__init__(port, seed)
+        self.__latency = latency
+        self.__tool_call_rate = tool_call_rate
+        self.__stream_chunks = stream_chunks
+
+    @property
+    def base_url(self) -> str:
+        return f'{self.url}/v1'
+
+    def handle(self, method: str, path: str, body: Any) -> FakeResponse:
+        if method != 'POST' or path != '/v1/chat/completions':
+            return super().handle(method, path, body)
+
+        self.sleep(self.__latency)
+        model = body.get('model', 'gpt-4o')
+        calls_tool = any(tool['function']['name'] == RESOLVE_NEGOTIATION_TOOL_NAME for tool in body.get('tools', [])) \
+            and self.random() < self.__tool_call_rate
+        content = '' if calls_tool else 'I could come down a little, how about 14,500?'
+        tool_calls = [self.__tool_call()] if calls_tool else None
+
+        if body.get('stream'):
+            include_usage = (body.get('stream_options') or {}).get('include_usage', False)
+            return FakeResponse(200, events=self.__chunks(model, content, tool_calls, include_usage))
+
+        message: dict[str, Any] = {'role': 'assistant', 'content': content or None}
+        if tool_calls:
+            message['tool_calls'] = tool_calls
+        return FakeResponse(200, {
+            'id': f'chatcmpl-{uuid.uuid4().hex}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'message': message, 'finish_reason': 'tool_calls' if tool_calls else 'stop'}],
+            'usage': fake_usage,
+        })
+
+    def __tool_call(self) -> dict[str, Any]:
+        return {
+            'id': f'call_{uuid.uuid4().hex}',
+            'type': 'function',
+            'function': {
+                'name': RESOLVE_NEGOTIATION_TOOL_NAME,
+                'arguments': json.dumps({'final_price': 12_000 + round(self.random() * 6_000)}),
+            },
+        }
+
+    def __chunks(
+            self,
+            model: str,
+            content: str,
+            tool_calls: Optional[list[dict[str, Any]]],
+            include_usage: bool,
+    ) -> Iterator[Any]:
+        completion_id = f'chatcmpl-{uuid.uuid4().hex}'
+
+        def chunk(delta: dict[str, Any], finish_reason: Optional[str] = None) -> dict[str, Any]:
+            return {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+            }
+
+        if tool_calls:
+            yield chunk({'role': 'assistant', 'tool_calls': [{'index': 0, **tool_calls[0]}]})
+            yield chunk({}, 'tool_calls')
+        else:
+            words = content.split(' ')
+            size = max(1, math.ceil(len(words) / self.__stream_chunks))
+            for start in range(0, len(words), size):
+                yield chunk({'content': ' '.join(words[start:start + size]) + ' '})
+            yield chunk({}, 'stop')
+
+        # OpenAI sends usage in a final chunk with no choices when it is asked for
+        if include_usage:
+            yield {**chunk({}), 'choices': [], 'usage': fake_usage}
+
+
+class FakeFreeplay(FakeServer):
+    template_path = re.compile(r'^/api/v2/projects/([^/]+)/prompt-templates/name/([^/]+)$')
+    completion_path = re.compile(r'^/api/v2/projects/[^/]+/sessions/[^/]+/completions$')
+    trace_path = re.compile(r'^/api/v2/projects/[^/]+/sessions/[^/]+/traces/id/[^/]+$')
+
+    def __init__(
+            self,
+            latency: Latency = Latency(),
+            model: str = 'gpt-4o',
+            port: int = 0,
+            seed: Optional[int] = None,
+    ) -> None:
+        super().__init__(port, seed)
+        self.__latency = latency
+        self.__model = model
+
+    @property
+    def api_base(self) -> str:
+        return f'{self.url}/api'
+
+    def handle(self, method: str, path: str, body: Any) -> FakeResponse:
+        template_match = self.template_path.match(path)
+        if method == 'GET' and template_match is not None:
+            self.sleep(self.__latency)
+            return FakeResponse(200, self.__template(template_match.group(1), template_match.group(2)))
+
+        if method == 'POST' and self.completion_path.match(path):
+            self.sleep(self.__latency)
+            return FakeResponse(201, {'completion_id': str(uuid.uuid4())})
+
+        if method == 'POST' and self.trace_path.match(path):
+            self.sleep(self.__latency)
+            return FakeResponse(201, {})
+
+        return super().handle(method, path, body)
+
+    def __template(self, project_id: str, template_name: str) -> dict[str, Any]:
+        return {
+            'prompt_template_id': str(uuid.uuid5(uuid.NAMESPACE_URL, template_name)),
+            'prompt_template_version_id': str(uuid.uuid5(uuid.NAMESPACE_URL, f'{template_name}/1')),
+            'prompt_template_name': template_name,
+            'content': [
+                {'role': 'system', 'content': 'You are a used car salesperson negotiating the price of a car.'},
+                {'kind': 'history'},
+            ],
+            'metadata': {
+                'provider': 'openai',
+                'flavor': 'openai_chat',
+                'model': self.__model,
+                'params': {'temperature': 0.7},
+                'provider_info': None,
+            },
+            'project_id': project_id,
+            'format_version': 2,
+        }
@@ -0,0 +1,209 @@
+import concurrent.futures
+import math
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import httpx
+from flask import Flask
+from werkzeug.serving import make_server, BaseWSGIServer, WSGIRequestHandler
+
+
+@dataclass
+class StageReport:
+    stage: str
+    count: int
+    errors: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    requests_per_second: float
+
+
+@dataclass
+class LoadTestReport:
+    elapsed_seconds: float
+    stages: List[StageReport]
+
+    def table(self) -> str:
+        lines = [f'{"stage":<20} {"count":>7} {"errors":>7} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"req/s":>8}']
+        for s in self.stages:
+            lines.append(
+                f'{s.stage:<20} {s.count:>7} {s.errors:>7} {s.p50_ms:>9.1f} {s.p95_ms:>9.1f} {s.p99_ms:>9.1f} '
+                f'{s.requests_per_second:>8.1f}'
+            )
+        lines.append(f'elapsed {self.elapsed_seconds:.1f}s')
+        return '\n'.join(lines)
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class StageTimings:
+    def __init__(self) -> None:
+        self.__durations: Dict[str, List[float]] = {}
+        self.__errors: Dict[str, int] = {}
+        self.__lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float, ok: bool = True) -> None:
+        with self.__lock:
+            self.__durations.setdefault(stage, []).append(seconds)
+            self.__errors.setdefault(stage, 0)
+            if not ok:
+                self.__errors[stage] += 1
+
+    def report(self, elapsed_seconds: float) -> LoadTestReport:
+        with self.__lock:
+            durations = {stage: sorted(values) for stage, values in self.__durations.items()}
+            errors = dict(self.__errors)
+
+        return LoadTestReport(elapsed_seconds, [
+            StageReport(
+                stage=stage,
+                count=len(values),
+                errors=errors[stage],
+                p50_ms=percentile(values, 0.50) * 1000,
+                p95_ms=percentile(values, 0.95) * 1000,
+                p99_ms=percentile(values, 0.99) * 1000,
+                requests_per_second=len(values) / elapsed_seconds if elapsed_seconds > 0 else 0.0,
+            )
+            for stage, values in durations.items()
+        ])
+
+
+@dataclass
+class LoadTestSettings:
+    concurrency: int = 10
+    negotiations: int = 100
+    turns: int = 5
+    stream_ratio: float = 0.0
+    request_timeout_seconds: float = 60.0
+    seed: Optional[int] = None
+    user_messages: List[str] = field(default_factory=lambda: [
+        'Hi, I am interested in the car. What is your best price?',
+        'That is more than I was hoping to spend. Could you do 12,000?',
+        'I have seen similar cars for less. How about 13,000?',
+        'Would you meet me in the middle at 13,500?',
+        'Alright, 14,000 is my final offer.',
+    ])
+
+
+# Each worker plays whole negotiations, so messages in one negotiation are sent in order as a user would
+class LoadTest:
+    def __init__(self, target_url: str, settings: LoadTestSettings = LoadTestSettings()) -> None:
+        self.__target_url = target_url.rstrip('/')
+        self.__settings = settings
+        self.__timings = StageTimings()
+        self.__rng = random.Random(settings.seed)
+
+    def run(self) -> LoadTestReport:
+        limits = httpx.Limits(max_connections=self.__settings.concurrency)
+        with httpx.Client(
+                base_url=self.__target_url,
+                limits=limits,
+                timeout=self.__settings.request_timeout_seconds,
+        ) as client:
+            start = time.perf_counter()
+            with concurrent.futures.ThreadPoolExecutor(self.__settings.concurrency, 'load-test') as executor:
+                streams = [
+                    [self.__rng.random() < self.__settings.stream_ratio for _ in range(self.__settings.turns)]
+                    for _ in range(self.__settings.negotiations)
+                ]
+                for future in [executor.submit(self.__negotiate, client, turns) for turns in streams]:
+                    future.result()
+            elapsed = time.perf_counter() - start
+
+        return self.__timings.report(elapsed)
+
+    def __negotiate(self, client: httpx.Client, streamed_turns: List[bool]) -> None:
+        response = self.__timed('create', lambda: client.post('/negotiation'), expected_status=302)
+        if response is None:
+            return
+        path = response.headers['Location']
+
+        if self.__timed('show', lambda: client.get(path)) is None:
+            return
+
+        for turn, streamed in enumerate(streamed_turns):
+            content = self.__settings.user_messages[turn % len(self.__settings.user_messages)]
+            body = {'id': str(uuid.uuid4()), 'content': content}
+            resolved = self.__stream(client, path, body) if streamed else self.__send(client, path, body)
+            if resolved is None or resolved:
+                return
+
+    def __send(self, client: httpx.Client, path: str, body: Dict[str, str]) -> Optional[bool]:
+        response = self.__timed('message', lambda: client.post(f'{path}/messages', json=body), expected_status=201)
+        if response is None:
+            return None
+
+        return 'final_price' in response.json()
+
+    def __stream(self, client: httpx.Client, path: str, body: Dict[str, str]) -> Optional[bool]:
+        start = time.perf_counter()
+        resolved = False
+        try:
+            with client.stream('POST', f'{path}/messages/stream', json=body) as response:
+                first_event = True
+                for line in response.iter_lines():
+                    if first_event and line.startswith('event:'):
+                        self.__timings.record('stream_first_event', time.perf_counter() - start)
+                        first_event = False
+                    resolved = resolved or line == 'event: resolved'
+                ok = response.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+
+        self.__timings.record('stream', time.perf_counter() - start, ok)
+        return resolved if ok else None
+
+    def __timed(
+            self,
+            stage: str,
+            send: Callable[[], httpx.Response],
+            expected_status: int = 200,
+    ) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = send()
+        except httpx.HTTPError:
+            self.__timings.record(stage, time.perf_counter() - start, ok=False)
+            return None
+
+        ok = response.status_code == expected_status
+        self.__timings.record(stage, time.perf_counter() - start, ok)
+        return response if ok else None
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, code: int | str = '-', size: int | str = '-') -> None:
+        pass
+
+
+class AppServer:
+    def __init__(self, app: Flask, port: int = 0) -> None:
+        self.__server: BaseWSGIServer = make_server(
+            '127.0.0.1', port, app, threaded=True, request_handler=QuietRequestHandler)
+        self.__thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.__server.server_port}'
+
+    def start(self) -> 'AppServer':
+        self.__thread = threading.Thread(target=self.__server.serve_forever, name='load-test-app', daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.__server.shutdown()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
@@ -0,0 +1,26 @@
+import quart
+from flask import Blueprint, Response
+from flask.typing import ResponseReturnValue
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from negotiator.metrics_support.metrics import latest_metrics
+
+
+def metrics_api() -> Blueprint:
+    api = Blueprint('metrics_api', __name__)
+
+    @api.get('/metrics')
+    def metrics() -> ResponseReturnValue:
+        return Response(latest_metrics(), content_type=CONTENT_TYPE_LATEST)
+
+    return api
+
+
+def async_metrics_api() -> quart.Blueprint:
+    api = quart.Blueprint('metrics_api', __name__)
+
+    @api.get('/metrics')
+    async def metrics() -> quart.typing.ResponseReturnValue:
+        return quart.Response(latest_metrics(), content_type=CONTENT_TYPE_LATEST)
+
+    return api
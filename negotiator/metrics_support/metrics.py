@@ -0,0 +1,90 @@
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, Any
+
+from prometheus_client import Histogram, Counter, Gauge, CollectorRegistry, REGISTRY, generate_latest, multiprocess
+
+unknown_model = 'unknown'
+
+latency_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+chat_turn_stage_seconds = Histogram(
+    'negotiator_chat_turn_stage_seconds',
+    'Time spent in each stage of a chat turn',
+    ['stage', 'model'],
+    buckets=latency_buckets,
+)
+chat_turn_errors = Counter(
+    'negotiator_chat_turn_errors',
+    'Chat turn stages that failed',
+    ['stage', 'model'],
+)
+llm_tokens = Counter(
+    'negotiator_llm_tokens',
+    'Tokens used by language model calls',
+    ['model', 'kind'],
+)
+negotiations_resolved = Counter(
+    'negotiator_negotiations_resolved',
+    'Negotiations resolved by the language model calling the resolve tool',
+    ['model'],
+)
+db_pool_checkout_seconds = Histogram(
+    'negotiator_db_pool_checkout_seconds',
+    'Time waiting for a database connection from the pool',
+    buckets=latency_buckets,
+)
+
+response_cache_hits = Counter(
+    'negotiator_response_cache_hits',
+    'Language model replies served from the response cache',
+)
+response_cache_misses = Counter(
+    'negotiator_response_cache_misses',
+    'Response cache lookups that had to call the language model',
+)
+response_cache_entries = Gauge(
+    'negotiator_response_cache_entries',
+    'Replies held in the response cache',
+    multiprocess_mode='livesum',
+)
+
+
+@dataclass
+class StageLabels:
+    stage: str
+    model: str = unknown_model
+
+
+# The model is not always known when a stage starts, so the stage can fill it in before it finishes
+@contextmanager
+def timed_stage(stage: str, model: str = unknown_model) -> Iterator[StageLabels]:
+    labels = StageLabels(stage, model)
+    start = time.perf_counter()
+    try:
+        yield labels
+    except Exception:
+        chat_turn_errors.labels(labels.stage, labels.model).inc()
+        raise
+    finally:
+        chat_turn_stage_seconds.labels(labels.stage, labels.model).observe(time.perf_counter() - start)
+
+
+def record_usage(model: str, usage: Any) -> None:
+    if usage is None:
+        return
+
+    llm_tokens.labels(model, 'prompt').inc(usage.prompt_tokens)
+    llm_tokens.labels(model, 'completion').inc(usage.completion_tokens)
+
+
+# Under gunicorn each worker writes its samples to PROMETHEUS_MULTIPROC_DIR, so any worker can report for all of them
+def latest_metrics() -> bytes:
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return generate_latest(REGISTRY)
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
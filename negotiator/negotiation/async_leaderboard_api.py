@@ -0,0 +1,23 @@
+import asyncio
+
+from quart import Blueprint, request, jsonify, Response
+from quart.typing import ResponseReturnValue
+
+from negotiator.negotiation.leaderboard_api import read_limit, to_info
+from negotiator.negotiation.negotiation_service import NegotiationService
+from negotiator.web_support import json_support
+
+
+def async_leaderboard_api(negotiation_service: NegotiationService) -> Blueprint:
+    api = Blueprint('leaderboard_api', __name__)
+
+    @api.get('/leaderboard')
+    async def leaderboard() -> ResponseReturnValue:
+        limit = read_limit(request.args.get('limit'))
+        if limit is None:
+            return jsonify({'error': 'limit must be a positive integer'}), 400
+
+        records = await asyncio.to_thread(negotiation_service.leaderboard, limit)
+        return Response(json_support.encode(to_info(records)), mimetype='application/json')
+
+    return api
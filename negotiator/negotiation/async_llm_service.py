@@ -0,0 +1,186 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Any, AsyncIterator
+from uuid import UUID, uuid4
+
+from negotiator.database_support.database_template import AsyncDatabaseTemplate
+from negotiator.metrics_support.metrics import timed_stage, record_usage, negotiations_resolved
+from negotiator.negotiation.llm_resilience import LLMUnavailable
+from negotiator.negotiation.llm_service import LLMService, ResolvedNegotiation, ChatTurnEvent, StreamedReply, \
+    ChatTurnDelta, ChatTurnReply, ChatTurn, LLMResponse, RESOLVE_NEGOTIATION_TOOL_NAME, minimum_write_seconds, \
+    unavailable_reply, unavailable_turn_reply
+from negotiator.negotiation.negotiation_service import AsyncNegotiationService, Negotiation, Message
+from negotiator.recording.recording_outbox import FreeplayRecording
+from negotiator.recording.recording_repository import AsyncRecordingRepository
+
+logger = logging.getLogger(__name__)
+
+
+# Turns are written on the async database; Freeplay prompts, summaries and resolutions still go through the
+# blocking LLMService off the event loop
+class AsyncLLMService:
+    def __init__(
+            self,
+            llm_service: LLMService,
+            call_llm: Any,
+            db: AsyncDatabaseTemplate,
+            negotiation_service: AsyncNegotiationService,
+            recording_repository: AsyncRecordingRepository,
+    ):
+        self.llm_service = llm_service
+        self.call_llm = call_llm
+        self.db = db
+        self.negotiation_service = negotiation_service
+        self.recording_repository = recording_repository
+
+    async def call_and_record_negotiator_chat_turn(
+            self,
+            negotiation: Negotiation,
+            user_message: Message,
+    ) -> ChatTurnReply | ResolvedNegotiation:
+        # Freeplay and the summaries are blocking, so they run off the event loop
+        try:
+            turn = await asyncio.to_thread(self.llm_service.prepare_chat_turn, negotiation, user_message)
+        except LLMUnavailable as e:
+            logger.warning('Unable to prepare the chat turn for negotiation %s: %s', negotiation.id, e, exc_info=True)
+            return unavailable_turn_reply()
+        llm_arguments = turn.llm_arguments()
+        cache_key = self.llm_service.response_cache.key(llm_arguments)
+
+        cached_response = self.llm_service.response_cache.get(cache_key)
+        if cached_response is not None:
+            now = time.time()
+            return await self.record_response(turn, now, now, cached_response)
+
+        start_time = time.time()
+        try:
+            with timed_stage('llm_call', turn.model()):
+                chat_completion = await self.call_llm(timeout=turn.deadline.check(), **llm_arguments)
+        except LLMUnavailable:
+            logger.warning('Language model unavailable for negotiation %s', negotiation.id, exc_info=True)
+            return unavailable_turn_reply()
+        end_time = time.time()
+        record_usage(turn.model(), chat_completion.usage)
+
+        response = LLMResponse.from_message(chat_completion.choices[0].message)
+        self.llm_service.response_cache.put(cache_key, response)
+
+        return await self.record_response(turn, start_time, end_time, response)
+
+    async def stream_negotiator_chat_turn(self, negotiation: Negotiation, user_message: Message) -> AsyncIterator[ChatTurnEvent]:
+        try:
+            turn = await asyncio.to_thread(self.llm_service.prepare_chat_turn, negotiation, user_message)
+        except LLMUnavailable as e:
+            logger.warning('Unable to prepare the chat turn for negotiation %s: %s', negotiation.id, e, exc_info=True)
+            yield ChatTurnDelta(unavailable_reply)
+            yield unavailable_turn_reply()
+            return
+        llm_arguments = turn.llm_arguments(stream=True, stream_options={'include_usage': True})
+        cache_key = self.llm_service.response_cache.key(llm_arguments)
+
+        cached_response = self.llm_service.response_cache.get(cache_key)
+        streamed = cached_response is None
+        start_time = time.time()
+        if cached_response is None:
+            try:
+                with timed_stage('llm_call', turn.model()):
+                    chunks = await self.call_llm(timeout=turn.deadline.check(), **llm_arguments)
+            except LLMUnavailable:
+                logger.warning('Language model unavailable for negotiation %s', negotiation.id, exc_info=True)
+                yield ChatTurnDelta(unavailable_reply)
+                yield unavailable_turn_reply()
+                return
+
+            streamed_reply = StreamedReply()
+            try:
+                with timed_stage('llm_stream', turn.model()):
+                    async for chunk in chunks:
+                        turn.deadline.check()
+                        content = streamed_reply.add(chunk)
+                        if content is not None:
+                            yield ChatTurnDelta(content)
+            except LLMUnavailable:
+                logger.warning('Language model stream broke off for negotiation %s', negotiation.id, exc_info=True)
+                yield unavailable_turn_reply()
+                return
+            record_usage(turn.model(), streamed_reply.usage)
+
+            cached_response = streamed_reply.response()
+            self.llm_service.response_cache.put(cache_key, cached_response)
+        end_time = time.time()
+
+        async for event in self.stream_response(turn, start_time, end_time, cached_response, streamed):
+            yield event
+
+    async def record_response(
+            self,
+            turn: ChatTurn,
+            start_time: float,
+            end_time: float,
+            response: LLMResponse
+    ) -> ChatTurnReply | ResolvedNegotiation:
+        if response.resolves_negotiation():
+            return await self.record_resolution(turn, start_time, end_time, response.tool_arguments)
+
+        reply_id = await self.record_reply(turn, start_time, end_time, response.content)
+        return ChatTurnReply(id=reply_id, content=response.content)
+
+    async def stream_response(
+            self,
+            turn: ChatTurn,
+            start_time: float,
+            end_time: float,
+            response: LLMResponse,
+            streamed: bool = False
+    ) -> AsyncIterator[ChatTurnEvent]:
+        if response.resolves_negotiation():
+            yield await self.record_resolution(turn, start_time, end_time, response.tool_arguments)
+            return
+
+        if not streamed and response.content:
+            yield ChatTurnDelta(response.content)
+        reply_id = await self.record_reply(turn, start_time, end_time, response.content)
+
+        yield ChatTurnReply(id=reply_id, content=response.content)
+
+    async def record_resolution(
+            self,
+            turn: ChatTurn,
+            start_time: float,
+            end_time: float,
+            arguments: str
+    ) -> ResolvedNegotiation:
+        recording = self.llm_service.freeplay_recording(
+            turn, arguments, start_time, end_time,
+            function_call={'name': RESOLVE_NEGOTIATION_TOOL_NAME, 'arguments': arguments}
+        )
+        tool_args = json.loads(arguments)
+        await self.__save_turn(turn, [turn.user_message], recording)
+
+        # Once per negotiation, so the leaderboard stays with the sync repositories
+        resolved = await asyncio.to_thread(self.llm_service.resolve_negotiation, turn.negotiation, **tool_args)
+        negotiations_resolved.labels(turn.model()).inc()
+        return resolved
+
+    async def record_reply(self, turn: ChatTurn, start_time: float, end_time: float, reply: str) -> UUID:
+        reply_id = uuid4()
+        recording = self.llm_service.freeplay_recording(turn, reply, start_time, end_time)
+        await self.__save_turn(turn, [
+            turn.user_message,
+            Message(id=reply_id, role='assistant', content=reply),
+        ], recording)
+
+        return reply_id
+
+    async def __save_turn(self, turn: ChatTurn, messages: list[Message], recording: FreeplayRecording) -> None:
+        # The recording commits with the messages, and is delivered to Freeplay once they are
+        statement_timeout = max(turn.deadline.remaining(), minimum_write_seconds)
+        recording_outbox = self.llm_service.recording_outbox
+        with timed_stage('db_write', turn.model()):
+            async with self.db.transaction(statement_timeout) as connection:
+                await self.negotiation_service.add_messages(turn.negotiation.id, messages, connection)
+                outbox_entry = await recording_outbox.add_async(self.recording_repository, recording, connection)
+
+        recording_outbox.enqueue(outbox_entry)
@@ -0,0 +1,113 @@
+from typing import cast, AsyncGenerator
+from uuid import UUID
+
+from quart import Blueprint, render_template, redirect, request, jsonify, Response
+from quart.typing import ResponseReturnValue
+from quart.wrappers.response import IterableBody
+
+from negotiator.negotiation.async_llm_service import AsyncLLMService
+from negotiator.negotiation.llm_service import ChatTurnDelta, ChatTurnReply, ResolvedNegotiation
+from negotiator.negotiation.negotiation_page import MessageInfo, to_info
+from negotiator.negotiation.negotiation_service import AsyncNegotiationService, Message, NegotiationUnavailable
+from negotiator.web_support import json_support, sse_support
+
+
+def async_negotiation_page(
+        negotiation_service: AsyncNegotiationService,
+        llm_service: AsyncLLMService,
+) -> Blueprint:
+    page = Blueprint('negotiation_page', __name__)
+
+    @page.post('/negotiation')
+    async def create() -> ResponseReturnValue:
+        negotiation_id = await negotiation_service.create()
+        return redirect(f'/negotiation/{negotiation_id}')
+
+    @page.get('/negotiation/<negotiation_id>')
+    async def show(negotiation_id: UUID) -> ResponseReturnValue:
+        negotiation = await negotiation_service.find(negotiation_id)
+
+        if negotiation is None:
+            return redirect('/')
+
+        return await render_template(
+            'negotiation.html',
+            negotiation_json=json_support.encode(to_info(negotiation))
+        )
+
+    @page.post('/negotiation/<negotiation_id>/messages')
+    async def new_message(negotiation_id: UUID) -> ResponseReturnValue:
+        negotiation = await negotiation_service.find(negotiation_id)
+        if negotiation is None:
+            return redirect('/')
+        if negotiation.archived:
+            return jsonify({'error': 'negotiation is archived'}), 409
+
+        user_message = await read_user_message()
+
+        try:
+            reply = await llm_service.call_and_record_negotiator_chat_turn(negotiation, user_message)
+        except NegotiationUnavailable:
+            return jsonify({'error': 'negotiation is archived'}), 409
+
+        if isinstance(reply, ResolvedNegotiation):
+            return jsonify(reply), 201
+
+        # Nothing was saved when the model is unavailable, so the apology is not a message to keep
+        return jsonify(MessageInfo(
+            id=reply.id,
+            role='assistant',
+            content=reply.content,
+            resettable=reply.resettable,
+        )), 201 if reply.resettable else 503
+
+    @page.post('/negotiation/<negotiation_id>/messages/stream')
+    async def stream_message(negotiation_id: UUID) -> ResponseReturnValue:
+        negotiation = await negotiation_service.find(negotiation_id)
+        if negotiation is None:
+            return redirect('/')
+        if negotiation.archived:
+            return jsonify({'error': 'negotiation is archived'}), 409
+
+        user_message = await read_user_message()
+
+        async def events() -> AsyncGenerator[bytes, None]:
+            try:
+                async for turn_event in llm_service.stream_negotiator_chat_turn(negotiation, user_message):
+                    if isinstance(turn_event, ChatTurnDelta):
+                        yield sse_support.event('delta', {'content': turn_event.content}).encode()
+                    elif isinstance(turn_event, ChatTurnReply):
+                        yield sse_support.event('message', MessageInfo(
+                            id=turn_event.id,
+                            role='assistant',
+                            content=turn_event.content,
+                            resettable=turn_event.resettable,
+                        )).encode()
+                    else:
+                        yield sse_support.event('resolved', turn_event).encode()
+            except NegotiationUnavailable:
+                yield sse_support.event('error', {'error': 'negotiation is archived'}).encode()
+
+        return Response(
+            IterableBody(events()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+        )
+
+    @page.post('/negotiation/<negotiation_id>/messages/<message_id>/reset')
+    async def reset(negotiation_id: UUID, message_id: UUID) -> ResponseReturnValue:
+        await negotiation_service.truncate(negotiation_id=negotiation_id, at_message_id=message_id)
+
+        return '', 204
+
+    return page
+
+
+async def read_user_message() -> Message:
+    request_body = cast(dict[str, str], await request.get_json())
+
+    return Message(
+        id=UUID(request_body['id']),
+        content=request_body['content'],
+        role='user',
+    )
@@ -0,0 +1,94 @@
+import datetime
+from dataclasses import dataclass
+from typing import Optional, cast, List, Any
+from uuid import UUID
+
+from negotiator.database_support.database_template import DatabaseTemplate
+from negotiator.database_support.result_mapping import map_rows
+from sqlalchemy import Connection, Row
+
+list_for_negotiation_statement = """
+                                 select b.id, b.negotiation_id, b.parent_branch_id, f.id, b.created_at,
+                                        b.id = n.head_branch_id, count(m.id)
+                                   from conversation_branches b
+                                   join negotiations n on n.id = b.negotiation_id
+                                   left join messages f on f.branch_id = b.parent_branch_id
+                                     and f.message_order = b.fork_message_order
+                                   left join messages m on m.branch_id = b.id
+                                   where b.negotiation_id = :negotiation_id
+                                   group by b.id, b.negotiation_created_at, f.id, n.head_branch_id
+                                   order by b.created_at, b.id
+                                 """
+
+# Only read when a negotiation has no branches in the partitioned tables, so the archive stays out of the hot path
+list_archived_for_negotiation_statement = """
+                                          select b.id, a.id, b.parent_branch_id, f.id, b.created_at,
+                                                 b.id = a.head_branch_id, jsonb_array_length(b.messages)
+                                            from archived_negotiations a
+                                            cross join jsonb_to_recordset(a.branches) as b (
+                                                id uuid, parent_branch_id uuid, fork_message_order int,
+                                                created_at timestamp, messages jsonb
+                                            )
+                                            left join lateral (
+                                                select pm.id
+                                                  from jsonb_to_recordset(a.branches) as p (id uuid, messages jsonb)
+                                                  cross join jsonb_to_recordset(p.messages)
+                                                      as pm (id uuid, message_order int)
+                                                  where p.id = b.parent_branch_id
+                                                  and pm.message_order = b.fork_message_order
+                                            ) f on true
+                                            where a.id = :negotiation_id
+                                            order by b.created_at, b.id
+                                          """
+
+
+@dataclass
+class BranchRecord:
+    id: UUID
+    negotiation_id: UUID
+    parent_branch_id: Optional[UUID]
+    # The last message of the parent branch that this branch continues from
+    fork_message_id: Optional[UUID]
+    created_at: datetime.datetime
+    head: bool
+    message_count: int
+
+
+# Every branch a negotiation has had, including the ones left behind by resets, archived or not
+class BranchRepository:
+    def __init__(self, db: DatabaseTemplate) -> None:
+        self.__db = db
+
+    def list_for_negotiation(
+            self,
+            negotiation_id: UUID,
+            connection: Optional[Connection] = None
+    ) -> List[BranchRecord]:
+        result = self.__db.query_prepared(
+            statement=list_for_negotiation_statement,
+            connection=connection,
+            negotiation_id=negotiation_id,
+        )
+        branches = map_rows(result, branch_record)
+        if branches:
+            return branches
+
+        result = self.__db.query_prepared(
+            statement=list_archived_for_negotiation_statement,
+            connection=connection,
+            negotiation_id=negotiation_id,
+        )
+
+        return map_rows(result, branch_record)
+
+
+def branch_record(row: Row[Any]) -> BranchRecord:
+    return BranchRecord(
+        id=cast(UUID, row[0]),
+        negotiation_id=cast(UUID, row[1]),
+        parent_branch_id=cast(Optional[UUID], row[2]),
+        fork_message_id=cast(Optional[UUID], row[3]),
+        created_at=cast(datetime.datetime, row[4]),
+        head=cast(bool, row[5]),
+        message_count=cast(int, row[6]),
+    )
@@ -0,0 +1,151 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional, cast
+from uuid import UUID
+
+from negotiator.negotiation.llm_resilience import Deadline
+from negotiator.negotiation.negotiation_service import Negotiation, Message
+from negotiator.negotiation.summary_repository import SummaryRepository, SummaryRecord
+
+message_overhead_tokens = 4
+prompt_roles = ['user', 'assistant', 'system']
+
+summary_instructions = 'You summarize the earlier part of a used car negotiation for the salesperson. ' \
+                       'Keep every price offered, accepted or rejected, any commitments made, and what ' \
+                       'the buyer has said about themselves. Reply with the updated summary only.'
+
+# Used when the caller gives no deadline for the turn
+summary_timeout_seconds = 30.0
+
+Summarize = Callable[[Optional[str], List[Message], float], str]
+
+
+# Roughly four bytes of English per token, plus the per message framing the chat format adds
+def estimate_tokens(text: str) -> int:
+    return (len(text.encode()) + 3) // 4 + message_overhead_tokens
+
+
+class TokenCounter:
+    def __init__(self, count_tokens: Callable[[str], int] = estimate_tokens, cache_size: int = 10_000) -> None:
+        self.__count_tokens = count_tokens
+        self.__cache_size = cache_size
+        self.__counts: OrderedDict[UUID, int] = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def count(self, message: Message) -> int:
+        with self.__lock:
+            tokens = self.__counts.get(message.id)
+            if tokens is not None:
+                self.__counts.move_to_end(message.id)
+                return tokens
+
+        tokens = self.__count_tokens(message.content)
+        with self.__lock:
+            self.__counts[message.id] = tokens
+            while len(self.__counts) > self.__cache_size:
+                self.__counts.popitem(last=False)
+
+        return tokens
+
+    def count_text(self, text: str) -> int:
+        return self.__count_tokens(text)
+
+    def total(self, messages: List[Message]) -> int:
+        return sum(self.count(message) for message in messages)
+
+
+class LLMSummarizer:
+    def __init__(self, call_llm: Any, model: str) -> None:
+        self.__call_llm = call_llm
+        self.__model = model
+
+    def __call__(self, previous_summary: Optional[str], messages: List[Message], timeout: float) -> str:
+        transcript = '\n'.join(f'{message.role}: {message.content}' for message in messages)
+        completion = self.__call_llm(
+            timeout=timeout,
+            model=self.__model,
+            temperature=0,
+            messages=[
+                {'role': 'system', 'content': summary_instructions},
+                {'role': 'user', 'content': f'Summary so far:\n{previous_summary or "(none)"}\n\n'
+                                            f'New messages:\n{transcript}'},
+            ],
+        )
+
+        return cast(str, completion.choices[0].message.content or '')
+
+
+class ContextWindow:
+    def __init__(
+            self,
+            summary_repository: SummaryRepository,
+            summarize: Summarize,
+            token_budget: int = 3_000,
+            refresh_ratio: float = 0.5,
+            token_counter: Optional[TokenCounter] = None,
+    ) -> None:
+        self.__summary_repository = summary_repository
+        self.__summarize = summarize
+        self.__token_budget = token_budget
+        self.__refresh_ratio = refresh_ratio
+        self.__token_counter = token_counter or TokenCounter()
+
+    # Keeps the opening message and the most recent turns, older turns are folded into a rolling summary.
+    # The summary is only refreshed once the turns after it outgrow the budget, and then it absorbs enough
+    # of them to leave headroom for several more turns.
+    def messages_dict(self, negotiation: Negotiation, deadline: Optional[Deadline] = None) -> list[dict[str, str]]:
+        messages = [message for message in negotiation.messages if message.role in prompt_roles]
+        if len(messages) < 3:
+            return to_dicts(messages)
+
+        opening, rest = messages[0], messages[1:]
+        budget = self.__token_budget - self.__token_counter.count(opening)
+        if self.__token_counter.total(rest) <= budget:
+            return to_dicts(messages)
+
+        summary = self.__summary_repository.find(negotiation.id)
+        summarized_ids = [message.id for message in rest[:-1]]
+        if summary is not None and summary.through_message_id in summarized_ids:
+            start = summarized_ids.index(summary.through_message_id) + 1
+            summary_content: Optional[str] = summary.content
+            summary_tokens = self.__token_counter.count_text(summary.content)
+        else:
+            start, summary_content, summary_tokens = 0, None, 0
+
+        if summary_content is not None and self.__token_counter.total(rest[start:]) + summary_tokens <= budget:
+            return with_summary(opening, summary_content, rest[start:])
+
+        split = self.__split(rest, self.__refresh_ratio * budget)
+        if split <= start:
+            return with_summary(opening, summary_content, rest[start:])
+
+        timeout = deadline.check() if deadline is not None else summary_timeout_seconds
+        summary_content = self.__summarize(summary_content, rest[start:split], timeout)
+        self.__summary_repository.save(SummaryRecord(negotiation.id, summary_content, rest[split - 1].id))
+
+        return with_summary(opening, summary_content, rest[split:])
+
+    # The newest message always stays verbatim, it is the one being answered
+    def __split(self, messages: List[Message], tokens: float) -> int:
+        split = len(messages) - 1
+        remaining = tokens - self.__token_counter.count(messages[split])
+        while split > 0 and self.__token_counter.count(messages[split - 1]) <= remaining:
+            split -= 1
+            remaining -= self.__token_counter.count(messages[split])
+
+        return split
+
+
+def to_dicts(messages: List[Message]) -> list[dict[str, str]]:
+    return [{'role': message.role, 'content': message.content} for message in messages]
+
+
+def with_summary(opening: Message, summary: Optional[str], recent: List[Message]) -> list[dict[str, str]]:
+    if summary is None:
+        return to_dicts([opening, *recent])
+
+    return [
+        *to_dicts([opening]),
+        {'role': 'system', 'content': f'Summary of the earlier conversation: {summary}'},
+        *to_dicts(recent),
+    ]
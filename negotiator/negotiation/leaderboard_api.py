@@ -0,0 +1,54 @@
+from dataclasses import dataclass
+from typing import List
+
+from flask import Blueprint, request, jsonify, Response
+from flask.typing import ResponseReturnValue
+
+from negotiator.negotiation.negotiation_service import NegotiationService
+from negotiator.negotiation.resolution_repository import ResolutionRecord
+from negotiator.web_support import json_support
+
+default_limit = 10
+max_limit = 100
+
+
+@dataclass
+class LeaderboardEntryInfo:
+    negotiation_id: str
+    final_price: int
+    rank: int
+
+
+def leaderboard_api(negotiation_service: NegotiationService) -> Blueprint:
+    api = Blueprint('leaderboard_api', __name__)
+
+    @api.get('/leaderboard')
+    def leaderboard() -> ResponseReturnValue:
+        limit = read_limit(request.args.get('limit'))
+        if limit is None:
+            return jsonify({'error': 'limit must be a positive integer'}), 400
+
+        records = negotiation_service.leaderboard(limit)
+        return Response(json_support.encode(to_info(records)), mimetype='application/json')
+
+    return api
+
+
+def read_limit(value: str | None) -> int | None:
+    if value is None:
+        return default_limit
+    if not value.isdigit() or int(value) == 0:
+        return None
+
+    return min(int(value), max_limit)
+
+
+def to_info(records: List[ResolutionRecord]) -> List[LeaderboardEntryInfo]:
+    return [
+        LeaderboardEntryInfo(
+            negotiation_id=str(record.negotiation_id),
+            final_price=record.final_price,
+            rank=record.rank,
+        )
+        for record in records
+    ]
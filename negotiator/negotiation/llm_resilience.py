@@ -0,0 +1,280 @@
+import asyncio
+import concurrent.futures
+import inspect
+import logging
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
+
+import httpx
+import openai
+
+logger = logging.getLogger(__name__)
+
+retryable_errors = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+# Once a stream is open its chunks are read straight from the connection, so transport errors arrive unwrapped
+stream_errors = (*retryable_errors, httpx.TransportError)
+
+
+class LLMUnavailable(Exception):
+    pass
+
+
+class CircuitOpen(LLMUnavailable):
+    pass
+
+
+class DeadlineExceeded(LLMUnavailable):
+    pass
+
+
+class Deadline:
+    def __init__(self, seconds: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.__clock = clock
+        self.__expires_at = clock() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.__expires_at - self.__clock())
+
+    def check(self) -> float:
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded('The chat turn ran out of time')
+        return remaining
+
+
+class CircuitBreaker:
+    def __init__(
+            self,
+            failure_threshold: int = 5,
+            reset_seconds: float = 30.0,
+            clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.__failure_threshold = failure_threshold
+        self.__reset_seconds = reset_seconds
+        self.__clock = clock
+        self.__failures = 0
+        self.__opened_at: Optional[float] = None
+        self.__trial_in_flight = False
+        self.__lock = threading.Lock()
+
+    # Once the reset period has passed a single trial call is let through, its result closes or reopens the circuit
+    def allow(self) -> None:
+        with self.__lock:
+            if self.__opened_at is None:
+                return
+            if self.__clock() - self.__opened_at < self.__reset_seconds or self.__trial_in_flight:
+                raise CircuitOpen('The language model is unavailable')
+            self.__trial_in_flight = True
+
+    def record_success(self) -> None:
+        with self.__lock:
+            self.__failures = 0
+            self.__opened_at = None
+            self.__trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self.__lock:
+            self.__failures += 1
+            self.__trial_in_flight = False
+            if self.__opened_at is not None or self.__failures >= self.__failure_threshold:
+                self.__opened_at = self.__clock()
+
+    # A call rejected for its own reasons, like a bad request, says nothing about whether the model is available
+    def release(self) -> None:
+        with self.__lock:
+            self.__trial_in_flight = False
+
+    def is_open(self) -> bool:
+        with self.__lock:
+            return self.__opened_at is not None
+
+
+class RetryPolicy:
+    def __init__(
+            self,
+            max_attempts: int = 3,
+            base_backoff_seconds: float = 0.25,
+            max_backoff_seconds: float = 2.0,
+            hedge_after_seconds: Optional[float] = None,
+    ) -> None:
+        self.max_attempts = max_attempts
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.hedge_after_seconds = hedge_after_seconds
+
+    def backoff_seconds(self, attempt: int) -> float:
+        delay = min(self.max_backoff_seconds, self.base_backoff_seconds * 2 ** attempt)
+        return random.uniform(delay / 2, delay)
+
+
+# The timeout argument is the whole budget for the call, each attempt gets what is left of it
+class ResilientLLMCall:
+    def __init__(
+            self,
+            call_llm: Any,
+            breaker: CircuitBreaker,
+            policy: RetryPolicy,
+            clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.__call_llm = call_llm
+        self.__breaker = breaker
+        self.__policy = policy
+        self.__clock = clock
+        self.__executor = concurrent.futures.ThreadPoolExecutor(thread_name_prefix='llm-hedge')
+
+    def __call__(self, timeout: float = 60.0, **kwargs: Any) -> Any:
+        deadline = Deadline(timeout, self.__clock)
+
+        for attempt in range(self.__policy.max_attempts):
+            self.__breaker.allow()
+            try:
+                result = self.__attempt(deadline, kwargs)
+            except DeadlineExceeded:
+                self.__breaker.record_failure()
+                raise
+            except retryable_errors as e:
+                self.__breaker.record_failure()
+                if attempt + 1 == self.__policy.max_attempts:
+                    raise LLMUnavailable('The language model did not respond') from e
+
+                delay = self.__policy.backoff_seconds(attempt)
+                logger.warning('Language model call failed, retrying in %.2fs', delay, exc_info=True)
+                time.sleep(min(delay, deadline.remaining()))
+                continue
+            except Exception:
+                self.__breaker.release()
+                raise
+
+            self.__breaker.record_success()
+            return self.__stream(result, deadline) if kwargs.get('stream') else result
+
+        raise LLMUnavailable('The language model did not respond')
+
+    # A stream that breaks off or outlasts the deadline counts against the breaker like a failed call
+    def __stream(self, chunks: Any, deadline: Deadline) -> Iterator[Any]:
+        try:
+            for chunk in chunks:
+                deadline.check()
+                yield chunk
+        except DeadlineExceeded:
+            self.__breaker.record_failure()
+            raise
+        except stream_errors as e:
+            self.__breaker.record_failure()
+            raise LLMUnavailable('The language model stopped responding') from e
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+    def __attempt(self, deadline: Deadline, kwargs: dict[str, Any]) -> Any:
+        hedge_after = self.__policy.hedge_after_seconds
+        if hedge_after is None or hedge_after >= deadline.remaining():
+            return self.__call_llm(timeout=deadline.check(), **kwargs)
+
+        primary = self.__executor.submit(self.__call_llm, timeout=deadline.check(), **kwargs)
+        done, _ = concurrent.futures.wait([primary], timeout=hedge_after)
+        if done:
+            return primary.result()
+
+        hedge = self.__executor.submit(self.__call_llm, timeout=deadline.check(), **kwargs)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = concurrent.futures.wait(
+                pending, timeout=deadline.check(), return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None or not pending:
+                    for loser in pending:
+                        loser.add_done_callback(close_result)
+                    return future.result()
+
+        raise DeadlineExceeded('The chat turn ran out of time')
+
+
+class AsyncResilientLLMCall:
+    def __init__(
+            self,
+            call_llm: Any,
+            breaker: CircuitBreaker,
+            policy: RetryPolicy,
+            clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.__call_llm = call_llm
+        self.__breaker = breaker
+        self.__policy = policy
+        self.__clock = clock
+
+    async def __call__(self, timeout: float = 60.0, **kwargs: Any) -> Any:
+        deadline = Deadline(timeout, self.__clock)
+
+        for attempt in range(self.__policy.max_attempts):
+            self.__breaker.allow()
+            try:
+                result = await self.__attempt(deadline, kwargs)
+            except DeadlineExceeded:
+                self.__breaker.record_failure()
+                raise
+            except retryable_errors as e:
+                self.__breaker.record_failure()
+                if attempt + 1 == self.__policy.max_attempts:
+                    raise LLMUnavailable('The language model did not respond') from e
+
+                delay = self.__policy.backoff_seconds(attempt)
+                logger.warning('Language model call failed, retrying in %.2fs', delay, exc_info=True)
+                await asyncio.sleep(min(delay, deadline.remaining()))
+                continue
+            except Exception:
+                self.__breaker.release()
+                raise
+
+            self.__breaker.record_success()
+            return self.__stream(result, deadline) if kwargs.get('stream') else result
+
+        raise LLMUnavailable('The language model did not respond')
+
+    async def __stream(self, chunks: Any, deadline: Deadline) -> AsyncIterator[Any]:
+        try:
+            async for chunk in chunks:
+                deadline.check()
+                yield chunk
+        except DeadlineExceeded:
+            self.__breaker.record_failure()
+            raise
+        except stream_errors as e:
+            self.__breaker.record_failure()
+            raise LLMUnavailable('The language model stopped responding') from e
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                closed = close()
+                if inspect.isawaitable(closed):
+                    await closed
+
+    async def __attempt(self, deadline: Deadline, kwargs: dict[str, Any]) -> Any:
+        hedge_after = self.__policy.hedge_after_seconds
+        if hedge_after is None or hedge_after >= deadline.remaining():
+            return await self.__call_llm(timeout=deadline.check(), **kwargs)
+
+        primary = asyncio.ensure_future(self.__call_llm(timeout=deadline.check(), **kwargs))
+        done, _ = await asyncio.wait([primary], timeout=hedge_after)
+        if done:
+            return primary.result()
+
+        hedge = asyncio.ensure_future(self.__call_llm(timeout=deadline.check(), **kwargs))
+        pending = {primary, hedge}
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=deadline.check(), return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None or not pending:
+                    for loser in pending:
+                        loser.cancel()
+                    return future.result()
+
+        raise DeadlineExceeded('The chat turn ran out of time')
+
+
+def close_result(future: concurrent.futures.Future) -> None:
+    if future.exception() is None and hasattr(future.result(), 'close'):
+        future.result().close()
@@ -1,15 +1,23 @@
+import dataclasses
 import json
+import logging
 import time
 from dataclasses import dataclass
-from typing import Any
-from uuid import uuid4
+from typing import Any, Iterator, cast
+from uuid import UUID, uuid4
 
-from freeplay import Freeplay, RecordPayload, CallInfo, ResponseInfo
-from freeplay.model import OpenAIFunctionCall
+from freeplay import Freeplay, CallInfo
 from freeplay.resources.prompts import FormattedPrompt
 from freeplay.resources.sessions import Session, TraceInfo
 
+from negotiator.database_support.database_template import DatabaseTemplate
+from negotiator.metrics_support.metrics import timed_stage, record_usage, negotiations_resolved
+from negotiator.negotiation.context_window import ContextWindow
+from negotiator.negotiation.llm_resilience import Deadline, LLMUnavailable
 from negotiator.negotiation.negotiation_service import NegotiationService, Negotiation, Message
+from negotiator.negotiation.prompt_template_cache import PromptTemplateCache
+from negotiator.negotiation.response_cache import ResponseCache
+from negotiator.recording.recording_outbox import RecordingOutbox, FreeplayRecording
 
 RESOLVE_NEGOTIATION_TOOL_NAME = "resolve_negotiation"
 resolve_negotiation_tool_spec = {
@@ -32,117 +40,347 @@ resolve_negotiation_tool_spec = {
     },
 }
 
+logger = logging.getLogger(__name__)
+
 freeplay_prompt_name = 'negotiator'
 freeplay_environment = 'latest'
 
+unavailable_reply = 'Sorry, I need to step away for a moment. Could you send that again in a minute?'
+minimum_write_seconds = 1.0
+
 
 @dataclass
 class ResolvedNegotiation:
     final_price: int
     leaderboard_rank: int
+    total_negotiations: int
+
+
+@dataclass
+class ChatTurnDelta:
+    content: str
+
+
+@dataclass
+class ChatTurnReply:
+    id: UUID
+    content: str
+    # Replies that were never saved, like the one sent when the model is unavailable, have nothing to reset to
+    resettable: bool = True
+
+
+ChatTurnEvent = ChatTurnDelta | ChatTurnReply | ResolvedNegotiation
+
+
+def unavailable_turn_reply() -> ChatTurnReply:
+    return ChatTurnReply(id=uuid4(), content=unavailable_reply, resettable=False)
+
+
+@dataclass
+class LLMResponse:
+    content: str
+    tool_name: str | None = None
+    tool_arguments: str = ''
+
+    @classmethod
+    def from_message(cls, message: Any) -> 'LLMResponse':
+        if message.tool_calls:
+            function = message.tool_calls[0].function
+            return cls(content=message.content or '', tool_name=function.name, tool_arguments=function.arguments)
+
+        return cls(content=message.content or '')
+
+    def resolves_negotiation(self) -> bool:
+        return self.tool_name == RESOLVE_NEGOTIATION_TOOL_NAME
+
+
+@dataclass
+class ChatTurn:
+    negotiation: Negotiation
+    user_message: Message
+    prompt: FormattedPrompt
+    session: Session
+    trace: TraceInfo
+    deadline: Deadline
+
+    def model(self) -> str:
+        return self.prompt.prompt_info.model
+
+    def llm_arguments(self, **kwargs: Any) -> dict[str, Any]:
+        return {
+            'model': self.prompt.prompt_info.model,
+            'messages': self.prompt.llm_prompt,
+            'tools': [resolve_negotiation_tool_spec],
+            **kwargs,
+            **self.prompt.prompt_info.model_parameters,
+        }
+
+
+class StreamedReply:
+    def __init__(self) -> None:
+        self.tool_name: str | None = None
+        self.usage: Any = None
+        self.__content_parts: list[str] = []
+        self.__tool_argument_parts: list[str] = []
+
+    def add(self, chunk: Any) -> str | None:
+        if getattr(chunk, 'usage', None) is not None:
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return None
+        delta = chunk.choices[0].delta
+
+        for tool_call in delta.tool_calls or []:
+            if tool_call.index != 0 or tool_call.function is None:
+                continue
+            if tool_call.function.name:
+                self.tool_name = tool_call.function.name
+            if tool_call.function.arguments:
+                self.__tool_argument_parts.append(tool_call.function.arguments)
+
+        if not delta.content or self.tool_name is not None:
+            return None
+
+        self.__content_parts.append(delta.content)
+        return cast(str, delta.content)
+
+    def resolves_negotiation(self) -> bool:
+        return self.tool_name == RESOLVE_NEGOTIATION_TOOL_NAME
+
+    def content(self) -> str:
+        return ''.join(self.__content_parts)
+
+    def tool_arguments(self) -> str:
+        return ''.join(self.__tool_argument_parts)
+
+    def response(self) -> LLMResponse:
+        return LLMResponse(content=self.content(), tool_name=self.tool_name, tool_arguments=self.tool_arguments())
 
 
 class LLMService:
     def __init__(
             self,
+            db: DatabaseTemplate,
             negotiation_service: NegotiationService,
             freeplay_client: Freeplay,
+            prompt_templates: PromptTemplateCache,
+            context_window: ContextWindow,
+            response_cache: ResponseCache[LLMResponse],
+            recording_outbox: RecordingOutbox,
             call_llm: Any,
-            freeplay_project_id: str
+            freeplay_project_id: str,
+            turn_timeout_seconds: float = 30.0,
+            prompt_environment: str = freeplay_environment,
     ):
+        self.db = db
         self.negotiation_service = negotiation_service
         self.freeplay_client = freeplay_client
+        self.prompt_templates = prompt_templates
+        self.context_window = context_window
+        self.response_cache = response_cache
+        self.recording_outbox = recording_outbox
         self.call_llm = call_llm
         self.freeplay_project_id = freeplay_project_id
+        self.turn_timeout_seconds = turn_timeout_seconds
+        self.prompt_environment = prompt_environment
 
-    def call_and_record_negotiator_chat_turn(self, negotiation: Negotiation, user_message: Message) -> str | ResolvedNegotiation:
-        # Retrieve prompt from Freeplay
-        prompt = self.freeplay_client.prompts.get_formatted(
-            self.freeplay_project_id,
-            freeplay_prompt_name,
-            freeplay_environment,
-            {},
-            negotiation.with_message(user_message).messages_dict()
-        )
-        session = self.freeplay_client.sessions.restore_session(str(negotiation.id))
-        trace = session.create_trace(user_message.content)
+    def call_and_record_negotiator_chat_turn(
+            self,
+            negotiation: Negotiation,
+            user_message: Message,
+    ) -> ChatTurnReply | ResolvedNegotiation:
+        try:
+            turn = self.prepare_chat_turn(negotiation, user_message)
+        except LLMUnavailable as e:
+            logger.warning('Unable to prepare the chat turn for negotiation %s: %s', negotiation.id, e, exc_info=True)
+            return unavailable_turn_reply()
+        llm_arguments = turn.llm_arguments()
+        cache_key = self.response_cache.key(llm_arguments)
+
+        cached_response = self.response_cache.get(cache_key)
+        if cached_response is not None:
+            now = time.time()
+            return self.record_response(turn, now, now, cached_response)
 
         # Make the call to OpenAI
         start_time = time.time()
-        chat_completion = self.call_llm(
-            model=prompt.prompt_info.model,
-            messages=prompt.llm_prompt,
-            tools=[resolve_negotiation_tool_spec],
-            **prompt.prompt_info.model_parameters
-        )
+        try:
+            with timed_stage('llm_call', turn.model()):
+                chat_completion = self.call_llm(timeout=turn.deadline.check(), **llm_arguments)
+        except LLMUnavailable:
+            logger.warning('Language model unavailable for negotiation %s', negotiation.id, exc_info=True)
+            return unavailable_turn_reply()
         end_time = time.time()
+        record_usage(turn.model(), chat_completion.usage)
 
-        llm_message = chat_completion.choices[0].message
-
-        if llm_message.tool_calls and llm_message.tool_calls[0].function.name == RESOLVE_NEGOTIATION_TOOL_NAME:
-            arguments = llm_message.tool_calls[0].function.arguments
-            self.__log_message_to_freeplay(
-                negotiation,
-                prompt,
-                arguments,
-                session,
-                trace,
-                start_time,
-                end_time,
-                ResponseInfo(
-                    function_call_response=OpenAIFunctionCall(
-                        {'name': RESOLVE_NEGOTIATION_TOOL_NAME, 'arguments': arguments}))
-            )
-            tool_args = json.loads(arguments)
-            self.negotiation_service.add_messages(negotiation.id, [
-                user_message
-            ])
-            return self.resolve_negotiation(negotiation, **tool_args)
-
-        # Add message to Negotiation in the database
-        reply = llm_message.content
-        reply_id = uuid4()
-        self.negotiation_service.add_messages(negotiation.id, [
-            user_message,
-            Message(id=reply_id, role='assistant', content=reply),
-        ])
+        response = LLMResponse.from_message(chat_completion.choices[0].message)
+        self.response_cache.put(cache_key, response)
 
-        self.__log_message_to_freeplay(
-            negotiation, prompt, reply, session, trace, start_time, end_time, ResponseInfo()
-        )
+        return self.record_response(turn, start_time, end_time, response)
+
+    def stream_negotiator_chat_turn(self, negotiation: Negotiation, user_message: Message) -> Iterator[ChatTurnEvent]:
+        try:
+            turn = self.prepare_chat_turn(negotiation, user_message)
+        except LLMUnavailable as e:
+            logger.warning('Unable to prepare the chat turn for negotiation %s: %s', negotiation.id, e, exc_info=True)
+            yield ChatTurnDelta(unavailable_reply)
+            yield unavailable_turn_reply()
+            return
+        llm_arguments = turn.llm_arguments(stream=True, stream_options={'include_usage': True})
+        cache_key = self.response_cache.key(llm_arguments)
+
+        cached_response = self.response_cache.get(cache_key)
+        if cached_response is not None:
+            now = time.time()
+            yield from self.stream_response(turn, now, now, cached_response)
+            return
+
+        # Stream the call to OpenAI, forwarding content as it arrives
+        start_time = time.time()
+        try:
+            with timed_stage('llm_call', turn.model()):
+                chunks = self.call_llm(timeout=turn.deadline.check(), **llm_arguments)
+        except LLMUnavailable:
+            logger.warning('Language model unavailable for negotiation %s', negotiation.id, exc_info=True)
+            yield ChatTurnDelta(unavailable_reply)
+            yield unavailable_turn_reply()
+            return
+
+        # The reply replaces whatever arrived before the stream broke off
+        streamed_reply = StreamedReply()
+        try:
+            with timed_stage('llm_stream', turn.model()):
+                for chunk in chunks:
+                    turn.deadline.check()
+                    content = streamed_reply.add(chunk)
+                    if content is not None:
+                        yield ChatTurnDelta(content)
+        except LLMUnavailable:
+            logger.warning('Language model stream broke off for negotiation %s', negotiation.id, exc_info=True)
+            yield unavailable_turn_reply()
+            return
+        end_time = time.time()
+        record_usage(turn.model(), streamed_reply.usage)
+
+        response = streamed_reply.response()
+        self.response_cache.put(cache_key, response)
+
+        yield from self.stream_response(turn, start_time, end_time, response, streamed=True)
 
-        return reply
+    def resolve_negotiation(self, negotiation: Negotiation, final_price: float) -> ResolvedNegotiation:
+        resolution = self.negotiation_service.resolve(negotiation.id, round(final_price))
 
-    def resolve_negotiation(self, negotiation: Negotiation, final_price: int) -> ResolvedNegotiation:
-        # TODO: Make your changes here!
         return ResolvedNegotiation(
-            final_price,
-            leaderboard_rank=0
+            resolution.final_price,
+            leaderboard_rank=resolution.rank.rank,
+            total_negotiations=resolution.rank.total,
         )
 
-    def __log_message_to_freeplay(
+    def prepare_chat_turn(self, negotiation: Negotiation, user_message: Message) -> ChatTurn:
+        deadline = Deadline(self.turn_timeout_seconds)
+
+        # Retrieve prompt from the cached Freeplay template
+        with timed_stage('prompt_fetch') as stage:
+            template = self.prompt_templates.get(
+                self.freeplay_project_id, freeplay_prompt_name, self.prompt_environment)
+            stage.model = template.prompt_info.model
+        model = template.prompt_info.model
+
+        with timed_stage('context_window', model):
+            history = self.context_window.messages_dict(negotiation.with_message(user_message), deadline)
+        prompt = template.bind({}, history).format()
+
+        with timed_stage('session_restore', model):
+            session = self.freeplay_client.sessions.restore_session(str(negotiation.id))
+            trace = session.create_trace(user_message.content)
+
+        return ChatTurn(negotiation, user_message, prompt, session, trace, deadline)
+
+    def record_response(
             self,
-            negotiation: Negotiation,
-            prompt: FormattedPrompt,
+            turn: ChatTurn,
+            start_time: float,
+            end_time: float,
+            response: LLMResponse
+    ) -> ChatTurnReply | ResolvedNegotiation:
+        if response.resolves_negotiation():
+            return self.record_resolution(turn, start_time, end_time, response.tool_arguments)
+
+        reply_id = self.record_reply(turn, start_time, end_time, response.content)
+        return ChatTurnReply(id=reply_id, content=response.content)
+
+    def stream_response(
+            self,
+            turn: ChatTurn,
+            start_time: float,
+            end_time: float,
+            response: LLMResponse,
+            streamed: bool = False
+    ) -> Iterator[ChatTurnEvent]:
+        if response.resolves_negotiation():
+            yield self.record_resolution(turn, start_time, end_time, response.tool_arguments)
+            return
+
+        if not streamed and response.content:
+            yield ChatTurnDelta(response.content)
+        reply_id = self.record_reply(turn, start_time, end_time, response.content)
+
+        yield ChatTurnReply(id=reply_id, content=response.content)
+
+    def record_resolution(self, turn: ChatTurn, start_time: float, end_time: float, arguments: str) -> ResolvedNegotiation:
+        recording = self.freeplay_recording(
+            turn, arguments, start_time, end_time,
+            function_call={'name': RESOLVE_NEGOTIATION_TOOL_NAME, 'arguments': arguments}
+        )
+        tool_args = json.loads(arguments)
+        self.__save_turn(turn, [turn.user_message], recording)
+
+        resolved = self.resolve_negotiation(turn.negotiation, **tool_args)
+        negotiations_resolved.labels(turn.model()).inc()
+        return resolved
+
+    def record_reply(self, turn: ChatTurn, start_time: float, end_time: float, reply: str) -> UUID:
+        reply_id = uuid4()
+        recording = self.freeplay_recording(turn, reply, start_time, end_time)
+        self.__save_turn(turn, [
+            turn.user_message,
+            Message(id=reply_id, role='assistant', content=reply),
+        ], recording)
+
+        return reply_id
+
+    def __save_turn(self, turn: ChatTurn, messages: list[Message], recording: FreeplayRecording) -> None:
+        # Add messages to Negotiation in the database, recording to Freeplay once they are committed.
+        # A reply that already arrived is worth saving, so the writes get a little time even past the deadline.
+        statement_timeout = max(turn.deadline.remaining(), minimum_write_seconds)
+        with timed_stage('db_write', turn.model()), self.db.transaction(statement_timeout) as connection:
+            self.negotiation_service.add_messages(turn.negotiation.id, messages, connection)
+            outbox_entry = self.recording_outbox.add(recording, connection)
+
+        self.recording_outbox.enqueue(outbox_entry)
+
+    def freeplay_recording(
+            self,
+            turn: ChatTurn,
             reply: str,
-            session: Session,
-            trace: TraceInfo,
             start_time: float,
             end_time: float,
-            response_info: ResponseInfo
-    ) -> None:
-        all_messages = prompt.all_messages({'role': 'assistant', 'content': reply})
-        self.freeplay_client.recordings.create(
-            RecordPayload(
-                all_messages=all_messages,
-                inputs={
-                    'initial_assistant_message': negotiation.messages[0].content
-                },
-                session_info=session.session_info,
-                prompt_info=prompt.prompt_info,
-                call_info=CallInfo.from_prompt_info(prompt.prompt_info, start_time=start_time, end_time=end_time),
-                response_info=response_info,
-                trace_info=trace
-            )
+            function_call: dict[str, str] | None = None
+    ) -> FreeplayRecording:
+        prompt = turn.prompt
+        return FreeplayRecording(
+            project_id=self.freeplay_project_id,
+            session_id=turn.session.session_id,
+            trace_id=turn.trace.trace_id,
+            trace_input=turn.trace.input or '',
+            output=reply,
+            all_messages=prompt.all_messages({'role': 'assistant', 'content': reply}),
+            inputs={
+                'initial_assistant_message': turn.negotiation.messages[0].content
+            },
+            prompt_info=dataclasses.asdict(prompt.prompt_info),
+            call_info=dataclasses.asdict(
+                CallInfo.from_prompt_info(prompt.prompt_info, start_time=start_time, end_time=end_time)
+            ),
+            function_call=function_call,
         )
-        trace.record_output(self.freeplay_project_id, reply)
@@ -1,10 +1,104 @@
 from dataclasses import dataclass
-from typing import Optional, cast, List
+from typing import Optional, cast, List, Any
 from uuid import UUID, uuid4
 
-from negotiator.database_support.database_template import DatabaseTemplate
-from negotiator.database_support.result_mapping import map_one_result, map_results
-from sqlalchemy import Connection
+from negotiator.database_support.database_template import DatabaseTemplate, AsyncDatabaseTemplate
+from negotiator.database_support.result_mapping import map_rows
+from sqlalchemy import Connection, Row
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+# New messages go on the head branch. After a reset the head points into the middle of a branch, so the first new
+# message starts a branch that forks there, and a negotiation gets its root branch with its first message.
+# Archived negotiations are no longer in the negotiations table, so nothing is inserted for them.
+create_many_statement = """
+                        with head as (
+                            select created_at, head_branch_id, head_message_order from negotiations
+                                where id = cast(:negotiation_id as uuid)
+                                for no key update
+                        ), fork as (
+                            insert into conversation_branches
+                                (id, negotiation_id, negotiation_created_at, parent_branch_id, fork_message_order)
+                                select cast(:branch_id as uuid), cast(:negotiation_id as uuid), created_at,
+                                       head_branch_id, head_message_order
+                                    from head
+                                    where head_branch_id is null
+                                    or exists (
+                                        select 1 from messages
+                                            where branch_id = head.head_branch_id
+                                            and message_order > head.head_message_order
+                                    )
+                                returning id
+                        ), moved_head as (
+                            update negotiations
+                                set head_branch_id = coalesce((select id from fork), head_branch_id),
+                                    head_message_order = null
+                                where id = cast(:negotiation_id as uuid)
+                                and (head_branch_id is null or head_message_order is not null)
+                        )
+                        insert into messages (id, negotiation_id, negotiation_created_at, branch_id, role, content)
+                            select new_messages.id, cast(:negotiation_id as uuid), head.created_at,
+                                   coalesce((select id from fork), head.head_branch_id), role, content
+                                from head,
+                                     unnest(cast(:ids as uuid[]), cast(:roles as text[]), cast(:contents as text[]))
+                                         with ordinality as new_messages (id, role, content, position)
+                                order by position
+                            returning id
+                        """
+
+# Reads the head branch and the part of each ancestor branch before it forked, one index range scan per branch
+list_for_negotiation_statement = """
+                                 select m.id, m.negotiation_id, m.role, m.content from negotiations n
+                                   join branch_path(n.head_branch_id, n.head_message_order) p on true
+                                   join messages m on m.branch_id = p.branch_id
+                                     and m.negotiation_created_at = n.created_at
+                                     and m.message_order <= p.through_message_order
+                                   where n.id = :negotiation_id
+                                   order by m.message_order
+                                 """
+
+list_for_branch_statement = """
+                            select m.id, m.negotiation_id, m.role, m.content from branch_path(:branch_id, null) p
+                              join messages m on m.branch_id = p.branch_id
+                                and m.message_order <= p.through_message_order
+                              order by m.message_order
+                            """
+
+# The same walk over the branches of the archived negotiation holding the branch, found through the gin index
+list_archived_for_branch_statement = """
+                                     with recursive archived_branches as (
+                                         select a.id as negotiation_id, b.id, b.parent_branch_id,
+                                                b.fork_message_order, b.messages
+                                           from archived_negotiations a
+                                           cross join jsonb_to_recordset(a.branches) as b (
+                                               id uuid, parent_branch_id uuid, fork_message_order int, messages jsonb
+                                           )
+                                           where a.branches @> jsonb_build_array(
+                                               jsonb_build_object('id', cast(cast(:branch_id as uuid) as text))
+                                           )
+                                     ), path (branch_id, parent_branch_id, fork_message_order, through_message_order)
+                                     as (
+                                         select id, parent_branch_id, fork_message_order, 2147483647
+                                           from archived_branches
+                                           where id = cast(:branch_id as uuid)
+                                         union all
+                                         select b.id, b.parent_branch_id, b.fork_message_order, path.fork_message_order
+                                           from path
+                                           join archived_branches b on b.id = path.parent_branch_id
+                                     )
+                                     select m.id, b.negotiation_id, m.role, m.content from path
+                                       join archived_branches b on b.id = path.branch_id
+                                       cross join jsonb_to_recordset(b.messages)
+                                           as m (id uuid, role text, content text, message_order int)
+                                       where m.message_order <= path.through_message_order
+                                       order by m.message_order
+                                     """
+
+
+@dataclass
+class NewMessage:
+    id: UUID
+    role: str
+    content: str
 
 
 @dataclass
@@ -27,61 +121,116 @@ class MessageRepository:
         content: str,
         connection: Optional[Connection] = None
     ) -> Optional[UUID]:
-        result = self.__db.query(
-            statement="""
-                    insert into messages (id, negotiation_id, role, content)
-                        values (:id, :negotiation_id, :role, :content)
-                        returning id
-                    """,
+        ids = self.create_many(negotiation_id, [NewMessage(id, role, content)], connection)
+        return ids[0] if ids else None
+
+    def create_many(
+        self,
+        negotiation_id: UUID,
+        messages: List[NewMessage],
+        connection: Optional[Connection] = None
+    ) -> List[UUID]:
+        if not messages:
+            return []
+
+        result = self.__db.query_prepared(
+            statement=create_many_statement,
             connection=connection,
-            id=id,
             negotiation_id=negotiation_id,
-            role=role,
-            content=content,
+            branch_id=uuid4(),
+            ids=[message.id for message in messages],
+            roles=[message.role for message in messages],
+            contents=[message.content for message in messages],
         )
 
-        return map_one_result(result, lambda row: cast(UUID, row['id']))
+        return map_rows(result, lambda row: cast(UUID, row[0]))
 
     def list_for_negotiation(
         self,
         negotiation_id: UUID,
         connection: Optional[Connection] = None
     ) -> List[MessageRecord]:
-        result = self.__db.query(
-            statement="""
-                      select id, negotiation_id, role, content from messages
-                        where negotiation_id = :negotiation_id
-                        order by created_at
-                      """,
+        result = self.__db.query_prepared(
+            statement=list_for_negotiation_statement,
             connection=connection,
             negotiation_id=negotiation_id,
         )
 
-        return map_results(result, lambda row: MessageRecord(
-            id=cast(UUID, row['id']),
-            negotiation_id=cast(UUID, row['negotiation_id']),
-            role=cast(str, row['role']),
-            content=cast(str, row['content']),
-        ))
+        return map_rows(result, message_record)
+
+    def list_for_branch(self, branch_id: UUID, connection: Optional[Connection] = None) -> List[MessageRecord]:
+        result = self.__db.query_prepared(
+            statement=list_for_branch_statement,
+            connection=connection,
+            branch_id=branch_id,
+        )
+        messages = map_rows(result, message_record)
+        if messages:
+            return messages
+
+        result = self.__db.query_prepared(
+            statement=list_archived_for_branch_statement,
+            connection=connection,
+            branch_id=branch_id,
+        )
+
+        return map_rows(result, message_record)
+
 
-    def truncate_for_negotiation(
+class AsyncMessageRepository:
+    def __init__(self, db: AsyncDatabaseTemplate) -> None:
+        self.__db = db
+
+    async def create(
         self,
         negotiation_id: UUID,
-        at_message_id: UUID,
-        connection: Optional[Connection] = None
-    ) -> None:
-        self.__db.query(
-            statement="""
-                      delete from messages
-                        where negotiation_id = :negotiation_id
-                        and id <> :message_id
-                        and message_order > (
-                            select message_order from messages
-                                where negotiation_id = :negotiation_id
-                                and id = :message_id
-                        )
-                      """,
+        id: UUID,
+        role: str,
+        content: str,
+        connection: Optional[AsyncConnection] = None
+    ) -> Optional[UUID]:
+        ids = await self.create_many(negotiation_id, [NewMessage(id, role, content)], connection)
+        return ids[0] if ids else None
+
+    async def create_many(
+        self,
+        negotiation_id: UUID,
+        messages: List[NewMessage],
+        connection: Optional[AsyncConnection] = None
+    ) -> List[UUID]:
+        if not messages:
+            return []
+
+        result = await self.__db.query_prepared(
+            statement=create_many_statement,
             connection=connection,
             negotiation_id=negotiation_id,
-            message_id=at_message_id,
+            branch_id=uuid4(),
+            ids=[message.id for message in messages],
+            roles=[message.role for message in messages],
+            contents=[message.content for message in messages],
         )
+
+        return map_rows(result, lambda row: cast(UUID, row[0]))
+
+    async def list_for_negotiation(
+        self,
+        negotiation_id: UUID,
+        connection: Optional[AsyncConnection] = None
+    ) -> List[MessageRecord]:
+        result = await self.__db.query_prepared(
+            statement=list_for_negotiation_statement,
+            connection=connection,
+            negotiation_id=negotiation_id,
+        )
+
+        return map_rows(result, message_record)
+
+
+def message_record(row: Row[Any]) -> MessageRecord:
+    return MessageRecord(
+        id=cast(UUID, row[0]),
+        negotiation_id=cast(UUID, row[1]),
+        role=cast(str, row[2]),
+        content=cast(str, row[3]),
+    )
@@ -0,0 +1,298 @@
+import logging
+import select
+import threading
+from collections import OrderedDict
+from typing import Optional, List
+from uuid import UUID, uuid4
+
+import psycopg2
+from sqlalchemy import Connection, event
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from negotiator.database_support.database_template import DatabaseTemplate, AsyncDatabaseTemplate
+from negotiator.negotiation.message_repository import MessageRepository, AsyncMessageRepository
+from negotiator.negotiation.negotiation_repository import NegotiationRepository, AsyncNegotiationRepository
+from negotiator.negotiation.negotiation_service import NegotiationService, Negotiation, Message, \
+    AsyncNegotiationService
+from negotiator.negotiation.resolution_repository import ResolutionRepository
+
+logger = logging.getLogger(__name__)
+
+changes_channel = 'negotiation_changes'
+
+
+class NegotiationCache:
+    def __init__(self, max_entries: int = 1_000, max_tracked_changes: int = 10_000) -> None:
+        self.source_id = str(uuid4())
+        self.__max_entries = max_entries
+        self.__max_tracked_changes = max_tracked_changes
+        self.__entries: OrderedDict[UUID, Negotiation] = OrderedDict()
+        self.__clock = 0
+        self.__changed_at: OrderedDict[UUID, int] = OrderedDict()
+        # Negotiations whose last change is no longer tracked are treated as changed at this point
+        self.__untracked_changed_at = 0
+        self.__suspended = False
+        self.__lock = threading.Lock()
+
+    def get(self, negotiation_id: UUID) -> Optional[Negotiation]:
+        with self.__lock:
+            if self.__suspended:
+                return None
+            negotiation = self.__entries.get(negotiation_id)
+            if negotiation is not None:
+                self.__entries.move_to_end(negotiation_id)
+            return negotiation
+
+    # Read before loading a negotiation, so one that changes while it is read is not cached afterwards
+    def generation(self) -> int:
+        with self.__lock:
+            return self.__clock
+
+    def put(self, negotiation: Negotiation, read_at_generation: Optional[int] = None) -> None:
+        if self.__max_entries <= 0:
+            return
+
+        with self.__lock:
+            if self.__suspended:
+                return
+            if read_at_generation is not None and self.__changed_since(negotiation.id, read_at_generation):
+                return
+            self.__entries[negotiation.id] = negotiation
+            self.__entries.move_to_end(negotiation.id)
+            while len(self.__entries) > self.__max_entries:
+                self.__entries.popitem(last=False)
+
+    def append(self, negotiation_id: UUID, messages: List[Message]) -> None:
+        with self.__lock:
+            self.__changed(negotiation_id)
+            negotiation = self.__entries.get(negotiation_id)
+            if negotiation is not None:
+                self.__entries[negotiation_id] = Negotiation(
+                    negotiation_id, [*negotiation.messages, *messages], negotiation.archived)
+
+    def invalidate(self, negotiation_id: UUID) -> None:
+        with self.__lock:
+            self.__changed(negotiation_id)
+            self.__entries.pop(negotiation_id, None)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__forget_everything()
+
+    # Changes from other workers go unnoticed while suspended, so nothing is served or stored until resumed
+    def suspend(self) -> None:
+        with self.__lock:
+            self.__suspended = True
+            self.__forget_everything()
+
+    def resume(self) -> None:
+        with self.__lock:
+            self.__suspended = False
+            self.__forget_everything()
+
+    @property
+    def suspended(self) -> bool:
+        with self.__lock:
+            return self.__suspended
+
+    def __changed(self, negotiation_id: UUID) -> None:
+        self.__clock += 1
+        self.__changed_at[negotiation_id] = self.__clock
+        self.__changed_at.move_to_end(negotiation_id)
+        while len(self.__changed_at) > self.__max_tracked_changes:
+            _, self.__untracked_changed_at = self.__changed_at.popitem(last=False)
+
+    def __changed_since(self, negotiation_id: UUID, generation: int) -> bool:
+        return self.__changed_at.get(negotiation_id, self.__untracked_changed_at) > generation
+
+    def __forget_everything(self) -> None:
+        self.__clock += 1
+        self.__changed_at.clear()
+        self.__untracked_changed_at = self.__clock
+        self.__entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+
+class CachedNegotiationService(NegotiationService):
+
+    def __init__(
+            self,
+            db: DatabaseTemplate,
+            negotiation_repository: NegotiationRepository,
+            message_repository: MessageRepository,
+            resolution_repository: ResolutionRepository,
+            cache: NegotiationCache,
+    ) -> None:
+        super().__init__(db, negotiation_repository, message_repository, resolution_repository)
+        self.__db = db
+        self.__negotiation_repository = negotiation_repository
+        self.__cache = cache
+
+    # While the cache is suspended get always misses and put stores nothing, so every find reads the database
+    def find(self, negotiation_id: UUID) -> Optional[Negotiation]:
+        negotiation = self.__cache.get(negotiation_id)
+        if negotiation is not None:
+            return negotiation
+
+        generation = self.__cache.generation()
+        negotiation = super().find(negotiation_id)
+        if negotiation is not None:
+            self.__cache.put(negotiation, generation)
+
+        return negotiation
+
+    # The cache only changes once the caller's transaction commits, so readers never see unsaved messages
+    def add_messages(self, negotiation_id: UUID, messages: List[Message], connection: Optional[Connection] = None) -> None:
+        if connection is None:
+            try:
+                with self.__db.transaction() as connection:
+                    self.__add_messages(negotiation_id, messages, connection)
+            except Exception:
+                self.__cache.invalidate(negotiation_id)
+                raise
+            self.__cache.append(negotiation_id, messages)
+            return
+
+        self.__add_messages(negotiation_id, messages, connection)
+        event.listen(connection, 'commit', lambda _: self.__cache.append(negotiation_id, messages), once=True)
+        event.listen(connection, 'rollback', lambda _: self.__cache.invalidate(negotiation_id), once=True)
+
+    def truncate(self, negotiation_id: UUID, at_message_id: UUID) -> None:
+        with self.__db.transaction() as connection:
+            self.__negotiation_repository.move_head(negotiation_id, at_message_id, connection)
+            self.__negotiation_repository.notify_changed(
+                changes_channel, self.__cache.source_id, negotiation_id, connection)
+        self.__cache.invalidate(negotiation_id)
+
+    def __add_messages(self, negotiation_id: UUID, messages: List[Message], connection: Connection) -> None:
+        super().add_messages(negotiation_id, messages, connection)
+        self.__negotiation_repository.notify_changed(changes_channel, self.__cache.source_id, negotiation_id, connection)
+
+
+# Shares its cache with the CachedNegotiationService of the same worker, which records the chat turns
+class AsyncCachedNegotiationService(AsyncNegotiationService):
+
+    def __init__(
+            self,
+            db: AsyncDatabaseTemplate,
+            negotiation_repository: AsyncNegotiationRepository,
+            message_repository: AsyncMessageRepository,
+            cache: NegotiationCache,
+    ) -> None:
+        super().__init__(db, negotiation_repository, message_repository)
+        self.__db = db
+        self.__negotiation_repository = negotiation_repository
+        self.__cache = cache
+
+    async def find(self, negotiation_id: UUID) -> Optional[Negotiation]:
+        negotiation = self.__cache.get(negotiation_id)
+        if negotiation is not None:
+            return negotiation
+
+        generation = self.__cache.generation()
+        negotiation = await super().find(negotiation_id)
+        if negotiation is not None:
+            self.__cache.put(negotiation, generation)
+
+        return negotiation
+
+    async def add_messages(
+            self,
+            negotiation_id: UUID,
+            messages: List[Message],
+            connection: Optional[AsyncConnection] = None
+    ) -> None:
+        if connection is None:
+            try:
+                async with self.__db.transaction() as connection:
+                    await self.__add_messages(negotiation_id, messages, connection)
+            except Exception:
+                self.__cache.invalidate(negotiation_id)
+                raise
+            self.__cache.append(negotiation_id, messages)
+            return
+
+        await self.__add_messages(negotiation_id, messages, connection)
+        sync_connection = connection.sync_connection
+        event.listen(sync_connection, 'commit', lambda _: self.__cache.append(negotiation_id, messages), once=True)
+        event.listen(sync_connection, 'rollback', lambda _: self.__cache.invalidate(negotiation_id), once=True)
+
+    async def truncate(self, negotiation_id: UUID, at_message_id: UUID) -> None:
+        async with self.__db.transaction() as connection:
+            await self.__negotiation_repository.move_head(negotiation_id, at_message_id, connection)
+            await self.__negotiation_repository.notify_changed(
+                changes_channel, self.__cache.source_id, negotiation_id, connection)
+        self.__cache.invalidate(negotiation_id)
+
+    async def __add_messages(self, negotiation_id: UUID, messages: List[Message], connection: AsyncConnection) -> None:
+        await super().add_messages(negotiation_id, messages, connection)
+        await self.__negotiation_repository.notify_changed(
+            changes_channel, self.__cache.source_id, negotiation_id, connection)
+
+
+class NegotiationChangeListener:
+    def __init__(self, database_url: str, cache: NegotiationCache, poll_interval_seconds: float = 5.0) -> None:
+        self.__database_url = database_url
+        self.__cache = cache
+        self.__poll_interval_seconds = poll_interval_seconds
+        self.__stopped = threading.Event()
+        self.__listening = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self.__thread is not None:
+            return
+
+        self.__cache.suspend()
+        self.__thread = threading.Thread(target=self.__run, name='negotiation-change-listener', daemon=True)
+        self.__thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self.__stopped.set()
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+            self.__thread = None
+
+    def wait_until_listening(self, timeout: Optional[float] = None) -> bool:
+        return self.__listening.wait(timeout)
+
+    def handle(self, payload: str) -> None:
+        source_id, _, negotiation_id = payload.partition(':')
+        if source_id != self.__cache.source_id:
+            self.__cache.invalidate(UUID(negotiation_id))
+
+    def __run(self) -> None:
+        while not self.__stopped.is_set():
+            try:
+                self.__listen()
+            except Exception:
+                logger.warning('Negotiation change listener disconnected, retrying', exc_info=True)
+                self.__listening.clear()
+                self.__cache.suspend()
+                self.__stopped.wait(self.__poll_interval_seconds)
+
+        self.__listening.clear()
+        self.__cache.suspend()
+
+    def __listen(self) -> None:
+        connection = psycopg2.connect(self.__database_url)
+        try:
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f'listen {changes_channel}')
+
+            # Changes made while we were not listening were missed
+            self.__cache.resume()
+            self.__listening.set()
+
+            while not self.__stopped.is_set():
+                if select.select([connection], [], [], self.__poll_interval_seconds) == ([], [], []):
+                    continue
+
+                connection.poll()
+                while connection.notifies:
+                    self.handle(connection.notifies.pop(0).payload)
+        finally:
+            connection.close()
@@ -1,13 +1,14 @@
 from dataclasses import dataclass
-from typing import cast
+from typing import cast, Iterator
 from uuid import UUID
 
-from flask import Blueprint, render_template, redirect, request, jsonify
+from flask import Blueprint, render_template, redirect, request, jsonify, Response, stream_with_context
 from flask.typing import ResponseReturnValue
 
-from negotiator.negotiation.llm_service import LLMService
-from negotiator.negotiation.negotiation_service import NegotiationService, Negotiation, Message
-from negotiator.web_support import json_support
+from negotiator.negotiation.llm_service import LLMService, ChatTurnDelta, ChatTurnReply, ResolvedNegotiation
+from negotiator.negotiation.negotiation_service import NegotiationService, Negotiation, Message, \
+    NegotiationUnavailable
+from negotiator.web_support import json_support, sse_support
 
 
 @dataclass
@@ -15,6 +16,7 @@ class MessageInfo:
     id: UUID
     role: str
     content: str
+    resettable: bool = True
 
 
 @dataclass
@@ -54,22 +56,60 @@ def negotiation_page(
         negotiation = negotiation_service.find(negotiation_id)
         if negotiation is None:
             return redirect('/')
+        if negotiation.archived:
+            return jsonify({'error': 'negotiation is archived'}), 409
 
-        request_body = cast(dict[str, str], request.get_json(silent=False))
+        user_message = read_user_message()
 
-        user_message = Message(
-            id=UUID(request_body['id']),
-            content=request_body['content'],
-            role='user',
-        )
+        try:
+            reply = llm_service.call_and_record_negotiator_chat_turn(negotiation, user_message)
+        except NegotiationUnavailable:
+            return jsonify({'error': 'negotiation is archived'}), 409
+
+        if isinstance(reply, ResolvedNegotiation):
+            return jsonify(reply), 201
 
-        reply = llm_service.call_and_record_negotiator_chat_turn(negotiation, user_message)
+        # Nothing was saved when the model is unavailable, so the apology is not a message to keep
+        return jsonify(MessageInfo(
+            id=reply.id,
+            role='assistant',
+            content=reply.content,
+            resettable=reply.resettable,
+        )), 201 if reply.resettable else 503
 
-        return jsonify({
-            'id': reply,
-            'role': 'assistant',
-            'content': reply,
-        }), 201
+    @page.post('/negotiation/<negotiation_id>/messages/stream')
+    def stream_message(negotiation_id: UUID) -> ResponseReturnValue:
+        negotiation = negotiation_service.find(negotiation_id)
+        if negotiation is None:
+            return redirect('/')
+        if negotiation.archived:
+            return jsonify({'error': 'negotiation is archived'}), 409
+
+        user_message = read_user_message()
+
+        def events() -> Iterator[str]:
+            # The negotiation can be archived while the reply is generated; the client keeps the unsent message
+            try:
+                for turn_event in llm_service.stream_negotiator_chat_turn(negotiation, user_message):
+                    if isinstance(turn_event, ChatTurnDelta):
+                        yield sse_support.event('delta', {'content': turn_event.content})
+                    elif isinstance(turn_event, ChatTurnReply):
+                        yield sse_support.event('message', MessageInfo(
+                            id=turn_event.id,
+                            role='assistant',
+                            content=turn_event.content,
+                            resettable=turn_event.resettable,
+                        ))
+                    else:
+                        yield sse_support.event('resolved', turn_event)
+            except NegotiationUnavailable:
+                yield sse_support.event('error', {'error': 'negotiation is archived'})
+
+        return Response(
+            stream_with_context(events()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+        )
 
     @page.post('/negotiation/<negotiation_id>/messages/<message_id>/reset')
     def reset(negotiation_id: UUID, message_id: UUID) -> ResponseReturnValue:
@@ -80,6 +120,16 @@ def negotiation_page(
     return page
 
 
+def read_user_message() -> Message:
+    request_body = cast(dict[str, str], request.get_json(silent=False))
+
+    return Message(
+        id=UUID(request_body['id']),
+        content=request_body['content'],
+        role='user',
+    )
+
+
 def to_info(record: Negotiation) -> NegotiationInfo:
     return NegotiationInfo(
         id=record.id,
@@ -1,10 +1,54 @@
 from dataclasses import dataclass
-from typing import Optional, cast
+from typing import Optional, cast, List, Any
 from uuid import UUID, uuid4
 
-from negotiator.database_support.database_template import DatabaseTemplate
-from negotiator.database_support.result_mapping import map_one_result
-from sqlalchemy import Connection
+from negotiator.database_support.database_template import DatabaseTemplate, AsyncDatabaseTemplate
+from negotiator.database_support.result_mapping import map_one_row
+from negotiator.negotiation.message_repository import MessageRecord
+from sqlalchemy import Connection, Row
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+create_statement = """
+                   insert into negotiations (id) values (:id) returning id
+                   """
+
+find_statement = """
+                 select id from negotiations where id = :id
+                 """
+
+notify_changed_statement = """
+                           select pg_notify(:channel, :payload)
+                           """
+
+find_with_messages_statement = """
+                               select n.id, m.id as message_id, m.role, m.content from negotiations n
+                                 left join branch_path(n.head_branch_id, n.head_message_order) p on true
+                                 left join messages m on m.branch_id = p.branch_id
+                                   and m.negotiation_created_at = n.created_at
+                                   and m.message_order <= p.through_message_order
+                                 where n.id = :id
+                                 order by m.message_order
+                               """
+
+# Only read when a negotiation is not in the partitioned tables, so the archive stays out of the hot path
+find_archived_with_messages_statement = """
+                                        select a.id, m.id, m.role, m.content from archived_negotiations a
+                                          left join rows from (
+                                              jsonb_to_recordset(a.messages) as (id uuid, role text, content text)
+                                          ) with ordinality as m (id, role, content, position) on true
+                                          where a.id = :id
+                                          order by m.position
+                                        """
+
+# A reset only moves the head, so the messages after it stay on their branch
+move_head_statement = """
+                      update negotiations
+                        set head_branch_id = m.branch_id, head_message_order = m.message_order
+                        from messages m
+                        where negotiations.id = :id
+                        and m.id = :message_id
+                        and m.negotiation_id = :id
+                      """
 
 
 @dataclass
@@ -12,27 +56,160 @@ class NegotiationRecord:
     id: UUID
 
 
+@dataclass
+class NegotiationWithMessagesRecord:
+    id: UUID
+    messages: List[MessageRecord]
+    archived: bool = False
+
+
 class NegotiationRepository:
     def __init__(self, db: DatabaseTemplate) -> None:
         self.__db = db
 
     def create(self, connection: Optional[Connection] = None) -> Optional[UUID]:
         id = uuid4()
-        result = self.__db.query(
-            statement="""
-                      insert into negotiations (id) values (:id) returning id
-                      """,
+        result = self.__db.query_prepared(
+            statement=create_statement,
             connection=connection,
             id=id)
 
-        return map_one_result(result, lambda row: cast(UUID, row['id']))
+        return map_one_row(result, lambda row: cast(UUID, row[0]))
 
     def find(self, id: UUID, connection: Optional[Connection] = None) -> Optional[NegotiationRecord]:
-        result = self.__db.query(
-            statement="""
-                      select id from negotiations where id = :id
-                      """,
+        result = self.__db.query_prepared(
+            statement=find_statement,
             connection=connection,
             id=id)
 
-        return map_one_result(result, lambda row: NegotiationRecord(cast(UUID, row['id'])))
+        return map_one_row(result, negotiation_record)
+
+    def find_with_messages(
+            self,
+            id: UUID,
+            connection: Optional[Connection] = None
+    ) -> Optional[NegotiationWithMessagesRecord]:
+        result = self.__db.query_prepared(
+            statement=find_with_messages_statement,
+            connection=connection,
+            id=id)
+        negotiation = negotiation_with_messages_record(list(result))
+        if negotiation is not None:
+            return negotiation
+
+        result = self.__db.query_prepared(
+            statement=find_archived_with_messages_statement,
+            connection=connection,
+            id=id)
+
+        return negotiation_with_messages_record(list(result), archived=True)
+
+    def move_head(self, id: UUID, message_id: UUID, connection: Optional[Connection] = None) -> None:
+        self.__db.query(
+            statement=move_head_statement,
+            connection=connection,
+            id=id,
+            message_id=message_id)
+
+    def notify_changed(
+            self,
+            channel: str,
+            source_id: str,
+            id: UUID,
+            connection: Optional[Connection] = None
+    ) -> None:
+        self.__db.query(
+            statement=notify_changed_statement,
+            connection=connection,
+            channel=channel,
+            payload=f'{source_id}:{id}')
+
+
+class AsyncNegotiationRepository:
+    def __init__(self, db: AsyncDatabaseTemplate) -> None:
+        self.__db = db
+
+    async def create(self, connection: Optional[AsyncConnection] = None) -> Optional[UUID]:
+        id = uuid4()
+        result = await self.__db.query_prepared(
+            statement=create_statement,
+            connection=connection,
+            id=id)
+
+        return map_one_row(result, lambda row: cast(UUID, row[0]))
+
+    async def find(self, id: UUID, connection: Optional[AsyncConnection] = None) -> Optional[NegotiationRecord]:
+        result = await self.__db.query_prepared(
+            statement=find_statement,
+            connection=connection,
+            id=id)
+
+        return map_one_row(result, negotiation_record)
+
+    async def find_with_messages(
+            self,
+            id: UUID,
+            connection: Optional[AsyncConnection] = None
+    ) -> Optional[NegotiationWithMessagesRecord]:
+        result = await self.__db.query_prepared(
+            statement=find_with_messages_statement,
+            connection=connection,
+            id=id)
+        negotiation = negotiation_with_messages_record(list(result))
+        if negotiation is not None:
+            return negotiation
+
+        result = await self.__db.query_prepared(
+            statement=find_archived_with_messages_statement,
+            connection=connection,
+            id=id)
+
+        return negotiation_with_messages_record(list(result), archived=True)
+
+    async def move_head(self, id: UUID, message_id: UUID, connection: Optional[AsyncConnection] = None) -> None:
+        await self.__db.query(
+            statement=move_head_statement,
+            connection=connection,
+            id=id,
+            message_id=message_id)
+
+    async def notify_changed(
+            self,
+            channel: str,
+            source_id: str,
+            id: UUID,
+            connection: Optional[AsyncConnection] = None
+    ) -> None:
+        await self.__db.query(
+            statement=notify_changed_statement,
+            connection=connection,
+            channel=channel,
+            payload=f'{source_id}:{id}')
+
+
+def negotiation_record(row: Row[Any]) -> NegotiationRecord:
+    return NegotiationRecord(cast(UUID, row[0]))
+
+
+def negotiation_with_messages_record(
+        rows: List[Row[Any]],
+        archived: bool = False
+) -> Optional[NegotiationWithMessagesRecord]:
+    if not rows:
+        return None
+
+    negotiation_id = cast(UUID, rows[0][0])
+    return NegotiationWithMessagesRecord(
+        id=negotiation_id,
+        messages=[
+            MessageRecord(
+                id=cast(UUID, row[1]),
+                negotiation_id=negotiation_id,
+                role=cast(str, row[2]),
+                content=cast(str, row[3]),
+            )
+            for row in rows
+            if row[1] is not None
+        ],
+        archived=archived,
+    )
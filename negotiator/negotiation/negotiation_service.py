@@ -3,10 +3,15 @@ from typing import Optional, List
 from uuid import UUID, uuid4
 
 from sqlalchemy import Connection
+from sqlalchemy.ext.asyncio import AsyncConnection
 
-from negotiator.database_support.database_template import DatabaseTemplate
-from negotiator.negotiation.message_repository import MessageRepository
-from negotiator.negotiation.negotiation_repository import NegotiationRepository
+from negotiator.database_support.database_template import DatabaseTemplate, AsyncDatabaseTemplate
+from negotiator.negotiation.message_repository import MessageRepository, AsyncMessageRepository, MessageRecord, \
+    NewMessage
+from negotiator.negotiation.negotiation_repository import NegotiationRepository, AsyncNegotiationRepository
+from negotiator.negotiation.resolution_repository import ResolutionRepository, LeaderboardRank, ResolutionRecord
+
+assistant_greeting = 'Hi there. I see you\'re looking at this 2020 Toyota 4Runner. How can I help you?'
 
 
 @dataclass
@@ -20,11 +25,14 @@ class Message:
 class Negotiation:
     id: UUID
     messages: list[Message]
+    # Archived negotiations can still be read, but new messages are not saved
+    archived: bool = False
 
     def with_message(self, message: Message) -> 'Negotiation':
         return Negotiation(
             id=self.id,
-            messages=[*self.messages, message]
+            messages=[*self.messages, message],
+            archived=self.archived,
         )
 
     def messages_dict(self) -> list[dict[str, str]]:
@@ -35,6 +43,17 @@ class Negotiation:
         ]
 
 
+# Raised when messages are added to a negotiation that was archived, or never existed, after it was read
+class NegotiationUnavailable(Exception):
+    pass
+
+
+@dataclass
+class Resolution:
+    final_price: int
+    rank: LeaderboardRank
+
+
 @dataclass
 class NegotiationWithMessage:
     id: UUID
@@ -49,59 +68,130 @@ class NegotiationService:
             db: DatabaseTemplate,
             negotiation_repository: NegotiationRepository,
             message_repository: MessageRepository,
+            resolution_repository: ResolutionRepository,
     ) -> None:
         self.__db = db
         self.__negotiation_repository = negotiation_repository
         self.__message_repository = message_repository
+        self.__resolution_repository = resolution_repository
 
     def create(self) -> Optional[UUID]:
         with self.__db.transaction() as connection:
             return self.__create_negotiation(connection)
 
     def find(self, negotiation_id: UUID) -> Optional[Negotiation]:
-        with self.__db.transaction() as connection:
-            negotiation = self.__negotiation_repository.find(negotiation_id, connection)
-            if negotiation is None:
-                return None
+        negotiation = self.__negotiation_repository.find_with_messages(negotiation_id)
+        if negotiation is None:
+            return None
 
-            message_records = self.__message_repository.list_for_negotiation(negotiation.id, connection)
+        return to_negotiation(negotiation.id, negotiation.messages, negotiation.archived)
 
-            return Negotiation(
-                id=negotiation.id,
-                messages=[
-                    Message(id=record.id, role=record.role, content=record.content)
-                    for record in message_records
-                ]
-            )
+    def add_messages(self, negotiation_id: UUID, messages: List[Message], connection: Optional[Connection] = None) -> None:
+        if connection is not None:
+            self.__create_messages(connection, negotiation_id, messages)
+            return
 
-    def add_messages(self, negotiation_id: UUID, messages: List[Message]) -> None:
         with self.__db.transaction() as connection:
             self.__create_messages(connection, negotiation_id, messages)
 
     def truncate(self, negotiation_id: UUID, at_message_id: UUID) -> None:
-        self.__message_repository.truncate_for_negotiation(
-            negotiation_id=negotiation_id,
-            at_message_id=at_message_id,
-        )
+        self.__negotiation_repository.move_head(negotiation_id, at_message_id)
 
-    def __create_negotiation(self, connection: Connection) -> Optional[UUID]:
-        assistant_message = 'Hi there. I see you\'re looking at this 2020 Toyota 4Runner. How can I help you?'
+    # A negotiation resolved by an earlier turn keeps the price it was resolved at
+    def resolve(self, negotiation_id: UUID, final_price: int) -> Resolution:
+        with self.__db.transaction() as connection:
+            if not self.__resolution_repository.create(negotiation_id, final_price, connection):
+                stored_price = self.__resolution_repository.final_price(negotiation_id, connection)
+                if stored_price is None:
+                    raise NegotiationUnavailable(f'Negotiation {negotiation_id} is archived or does not exist')
+                final_price = stored_price
+
+            return Resolution(final_price, self.__resolution_repository.rank(final_price, connection))
+
+    def leaderboard(self, limit: int) -> List[ResolutionRecord]:
+        return self.__resolution_repository.top(limit)
 
+    def __create_negotiation(self, connection: Connection) -> Optional[UUID]:
         negotiation_id = self.__negotiation_repository.create(connection)
         if negotiation_id is None:
             connection.rollback()
             return None
 
-        self.__message_repository.create(negotiation_id, uuid4(), 'assistant', assistant_message, connection)
+        self.__message_repository.create(negotiation_id, uuid4(), 'assistant', assistant_greeting, connection)
 
         return negotiation_id
 
     def __create_messages(self, connection: Connection, negotiation_id: UUID, messages: List[Message]) -> None:
-        for message in messages:
-            self.__message_repository.create(
-                negotiation_id=negotiation_id,
-                id=message.id,
-                role=message.role,
-                content=message.content,
-                connection=connection,
-            )
+        ids = self.__message_repository.create_many(negotiation_id, to_new_messages(messages), connection)
+        if len(ids) != len(messages):
+            raise NegotiationUnavailable(f'Negotiation {negotiation_id} is archived or does not exist')
+
+
+class AsyncNegotiationService:
+
+    def __init__(
+            self,
+            db: AsyncDatabaseTemplate,
+            negotiation_repository: AsyncNegotiationRepository,
+            message_repository: AsyncMessageRepository,
+    ) -> None:
+        self.__db = db
+        self.__negotiation_repository = negotiation_repository
+        self.__message_repository = message_repository
+
+    async def create(self) -> Optional[UUID]:
+        async with self.__db.transaction() as connection:
+            return await self.__create_negotiation(connection)
+
+    async def find(self, negotiation_id: UUID) -> Optional[Negotiation]:
+        negotiation = await self.__negotiation_repository.find_with_messages(negotiation_id)
+        if negotiation is None:
+            return None
+
+        return to_negotiation(negotiation.id, negotiation.messages, negotiation.archived)
+
+    async def add_messages(
+            self,
+            negotiation_id: UUID,
+            messages: List[Message],
+            connection: Optional[AsyncConnection] = None
+    ) -> None:
+        if connection is not None:
+            await self.__create_messages(connection, negotiation_id, messages)
+            return
+
+        async with self.__db.transaction() as connection:
+            await self.__create_messages(connection, negotiation_id, messages)
+
+    async def truncate(self, negotiation_id: UUID, at_message_id: UUID) -> None:
+        await self.__negotiation_repository.move_head(negotiation_id, at_message_id)
+
+    async def __create_negotiation(self, connection: AsyncConnection) -> Optional[UUID]:
+        negotiation_id = await self.__negotiation_repository.create(connection)
+        if negotiation_id is None:
+            await connection.rollback()
+            return None
+
+        await self.__message_repository.create(negotiation_id, uuid4(), 'assistant', assistant_greeting, connection)
+
+        return negotiation_id
+
+    async def __create_messages(self, connection: AsyncConnection, negotiation_id: UUID, messages: List[Message]) -> None:
+        ids = await self.__message_repository.create_many(negotiation_id, to_new_messages(messages), connection)
+        if len(ids) != len(messages):
+            raise NegotiationUnavailable(f'Negotiation {negotiation_id} is archived or does not exist')
+
+
+def to_negotiation(negotiation_id: UUID, message_records: List[MessageRecord], archived: bool = False) -> Negotiation:
+    return Negotiation(
+        id=negotiation_id,
+        messages=[
+            Message(id=record.id, role=record.role, content=record.content)
+            for record in message_records
+        ],
+        archived=archived,
+    )
+
+
+def to_new_messages(messages: List[Message]) -> List[NewMessage]:
+    return [NewMessage(id=message.id, role=message.role, content=message.content) for message in messages]
@@ -0,0 +1,282 @@
+import datetime
+import logging
+from dataclasses import dataclass, field
+from typing import List, Dict, cast
+
+from sqlalchemy import Connection
+
+from negotiator.database_support.database_template import DatabaseTemplate
+from negotiator.database_support.result_mapping import map_rows
+from negotiator.negotiation.negotiation_cache import changes_channel
+
+logger = logging.getLogger(__name__)
+
+# Referencing tables come first, since a partition can only be detached once nothing attached refers to it
+partitioned_tables = ['messages', 'conversation_branches', 'negotiations']
+
+maintenance_source_id = 'partition-maintenance'
+
+create_partitions_statement = """
+                              select create_negotiation_partitions(cast(:month as date))
+                              """
+
+list_partitions_statement = """
+                            select to_date(substring(c.relname from '[0-9]{4}_[0-9]{2}$'), 'YYYY_MM') as month
+                              from pg_inherits i
+                              join pg_class c on c.oid = i.inhrelid
+                              where i.inhparent = cast('negotiations' as regclass)
+                              and c.relname ~ '^negotiations_[0-9]{4}_[0-9]{2}$'
+                              order by month
+                            """
+
+default_partition_rows_statement = """
+                                   select count(*) from negotiations_default
+                                   """
+
+# Taken up front at the strength detaching needs, so the transaction never upgrades a lock it holds. Parents come
+# before their partitions, the order queries lock them in. Writers to the month wait until it is gone rather than
+# adding messages after it was copied, and reads of the partitioned tables wait with them.
+lock_partitions_statement = """
+                            lock table only negotiations, only conversation_branches, only messages,
+                              {negotiations}, {conversation_branches}, {messages}
+                              in access exclusive mode
+                            """
+
+# Gives up on the month rather than queueing, which would hold up every query behind the lock request. Kept under
+# Postgres' default one second deadlock_timeout, so when a chat turn locks the tables in another order it is
+# maintenance that gives up, not the turn.
+lock_timeout_statement = """
+                         select set_config('lock_timeout', :timeout, true)
+                         """
+
+archive_statement = """
+                    with archived as (
+                        insert into archived_negotiations (
+                            id, created_at, final_price, resolved_at, head_branch_id, head_message_order, messages,
+                            branches
+                        )
+                          select n.id, n.created_at, n.final_price, n.resolved_at, n.head_branch_id,
+                                 n.head_message_order, coalesce((
+                              select jsonb_agg(
+                                         jsonb_build_object('id', m.id, 'role', m.role, 'content', m.content)
+                                         order by m.message_order
+                                     )
+                                from branch_path(n.head_branch_id, n.head_message_order) p
+                                join {messages} m on m.branch_id = p.branch_id
+                                  and m.message_order <= p.through_message_order
+                          ), '[]'), coalesce((
+                              select jsonb_agg(
+                                         jsonb_build_object(
+                                             'id', b.id,
+                                             'parent_branch_id', b.parent_branch_id,
+                                             'fork_message_order', b.fork_message_order,
+                                             'created_at', b.created_at,
+                                             'messages', coalesce((
+                                                 select jsonb_agg(
+                                                            jsonb_build_object(
+                                                                'id', m.id,
+                                                                'role', m.role,
+                                                                'content', m.content,
+                                                                'message_order', m.message_order
+                                                            )
+                                                            order by m.message_order
+                                                        )
+                                                   from {messages} m
+                                                   where m.branch_id = b.id
+                                             ), '[]')
+                                         )
+                                         order by b.created_at, b.id
+                                     )
+                                from {conversation_branches} b
+                                where b.negotiation_id = n.id
+                          ), '[]')
+                            from {negotiations} n
+                          on conflict (id) do nothing
+                          returning id
+                    )
+                    select count(*) from archived
+                    """
+
+# Workers drop the negotiations from their caches once the transaction commits
+notify_changed_statement = """
+                           select count(pg_notify(:channel, :source_id || ':' || n.id)) from {negotiations} n
+                           """
+
+# Dropped negotiations leave the leaderboard; archived ones stay on it
+uncount_final_prices_statement = """
+                                 update final_price_counts c set negotiations = c.negotiations - d.negotiations
+                                   from (
+                                       select final_price, count(*) as negotiations from {negotiations}
+                                         where final_price is not null
+                                         group by final_price
+                                   ) d
+                                   where c.final_price = d.final_price
+                                 """
+
+delete_summaries_statement = """
+                             delete from negotiation_summaries
+                               where negotiation_created_at >= :starts
+                               and negotiation_created_at < :ends
+                             """
+
+detach_partition_statement = """
+                             alter table {table} detach partition {partition}
+                             """
+
+drop_partition_statement = """
+                           drop table {partition}
+                           """
+
+# Autovacuum never analyzes partitioned tables, only their partitions
+analyze_statement = """
+                    analyze negotiations, conversation_branches, messages
+                    """
+
+expire_archived_statement = """
+                            with expired as (
+                                delete from archived_negotiations where created_at < :before
+                                  returning id, final_price
+                            ),
+                            uncounted as (
+                                update final_price_counts c set negotiations = c.negotiations - e.negotiations
+                                  from (
+                                      select final_price, count(*) as negotiations from expired
+                                        where final_price is not null
+                                        group by final_price
+                                  ) e
+                                  where c.final_price = e.final_price
+                            )
+                            select count(*) from expired
+                            """
+
+
+@dataclass
+class MaintenanceReport:
+    created: List[datetime.date] = field(default_factory=list)
+    archived: Dict[datetime.date, int] = field(default_factory=dict)
+    dropped: List[datetime.date] = field(default_factory=list)
+    expired: int = 0
+    default_partition_rows: int = 0
+
+
+# Keeps the partitioned tables down to the last few months. Older months are copied into archived_negotiations,
+# one compressed row per negotiation holding every branch, and their partitions dropped; after the retention window
+# they are deleted.
+class PartitionMaintenance:
+    def __init__(
+            self,
+            db: DatabaseTemplate,
+            archive_after_months: int = 3,
+            retention_months: int = 0,
+            months_ahead: int = 3,
+            lock_timeout_seconds: float = 0.5,
+    ) -> None:
+        if archive_after_months < 1:
+            raise ValueError('archive_after_months must be at least 1, the current month is always kept')
+        if retention_months < 0:
+            raise ValueError('retention_months must be 0, to keep archived negotiations, or more')
+
+        self.__db = db
+        self.__archive_after_months = archive_after_months
+        self.__retention_months = retention_months
+        self.__months_ahead = months_ahead
+        self.__lock_timeout_seconds = lock_timeout_seconds
+
+    def run(self, today: datetime.date) -> MaintenanceReport:
+        report = MaintenanceReport()
+        current_month = today.replace(day=1)
+
+        existing = set(self.partitions())
+        for offset in range(self.__months_ahead + 1):
+            month = add_months(current_month, offset)
+            if month not in existing:
+                self.create_partitions(month)
+                report.created.append(month)
+
+        archive_before = add_months(current_month, -self.__archive_after_months)
+        expire_before = add_months(current_month, -self.__retention_months) if self.__retention_months > 0 else None
+
+        for month in self.partitions():
+            if month >= archive_before:
+                continue
+            if expire_before is not None and month < expire_before:
+                self.drop(month)
+                report.dropped.append(month)
+            else:
+                report.archived[month] = self.archive(month)
+
+        if expire_before is not None:
+            report.expired = self.expire_archived(expire_before)
+
+        self.__db.query(analyze_statement)
+
+        report.default_partition_rows = self.default_partition_rows()
+        if report.default_partition_rows > 0:
+            logger.warning(
+                'negotiations_default holds %d negotiations created outside every monthly partition',
+                report.default_partition_rows,
+            )
+
+        return report
+
+    def create_partitions(self, month: datetime.date) -> None:
+        self.__db.query(create_partitions_statement, month=month)
+        logger.info('Created partitions for %s', month.strftime('%Y-%m'))
+
+    def partitions(self) -> List[datetime.date]:
+        return map_rows(self.__db.query(list_partitions_statement), lambda row: cast(datetime.date, row[0]))
+
+    def archive(self, month: datetime.date) -> int:
+        names = partition_names(month)
+        with self.__db.transaction() as connection:
+            self.__lock(month, connection)
+            result = self.__db.query(archive_statement.format(**names), connection)
+            archived = cast(int, result.scalar_one())
+            self.__detach_and_drop(month, connection)
+
+        logger.info('Archived %d negotiations from %s', archived, month.strftime('%Y-%m'))
+        return archived
+
+    def drop(self, month: datetime.date) -> None:
+        with self.__db.transaction() as connection:
+            self.__lock(month, connection)
+            self.__db.query(uncount_final_prices_statement.format(**partition_names(month)), connection)
+            self.__detach_and_drop(month, connection)
+
+        logger.info('Dropped negotiations from %s without archiving them', month.strftime('%Y-%m'))
+
+    def expire_archived(self, before: datetime.date) -> int:
+        expired = cast(int, self.__db.query(expire_archived_statement, before=before).scalar_one())
+        logger.info('Deleted %d archived negotiations created before %s', expired, before.isoformat())
+        return expired
+
+    def default_partition_rows(self) -> int:
+        return cast(int, self.__db.query(default_partition_rows_statement).scalar_one())
+
+    def __lock(self, month: datetime.date, connection: Connection) -> None:
+        self.__db.query(
+            lock_timeout_statement, connection, timeout=f'{max(1, int(self.__lock_timeout_seconds * 1000))}ms')
+        self.__db.query(lock_partitions_statement.format(**partition_names(month)), connection)
+
+    def __detach_and_drop(self, month: datetime.date, connection: Connection) -> None:
+        names = partition_names(month)
+        self.__db.query(
+            notify_changed_statement.format(**names),
+            connection,
+            channel=changes_channel,
+            source_id=maintenance_source_id,
+        )
+        self.__db.query(delete_summaries_statement, connection, starts=month, ends=add_months(month, 1))
+
+        for table in partitioned_tables:
+            self.__db.query(detach_partition_statement.format(table=table, partition=names[table]), connection)
+            self.__db.query(drop_partition_statement.format(partition=names[table]), connection)
+
+
+def partition_names(month: datetime.date) -> Dict[str, str]:
+    return {table: f'{table}_{month:%Y_%m}' for table in partitioned_tables}
+
+
+def add_months(month: datetime.date, months: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
@@ -0,0 +1,95 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from freeplay import Freeplay
+from freeplay.model import InputVariables
+from freeplay.resources.prompts import FormattedPrompt, TemplatePrompt
+
+logger = logging.getLogger(__name__)
+
+TemplateKey = Tuple[str, str, str]
+
+
+@dataclass
+class CachedTemplate:
+    template: TemplatePrompt
+    fetched_at: float
+    refreshing: bool = False
+
+
+class PromptTemplateCache:
+    def __init__(
+            self,
+            freeplay_client: Freeplay,
+            ttl_seconds: float = 300.0,
+            clock: Callable[[], float] = time.monotonic,
+            refresh_in_background: bool = True,
+    ) -> None:
+        self.__freeplay_client = freeplay_client
+        self.__ttl_seconds = ttl_seconds
+        self.__clock = clock
+        self.__refresh_in_background = refresh_in_background
+        self.__entries: Dict[TemplateKey, CachedTemplate] = {}
+        self.__lock = threading.Lock()
+
+    def get_formatted(
+            self,
+            project_id: str,
+            template_name: str,
+            environment: str,
+            variables: InputVariables,
+            history: Optional[List[Dict[str, str]]] = None,
+    ) -> FormattedPrompt:
+        template = self.get(project_id, template_name, environment)
+        return template.bind(variables, history).format()
+
+    def get(self, project_id: str, template_name: str, environment: str) -> TemplatePrompt:
+        key = (project_id, template_name, environment)
+
+        with self.__lock:
+            entry = self.__entries.get(key)
+            stale = entry is not None and not entry.refreshing \
+                and self.__clock() - entry.fetched_at >= self.__ttl_seconds
+            if entry is not None and stale:
+                entry.refreshing = True
+
+        if entry is None:
+            return self.__fetch(key)
+
+        template = entry.template
+        if stale:
+            if self.__refresh_in_background:
+                threading.Thread(target=self.__refresh, args=(key,), name='prompt-template-refresh', daemon=True).start()
+            else:
+                self.__refresh(key)
+
+        return template
+
+    def __fetch(self, key: TemplateKey) -> TemplatePrompt:
+        template = self.__freeplay_client.prompts.get(*key)
+
+        with self.__lock:
+            self.__entries[key] = CachedTemplate(template, self.__clock())
+
+        return template
+
+    # Serve the last good template when Freeplay is slow or down, and keep it when the version has not changed
+    def __refresh(self, key: TemplateKey) -> None:
+        try:
+            template = self.__freeplay_client.prompts.get(*key)
+        except Exception:
+            logger.warning('Unable to refresh prompt template %s, serving the cached version', key, exc_info=True)
+            with self.__lock:
+                self.__entries[key].fetched_at = self.__clock()
+                self.__entries[key].refreshing = False
+            return
+
+        with self.__lock:
+            entry = self.__entries[key]
+            if template.prompt_info.prompt_template_version_id != entry.template.prompt_info.prompt_template_version_id:
+                entry.template = template
+            entry.fetched_at = self.__clock()
+            entry.refreshing = False
@@ -0,0 +1,114 @@
+from dataclasses import dataclass
+from typing import Optional, cast, List
+from uuid import UUID
+
+from negotiator.database_support.database_template import DatabaseTemplate
+from negotiator.database_support.result_mapping import map_one_row, map_rows
+from sqlalchemy import Connection
+
+
+@dataclass
+class LeaderboardRank:
+    rank: int
+    total: int
+
+
+@dataclass
+class ResolutionRecord:
+    negotiation_id: UUID
+    final_price: int
+    rank: int
+
+
+class ResolutionRepository:
+    def __init__(self, db: DatabaseTemplate) -> None:
+        self.__db = db
+
+    def create(self, negotiation_id: UUID, final_price: int, connection: Optional[Connection] = None) -> bool:
+        result = self.__db.query(
+            statement="""
+                      update negotiations set final_price = :final_price, resolved_at = now()
+                        where id = :negotiation_id
+                        and final_price is null
+                        returning id
+                      """,
+            connection=connection,
+            negotiation_id=negotiation_id,
+            final_price=final_price,
+        )
+        if map_one_row(result, lambda row: cast(UUID, row[0])) is None:
+            return False
+
+        self.__db.query(
+            statement="""
+                      insert into final_price_counts (final_price, negotiations) values (:final_price, 1)
+                        on conflict (final_price)
+                        do update set negotiations = final_price_counts.negotiations + 1
+                      """,
+            connection=connection,
+            final_price=final_price,
+        )
+        return True
+
+    def final_price(self, negotiation_id: UUID, connection: Optional[Connection] = None) -> Optional[int]:
+        result = self.__db.query(
+            statement="""
+                      select final_price from negotiations where id = :negotiation_id
+                      """,
+            connection=connection,
+            negotiation_id=negotiation_id,
+        )
+
+        return map_one_row(result, lambda row: cast(Optional[int], row[0]))
+
+    def rank(self, final_price: int, connection: Optional[Connection] = None) -> LeaderboardRank:
+        result = self.__db.query(
+            # Whole buckets below the price, then the prices below it within its own bucket by primary key range
+            statement="""
+                      select coalesce((
+                                 select sum(negotiations) from final_price_buckets
+                                   where bucket < final_price_bucket(:final_price)
+                             ), 0) + coalesce((
+                                 select sum(negotiations) from final_price_counts
+                                   where final_price >= final_price_bucket(:final_price)
+                                   and final_price < :final_price
+                             ), 0) + 1 as rank,
+                             coalesce((select sum(negotiations) from final_price_buckets), 0) as total
+                      """,
+            connection=connection,
+            final_price=final_price,
+        )
+
+        return cast(LeaderboardRank, map_one_row(result, lambda row: LeaderboardRank(
+            rank=int(row[0]),
+            total=int(row[1]),
+        )))
+
+    def top(self, limit: int, connection: Optional[Connection] = None) -> List[ResolutionRecord]:
+        result = self.__db.query(
+            statement="""
+                      select id, final_price, rank() over (order by final_price) as rank
+                        from (
+                            (select id, final_price, resolved_at from negotiations
+                                where final_price is not null
+                                order by final_price, resolved_at
+                                limit :limit)
+                            union all
+                            (select id, final_price, resolved_at from archived_negotiations
+                                where final_price is not null
+                                order by final_price, resolved_at
+                                limit :limit)
+                            order by final_price, resolved_at
+                            limit :limit
+                        ) as top_negotiations
+                        order by final_price, resolved_at
+                      """,
+            connection=connection,
+            limit=limit,
+        )
+
+        return map_rows(result, lambda row: ResolutionRecord(
+            negotiation_id=cast(UUID, row[0]),
+            final_price=cast(int, row[1]),
+            rank=cast(int, row[2]),
+        ))
@@ -0,0 +1,91 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Generic, Optional, Tuple, TypeVar
+
+from negotiator.metrics_support.metrics import response_cache_hits, response_cache_misses, response_cache_entries
+
+T = TypeVar('T')
+
+# Streamed and non-streamed calls for the same prompt share an entry
+uncached_arguments = {'stream', 'stream_options'}
+
+
+@dataclass
+class ResponseCacheStats:
+    hits: int = 0
+    misses: int = 0
+    size: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ResponseCache(Generic[T]):
+    def __init__(
+            self,
+            max_entries: int = 1_000,
+            ttl_seconds: float = 3_600.0,
+            cache_all_temperatures: bool = False,
+            clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.__max_entries = max_entries
+        self.__ttl_seconds = ttl_seconds
+        self.__cache_all_temperatures = cache_all_temperatures
+        self.__clock = clock
+        self.__entries: OrderedDict[str, Tuple[float, T]] = OrderedDict()
+        self.__stats = ResponseCacheStats()
+        self.__lock = threading.Lock()
+
+    # Sampled replies are only reused when asked to, a temperature 0 reply is what the model would say again
+    def key(self, llm_arguments: dict[str, Any]) -> Optional[str]:
+        if self.__max_entries <= 0:
+            return None
+        if not self.__cache_all_temperatures and llm_arguments.get('temperature') != 0:
+            return None
+
+        arguments = {name: value for name, value in llm_arguments.items() if name not in uncached_arguments}
+        encoded = json.dumps(arguments, sort_keys=True, default=str)
+        return hashlib.sha256(encoded.encode()).hexdigest()
+
+    def get(self, key: Optional[str]) -> Optional[T]:
+        if key is None:
+            return None
+
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and self.__clock() - entry[0] >= self.__ttl_seconds:
+                del self.__entries[key]
+                response_cache_entries.dec()
+                entry = None
+
+            if entry is None:
+                self.__stats.misses += 1
+                response_cache_misses.inc()
+                return None
+
+            self.__stats.hits += 1
+            response_cache_hits.inc()
+            self.__entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: Optional[str], value: T) -> None:
+        if key is None:
+            return
+
+        with self.__lock:
+            size = len(self.__entries)
+            self.__entries[key] = (self.__clock(), value)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__max_entries:
+                self.__entries.popitem(last=False)
+            response_cache_entries.inc(len(self.__entries) - size)
+
+    def stats(self) -> ResponseCacheStats:
+        with self.__lock:
+            return ResponseCacheStats(self.__stats.hits, self.__stats.misses, len(self.__entries))
@@ -0,0 +1,53 @@
+from dataclasses import dataclass
+from typing import Optional, cast
+from uuid import UUID
+
+from negotiator.database_support.database_template import DatabaseTemplate
+from negotiator.database_support.result_mapping import map_one_row
+from sqlalchemy import Connection
+
+
+@dataclass
+class SummaryRecord:
+    negotiation_id: UUID
+    content: str
+    through_message_id: UUID
+
+
+class SummaryRepository:
+    def __init__(self, db: DatabaseTemplate) -> None:
+        self.__db = db
+
+    def find(self, negotiation_id: UUID, connection: Optional[Connection] = None) -> Optional[SummaryRecord]:
+        result = self.__db.query_prepared(
+            statement="""
+                      select negotiation_id, content, through_message_id from negotiation_summaries
+                        where negotiation_id = :negotiation_id
+                      """,
+            connection=connection,
+            negotiation_id=negotiation_id,
+        )
+
+        return map_one_row(result, lambda row: SummaryRecord(
+            negotiation_id=cast(UUID, row[0]),
+            content=cast(str, row[1]),
+            through_message_id=cast(UUID, row[2]),
+        ))
+
+    def save(self, summary: SummaryRecord, connection: Optional[Connection] = None) -> None:
+        self.__db.query(
+            statement="""
+                      insert into negotiation_summaries
+                        (negotiation_id, negotiation_created_at, content, through_message_id)
+                        select id, created_at, :content, :through_message_id from negotiations
+                          where id = :negotiation_id
+                        on conflict (negotiation_id)
+                        do update set content = excluded.content,
+                                      through_message_id = excluded.through_message_id,
+                                      updated_at = now()
+                      """,
+            connection=connection,
+            negotiation_id=summary.negotiation_id,
+            content=summary.content,
+            through_message_id=summary.through_message_id,
+        )
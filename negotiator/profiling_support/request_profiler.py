@@ -0,0 +1,116 @@
+import hmac
+import json
+import logging
+import random
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List
+
+from flask import Blueprint, request, g, Response
+
+from negotiator.environment import Environment
+from negotiator.profiling_support.stack_sampler import StackSampler, Profile
+
+logger = logging.getLogger(__name__)
+
+profile_header = 'X-Profile-Token'
+profile_file_header = 'X-Profile-File'
+profile_formats = ('speedscope', 'collapsed')
+
+
+@dataclass
+class ProfileSettings:
+    token: str = ''
+    sample_rate: float = 0.0
+    directory: str = 'profiles'
+    interval_seconds: float = 0.005
+    format: str = 'speedscope'
+
+    @classmethod
+    def from_environment(cls, env: Environment) -> 'ProfileSettings':
+        return cls(
+            token=env.profile_token,
+            sample_rate=env.profile_sample_rate,
+            directory=env.profile_directory,
+            interval_seconds=env.profile_interval_ms / 1000,
+            format=env.profile_format,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.token != '' or self.sample_rate > 0
+
+
+def profile_file_stem(method: str, path: str) -> str:
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', path).strip('_')[:80] or 'root'
+    return f'{time.strftime("%Y%m%dT%H%M%S")}-{method}-{slug}-{uuid.uuid4().hex[:8]}'
+
+
+def save_profile(profile: Profile, directory: Path, stem: str, format: str) -> List[Path]:
+    directory.mkdir(parents=True, exist_ok=True)
+
+    if format == 'collapsed':
+        paths = [directory / f'{stem}.wall.collapsed']
+        paths[0].write_text(Profile.collapsed(profile.wall_seconds))
+        if profile.cpu_available:
+            paths.append(directory / f'{stem}.cpu.collapsed')
+            paths[1].write_text(Profile.collapsed(profile.cpu_seconds))
+        return paths
+
+    path = directory / f'{stem}.speedscope.json'
+    path.write_text(json.dumps(profile.speedscope()))
+    return [path]
+
+
+# Only registered when profiling is configured, so requests pay nothing for it otherwise.
+# Streamed responses are profiled until the response is closed, not just until the view returns.
+def request_profiler(settings: ProfileSettings, sample: Callable[[], float] = random.random) -> Blueprint:
+    if settings.format not in profile_formats:
+        raise ValueError(f'Unknown profile format {settings.format}, expected one of {", ".join(profile_formats)}')
+
+    profiler = Blueprint('request_profiler', __name__)
+    directory = Path(settings.directory)
+
+    def requested() -> bool:
+        token = request.headers.get(profile_header)
+        if token is not None and settings.token != '':
+            return hmac.compare_digest(token, settings.token)
+        return settings.sample_rate > 0 and sample() < settings.sample_rate
+
+    @profiler.before_app_request
+    def start_profile() -> None:
+        if requested():
+            g.profile_sampler = StackSampler.for_current_thread(
+                f'{request.method} {request.path}', settings.interval_seconds).start()
+            g.profile_stem = profile_file_stem(request.method, request.path)
+
+    @profiler.after_app_request
+    def finish_profile(response: Response) -> Response:
+        sampler = g.pop('profile_sampler', None)
+        if sampler is None:
+            return response
+        stem = g.pop('profile_stem')
+
+        def save() -> None:
+            profile = sampler.stop()
+            try:
+                paths = save_profile(profile, directory, stem, settings.format)
+            except OSError as e:
+                logger.warning('Unable to save profile %s: %s', stem, e)
+                return
+            logger.info(
+                'Profiled %s in %.1f ms wall clock, %.1f ms CPU: %s',
+                profile.name,
+                profile.total_wall_seconds * 1000,
+                profile.total_cpu_seconds * 1000,
+                ', '.join(str(path) for path in paths),
+            )
+
+        response.headers[profile_file_header] = stem
+        response.call_on_close(save)
+        return response
+
+    return profiler
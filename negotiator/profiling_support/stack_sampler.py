@@ -0,0 +1,189 @@
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from types import FrameType
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class StackFrame:
+    name: str
+    file: str
+    line: int
+
+    def label(self) -> str:
+        return f'{self.name} ({self.file}:{self.line})'
+
+
+Stack = Tuple[StackFrame, ...]
+
+
+@dataclass
+class Profile:
+    name: str
+    wall_seconds: Dict[Stack, float] = field(default_factory=dict)
+    cpu_seconds: Dict[Stack, float] = field(default_factory=dict)
+    # Per-thread CPU clocks are not available on every platform, macOS among them
+    cpu_available: bool = True
+
+    def add(self, stack: Stack, wall_seconds: float, cpu_seconds: float) -> None:
+        self.wall_seconds[stack] = self.wall_seconds.get(stack, 0.0) + wall_seconds
+        if cpu_seconds > 0:
+            self.cpu_seconds[stack] = self.cpu_seconds.get(stack, 0.0) + cpu_seconds
+
+    @property
+    def total_wall_seconds(self) -> float:
+        return sum(self.wall_seconds.values())
+
+    @property
+    def total_cpu_seconds(self) -> float:
+        return sum(self.cpu_seconds.values())
+
+    def speedscope(self) -> Dict[str, Any]:
+        frames: List[StackFrame] = []
+        frame_indexes: Dict[StackFrame, int] = {}
+
+        def sampled(name: str, weights: Dict[Stack, float]) -> Dict[str, Any]:
+            samples = []
+            for stack in weights:
+                for frame in stack:
+                    if frame not in frame_indexes:
+                        frame_indexes[frame] = len(frames)
+                        frames.append(frame)
+                samples.append([frame_indexes[frame] for frame in stack])
+            milliseconds = [seconds * 1000 for seconds in weights.values()]
+            return {
+                'type': 'sampled',
+                'name': name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': sum(milliseconds),
+                'samples': samples,
+                'weights': milliseconds,
+            }
+
+        profiles = [sampled(f'{self.name} wall clock', self.wall_seconds)]
+        if self.cpu_available:
+            profiles.append(sampled(f'{self.name} CPU', self.cpu_seconds))
+
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': self.name,
+            'exporter': 'negotiator',
+            'activeProfileIndex': 0,
+            'profiles': profiles,
+            'shared': {'frames': [{'name': f.name, 'file': f.file, 'line': f.line} for f in frames]},
+        }
+
+    # Brendan Gregg's folded format, one "root;...;leaf weight" line per stack, weighted in microseconds
+    @staticmethod
+    def collapsed(weights: Dict[Stack, float]) -> str:
+        return ''.join(
+            f'{";".join(frame.label() for frame in stack)} {round(seconds * 1_000_000)}\n'
+            for stack, seconds in weights.items()
+            if round(seconds * 1_000_000) > 0
+        )
+
+
+def stack_of(frame: Optional[FrameType]) -> Stack:
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(StackFrame(code.co_qualname, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    return tuple(reversed(frames))
+
+
+Clock = Callable[[], float]
+StackSource = Callable[[], Optional[Stack]]
+
+
+# None once the thread has exited
+def thread_stack(thread_id: int) -> StackSource:
+    def current_stack() -> Optional[Stack]:
+        frame = sys._current_frames().get(thread_id)
+        return None if frame is None else stack_of(frame)
+
+    return current_stack
+
+
+# None where per-thread CPU clocks are not available
+def thread_cpu_clock(thread_id: int) -> Optional[Clock]:
+    if not hasattr(time, 'pthread_getcpuclockid'):
+        return None
+    clock_id = time.pthread_getcpuclockid(thread_id)
+    return lambda: time.clock_gettime(clock_id)
+
+
+# Samples another thread's stack on a timer, so the profiled code runs unmodified between samples.
+# Each sample is weighted by the wall clock and thread CPU time that passed since the previous one.
+class StackSampler:
+    def __init__(
+            self,
+            name: str,
+            interval_seconds: float,
+            stack_source: StackSource,
+            cpu_clock: Optional[Clock],
+            wall_clock: Clock = time.perf_counter,
+    ) -> None:
+        self.__interval_seconds = interval_seconds
+        self.__stack_source = stack_source
+        self.__cpu_clock = cpu_clock
+        self.__wall_clock = wall_clock
+        self.__profile = Profile(name, cpu_available=cpu_clock is not None)
+        self.__stopped = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+        self.__last_wall = 0.0
+        self.__last_cpu = 0.0
+        self.mark()
+
+    @classmethod
+    def for_thread(cls, name: str, thread_id: int, interval_seconds: float) -> 'StackSampler':
+        return cls(name, interval_seconds, thread_stack(thread_id), thread_cpu_clock(thread_id))
+
+    @classmethod
+    def for_current_thread(cls, name: str, interval_seconds: float) -> 'StackSampler':
+        return cls.for_thread(name, threading.get_ident(), interval_seconds)
+
+    def start(self) -> 'StackSampler':
+        self.mark()
+        self.__thread = threading.Thread(target=self.__sample_until_stopped, name='stack-sampler', daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self) -> Profile:
+        self.__stopped.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        return self.__profile
+
+    # Starts the interval the next sample is weighted by
+    def mark(self) -> None:
+        self.__last_wall = self.__wall_clock()
+        self.__last_cpu = self.__cpu_time()
+
+    # Attributes the time since the previous sample to the current stack; False once the thread has exited
+    def sample(self) -> bool:
+        stack = self.__stack_source()
+        if stack is None:
+            return False
+
+        wall = self.__wall_clock()
+        try:
+            cpu = self.__cpu_time()
+        except OSError:
+            # The thread exited between taking its frame and reading its clock
+            return False
+        self.__profile.add(stack, wall - self.__last_wall, cpu - self.__last_cpu)
+        self.__last_wall, self.__last_cpu = wall, cpu
+        return True
+
+    def __sample_until_stopped(self) -> None:
+        while not self.__stopped.wait(self.__interval_seconds):
+            if not self.sample():
+                return
+
+    def __cpu_time(self) -> float:
+        return 0.0 if self.__cpu_clock is None else self.__cpu_clock()
@@ -0,0 +1,248 @@
+import concurrent.futures
+import dataclasses
+import logging
+import queue
+import random
+import threading
+from dataclasses import dataclass
+from typing import Any, Optional, List, cast
+from uuid import UUID, uuid4
+
+from freeplay import Freeplay, RecordPayload, CallInfo, ResponseInfo
+from freeplay.model import OpenAIFunctionCall
+from freeplay.resources.prompts import PromptInfo
+from freeplay.resources.sessions import Session, TraceInfo
+from sqlalchemy import Connection
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from negotiator.metrics_support.metrics import timed_stage, unknown_model
+from negotiator.recording.recording_repository import RecordingRepository, AsyncRecordingRepository
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FreeplayRecording:
+    project_id: str
+    session_id: str
+    trace_id: str
+    trace_input: str
+    output: str
+    all_messages: list[dict[str, str]]
+    inputs: dict[str, Any]
+    prompt_info: dict[str, Any]
+    call_info: dict[str, Any]
+    function_call: Optional[dict[str, str]] = None
+
+    def to_payload(self) -> dict[str, Any]:
+        return dataclasses.asdict(self)
+
+    @classmethod
+    def from_payload(cls, payload: dict[str, Any]) -> 'FreeplayRecording':
+        return cls(**payload)
+
+
+@dataclass
+class OutboxEntry:
+    id: UUID
+    recording: FreeplayRecording
+    lease_id: UUID
+    attempts: int = 0
+    # Freeplay already has the call, only the trace output is left to record
+    recorded: bool = False
+
+
+class RecordingOutbox:
+    def __init__(
+            self,
+            recording_repository: RecordingRepository,
+            freeplay_client: Freeplay,
+            queue_size: int = 1_000,
+            batch_size: int = 20,
+            poll_interval_seconds: float = 5.0,
+            lease_seconds: float = 60.0,
+            max_attempts: int = 10,
+            base_backoff_seconds: float = 1.0,
+            max_backoff_seconds: float = 300.0,
+            delivery_threads: int = 4,
+    ) -> None:
+        self.__repository = recording_repository
+        self.__freeplay_client = freeplay_client
+        self.__queue: queue.Queue[OutboxEntry] = queue.Queue(maxsize=queue_size)
+        self.__batch_size = batch_size
+        self.__poll_interval_seconds = poll_interval_seconds
+        self.__lease_seconds = lease_seconds
+        self.__max_attempts = max_attempts
+        self.__base_backoff_seconds = base_backoff_seconds
+        self.__max_backoff_seconds = max_backoff_seconds
+        self.__executor = concurrent.futures.ThreadPoolExecutor(delivery_threads, 'recording-delivery')
+        self.__stopped = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+
+    # Rows are leased to this worker until the in-memory queue delivers them, otherwise the poller picks them up
+    def add(self, recording: FreeplayRecording, connection: Optional[Connection] = None) -> OutboxEntry:
+        lease_id = uuid4()
+        recording_id = self.__repository.create(recording.to_payload(), self.__lease_seconds, lease_id, connection)
+        if recording_id is None:
+            raise Exception('Unable to add recording to the outbox')
+
+        return OutboxEntry(id=recording_id, recording=recording, lease_id=lease_id)
+
+    async def add_async(
+            self,
+            repository: AsyncRecordingRepository,
+            recording: FreeplayRecording,
+            connection: Optional[AsyncConnection] = None,
+    ) -> OutboxEntry:
+        lease_id = uuid4()
+        recording_id = await repository.create(recording.to_payload(), self.__lease_seconds, lease_id, connection)
+        if recording_id is None:
+            raise Exception('Unable to add recording to the outbox')
+
+        return OutboxEntry(id=recording_id, recording=recording, lease_id=lease_id)
+
+    def enqueue(self, entry: OutboxEntry) -> None:
+        try:
+            self.__queue.put_nowait(entry)
+        except queue.Full:
+            logger.warning('Recording outbox queue is full, leaving recording %s for the poller', entry.id)
+
+    def start(self) -> None:
+        if self.__thread is not None:
+            return
+
+        self.__thread = threading.Thread(target=self.__run, name='recording-outbox', daemon=True)
+        self.__thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self.__stopped.set()
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+            self.__thread = None
+        self.__executor.shutdown(wait=False)
+
+    # Freeplay records one call per request, so a batch is delivered concurrently and settled in two statements
+    def drain_once(self, wait_seconds: float = 0) -> int:
+        batch = self.__renew_leases(self.__take_queued(wait_seconds))
+        if not batch:
+            batch = [
+                OutboxEntry(
+                    id=record.id,
+                    recording=FreeplayRecording.from_payload(record.payload),
+                    lease_id=cast(UUID, record.lease_id),
+                    attempts=record.attempts,
+                    recorded=record.recorded,
+                )
+                for record in self.__repository.claim_due(self.__batch_size, self.__max_attempts, self.__lease_seconds)
+            ]
+
+        deliveries = [(entry, self.__executor.submit(self.__deliver, entry)) for entry in batch]
+
+        delivered: List[UUID] = []
+        given_up: List[UUID] = []
+        failed: List[UUID] = []
+        delays: List[float] = []
+        for entry, delivery in deliveries:
+            try:
+                delivery.result()
+                delivered.append(entry.id)
+            except Exception:
+                if entry.attempts + 1 >= self.__max_attempts:
+                    logger.error('Giving up on recording %s for session %s after %d attempts', entry.id,
+                                 entry.recording.session_id, entry.attempts + 1, exc_info=True)
+                    given_up.append(entry.id)
+                    continue
+
+                delay = self.__backoff_seconds(entry.attempts)
+                logger.warning('Unable to deliver recording %s to Freeplay, retrying in %.1fs', entry.id, delay,
+                               exc_info=True)
+                failed.append(entry.id)
+                delays.append(delay)
+
+        if delivered or given_up:
+            self.__repository.delete(delivered + given_up)
+        self.__repository.reschedule_many(failed, delays)
+
+        return len(delivered)
+
+    def __run(self) -> None:
+        while not self.__stopped.is_set():
+            try:
+                self.drain_once(self.__poll_interval_seconds)
+            except Exception:
+                logger.exception('Recording outbox drain failed')
+                self.__stopped.wait(self.__poll_interval_seconds)
+
+    def __take_queued(self, wait_seconds: float) -> List[OutboxEntry]:
+        try:
+            batch = [self.__queue.get(timeout=wait_seconds) if wait_seconds > 0 else self.__queue.get_nowait()]
+        except queue.Empty:
+            return []
+
+        while len(batch) < self.__batch_size:
+            try:
+                batch.append(self.__queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+    # Entries can wait in the queue past their lease, so only the ones nobody has claimed since are delivered,
+    # with the attempts and progress stored for them
+    def __renew_leases(self, entries: List[OutboxEntry]) -> List[OutboxEntry]:
+        leases = {
+            lease.id: lease
+            for lease in self.__repository.renew_leases(
+                [entry.id for entry in entries],
+                [entry.lease_id for entry in entries],
+                self.__lease_seconds,
+            )
+        }
+        for entry in entries:
+            if entry.id not in leases:
+                logger.info('Recording %s was claimed by the poller while queued, leaving it there', entry.id)
+
+        return [
+            dataclasses.replace(entry, attempts=leases[entry.id].attempts, recorded=leases[entry.id].recorded)
+            for entry in entries
+            if entry.id in leases
+        ]
+
+    def __backoff_seconds(self, attempts: int) -> float:
+        delay = min(self.__max_backoff_seconds, self.__base_backoff_seconds * 2 ** attempts)
+        return random.uniform(delay / 2, delay)
+
+    def __deliver(self, entry: OutboxEntry) -> None:
+        with timed_stage('freeplay_record', entry.recording.prompt_info.get('model', unknown_model)):
+            self.__record(entry)
+
+    # Two remote calls; the first is noted on the row as soon as it succeeds, so a retry never records it twice
+    def __record(self, entry: OutboxEntry) -> None:
+        recording = entry.recording
+        session = self.__freeplay_client.sessions.restore_session(recording.session_id)
+        trace = session.restore_trace(UUID(recording.trace_id), recording.trace_input)
+        if not entry.recorded:
+            self.__record_call(recording, session, trace)
+            self.__repository.mark_recorded(entry.id)
+
+        trace.record_output(recording.project_id, recording.output)
+
+    def __record_call(self, recording: FreeplayRecording, session: Session, trace: TraceInfo) -> None:
+        response_info = ResponseInfo()
+        if recording.function_call is not None:
+            response_info = ResponseInfo(function_call_response=OpenAIFunctionCall(
+                name=recording.function_call['name'],
+                arguments=recording.function_call['arguments'],
+            ))
+
+        self.__freeplay_client.recordings.create(
+            RecordPayload(
+                all_messages=recording.all_messages,
+                inputs=recording.inputs,
+                session_info=session.session_info,
+                prompt_info=PromptInfo(**recording.prompt_info),
+                call_info=CallInfo(**recording.call_info),
+                response_info=response_info,
+                trace_info=trace
+            )
+        )
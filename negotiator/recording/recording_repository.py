@@ -0,0 +1,194 @@
+import json
+from dataclasses import dataclass
+from typing import Optional, cast, List, Any
+from uuid import UUID
+
+from negotiator.database_support.database_template import DatabaseTemplate, AsyncDatabaseTemplate
+from negotiator.database_support.result_mapping import map_one_row, map_rows
+from sqlalchemy import Connection
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+create_statement = """
+                   insert into freeplay_recordings (payload, next_attempt_at, lease_id)
+                     values (
+                         cast(:payload as jsonb),
+                         now() + make_interval(secs => :lease_seconds),
+                         cast(:lease_id as uuid)
+                     )
+                     returning id
+                   """
+
+
+@dataclass
+class RecordingRecord:
+    id: UUID
+    payload: dict[str, Any]
+    attempts: int
+    lease_id: Optional[UUID] = None
+    recorded: bool = False
+
+
+@dataclass
+class RecordingLease:
+    id: UUID
+    lease_id: UUID
+    attempts: int
+    recorded: bool = False
+
+
+class RecordingRepository:
+    def __init__(self, db: DatabaseTemplate) -> None:
+        self.__db = db
+
+    def create(
+        self,
+        payload: dict[str, Any],
+        lease_seconds: float = 0,
+        lease_id: Optional[UUID] = None,
+        connection: Optional[Connection] = None
+    ) -> Optional[UUID]:
+        result = self.__db.query(
+            statement=create_statement,
+            connection=connection,
+            payload=json.dumps(payload),
+            lease_seconds=lease_seconds,
+            lease_id=lease_id,
+        )
+
+        return map_one_row(result, lambda row: cast(UUID, row[0]))
+
+    def claim_due(
+        self,
+        limit: int,
+        max_attempts: int,
+        lease_seconds: float,
+        connection: Optional[Connection] = None
+    ) -> List[RecordingRecord]:
+        result = self.__db.query(
+            statement="""
+                      update freeplay_recordings
+                        set next_attempt_at = now() + make_interval(secs => :lease_seconds),
+                            lease_id = gen_random_uuid()
+                        where id in (
+                            select id from freeplay_recordings
+                                where next_attempt_at <= now()
+                                and attempts < :max_attempts
+                                order by next_attempt_at
+                                limit :limit
+                                for update skip locked
+                        )
+                        returning id, payload, attempts, lease_id, recorded_at is not null
+                      """,
+            connection=connection,
+            limit=limit,
+            max_attempts=max_attempts,
+            lease_seconds=lease_seconds,
+        )
+
+        return map_rows(result, lambda row: RecordingRecord(
+            id=cast(UUID, row[0]),
+            payload=cast(dict[str, Any], row[1]),
+            attempts=cast(int, row[2]),
+            lease_id=cast(UUID, row[3]),
+            recorded=cast(bool, row[4]),
+        ))
+
+    # Extends the leases still held under the given lease ids; recordings claimed by someone else are left out
+    def renew_leases(
+        self,
+        ids: List[UUID],
+        lease_ids: List[UUID],
+        lease_seconds: float,
+        connection: Optional[Connection] = None
+    ) -> List[RecordingLease]:
+        if not ids:
+            return []
+
+        result = self.__db.query(
+            statement="""
+                      update freeplay_recordings r
+                        set next_attempt_at = now() + make_interval(secs => :lease_seconds)
+                        from unnest(cast(:ids as uuid[]), cast(:lease_ids as uuid[])) as l (id, lease_id)
+                        where r.id = l.id
+                        and r.lease_id = l.lease_id
+                        returning r.id, r.lease_id, r.attempts, r.recorded_at is not null
+                      """,
+            connection=connection,
+            ids=ids,
+            lease_ids=lease_ids,
+            lease_seconds=lease_seconds,
+        )
+
+        return map_rows(result, lambda row: RecordingLease(
+            id=cast(UUID, row[0]),
+            lease_id=cast(UUID, row[1]),
+            attempts=cast(int, row[2]),
+            recorded=cast(bool, row[3]),
+        ))
+
+    def mark_recorded(self, id: UUID, connection: Optional[Connection] = None) -> None:
+        self.__db.query(
+            statement="""
+                      update freeplay_recordings set recorded_at = now() where id = :id
+                      """,
+            connection=connection,
+            id=id,
+        )
+
+    def delete(self, ids: List[UUID], connection: Optional[Connection] = None) -> None:
+        self.__db.query(
+            statement="""
+                      delete from freeplay_recordings where id = any(:ids)
+                      """,
+            connection=connection,
+            ids=ids,
+        )
+
+    def reschedule(self, id: UUID, delay_seconds: float, connection: Optional[Connection] = None) -> None:
+        self.reschedule_many([id], [delay_seconds], connection)
+
+    def reschedule_many(
+        self,
+        ids: List[UUID],
+        delays_seconds: List[float],
+        connection: Optional[Connection] = None
+    ) -> None:
+        if not ids:
+            return
+
+        self.__db.query(
+            statement="""
+                      update freeplay_recordings r
+                        set attempts = r.attempts + 1,
+                            next_attempt_at = now() + make_interval(secs => d.delay_seconds)
+                        from unnest(cast(:ids as uuid[]), cast(:delays_seconds as float8[])) as d (id, delay_seconds)
+                        where r.id = d.id
+                      """,
+            connection=connection,
+            ids=ids,
+            delays_seconds=delays_seconds,
+        )
+
+
+# Lets chat turns on the async database write their recording in the same transaction as their messages.
+# Delivery stays with RecordingOutbox and the sync repository.
+class AsyncRecordingRepository:
+    def __init__(self, db: AsyncDatabaseTemplate) -> None:
+        self.__db = db
+
+    async def create(
+        self,
+        payload: dict[str, Any],
+        lease_seconds: float = 0,
+        lease_id: Optional[UUID] = None,
+        connection: Optional[AsyncConnection] = None
+    ) -> Optional[UUID]:
+        result = await self.__db.query(
+            statement=create_statement,
+            connection=connection,
+            payload=json.dumps(payload),
+            lease_seconds=lease_seconds,
+            lease_id=lease_id,
+        )
+
+        return map_one_row(result, lambda row: cast(UUID, row[0]))
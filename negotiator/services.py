@@ -0,0 +1,138 @@
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import httpx
+import openai
+import sqlalchemy
+from freeplay import Freeplay
+
+from negotiator.database_support.database_template import DatabaseTemplate
+from negotiator.environment import Environment
+from negotiator.http_support.http_clients import HttpClientSettings, ConnectionCounter, FreeplaySession, \
+    http_client, pooled_openai_client, pooled_freeplay_client, shared_freeplay_session
+from negotiator.negotiation.context_window import ContextWindow, LLMSummarizer
+from negotiator.negotiation.llm_resilience import CircuitBreaker, RetryPolicy, ResilientLLMCall
+from negotiator.negotiation.llm_service import LLMService, LLMResponse
+from negotiator.negotiation.message_repository import MessageRepository
+from negotiator.negotiation.negotiation_cache import NegotiationCache, NegotiationChangeListener, \
+    CachedNegotiationService
+from negotiator.negotiation.negotiation_repository import NegotiationRepository
+from negotiator.negotiation.prompt_template_cache import PromptTemplateCache
+from negotiator.negotiation.resolution_repository import ResolutionRepository
+from negotiator.negotiation.response_cache import ResponseCache
+from negotiator.negotiation.summary_repository import SummaryRepository
+from negotiator.recording.recording_outbox import RecordingOutbox
+from negotiator.recording.recording_repository import RecordingRepository
+
+
+@dataclass
+class Services:
+    env: Environment
+    db_template: DatabaseTemplate
+    openai_connections: ConnectionCounter
+    openai_http_client: httpx.Client
+    openai_client: openai.OpenAI
+    freeplay_session: FreeplaySession
+    freeplay_client: Freeplay
+    negotiation_cache: NegotiationCache
+    negotiation_service: CachedNegotiationService
+    prompt_templates: PromptTemplateCache
+    llm_breaker: CircuitBreaker
+    llm_retry_policy: RetryPolicy
+    call_llm: ResilientLLMCall
+    context_window: ContextWindow
+    recording_outbox: RecordingOutbox
+    llm_service: LLMService
+
+    # Shares everything with the default LLM service except the model call, the response cache and the prompt version.
+    # Summaries go through the given call too, so wrapping it sees every call a turn makes.
+    def llm_service_with(
+            self,
+            call_llm: Any,
+            response_cache: ResponseCache[LLMResponse],
+            prompt_environment: str,
+    ) -> LLMService:
+        return LLMService(
+            self.db_template,
+            self.negotiation_service,
+            self.freeplay_client,
+            self.prompt_templates,
+            summarizing_context_window(self.env, self.db_template, call_llm),
+            response_cache,
+            self.recording_outbox,
+            call_llm,
+            self.env.freeplay_project_id,
+            self.env.llm_turn_timeout_seconds,
+            prompt_environment=prompt_environment,
+        )
+
+
+# Summaries go through the same breaker and retries as replies, and share the turn's deadline
+def summarizing_context_window(env: Environment, db_template: DatabaseTemplate, call_llm: Any) -> ContextWindow:
+    return ContextWindow(
+        SummaryRepository(db_template),
+        LLMSummarizer(call_llm, env.summary_model),
+        env.context_token_budget,
+    )
+
+
+# The wiring behind a chat turn, shared by the sync and async apps and the evaluate command. Starts the change
+# listener and the recording outbox.
+def create_services(env: Environment, database_url: str, pool_size: Optional[int] = None) -> Services:
+    db = sqlalchemy.create_engine(database_url, pool_size=pool_size or env.database_pool_size)
+    db_template = DatabaseTemplate(db, env.database_prepared_statements)
+
+    http_settings = HttpClientSettings.from_environment(env)
+    openai_connections = ConnectionCounter()
+    openai_http_client = http_client(http_settings, openai_connections)
+    openai_client = pooled_openai_client(env.openai_api_key, openai_http_client, env.openai_base_url)
+    freeplay_session = shared_freeplay_session(http_settings)
+    freeplay_client = pooled_freeplay_client(env.freeplay_api_key, freeplay_session, env.freeplay_api_base)
+
+    negotiation_cache = NegotiationCache(env.negotiation_cache_size)
+    NegotiationChangeListener(database_url, negotiation_cache).start()
+    negotiation_service = CachedNegotiationService(
+        db_template,
+        NegotiationRepository(db_template),
+        MessageRepository(db_template),
+        ResolutionRepository(db_template),
+        negotiation_cache,
+    )
+    prompt_templates = PromptTemplateCache(freeplay_client, env.prompt_cache_ttl_seconds)
+    llm_breaker = CircuitBreaker(env.llm_breaker_failures, env.llm_breaker_reset_seconds)
+    llm_retry_policy = RetryPolicy(env.llm_max_attempts, hedge_after_seconds=env.llm_hedge_after_seconds or None)
+    call_llm = ResilientLLMCall(openai_client.chat.completions.create, llm_breaker, llm_retry_policy)
+    context_window = summarizing_context_window(env, db_template, call_llm)
+    recording_outbox = RecordingOutbox(RecordingRepository(db_template), freeplay_client)
+    recording_outbox.start()
+    llm_service = LLMService(
+        db_template,
+        negotiation_service,
+        freeplay_client,
+        prompt_templates,
+        context_window,
+        ResponseCache(env.response_cache_size, env.response_cache_ttl_seconds, env.response_cache_all_temperatures),
+        recording_outbox,
+        call_llm,
+        env.freeplay_project_id,
+        env.llm_turn_timeout_seconds,
+    )
+
+    return Services(
+        env=env,
+        db_template=db_template,
+        openai_connections=openai_connections,
+        openai_http_client=openai_http_client,
+        openai_client=openai_client,
+        freeplay_session=freeplay_session,
+        freeplay_client=freeplay_client,
+        negotiation_cache=negotiation_cache,
+        negotiation_service=negotiation_service,
+        prompt_templates=prompt_templates,
+        llm_breaker=llm_breaker,
+        llm_retry_policy=llm_retry_policy,
+        call_llm=call_llm,
+        context_window=context_window,
+        recording_outbox=recording_outbox,
+        llm_service=llm_service,
+    )
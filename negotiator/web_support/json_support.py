@@ -1,18 +1,206 @@
 import dataclasses
+import datetime
 import json
+import threading
+import types
 import typing
+from json.encoder import encode_basestring_ascii
 from uuid import UUID
 
+default_chunk_size = 64 * 1024
+
 
 def encode(obj: typing.Any) -> str:
-    return json.dumps(obj, cls=EncoderWithDataClassSupport)
+    return encode_value(obj)
+
+
+# Yields the same text as encode in pieces of at least chunk_size, so a long transcript is never held as one string
+def encode_chunks(obj: typing.Any, chunk_size: int = default_chunk_size) -> typing.Iterator[str]:
+    buffer: list[str] = []
+    size = 0
+    for piece in pieces(obj):
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield ''.join(buffer)
+            buffer, size = [], 0
 
+    if buffer:
+        yield ''.join(buffer)
 
+
+# The reference encoder, kept for callers that pass a cls to json.dumps; encode produces the same text faster
 class EncoderWithDataClassSupport(json.JSONEncoder):
     def default(self, o: typing.Any) -> typing.Any:
         if dataclasses.is_dataclass(o):
             return dataclasses.asdict(o)
-        if type(o) is UUID:
+        if isinstance(o, UUID):
             return str(o)
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
 
         return super().default(o)
+
+
+def encode_value(o: typing.Any) -> str:
+    cls = o.__class__
+    encoder = encoders.get(cls)
+    if encoder is not None:
+        return encoder(o)
+
+    if isinstance(o, str):
+        return encode_basestring_ascii(o)
+    if o is None:
+        return 'null'
+    if o is True:
+        return 'true'
+    if o is False:
+        return 'false'
+    if isinstance(o, int):
+        return int.__repr__(o)
+    if isinstance(o, float):
+        return encode_float(o)
+    if isinstance(o, (list, tuple)):
+        return '[' + ', '.join([encode_value(item) for item in o]) + ']'
+    if isinstance(o, dict):
+        return '{' + ', '.join([encode_key(key) + ': ' + encode_value(value) for key, value in o.items()]) + '}'
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return encoder_for(cls)(o)
+    if isinstance(o, UUID):
+        return f'"{o}"'
+    if isinstance(o, datetime.datetime):
+        return encode_basestring_ascii(o.isoformat())
+
+    raise TypeError(f'Object of type {cls.__name__} is not JSON serializable')
+
+
+def encode_float(o: float) -> str:
+    if o != o:
+        return 'NaN'
+    if o == float('inf'):
+        return 'Infinity'
+    if o == float('-inf'):
+        return '-Infinity'
+    return float.__repr__(o)
+
+
+def encode_key(key: typing.Any) -> str:
+    if isinstance(key, str):
+        return encode_basestring_ascii(key)
+    if isinstance(key, float):
+        return f'"{encode_float(key)}"'
+    if key is True or key is False or key is None or isinstance(key, int):
+        return f'"{encode_value(key)}"'
+
+    raise TypeError(f'keys must be str, int, float, bool or None, not {key.__class__.__name__}')
+
+
+encoders: dict[type, typing.Callable[[typing.Any], str]] = {
+    str: encode_basestring_ascii,
+    UUID: lambda o: f'"{o}"',
+    int: int.__repr__,
+    float: encode_float,
+    bool: lambda o: 'true' if o else 'false',
+    type(None): lambda o: 'null',
+}
+compile_lock = threading.Lock()
+
+
+# Generates a serializer for each dataclass the first time it is encoded. Fields are read directly instead of
+# through dataclasses.asdict, which deep copies every value, and fields whose annotation names a type get an
+# inline fast path that falls back to encode_value when the value turns out to be something else.
+def encoder_for(cls: type) -> typing.Callable[[typing.Any], str]:
+    encoder = encoders.get(cls)
+    if encoder is not None:
+        return encoder
+
+    with compile_lock:
+        return compile_encoder(cls, set())
+
+
+def compile_encoder(cls: type, compiling: set[type]) -> typing.Callable[[typing.Any], str]:
+    encoder = encoders.get(cls)
+    if encoder is not None:
+        return encoder
+
+    compiling.add(cls)
+    try:
+        hints = typing.get_type_hints(cls)
+    except Exception:
+        hints = {}
+
+    namespace: dict[str, typing.Any] = {'encode_value': encode_value}
+    lines = ['def encode_dataclass(o):']
+    parts = []
+    for index, field in enumerate(dataclasses.fields(cls)):
+        value = f'v{index}'
+        lines.append(f'    {value} = o.{field.name}')
+        key = encode_basestring_ascii(field.name)
+        parts.append(repr(('{' if index == 0 else ', ') + key + ': '))
+        parts.append(value_expression(hints.get(field.name, typing.Any), value, namespace, compiling))
+
+    lines.append(f'    return {" + ".join(parts)} + "}}"' if parts else '    return "{}"')
+    exec('\n'.join(lines), namespace)
+    compiling.discard(cls)
+
+    encoder = namespace['encode_dataclass']
+    encoders[cls] = encoder
+    return typing.cast(typing.Callable[[typing.Any], str], encoder)
+
+
+def value_expression(hint: typing.Any, value: str, namespace: dict[str, typing.Any], compiling: set[type]) -> str:
+    origin = typing.get_origin(hint)
+    arguments = typing.get_args(hint)
+
+    if origin in (typing.Union, types.UnionType) and len(arguments) == 2 and type(None) in arguments:
+        other = arguments[0] if arguments[1] is type(None) else arguments[1]
+        return f'("null" if {value} is None else {value_expression(other, value, namespace, compiling)})'
+
+    if origin is list and len(arguments) == 1:
+        item = f'{value}_item'
+        item_expression = value_expression(arguments[0], item, namespace, compiling)
+        return f'("[" + ", ".join([{item_expression} for {item} in {value}]) + "]" ' \
+               f'if {value}.__class__ is list else encode_value({value}))'
+
+    if not isinstance(hint, type):
+        return f'encode_value({value})'
+
+    name = f'encode_field_{len(namespace)}'
+    if hint in encoders:
+        namespace[name] = encoders[hint]
+    elif dataclasses.is_dataclass(hint) and hint not in compiling:
+        namespace[name] = compile_encoder(hint, compiling)
+    else:
+        return f'encode_value({value})'
+
+    namespace[f'{name}_type'] = hint
+    return f'({name}({value}) if {value}.__class__ is {name}_type else encode_value({value}))'
+
+
+def pieces(o: typing.Any) -> typing.Iterator[str]:
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        fields = dataclasses.fields(o)
+        if not fields:
+            yield '{}'
+            return
+        for index, field in enumerate(fields):
+            yield ('{' if index == 0 else ', ') + encode_basestring_ascii(field.name) + ': '
+            yield from pieces(getattr(o, field.name))
+        yield '}'
+    elif isinstance(o, (list, tuple)):
+        if not o:
+            yield '[]'
+            return
+        for index, item in enumerate(o):
+            yield ('[' if index == 0 else ', ') + encode_value(item)
+        yield ']'
+    elif isinstance(o, dict):
+        if not o:
+            yield '{}'
+            return
+        for index, (key, value) in enumerate(o.items()):
+            yield ('{' if index == 0 else ', ') + encode_key(key) + ': '
+            yield from pieces(value)
+        yield '}'
+    else:
+        yield encode_value(o)
@@ -0,0 +1,7 @@
+import typing
+
+from negotiator.web_support import json_support
+
+
+def event(name: str, data: typing.Any) -> str:
+    return f'event: {name}\ndata: {json_support.encode(data)}\n\n'
@@ -0,0 +1,45 @@
+import argparse
+import sys
+from pathlib import Path
+
+from tests.benchmarks.benchmark_support import measure, load_baseline, save_baseline, regressions, format_results
+from tests.benchmarks.negotiation_benchmarks import negotiation_benchmarks
+from tests.db_test_support import test_db_template
+
+default_baseline = Path(__file__).parent / 'baseline.json'
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='benchmarks', description='time repositories, services and serialization')
+    parser.add_argument('--sizes', default='10,100,1000,10000', help='comma separated transcript sizes')
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per benchmark and size')
+    parser.add_argument('--filter', default='', help='only run benchmarks whose name contains this')
+    parser.add_argument('--baseline', type=Path, default=default_baseline)
+    parser.add_argument('--save', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--max-regression-percent', type=float, default=25.0)
+    arguments = parser.parse_args()
+
+    db = test_db_template()
+    db.clear()
+    baseline = load_baseline(arguments.baseline)
+
+    results = []
+    for benchmark in negotiation_benchmarks(db):
+        if arguments.filter not in benchmark.name:
+            continue
+        for size in [int(size) for size in arguments.sizes.split(',')]:
+            results.append(measure(benchmark, size, arguments.repeat))
+            print(format_results(results[-1:], baseline).splitlines()[-1], file=sys.stderr, flush=True)
+
+    db.clear()
+    print(format_results(results, baseline))
+
+    if arguments.save:
+        save_baseline(arguments.baseline, results)
+        print(f'Saved baseline to {arguments.baseline}')
+        sys.exit(0)
+
+    found = regressions(results, baseline, arguments.max_regression_percent)
+    for regression in found:
+        print(f'{regression.key} regressed {regression.percent:.1f}% '
+              f'({regression.baseline_ms:.3f}ms -> {regression.current_ms:.3f}ms)', file=sys.stderr)
+    sys.exit(1 if found else 0)
@@ -0,0 +1,112 @@
+import json
+import platform
+import statistics
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+
+@dataclass
+class Benchmark:
+    name: str
+    # Runs once per size, outside the timing
+    prepare: Callable[[int], Any]
+    run: Callable[[Any], Any]
+    # Runs before every timed run and hands its result to run, for benchmarks that consume their data
+    before_each: Optional[Callable[[Any], Any]] = None
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    size: int
+    runs: int
+    median_ms: float
+    min_ms: float
+    max_ms: float
+
+    @property
+    def key(self) -> str:
+        return f'{self.name}[{self.size}]'
+
+
+@dataclass
+class Regression:
+    key: str
+    baseline_ms: float
+    current_ms: float
+
+    @property
+    def percent(self) -> float:
+        return (self.current_ms - self.baseline_ms) / self.baseline_ms * 100
+
+
+def measure(benchmark: Benchmark, size: int, repeat: int = 20, warmup: int = 1) -> BenchmarkResult:
+    state = benchmark.prepare(size)
+    durations: List[float] = []
+
+    for attempt in range(warmup + repeat):
+        argument = state if benchmark.before_each is None else benchmark.before_each(state)
+        start = time.perf_counter()
+        benchmark.run(argument)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if attempt >= warmup:
+            durations.append(elapsed_ms)
+
+    return BenchmarkResult(
+        name=benchmark.name,
+        size=size,
+        runs=repeat,
+        median_ms=statistics.median(durations),
+        min_ms=min(durations),
+        max_ms=max(durations),
+    )
+
+
+def save_baseline(path: Path, results: List[BenchmarkResult]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'benchmarks': {result.key: asdict(result) for result in results},
+    }, indent=2) + '\n')
+
+
+def load_baseline(path: Path) -> Dict[str, BenchmarkResult]:
+    if not path.exists():
+        return {}
+
+    document = json.loads(path.read_text())
+    return {key: BenchmarkResult(**result) for key, result in document['benchmarks'].items()}
+
+
+# Medians are compared, since a single slow run says more about the machine than the code
+def regressions(
+        results: List[BenchmarkResult],
+        baseline: Dict[str, BenchmarkResult],
+        max_regression_percent: float,
+) -> List[Regression]:
+    found = []
+    for result in results:
+        previous = baseline.get(result.key)
+        if previous is None or previous.median_ms <= 0:
+            continue
+
+        regression = Regression(result.key, previous.median_ms, result.median_ms)
+        if regression.percent > max_regression_percent:
+            found.append(regression)
+
+    return found
+
+
+def format_results(results: List[BenchmarkResult], baseline: Dict[str, BenchmarkResult]) -> str:
+    lines = [f'{"benchmark":<52} {"median ms":>10} {"min ms":>10} {"max ms":>10} {"change":>8}']
+    for result in results:
+        previous = baseline.get(result.key)
+        change = '' if previous is None or previous.median_ms <= 0 \
+            else f'{Regression(result.key, previous.median_ms, result.median_ms).percent:+.1f}%'
+        lines.append(
+            f'{result.key:<52} {result.median_ms:>10.3f} {result.min_ms:>10.3f} {result.max_ms:>10.3f} {change:>8}'
+        )
+    return '\n'.join(lines)
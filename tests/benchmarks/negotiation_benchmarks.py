@@ -0,0 +1,92 @@
+from dataclasses import dataclass
+from typing import List
+from uuid import UUID, uuid4
+
+from negotiator.negotiation.message_repository import MessageRepository, NewMessage
+from negotiator.negotiation.negotiation_page import to_info
+from negotiator.negotiation.negotiation_repository import NegotiationRepository
+from negotiator.negotiation.negotiation_service import NegotiationService, Negotiation
+from negotiator.negotiation.resolution_repository import ResolutionRepository
+from negotiator.web_support import json_support
+from tests.benchmarks.benchmark_support import Benchmark
+from tests.db_test_support import TestDatabaseTemplate
+
+
+@dataclass
+class Transcript:
+    negotiation_id: UUID
+    message_ids: List[UUID]
+
+
+def new_messages(size: int) -> List[NewMessage]:
+    return [
+        NewMessage(uuid4(), 'user' if i % 2 == 0 else 'assistant', f'Message {i} about the price of the car. ' * 4)
+        for i in range(size)
+    ]
+
+
+def negotiation_benchmarks(db: TestDatabaseTemplate) -> List[Benchmark]:
+    negotiation_repository = NegotiationRepository(db)
+    message_repository = MessageRepository(db)
+    negotiation_service = NegotiationService(
+        db, negotiation_repository, message_repository, ResolutionRepository(db))
+
+    def transcript(size: int) -> Transcript:
+        negotiation_id = negotiation_repository.create()
+        assert negotiation_id is not None
+        messages = new_messages(size)
+        message_repository.create_many(negotiation_id, messages)
+        return Transcript(negotiation_id, [message.id for message in messages])
+
+    def empty_negotiation() -> UUID:
+        negotiation_id = negotiation_repository.create()
+        assert negotiation_id is not None
+        return negotiation_id
+
+    def negotiation(size: int) -> Negotiation:
+        created = transcript(size)
+        found = negotiation_service.find(created.negotiation_id)
+        assert found is not None
+        return found
+
+    return [
+        Benchmark(
+            name='message_repository.create',
+            prepare=transcript,
+            run=lambda t: message_repository.create(
+                negotiation_id=t.negotiation_id, id=uuid4(), role='user', content='How about 14,000?'),
+        ),
+        Benchmark(
+            name='message_repository.create_many',
+            prepare=lambda size: size,
+            before_each=lambda size: (empty_negotiation(), new_messages(size)),
+            run=lambda arguments: message_repository.create_many(*arguments),
+        ),
+        Benchmark(
+            name='message_repository.list_for_negotiation',
+            prepare=transcript,
+            run=lambda t: message_repository.list_for_negotiation(t.negotiation_id),
+        ),
+        Benchmark(
+            name='negotiation_repository.move_head',
+            prepare=lambda size: size,
+            before_each=transcript,
+            run=lambda t: negotiation_repository.move_head(
+                t.negotiation_id, t.message_ids[len(t.message_ids) // 2]),
+        ),
+        Benchmark(
+            name='negotiation_service.find',
+            prepare=transcript,
+            run=lambda t: negotiation_service.find(t.negotiation_id),
+        ),
+        Benchmark(
+            name='json_support.encode',
+            prepare=negotiation,
+            run=lambda n: json_support.encode(to_info(n)),
+        ),
+        Benchmark(
+            name='json_support.encode_chunks',
+            prepare=negotiation,
+            run=lambda n: sum(len(chunk) for chunk in json_support.encode_chunks(to_info(n))),
+        ),
+    ]
@@ -0,0 +1,61 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from tests.benchmarks.benchmark_support import Benchmark, BenchmarkResult, measure, save_baseline, load_baseline, \
+    regressions, format_results
+
+
+def result(median_ms: float, size: int = 10) -> BenchmarkResult:
+    return BenchmarkResult(name='some.benchmark', size=size, runs=5, median_ms=median_ms, min_ms=1.0, max_ms=9.0)
+
+
+class TestBenchmarkSupport(TestCase):
+    def test_measure(self):
+        prepared = []
+        runs = []
+
+        def prepare(size: int) -> int:
+            prepared.append(size)
+            return size * 2
+
+        benchmark = Benchmark(
+            name='some.benchmark',
+            prepare=prepare,
+            before_each=lambda state: state + 1,
+            run=runs.append,
+        )
+
+        measured = measure(benchmark, size=10, repeat=3, warmup=1)
+
+        self.assertEqual([10], prepared)
+        self.assertEqual([21, 21, 21, 21], runs)
+        self.assertEqual('some.benchmark[10]', measured.key)
+        self.assertEqual(3, measured.runs)
+        self.assertLessEqual(measured.min_ms, measured.median_ms)
+
+    def test_baseline(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'benchmarks' / 'baseline.json'
+
+            self.assertEqual({}, load_baseline(path))
+            save_baseline(path, [result(2.0), result(3.0, size=100)])
+
+            self.assertEqual({
+                'some.benchmark[10]': result(2.0),
+                'some.benchmark[100]': result(3.0, size=100),
+            }, load_baseline(path))
+
+    def test_regressions(self):
+        baseline = {'some.benchmark[10]': result(2.0), 'some.benchmark[100]': result(4.0, size=100)}
+
+        found = regressions([result(2.4), result(5.2, size=100), result(1.0, size=1000)], baseline, 25.0)
+
+        self.assertEqual(['some.benchmark[100]'], [regression.key for regression in found])
+        self.assertAlmostEqual(30.0, found[0].percent)
+
+    def test_format_results(self):
+        formatted = format_results([result(3.0), result(1.0, size=100)], {'some.benchmark[10]': result(2.0)})
+
+        self.assertIn('+50.0%', formatted.splitlines()[1])
+        self.assertNotIn('%', formatted.splitlines()[2])
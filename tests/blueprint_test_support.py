@@ -1,5 +1,7 @@
+import quart
 from flask import Blueprint, Flask
 from flask.testing import FlaskClient
+from quart.typing import TestClientProtocol
 
 
 def test_client(blueprint: Blueprint) -> FlaskClient:
@@ -10,3 +12,13 @@ def test_client(blueprint: Blueprint) -> FlaskClient:
     client = app.test_client()
 
     return client
+
+
+def async_test_client(blueprint: quart.Blueprint) -> TestClientProtocol:
+    app = quart.Quart(__name__, template_folder='../negotiator/templates')
+    app.config['TESTING'] = True
+    app.register_blueprint(blueprint)
+    app.secret_key = 'test-secret'
+    client = app.test_client()
+
+    return client
@@ -0,0 +1,102 @@
+from unittest import TestCase, IsolatedAsyncioTestCase
+from uuid import UUID
+
+import sqlalchemy
+from sqlalchemy import NullPool
+from sqlalchemy.exc import OperationalError
+
+from negotiator.database_support.database_template import prepared_statement, StatementCacheStats, DatabaseTemplate
+from tests.db_test_support import test_db_template, test_async_db_template
+
+
+class TestDatabaseTemplate(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.db = test_db_template()
+        self.db.clear()
+
+    def test_query__caches_statements(self):
+        before = self.db.statement_stats()
+
+        self.db.query('select 1')
+        self.db.query('select 1')
+        self.db.query('select 2')
+
+        stats = self.db.statement_stats()
+        self.assertEqual(1, stats.hits - before.hits)
+        self.assertEqual(2, stats.misses - before.misses)
+
+    def test_query__reads_rows_before_releasing_the_connection(self):
+        url = 'postgresql://localhost:5432/negotiator_test?user=negotiator&password=negotiator'
+        db = DatabaseTemplate(sqlalchemy.create_engine(url, poolclass=NullPool), prepare_statements=True)
+
+        self.assertEqual([(1,), (2,)], list(db.query('select generate_series(1, 2)')))
+        self.assertEqual([(3,)], list(db.query_prepared('select cast(:n as int)', n=3)))
+
+    def test_transaction__statement_timeout(self):
+        with self.assertRaises(OperationalError):
+            with self.db.transaction(statement_timeout_seconds=0.05) as connection:
+                self.db.query('select pg_sleep(1)', connection)
+
+        with self.db.transaction(statement_timeout_seconds=2) as connection:
+            self.assertEqual([('2s',)], list(self.db.query("select current_setting('statement_timeout')", connection)))
+        self.assertEqual([('0',)], list(self.db.query("select current_setting('statement_timeout')")))
+
+    def test_pool_stats(self):
+        url = 'postgresql://localhost:5432/negotiator_test?user=negotiator&password=negotiator'
+        db = DatabaseTemplate(sqlalchemy.create_engine(url, pool_size=2, max_overflow=1))
+
+        with db.transaction(), db.transaction(), db.transaction():
+            stats = db.pool_stats()
+
+        self.assertEqual(2, stats.size)
+        self.assertEqual(3, stats.checked_out)
+        self.assertEqual(1, stats.overflow)
+        self.assertTrue(stats.exhausted)
+        self.assertEqual(3, stats.checkouts)
+        self.assertGreater(stats.recent_wait_seconds_max, 0)
+        self.assertEqual(0, db.pool_stats().checked_out)
+        self.assertFalse(db.pool_stats().exhausted)
+
+    def test_pool_stats__null_pool(self):
+        url = 'postgresql://localhost:5432/negotiator_test?user=negotiator&password=negotiator'
+        db = DatabaseTemplate(sqlalchemy.create_engine(url, poolclass=NullPool))
+
+        db.query('select 1')
+
+        stats = db.pool_stats()
+        self.assertEqual(1, stats.checkouts)
+        self.assertFalse(stats.exhausted)
+
+    def test_query_prepared(self):
+        statement = "select cast(:id as uuid) as id, cast(:count as int) + 1 as next, '100%' as done"
+
+        first = list(self.db.query_prepared(statement, id=UUID('11111111-0b3f-430e-8b86-884a2c5d9bc9'), count=1))
+        with self.db.transaction() as connection:
+            second = list(self.db.query_prepared(statement, connection, id=UUID('22222222-0b3f-430e-8b86-884a2c5d9bc9'), count=2))
+
+        self.assertEqual([(UUID('11111111-0b3f-430e-8b86-884a2c5d9bc9'), 2, '100%')], first)
+        self.assertEqual([(UUID('22222222-0b3f-430e-8b86-884a2c5d9bc9'), 3, '100%')], second)
+        self.assertEqual(2, self.db.statement_stats().prepared_executions)
+        self.assertEqual(1, self.db.statement_stats().prepares)
+
+    def test_prepared_statement(self):
+        prepared = prepared_statement('select :b, cast(:a as int[]), :b')
+
+        self.assertRegex(prepared.name, r'^negotiator_[0-9a-f]{16}$')
+        self.assertEqual(f'prepare {prepared.name} as select $1, cast($2 as int[]), $1', prepared.prepare)
+        self.assertEqual(f'execute {prepared.name}(:b, :a)', prepared.execute.text)
+
+    def test_hit_rate(self):
+        self.assertEqual(0.75, StatementCacheStats(hits=3, misses=1).hit_rate)
+        self.assertEqual(0.0, StatementCacheStats().hit_rate)
+
+
+class TestAsyncDatabaseTemplate(IsolatedAsyncioTestCase):
+    async def test_transaction__statement_timeout(self):
+        db = test_async_db_template()
+
+        async with db.transaction(statement_timeout_seconds=2) as connection:
+            result = await db.query("select current_setting('statement_timeout')", connection)
+            self.assertEqual([('2s',)], list(result))
+        self.assertEqual([('0',)], list(await db.query("select current_setting('statement_timeout')")))
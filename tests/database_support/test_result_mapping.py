@@ -0,0 +1,45 @@
+from unittest import TestCase
+
+from negotiator.database_support.result_mapping import map_one_row, map_rows, stream_rows, map_one_result
+from tests.db_test_support import test_db_template
+
+
+class TestResultMapping(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.db = test_db_template()
+
+    def test_map_one_row(self):
+        result = self.db.query('select 1, 2')
+
+        self.assertEqual((1, 2), map_one_row(result, lambda row: (row[0], row[1])))
+
+    def test_map_one_row__none(self):
+        result = self.db.query('select 1 where false')
+
+        self.assertIsNone(map_one_row(result, lambda row: row[0]))
+
+    def test_map_one_row__many(self):
+        result = self.db.query('select generate_series(1, 2)')
+
+        with self.assertRaises(Exception):
+            map_one_row(result, lambda row: row[0])
+
+    def test_map_one_result__many(self):
+        result = self.db.query('select generate_series(1, 2) as value')
+
+        with self.assertRaises(Exception):
+            map_one_result(result, lambda row: row['value'])
+
+    def test_map_rows(self):
+        result = self.db.query('select generate_series(1, 3)')
+
+        self.assertEqual([1, 2, 3], map_rows(result, lambda row: row[0]))
+
+    def test_stream_rows(self):
+        rows = self.db.query_stream('select generate_series(1, :count)', batch_size=2, count=5)
+
+        values = stream_rows(rows, lambda row: row[0] * 10)
+
+        self.assertEqual(10, next(values))
+        self.assertEqual([20, 30, 40, 50], list(values))
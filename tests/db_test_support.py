@@ -1,18 +1,23 @@
 from typing import Any, List
 
 import sqlalchemy
-from negotiator.database_support.database_template import DatabaseTemplate
-from sqlalchemy import Engine, RowMapping
+from negotiator.database_support.database_template import DatabaseTemplate, AsyncDatabaseTemplate
+from sqlalchemy import Engine, RowMapping, NullPool
+from sqlalchemy.ext.asyncio import create_async_engine
 
 
 class TestDatabaseTemplate(DatabaseTemplate):
 
-    def __init__(self, engine: Engine) -> None:
-        super().__init__(engine)
+    def __init__(self, engine: Engine, prepare_statements: bool = True) -> None:
+        super().__init__(engine, prepare_statements)
 
     def clear(self):
+        self.query('delete from freeplay_recordings')
+        self.query('delete from final_price_counts')
+        self.query('delete from final_price_buckets')
         self.query('delete from messages')
         self.query('delete from negotiations')
+        self.query('delete from archived_negotiations')
 
     def query_to_dict(self, statement: str, **kwargs: Any) -> List[RowMapping]:
         return [
@@ -28,3 +33,12 @@ def test_db_template() -> TestDatabaseTemplate:
     )
 
     return TestDatabaseTemplate(db)
+
+
+def test_async_db_template() -> AsyncDatabaseTemplate:
+    db = create_async_engine(
+        url='postgresql+asyncpg://localhost:5432/negotiator_test?user=negotiator&password=negotiator',
+        poolclass=NullPool
+    )
+
+    return AsyncDatabaseTemplate(db)
@@ -0,0 +1,223 @@
+import json
+import os
+import tempfile
+import uuid
+from typing import Any, List
+from unittest import TestCase, mock
+
+from freeplay.llm_parameters import LLMParameters
+from freeplay.resources.prompts import PromptInfo, TemplatePrompt
+from freeplay.resources.sessions import Session
+from openai.types import CompletionUsage
+from openai.types.chat import ChatCompletion, ChatCompletionMessage, ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion import Choice
+from openai.types.chat.chat_completion_message_tool_call import Function
+
+from negotiator.evaluation.prompt_evaluation import PromptEvaluation, EvaluationSettings, BuyerPersona, \
+    UsageCounter, RateLimiter, EvaluationRun, load_personas, summarize
+from negotiator.negotiation.context_window import ContextWindow
+from negotiator.negotiation.llm_resilience import CircuitOpen
+from negotiator.negotiation.llm_service import LLMService, RESOLVE_NEGOTIATION_TOOL_NAME
+from negotiator.negotiation.message_repository import MessageRepository
+from negotiator.negotiation.negotiation_repository import NegotiationRepository
+from negotiator.negotiation.negotiation_service import NegotiationService
+from negotiator.negotiation.prompt_template_cache import PromptTemplateCache
+from negotiator.negotiation.resolution_repository import ResolutionRepository
+from negotiator.negotiation.response_cache import ResponseCache
+from negotiator.negotiation.summary_repository import SummaryRepository
+from negotiator.recording.recording_outbox import RecordingOutbox
+from negotiator.recording.recording_repository import RecordingRepository
+from tests.db_test_support import test_db_template
+
+personas = [
+    BuyerPersona('lowballer', ['What is your best price?', 'How about 12,000?', 'Alright, 14,000.']),
+    BuyerPersona('eager', ['I will take it!']),
+]
+
+
+def template(environment: str) -> TemplatePrompt:
+    return TemplatePrompt(
+        prompt_info=PromptInfo(
+            str(uuid.uuid4()),
+            str(uuid.uuid4()),
+            'negotiator',
+            environment,
+            model_parameters=LLMParameters({}),
+            provider_info=None,
+            provider='openai',
+            model='gpt-4o-mini' if environment == 'candidate' else 'gpt-4o',
+            flavor_name='openai_chat',
+            project_id=str(uuid.uuid4())
+        ),
+        messages=[{'kind': 'history'}]
+    )
+
+
+def completion(content: str | None = None, final_price: int | None = None) -> ChatCompletion:
+    tool_calls = None if final_price is None else [
+        ChatCompletionMessageToolCall(
+            id='call_' + str(uuid.uuid4()),
+            type='function',
+            function=Function(name=RESOLVE_NEGOTIATION_TOOL_NAME, arguments=json.dumps({'final_price': final_price})),
+        )
+    ]
+    return ChatCompletion(
+        id='chatcmpl-evaluation',
+        choices=[Choice(
+            finish_reason='stop',
+            index=0,
+            message=ChatCompletionMessage(content=content, role='assistant', tool_calls=tool_calls),
+        )],
+        created=1727067917,
+        model='gpt-4o-2024-08-06',
+        object='chat.completion',
+        usage=CompletionUsage(completion_tokens=40, prompt_tokens=400, total_tokens=440),
+    )
+
+
+# The candidate prompt gives in on the first offer, the latest one holds out until the buyer's third message
+def negotiator_llm(model: str, messages: List[dict[str, str]], **_: Any) -> ChatCompletion:
+    user_messages = [message for message in messages if message['role'] == 'user']
+    if model == 'gpt-4o-mini':
+        return completion(final_price=12_000)
+    if len(user_messages) >= 3:
+        return completion(final_price=14_000)
+    return completion(content='I could do 16,000.')
+
+
+class TestPromptEvaluation(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.db = test_db_template()
+        self.db.clear()
+
+        self.negotiation_service = NegotiationService(
+            self.db, NegotiationRepository(self.db), MessageRepository(self.db), ResolutionRepository(self.db))
+        self.freeplay_mock = mock.Mock()
+        self.freeplay_mock.prompts.get.side_effect = lambda project_id, name, environment: template(environment)
+        self.freeplay_mock.sessions.restore_session.side_effect = \
+            lambda session_id: Session(session_id, None, mock.Mock())
+        self.call_llm = mock.MagicMock(side_effect=negotiator_llm)
+        self.usage_counter = UsageCounter(self.call_llm)
+        prompt_templates = PromptTemplateCache(self.freeplay_mock)
+        context_window = ContextWindow(SummaryRepository(self.db), mock.Mock())
+        recording_outbox = RecordingOutbox(RecordingRepository(self.db), self.freeplay_mock)
+        self.llm_services = {
+            version: LLMService(
+                self.db,
+                self.negotiation_service,
+                self.freeplay_mock,
+                prompt_templates,
+                context_window,
+                ResponseCache(0),
+                recording_outbox,
+                self.usage_counter,
+                str(uuid.uuid4()),
+                prompt_environment=version,
+            )
+            for version in ['latest', 'candidate']
+        }
+
+    def test_run(self):
+        report = PromptEvaluation(
+            self.negotiation_service,
+            self.llm_services,
+            self.usage_counter,
+            EvaluationSettings(concurrency=4, runs_per_persona=2),
+        ).run(personas)
+
+        self.assertEqual(8, len(report.runs))
+        outcomes = sorted({(run.persona, run.version, run.final_price, run.turns) for run in report.runs})
+        self.assertEqual([
+            ('eager', 'candidate', 12_000, 1),
+            ('eager', 'latest', None, 1),
+            ('lowballer', 'candidate', 12_000, 1),
+            ('lowballer', 'latest', 14_000, 3),
+        ], outcomes)
+
+        lowballer = next(run for run in report.runs if run.persona == 'lowballer' and run.version == 'latest')
+        self.assertEqual(3, len(lowballer.turn_seconds))
+        self.assertEqual((1_200, 120), (lowballer.prompt_tokens, lowballer.completion_tokens))
+        self.assertIsNone(lowballer.error)
+
+        self.assertEqual(
+            {('all', 'candidate', 4, 4, 12_000), ('all', 'latest', 4, 2, 14_000)},
+            {(s.persona, s.version, s.runs, s.resolved, s.median_price) for s in report.summaries
+             if s.persona == 'all'},
+        )
+        self.assertIn('lowballer', report.table())
+        self.assertEqual(
+            {'latest', 'candidate'},
+            {call.args[2] for call in self.freeplay_mock.prompts.get.call_args_list},
+        )
+
+    def test_run__llm_unavailable(self):
+        self.call_llm.side_effect = CircuitOpen('open')
+
+        report = PromptEvaluation(
+            self.negotiation_service,
+            {'latest': self.llm_services['latest']},
+            self.usage_counter,
+            EvaluationSettings(concurrency=2, runs_per_persona=1),
+        ).run(personas)
+
+        self.assertEqual(['language model unavailable'] * 2, [run.error for run in report.runs])
+        self.assertEqual([1, 1], [run.turns for run in report.runs])
+        summary = next(s for s in report.summaries if s.persona == 'all')
+        self.assertEqual((2, 0, None), (summary.errors, summary.resolved, summary.median_price))
+
+
+class TestRateLimiter(TestCase):
+    def test_acquire(self):
+        now = [10.0]
+        sleeps: List[float] = []
+        limiter = RateLimiter(4, clock=lambda: now[0], sleep=sleeps.append)
+
+        for _ in range(3):
+            limiter.acquire()
+        now[0] = 11.0
+        limiter.acquire()
+
+        self.assertEqual([0.25, 0.5], sleeps)
+
+    def test_acquire__unlimited(self):
+        sleeps: List[float] = []
+        limiter = RateLimiter(0, clock=lambda: 10.0, sleep=sleeps.append)
+
+        for _ in range(3):
+            limiter.acquire()
+
+        self.assertEqual([], sleeps)
+
+
+class TestPersonas(TestCase):
+    def test_load_personas(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'personas.json')
+            with open(path, 'w') as file:
+                json.dump([{'name': 'eager', 'messages': ['I will take it!']}], file)
+
+            self.assertEqual([BuyerPersona('eager', ['I will take it!'])], load_personas(path))
+
+            with open(path, 'w') as file:
+                json.dump([{'name': 'silent', 'messages': []}], file)
+
+            with self.assertRaises(ValueError):
+                load_personas(path)
+
+    def test_example_personas(self):
+        self.assertLess(0, len(load_personas('negotiator/evaluation/buyer_personas.json')))
+
+    def test_summarize(self):
+        summaries = summarize([
+            EvaluationRun('latest', 'eager', final_price=14_000, turns=1, turn_seconds=[0.2]),
+            EvaluationRun('latest', 'eager', final_price=15_000, turns=3, turn_seconds=[0.1, 0.1, 0.3]),
+            EvaluationRun('latest', 'eager', turns=2, turn_seconds=[0.1, 0.1], error='failed'),
+        ])
+
+        self.assertEqual(['eager', 'all'], [s.persona for s in summaries])
+        self.assertEqual(14_500, summaries[0].median_price)
+        self.assertEqual(2.0, summaries[0].mean_turns)
+        self.assertEqual(1, summaries[0].errors)
+        self.assertAlmostEqual(300.0, summaries[0].p95_turn_ms)
@@ -0,0 +1,137 @@
+import datetime
+import json
+from typing import cast
+from unittest import TestCase
+from uuid import UUID
+
+from negotiator.export.export_api import export_api
+from negotiator.export.negotiation_export import NegotiationExportRepository, ExportedMessage, \
+    ExportedNegotiation, ndjson_lines
+from negotiator.negotiation.message_repository import MessageRepository
+from negotiator.negotiation.negotiation_repository import NegotiationRepository
+from negotiator.negotiation.negotiation_service import NegotiationService, Message
+from negotiator.negotiation.resolution_repository import ResolutionRepository
+from tests.blueprint_test_support import test_client
+from tests.db_test_support import test_db_template
+
+
+class TestNegotiationExport(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.db = test_db_template()
+        self.db.clear()
+
+        service = NegotiationService(
+            self.db, NegotiationRepository(self.db), MessageRepository(self.db), ResolutionRepository(self.db))
+        first_id = cast(UUID, service.create())
+        second_id = UUID('33333333-0b3f-430e-8b86-884a2c5d9bc9')
+        service.add_messages(first_id, [
+            Message(UUID('11111111-0b3f-430e-8b86-884a2c5d9bc9'), 'user', 'user content'),
+            Message(UUID('22222222-0b3f-430e-8b86-884a2c5d9bc9'), 'assistant', 'assistant content'),
+        ])
+        service.resolve(first_id, 15_000)
+        self.db.query("insert into negotiations (id, created_at) values (:id, '2024-01-01')", id=second_id)
+        self.db.query('insert into negotiations (id) values (:id)', id=UUID('00000000-0b3f-430e-8b86-884a2c5d9bc9'))
+        self.db.query(
+            "insert into archived_negotiations (id, created_at, messages) values (:id, '2023-06-01', :messages)",
+            id=UUID('44444444-0b3f-430e-8b86-884a2c5d9bc9'),
+            messages='[{"id": "55555555-0b3f-430e-8b86-884a2c5d9bc9", "role": "assistant", "content": "hi"}]',
+        )
+
+        self.first_id, self.second_id = first_id, second_id
+        self.repository = NegotiationExportRepository(self.db, batch_size=2)
+
+    def test_stream(self):
+        negotiations = {negotiation.id: negotiation for negotiation in self.repository.stream()}
+
+        self.assertEqual(4, len(negotiations))
+        first = negotiations[self.first_id]
+        self.assertEqual(15_000, first.final_price)
+        self.assertIsNotNone(first.resolved_at)
+        self.assertEqual([
+            ExportedMessage(UUID('11111111-0b3f-430e-8b86-884a2c5d9bc9'), 'user', 'user content'),
+            ExportedMessage(UUID('22222222-0b3f-430e-8b86-884a2c5d9bc9'), 'assistant', 'assistant content'),
+        ], first.messages[1:])
+        self.assertIsNone(negotiations[self.second_id].final_price)
+        self.assertEqual([], negotiations[UUID('00000000-0b3f-430e-8b86-884a2c5d9bc9')].messages)
+        self.assertEqual(
+            [ExportedMessage(UUID('55555555-0b3f-430e-8b86-884a2c5d9bc9'), 'assistant', 'hi')],
+            negotiations[UUID('44444444-0b3f-430e-8b86-884a2c5d9bc9')].messages,
+        )
+
+    def test_stream__ordered_and_resumable(self):
+        ids = [negotiation.id for negotiation in self.repository.stream()]
+
+        resumed = [negotiation.id for negotiation in self.repository.stream(after=ids[0])]
+
+        self.assertEqual(sorted(ids), ids)
+        self.assertEqual(ids[1:], resumed)
+
+    def test_stream__created_range(self):
+        negotiations = self.repository.stream(
+            created_from=datetime.datetime(2023, 12, 1),
+            created_to=datetime.datetime(2024, 2, 1),
+        )
+
+        self.assertEqual([self.second_id], [negotiation.id for negotiation in negotiations])
+
+    def test_ndjson_lines(self):
+        lines = list(ndjson_lines(self.repository.stream(created_to=datetime.datetime(2024, 2, 1))))
+
+        self.assertTrue(all(line.endswith('\n') for line in lines))
+        self.assertEqual(
+            ['2024-01-01T00:00:00', '2023-06-01T00:00:00'],
+            [json.loads(line)['created_at'] for line in lines],
+        )
+
+    def test_ndjson_lines__long_negotiation(self):
+        messages = [ExportedMessage(UUID(int=index), 'user', 'How about 12,000? ' * 20) for index in range(1_000)]
+        negotiations = [
+            ExportedNegotiation(UUID(int=1), datetime.datetime(2024, 1, 1), None, None, messages),
+            ExportedNegotiation(UUID(int=2), datetime.datetime(2024, 1, 2), None, None, []),
+        ]
+
+        chunks = list(ndjson_lines(negotiations))
+
+        self.assertGreater(len(chunks), 2)
+        lines = ''.join(chunks).splitlines()
+        self.assertEqual(1_000, len(json.loads(lines[0])['messages']))
+        self.assertEqual(str(UUID(int=2)), json.loads(lines[1])['id'])
+
+
+class TestExportApi(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.db = test_db_template()
+        self.db.clear()
+        self.db.query('insert into negotiations (id) values (:id)', id=UUID('00000000-0b3f-430e-8b86-884a2c5d9bc9'))
+
+        self.test_client = test_client(export_api(NegotiationExportRepository(self.db), 'some-token'))
+
+    def test_export(self):
+        response = self.test_client.get('/export/negotiations.ndjson', headers={'Authorization': 'Bearer some-token'})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('application/x-ndjson', response.mimetype)
+        self.assertEqual(
+            ['00000000-0b3f-430e-8b86-884a2c5d9bc9'],
+            [json.loads(line)['id'] for line in response.text.splitlines()]
+        )
+
+    def test_export__unauthorized(self):
+        response = self.test_client.get('/export/negotiations.ndjson')
+
+        self.assertEqual(401, response.status_code)
+
+    def test_export__invalid_cursor(self):
+        response = self.test_client.get(
+            '/export/negotiations.ndjson?after=nope',
+            headers={'Authorization': 'Bearer some-token'},
+        )
+
+        self.assertEqual(400, response.status_code)
+
+    def test_export__disabled(self):
+        client = test_client(export_api(NegotiationExportRepository(self.db), ''))
+
+        self.assertEqual(404, client.get('/export/negotiations.ndjson').status_code)
@@ -0,0 +1,126 @@
+import threading
+from unittest import TestCase
+
+import httpx
+
+from negotiator.database_support.database_template import PoolStats
+from negotiator.health_support.readiness import ReadinessMonitor, ReadinessCheck, database_check, http_check
+from tests.db_test_support import test_db_template
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def passing() -> None:
+    pass
+
+
+def failing() -> None:
+    raise ConnectionError('connection refused')
+
+
+class TestReadinessMonitor(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.clock = FakeClock()
+
+    def test_report(self):
+        monitor = ReadinessMonitor(
+            [ReadinessCheck('database', passing), ReadinessCheck('freeplay', failing, required=False)],
+            interval_seconds=5,
+            clock=self.clock,
+        )
+
+        monitor.check_now()
+        report = monitor.report()
+
+        self.assertTrue(report.ready)
+        self.assertEqual('UP', report.checks['database']['status'])
+        self.assertEqual('DOWN', report.checks['freeplay']['status'])
+        self.assertEqual('connection refused', report.checks['freeplay']['error'])
+        self.assertEqual('READY', report.to_dict()['status'])
+
+    def test_report__required_check_fails(self):
+        monitor = ReadinessMonitor([ReadinessCheck('database', failing)], clock=self.clock)
+
+        monitor.check_now()
+
+        self.assertFalse(monitor.report().ready)
+        self.assertEqual('NOT_READY', monitor.report().to_dict()['status'])
+
+    def test_report__before_first_check(self):
+        report = ReadinessMonitor([ReadinessCheck('database', passing)], clock=self.clock).report()
+
+        self.assertFalse(report.ready)
+        self.assertEqual('UNKNOWN', report.checks['database']['status'])
+
+    def test_report__stale(self):
+        monitor = ReadinessMonitor([ReadinessCheck('database', passing)], stale_after_seconds=12, clock=self.clock)
+        monitor.check_now()
+
+        self.clock.now += 12
+        self.assertTrue(monitor.report().ready)
+
+        self.clock.now += 1
+        report = monitor.report()
+        self.assertFalse(report.ready)
+        self.assertEqual('STALE', report.checks['database']['status'])
+        self.assertEqual(13, report.checks['database']['age_seconds'])
+
+    def test_report__pools(self):
+        stats = PoolStats(4, 4, 0, 0, 10, 0.5, 0.01, 0.2)
+        monitor = ReadinessMonitor([], pool_stats=lambda: {'database': stats})
+
+        pools = monitor.report().to_dict()['pools']
+
+        self.assertEqual(4, pools['database']['checked_out'])
+        self.assertTrue(pools['database']['exhausted'])
+        self.assertEqual(200, pools['database']['recent_wait_ms_max'])
+
+    def test_start(self):
+        checked = threading.Event()
+        monitor = ReadinessMonitor([ReadinessCheck('database', checked.set)], interval_seconds=0.01)
+
+        monitor.start()
+        self.assertTrue(checked.wait(1))
+        monitor.stop(1)
+
+    def test_start__hung_check(self):
+        release = threading.Event()
+        monitor = ReadinessMonitor(
+            [ReadinessCheck('database', passing), ReadinessCheck('openai', lambda: release.wait(), required=False)],
+            interval_seconds=0.01,
+        )
+
+        monitor.start()
+        try:
+            for _ in range(100):
+                if monitor.report().checks['database']['status'] == 'UP':
+                    break
+                threading.Event().wait(0.01)
+            report = monitor.report()
+        finally:
+            release.set()
+            monitor.stop(1)
+
+        self.assertTrue(report.ready)
+        self.assertEqual('UNKNOWN', report.checks['openai']['status'])
+
+
+class TestChecks(TestCase):
+    def test_database_check(self):
+        database_check(test_db_template(), timeout_seconds=1)()
+
+    def test_http_check(self):
+        statuses = {'/up': 404, '/down': 503}
+        client = httpx.Client(transport=httpx.MockTransport(
+            lambda request: httpx.Response(statuses[request.url.path])))
+
+        http_check(client, 'http://dependency/up', timeout_seconds=1)()
+        with self.assertRaisesRegex(Exception, 'responded with 503'):
+            http_check(client, 'http://dependency/down', timeout_seconds=1)()
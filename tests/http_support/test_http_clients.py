@@ -0,0 +1,152 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from unittest import TestCase, IsolatedAsyncioTestCase
+
+import requests
+from freeplay import api_support
+
+from negotiator.http_support.http_clients import HttpClientSettings, ConnectionCounter, FreeplaySession, \
+    ConnectionStats, http_client, async_http_client, pooled_openai_client, pooled_freeplay_client, \
+    shared_freeplay_session, warm_up
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self) -> None:
+        body = json.dumps({'path': self.path}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self) -> None:
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class ServerTestCase(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.settings = HttpClientSettings(max_connections=4, max_keepalive_connections=2, http2=False)
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        super().tearDown()
+
+
+class TestHttpClient(ServerTestCase):
+    def test_reuses_connections(self):
+        counter = ConnectionCounter()
+
+        with http_client(self.settings, counter) as client:
+            for _ in range(3):
+                self.assertEqual(200, client.get(f'{self.url}/ping').status_code)
+
+        self.assertEqual(ConnectionStats(requests=3, new_connections=1), counter.stats())
+        self.assertEqual(2, counter.stats().reused_connections)
+
+    def test_settings(self):
+        client = http_client(self.settings, ConnectionCounter())
+
+        self.assertEqual(5.0, client.timeout.connect)
+        self.assertEqual(60.0, client.timeout.read)
+
+    def test_warm_up(self):
+        counter = ConnectionCounter()
+
+        with http_client(self.settings, counter) as client:
+            warm_up(client, self.url)
+            client.get(f'{self.url}/ping')
+
+        self.assertEqual(ConnectionStats(requests=2, new_connections=1), counter.stats())
+
+    def test_warm_up__unreachable(self):
+        with http_client(self.settings, ConnectionCounter()) as client:
+            with self.assertLogs('negotiator.http_support.http_clients', 'WARNING'):
+                warm_up(client, 'http://127.0.0.1:1')
+
+    def test_pooled_openai_client(self):
+        client = http_client(self.settings, ConnectionCounter())
+
+        openai_client = pooled_openai_client('some-key', client)
+
+        self.assertIs(client, openai_client._client)
+        self.assertEqual(0, openai_client.max_retries)
+
+
+class TestAsyncHttpClient(IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        super().tearDown()
+
+    async def test_reuses_connections(self):
+        counter = ConnectionCounter()
+
+        async with async_http_client(HttpClientSettings(http2=False), counter) as client:
+            for _ in range(3):
+                self.assertEqual(200, (await client.get(f'{self.url}/ping')).status_code)
+
+        self.assertEqual(ConnectionStats(requests=3, new_connections=1), counter.stats())
+
+
+class TestFreeplaySession(ServerTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.original_requests = api_support.requests
+
+    def tearDown(self) -> None:
+        setattr(api_support, 'requests', self.original_requests)
+        super().tearDown()
+
+    def test_reuses_connections(self):
+        session = FreeplaySession(self.settings)
+
+        for _ in range(3):
+            self.assertEqual(200, session.get(f'{self.url}/ping').status_code)
+
+        self.assertEqual(ConnectionStats(requests=3, new_connections=1), session.stats())
+
+    def test_pooled_freeplay_client(self):
+        session = shared_freeplay_session(self.settings)
+
+        pooled_freeplay_client('some-key', session, self.url)
+        response = api_support.get_raw('some-key', f'{self.url}/projects')
+
+        self.assertEqual({'path': '/projects'}, response.json())
+        self.assertEqual(1, session.stats().requests)
+        self.assertIs(requests.RequestException, api_support.requests.RequestException)
+
+    def test_shared_freeplay_session(self):
+        session = shared_freeplay_session(self.settings)
+
+        self.assertIs(session, shared_freeplay_session(HttpClientSettings()))
+
+    def test_shared_freeplay_session__sdk_without_requests(self):
+        delattr(api_support, 'requests')
+
+        with self.assertRaises(RuntimeError):
+            shared_freeplay_session(self.settings)
+
+    def test_pooled_freeplay_client__other_session(self):
+        shared_freeplay_session(self.settings)
+
+        with self.assertRaises(ValueError):
+            pooled_freeplay_client('some-key', FreeplaySession(self.settings), self.url)
@@ -0,0 +1,111 @@
+import json
+import random
+from unittest import TestCase
+
+import httpx
+import openai
+from freeplay import Freeplay
+
+from negotiator.load_test.fake_servers import Latency, FakeOpenAI, FakeFreeplay
+from negotiator.negotiation.llm_service import resolve_negotiation_tool_spec, StreamedReply
+
+
+class TestLatency(TestCase):
+    def test_sample(self):
+        rng = random.Random(1)
+        samples = sorted(Latency(0.1, 0.5).sample(rng) for _ in range(10_000))
+
+        self.assertAlmostEqual(0.1, samples[5_000], delta=0.01)
+        self.assertAlmostEqual(0.5, samples[9_900], delta=0.1)
+
+    def test_sample__fixed(self):
+        self.assertEqual(0.0, Latency().sample(random.Random()))
+        self.assertEqual(0.2, Latency(0.2).sample(random.Random()))
+
+
+class TestFakeOpenAI(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.messages = [{'role': 'user', 'content': 'How much is the car?'}]
+
+    def tearDown(self) -> None:
+        self.fake.stop()
+        super().tearDown()
+
+    def client(self, tool_call_rate: float) -> openai.OpenAI:
+        self.fake = FakeOpenAI(tool_call_rate=tool_call_rate, seed=1).start()
+        return openai.OpenAI(api_key='some-key', base_url=self.fake.base_url, max_retries=0)
+
+    def test_completion(self):
+        completion = self.client(0.0).chat.completions.create(
+            model='gpt-4o', messages=self.messages, tools=[resolve_negotiation_tool_spec])
+
+        self.assertIn('14,500', completion.choices[0].message.content)
+        self.assertIsNone(completion.choices[0].message.tool_calls)
+        self.assertEqual(1, self.fake.requests)
+
+    def test_completion__tool_call(self):
+        completion = self.client(1.0).chat.completions.create(
+            model='gpt-4o', messages=self.messages, tools=[resolve_negotiation_tool_spec])
+
+        function = completion.choices[0].message.tool_calls[0].function
+        self.assertEqual('resolve_negotiation', function.name)
+        self.assertIn('final_price', json.loads(function.arguments))
+
+    def test_stream(self):
+        reply = StreamedReply()
+        for chunk in self.client(0.0).chat.completions.create(
+                model='gpt-4o', messages=self.messages, tools=[resolve_negotiation_tool_spec], stream=True):
+            reply.add(chunk)
+
+        self.assertEqual('I could come down a little, how about 14,500?', reply.content().strip())
+
+    def test_stream__tool_call(self):
+        reply = StreamedReply()
+        for chunk in self.client(1.0).chat.completions.create(
+                model='gpt-4o', messages=self.messages, tools=[resolve_negotiation_tool_spec], stream=True):
+            reply.add(chunk)
+
+        self.assertTrue(reply.resolves_negotiation())
+        self.assertIn('final_price', json.loads(reply.tool_arguments()))
+
+    def test_stream__usage(self):
+        reply = StreamedReply()
+        for chunk in self.client(0.0).chat.completions.create(
+                model='gpt-4o', messages=self.messages, stream=True, stream_options={'include_usage': True}):
+            reply.add(chunk)
+
+        self.assertEqual(100, reply.usage.prompt_tokens)
+        self.assertIn('14,500', reply.content())
+
+    def test_unknown_path(self):
+        self.client(0.0)
+
+        self.assertEqual(404, httpx.get(f'{self.fake.url}/v1/models').status_code)
+
+
+class TestFakeFreeplay(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.fake = FakeFreeplay(model='gpt-4o-mini').start()
+        self.freeplay_client = Freeplay('some-key', self.fake.api_base)
+
+    def tearDown(self) -> None:
+        self.fake.stop()
+        super().tearDown()
+
+    def test_prompt_template(self):
+        template = self.freeplay_client.prompts.get('some-project', 'negotiator', 'latest')
+
+        formatted = template.bind({}, [{'role': 'user', 'content': 'Hello'}]).format()
+
+        self.assertEqual('gpt-4o-mini', formatted.prompt_info.model)
+        self.assertEqual(['system', 'user'], [message['role'] for message in formatted.llm_prompt])
+
+    def test_trace(self):
+        session = self.freeplay_client.sessions.create()
+        trace = session.create_trace('Hello')
+
+        trace.record_output('some-project', 'Hi there')
+
+        self.assertEqual(1, self.fake.requests)
@@ -0,0 +1,85 @@
+from typing import Iterator
+from unittest import TestCase
+
+from flask import Flask, Response, redirect, jsonify
+from flask.typing import ResponseReturnValue
+
+from negotiator.load_test.load_test import percentile, StageTimings, LoadTest, LoadTestSettings, AppServer
+from negotiator.web_support import sse_support
+
+
+def negotiation_app() -> Flask:
+    app = Flask(__name__)
+
+    @app.post('/negotiation')
+    def create() -> ResponseReturnValue:
+        return redirect('/negotiation/1')
+
+    @app.get('/negotiation/1')
+    def show() -> ResponseReturnValue:
+        return 'negotiation'
+
+    @app.post('/negotiation/1/messages')
+    def message() -> ResponseReturnValue:
+        return jsonify({'id': 'reply', 'role': 'assistant', 'content': 'reply'}), 201
+
+    @app.post('/negotiation/1/messages/stream')
+    def stream() -> ResponseReturnValue:
+        def events() -> Iterator[str]:
+            yield sse_support.event('delta', {'content': 'reply'})
+            yield sse_support.event('resolved', {'final_price': 14_000})
+
+        return Response(events(), mimetype='text/event-stream')
+
+    return app
+
+
+class TestStageTimings(TestCase):
+    def test_percentile(self):
+        values = [float(value) for value in range(1, 101)]
+
+        self.assertEqual(50.0, percentile(values, 0.50))
+        self.assertEqual(95.0, percentile(values, 0.95))
+        self.assertEqual(99.0, percentile(values, 0.99))
+        self.assertEqual(0.0, percentile([], 0.99))
+
+    def test_report(self):
+        timings = StageTimings()
+        timings.record('message', 0.1)
+        timings.record('message', 0.3, ok=False)
+        timings.record('create', 0.2)
+
+        report = timings.report(elapsed_seconds=2.0)
+
+        message = next(stage for stage in report.stages if stage.stage == 'message')
+        self.assertEqual(2, message.count)
+        self.assertEqual(1, message.errors)
+        self.assertAlmostEqual(100.0, message.p50_ms)
+        self.assertAlmostEqual(300.0, message.p99_ms)
+        self.assertEqual(1.0, message.requests_per_second)
+        self.assertIn('create', report.table())
+
+
+class TestLoadTest(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.server = AppServer(negotiation_app()).start()
+
+    def tearDown(self) -> None:
+        self.server.stop()
+        super().tearDown()
+
+    def test_run(self):
+        report = LoadTest(self.server.url, LoadTestSettings(concurrency=2, negotiations=4, turns=3)).run()
+
+        counts = {stage.stage: (stage.count, stage.errors) for stage in report.stages}
+        self.assertEqual({'create': (4, 0), 'show': (4, 0), 'message': (12, 0)}, counts)
+
+    def test_run__stream_until_resolved(self):
+        settings = LoadTestSettings(concurrency=2, negotiations=4, turns=3, stream_ratio=1)
+
+        report = LoadTest(self.server.url, settings).run()
+
+        counts = {stage.stage: (stage.count, stage.errors) for stage in report.stages}
+        self.assertEqual((4, 0), counts['stream'])
+        self.assertEqual((4, 0), counts['stream_first_event'])
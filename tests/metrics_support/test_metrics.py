@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+import tempfile
+from types import SimpleNamespace
+from unittest import TestCase
+
+from prometheus_client import REGISTRY
+
+from negotiator.metrics_support.metrics import timed_stage, record_usage, latest_metrics
+
+record_in_worker = '''
+from negotiator.metrics_support.metrics import timed_stage, negotiations_resolved
+with timed_stage('llm_call', 'some-model'):
+    negotiations_resolved.labels('some-model').inc()
+'''
+
+report_in_worker = '''
+import sys
+from negotiator.metrics_support.metrics import latest_metrics
+sys.stdout.write(latest_metrics().decode())
+'''
+
+
+def sample(name: str, **labels: str) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestMetrics(TestCase):
+    def test_timed_stage(self):
+        before = sample('negotiator_chat_turn_stage_seconds_count', stage='prompt_fetch', model='some-model')
+
+        with timed_stage('prompt_fetch') as stage:
+            stage.model = 'some-model'
+
+        after = sample('negotiator_chat_turn_stage_seconds_count', stage='prompt_fetch', model='some-model')
+        self.assertEqual(1, after - before)
+
+    def test_timed_stage__error(self):
+        before = sample('negotiator_chat_turn_errors_total', stage='db_write', model='some-model')
+
+        with self.assertRaises(ValueError):
+            with timed_stage('db_write', 'some-model'):
+                raise ValueError('some error')
+
+        self.assertEqual(1, sample('negotiator_chat_turn_errors_total', stage='db_write', model='some-model') - before)
+
+    def test_record_usage(self):
+        before = sample('negotiator_llm_tokens_total', model='some-model', kind='prompt')
+
+        record_usage('some-model', SimpleNamespace(prompt_tokens=12, completion_tokens=3))
+        record_usage('some-model', None)
+
+        self.assertEqual(12, sample('negotiator_llm_tokens_total', model='some-model', kind='prompt') - before)
+
+    def test_latest_metrics(self):
+        self.assertIn(b'# TYPE negotiator_chat_turn_stage_seconds histogram', latest_metrics())
+
+    def test_latest_metrics__multiple_processes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            env = {**os.environ, 'PROMETHEUS_MULTIPROC_DIR': directory}
+            for _ in range(2):
+                subprocess.run([sys.executable, '-c', record_in_worker], env=env, check=True)
+
+            report = subprocess.run(
+                [sys.executable, '-c', report_in_worker], env=env, check=True, capture_output=True, text=True).stdout
+
+        self.assertIn('negotiator_negotiations_resolved_total{model="some-model"} 2.0', report)
+        self.assertIn('negotiator_chat_turn_stage_seconds_count{model="some-model",stage="llm_call"} 2.0', report)
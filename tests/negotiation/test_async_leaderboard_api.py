@@ -0,0 +1,30 @@
+from typing import cast
+from unittest import IsolatedAsyncioTestCase
+from uuid import UUID
+
+from negotiator.negotiation.async_leaderboard_api import async_leaderboard_api
+from negotiator.negotiation.message_repository import MessageRepository
+from negotiator.negotiation.negotiation_repository import NegotiationRepository
+from negotiator.negotiation.negotiation_service import NegotiationService
+from negotiator.negotiation.resolution_repository import ResolutionRepository
+from tests.blueprint_test_support import async_test_client
+from tests.db_test_support import test_db_template
+
+
+class TestAsyncLeaderboardApi(IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+
+        db = test_db_template()
+        db.clear()
+
+        service = NegotiationService(db, NegotiationRepository(db), MessageRepository(db), ResolutionRepository(db))
+        service.resolve(cast(UUID, service.create()), 15_000)
+
+        self.test_client = async_test_client(async_leaderboard_api(service))
+
+    async def test_leaderboard(self):
+        response = await self.test_client.get('/leaderboard')
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(15_000, (await response.json)[0]['final_price'])
@@ -0,0 +1,216 @@
+import json
+import uuid
+from unittest import IsolatedAsyncioTestCase, mock
+
+from freeplay.llm_parameters import LLMParameters
+from freeplay.resources.prompts import PromptInfo, TemplatePrompt
+from freeplay.resources.sessions import Session
+from openai.types.chat import ChatCompletion, ChatCompletionMessage, ChatCompletionMessageToolCall, ChatCompletionChunk
+from openai.types.chat.chat_completion import Choice
+from openai.types.chat.chat_completion_chunk import Choice as ChunkChoice, ChoiceDelta
+from openai.types.chat.chat_completion_message_tool_call import Function
+
+from negotiator.negotiation.async_llm_service import AsyncLLMService
+from negotiator.negotiation.context_window import ContextWindow
+from negotiator.negotiation.llm_resilience import LLMUnavailable
+from negotiator.negotiation.llm_service import LLMService, RESOLVE_NEGOTIATION_TOOL_NAME, ChatTurnDelta, \
+    ChatTurnReply, ResolvedNegotiation, unavailable_reply
+from negotiator.negotiation.message_repository import MessageRepository, AsyncMessageRepository
+from negotiator.negotiation.negotiation_repository import NegotiationRepository, AsyncNegotiationRepository
+from negotiator.negotiation.negotiation_service import NegotiationService, AsyncNegotiationService, Message
+from negotiator.negotiation.resolution_repository import ResolutionRepository
+from negotiator.negotiation.response_cache import ResponseCache
+from negotiator.negotiation.summary_repository import SummaryRepository
+from negotiator.negotiation.prompt_template_cache import PromptTemplateCache
+from negotiator.recording.recording_outbox import RecordingOutbox
+from negotiator.recording.recording_repository import RecordingRepository, AsyncRecordingRepository
+from tests.db_test_support import test_db_template, test_async_db_template
+
+
+class TestAsyncLLMService(IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.db = test_db_template()
+        self.db.clear()
+
+        self.negotiation_service = NegotiationService(
+            self.db, NegotiationRepository(self.db), MessageRepository(self.db), ResolutionRepository(self.db))
+        self.freeplay_mock = mock.Mock()
+        self.freeplay_mock.prompts.get.return_value = TemplatePrompt(
+            prompt_info=PromptInfo(
+                str(uuid.uuid4()),
+                str(uuid.uuid4()),
+                'template',
+                'latest',
+                model_parameters=LLMParameters({}),
+                provider_info=None,
+                provider='openai',
+                model='gpt-4o',
+                flavor_name='openai_chat',
+                project_id=str(uuid.uuid4())
+            ),
+            messages=[{'kind': 'history'}]
+        )
+        self.freeplay_mock.sessions.restore_session.side_effect = \
+            lambda session_id: Session(session_id, None, mock.Mock())
+        self.response_cache: ResponseCache = ResponseCache(cache_all_temperatures=True)
+        self.recording_outbox = RecordingOutbox(RecordingRepository(self.db), self.freeplay_mock)
+        llm_service = LLMService(
+            self.db,
+            self.negotiation_service,
+            self.freeplay_mock,
+            PromptTemplateCache(self.freeplay_mock),
+            ContextWindow(SummaryRepository(self.db), mock.Mock()),
+            self.response_cache,
+            self.recording_outbox,
+            mock.Mock(),
+            str(uuid.uuid4())
+        )
+        self.mock_call_llm = mock.AsyncMock()
+        async_db = test_async_db_template()
+        self.llm_service = AsyncLLMService(
+            llm_service,
+            self.mock_call_llm,
+            async_db,
+            AsyncNegotiationService(async_db, AsyncNegotiationRepository(async_db), AsyncMessageRepository(async_db)),
+            AsyncRecordingRepository(async_db),
+        )
+
+    async def test_cached_response(self):
+        self.mock_call_llm.return_value = self.mock_openai_response(ChatCompletionMessage(
+            role='assistant', content='Assistant response'))
+        negotiations = [self.negotiation_service.find(self.negotiation_service.create()) for _ in range(2)]
+
+        for negotiation in negotiations:
+            reply = await self.llm_service.call_and_record_negotiator_chat_turn(
+                negotiation, Message(id=uuid.uuid4(), role='user', content='Best price?'))
+            self.assertEqual('Assistant response', reply.content)
+
+        self.mock_call_llm.assert_awaited_once()
+        self.assertEqual(3, len(self.negotiation_service.find(negotiations[1].id).messages))
+
+    async def test_openai_response(self):
+        self.mock_call_llm.return_value = self.mock_openai_response(ChatCompletionMessage(
+            role='assistant', content='Assistant response'))
+        negotiation_id = self.negotiation_service.create()
+        negotiation = self.negotiation_service.find(negotiation_id)
+
+        reply = await self.llm_service.call_and_record_negotiator_chat_turn(negotiation, Message(
+            id=uuid.uuid4(),
+            role='user',
+            content='A new message!'
+        ))
+
+        self.assertEqual('Assistant response', reply.content)
+        updated_negotiation = self.negotiation_service.find(negotiation_id)
+        self.assertEqual(3, len(updated_negotiation.messages))
+        self.assertEqual('A new message!', updated_negotiation.messages[1].content)
+        self.assertEqual('Assistant response', updated_negotiation.messages[2].content)
+        self.assertEqual(reply.id, updated_negotiation.messages[2].id)
+
+        self.assertEqual(1, self.recording_outbox.drain_once())
+        self.freeplay_mock.recordings.create.assert_called_once()
+
+    async def test_llm_unavailable(self):
+        self.mock_call_llm.side_effect = LLMUnavailable('The language model did not respond')
+        negotiation_id = self.negotiation_service.create()
+        negotiation = self.negotiation_service.find(negotiation_id)
+
+        reply = await self.llm_service.call_and_record_negotiator_chat_turn(negotiation, Message(
+            id=uuid.uuid4(),
+            role='user',
+            content='A new message!'
+        ))
+
+        self.assertEqual(unavailable_reply, reply.content)
+        self.assertFalse(reply.resettable)
+        self.assertEqual(1, len(self.negotiation_service.find(negotiation_id).messages))
+
+    async def test_resolve_negotiation(self):
+        self.mock_call_llm.return_value = self.mock_openai_response(ChatCompletionMessage(
+            role='assistant',
+            content=None,
+            tool_calls=[ChatCompletionMessageToolCall(
+                id="call_" + str(uuid.uuid4()),
+                type="function",
+                function=Function(
+                    name=RESOLVE_NEGOTIATION_TOOL_NAME,
+                    arguments=json.dumps({'final_price': 15_000})
+                )
+            )]
+        ))
+        negotiation_id = self.negotiation_service.create()
+        negotiation = self.negotiation_service.find(negotiation_id)
+
+        result = await self.llm_service.call_and_record_negotiator_chat_turn(negotiation, Message(
+            id=uuid.uuid4(),
+            role='user',
+            content='Final user message'
+        ))
+
+        self.assertEqual(ResolvedNegotiation(final_price=15_000, leaderboard_rank=1, total_negotiations=1), result)
+        updated_negotiation = self.negotiation_service.find(negotiation_id)
+        self.assertEqual(2, len(updated_negotiation.messages))
+
+    async def test_stream_openai_response(self):
+        async def chunks():
+            for content in ['Assistant ', 'response']:
+                yield ChatCompletionChunk(
+                    id='chatcmpl-AAVY5zYwj6TXgZwqAwDno6EpuGfzy',
+                    choices=[ChunkChoice(delta=ChoiceDelta(content=content), index=0)],
+                    created=1727067917,
+                    model='gpt-4o-2024-08-06',
+                    object='chat.completion.chunk',
+                )
+
+        self.mock_call_llm.return_value = chunks()
+        negotiation_id = self.negotiation_service.create()
+        negotiation = self.negotiation_service.find(negotiation_id)
+
+        events = [event async for event in self.llm_service.stream_negotiator_chat_turn(negotiation, Message(
+            id=uuid.uuid4(),
+            role='user',
+            content='A new message!'
+        ))]
+
+        self.assertEqual([ChatTurnDelta('Assistant '), ChatTurnDelta('response')], events[:-1])
+        self.assertIsInstance(events[-1], ChatTurnReply)
+        self.assertTrue(self.mock_call_llm.call_args.kwargs['stream'])
+        updated_negotiation = self.negotiation_service.find(negotiation_id)
+        self.assertEqual('Assistant response', updated_negotiation.messages[2].content)
+
+    async def test_stream_breaks_off(self):
+        async def chunks():
+            yield ChatCompletionChunk(
+                id='chatcmpl-AAVY5zYwj6TXgZwqAwDno6EpuGfzy',
+                choices=[ChunkChoice(delta=ChoiceDelta(content='Assistant '), index=0)],
+                created=1727067917,
+                model='gpt-4o-2024-08-06',
+                object='chat.completion.chunk',
+            )
+            raise LLMUnavailable('The language model stopped responding')
+
+        self.mock_call_llm.return_value = chunks()
+        negotiation_id = self.negotiation_service.create()
+        negotiation = self.negotiation_service.find(negotiation_id)
+
+        events = [event async for event in self.llm_service.stream_negotiator_chat_turn(negotiation, Message(
+            id=uuid.uuid4(),
+            role='user',
+            content='A new message!'
+        ))]
+
+        self.assertEqual(ChatTurnDelta('Assistant '), events[0])
+        self.assertEqual(unavailable_reply, events[1].content)
+        self.assertFalse(events[1].resettable)
+        self.assertEqual(1, len(self.negotiation_service.find(negotiation_id).messages))
+
+    def mock_openai_response(self, message: ChatCompletionMessage) -> ChatCompletion:
+        return ChatCompletion(
+            id='chatcmpl-AAVY5zYwj6TXgZwqAwDno6EpuGfzy',
+            choices=[Choice(finish_reason='stop', index=0, logprobs=None, message=message)],
+            created=1727067917,
+            model='gpt-4o-2024-08-06',
+            object='chat.completion',
+        )
@@ -0,0 +1,139 @@
+import re
+from typing import cast
+from unittest import IsolatedAsyncioTestCase, mock
+from uuid import UUID
+
+from negotiator.negotiation.async_negotiation_page import async_negotiation_page
+from negotiator.negotiation.llm_service import ChatTurnDelta, ChatTurnReply, unavailable_reply, \
+    unavailable_turn_reply
+from negotiator.negotiation.message_repository import AsyncMessageRepository
+from negotiator.negotiation.negotiation_repository import AsyncNegotiationRepository
+from negotiator.negotiation.negotiation_service import AsyncNegotiationService, Negotiation
+from tests.blueprint_test_support import async_test_client
+from tests.db_test_support import test_db_template, test_async_db_template
+
+
+class TestAsyncNegotiationPage(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+
+        test_db_template().clear()
+        self.db = test_async_db_template()
+
+        negotiation_repository = AsyncNegotiationRepository(self.db)
+        message_repository = AsyncMessageRepository(self.db)
+
+        service = AsyncNegotiationService(self.db, negotiation_repository, message_repository)
+        self.llm_service = llm_service = mock.Mock()
+        llm_service.call_and_record_negotiator_chat_turn = mock.AsyncMock(
+            return_value=ChatTurnReply(UUID('2c4c4cd8-a1b5-4f62-9d46-d7c4d5bd3b4b'), 'I sure will'))
+
+        async def stream_negotiator_chat_turn(negotiation, user_message):
+            yield ChatTurnDelta('I sure')
+            yield ChatTurnDelta(' will')
+            yield ChatTurnReply(UUID('2c4c4cd8-a1b5-4f62-9d46-d7c4d5bd3b4b'), 'I sure will')
+
+        llm_service.stream_negotiator_chat_turn = stream_negotiator_chat_turn
+        blueprint = async_negotiation_page(service, llm_service)
+
+        self.test_client = async_test_client(blueprint)
+        self.negotiation_id = await service.create()
+        self.first_message_id = cast(Negotiation, await service.find(cast(UUID, self.negotiation_id))).messages[0].id
+
+    async def test_create(self):
+        response = await self.test_client.post('/negotiation')
+
+        self.assertEqual(302, response.status_code)
+
+        uuid_regex = r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}'
+        self.assertRegex(
+            response.headers['Location'],
+            re.compile(r'^/negotiation/' + uuid_regex)
+        )
+
+    async def test_show(self):
+        response = await self.test_client.get(f'/negotiation/{self.negotiation_id}')
+
+        self.assertEqual(200, response.status_code)
+        self.assertIn('Hi there', await response.get_data(as_text=True))
+
+    async def test_show__not_found(self):
+        response = await self.test_client.get(f'/negotiation/decf0189-9220-42ca-b825-9df389baee48')
+
+        self.assertEqual(302, response.status_code)
+        self.assertEqual('/', response.headers['Location'])
+
+    async def test_new_message(self):
+        response = await self.test_client.post(
+            f'/negotiation/{self.negotiation_id}/messages',
+            json={
+                'content': 'Tell me more',
+                'id': '1914219c-7b81-4ac7-8edc-ee23114ac270',
+            },
+        )
+
+        self.assertEqual(201, response.status_code)
+        body = await response.get_json()
+        self.assertEqual('2c4c4cd8-a1b5-4f62-9d46-d7c4d5bd3b4b', body['id'])
+        self.assertEqual('assistant', body['role'])
+        self.assertEqual('I sure will', body['content'])
+        self.assertTrue(body['resettable'])
+
+    async def test_new_message__llm_unavailable(self):
+        self.llm_service.call_and_record_negotiator_chat_turn.return_value = unavailable_turn_reply()
+
+        response = await self.test_client.post(
+            f'/negotiation/{self.negotiation_id}/messages',
+            json={
+                'content': 'Tell me more',
+                'id': '1914219c-7b81-4ac7-8edc-ee23114ac270',
+            },
+        )
+
+        self.assertEqual(503, response.status_code)
+        body = await response.get_json()
+        self.assertEqual(unavailable_reply, body['content'])
+        self.assertFalse(body['resettable'])
+
+    async def test_new_message__not_found(self):
+        response = await self.test_client.post(
+            f'/negotiation/f94a796d-d8a0-4bab-a986-98fce4348e06/messages',
+            json={
+                'content': 'Tell me more',
+                'id': '1914219c-7b81-4ac7-8edc-ee23114ac270',
+            },
+        )
+
+        self.assertEqual(302, response.status_code)
+        self.assertEqual('/', response.headers['Location'])
+
+    async def test_stream_message(self):
+        response = await self.test_client.post(
+            f'/negotiation/{self.negotiation_id}/messages/stream',
+            json={
+                'content': 'Tell me more',
+                'id': '1914219c-7b81-4ac7-8edc-ee23114ac270',
+            },
+        )
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('text/event-stream', response.mimetype)
+        self.assertEqual(
+            'event: delta\ndata: {"content": "I sure"}\n\n'
+            'event: delta\ndata: {"content": " will"}\n\n'
+            'event: message\ndata: {"id": "2c4c4cd8-a1b5-4f62-9d46-d7c4d5bd3b4b", "role": "assistant", '
+            '"content": "I sure will", "resettable": true}\n\n',
+            await response.get_data(as_text=True)
+        )
+
+    async def test_reset(self):
+        response = await self.test_client.post(
+            f'/negotiation/{self.negotiation_id}/messages/{self.first_message_id}/reset'
+        )
+
+        self.assertEqual(204, response.status_code)
+
+        response = await self.test_client.get(f'/negotiation/{self.negotiation_id}')
+
+        self.assertEqual(200, response.status_code)
+        self.assertIn('4Runner', await response.get_data(as_text=True))
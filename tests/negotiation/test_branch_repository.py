@@ -0,0 +1,38 @@
+import uuid
+from unittest import TestCase
+
+from negotiator.negotiation.branch_repository import BranchRepository
+from negotiator.negotiation.message_repository import MessageRepository, NewMessage
+from negotiator.negotiation.negotiation_repository import NegotiationRepository
+from tests.db_test_support import test_db_template
+
+
+class TestBranchRepository(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.db = test_db_template()
+        self.db.clear()
+
+        self.negotiation_repository = NegotiationRepository(self.db)
+        self.message_repository = MessageRepository(self.db)
+        self.repository = BranchRepository(self.db)
+
+    def test_list_for_negotiation(self):
+        negotiation_id = self.negotiation_repository.create()
+        first, second, third = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+        self.message_repository.create_many(negotiation_id, [
+            NewMessage(first, 'assistant', 'hi'),
+            NewMessage(second, 'user', 'original question'),
+        ])
+        self.negotiation_repository.move_head(negotiation_id, first)
+        self.message_repository.create(negotiation_id, third, 'user', 'new question')
+
+        root, fork = self.repository.list_for_negotiation(negotiation_id)
+
+        self.assertEqual((None, None, False, 2), (root.parent_branch_id, root.fork_message_id, root.head, root.message_count))
+        self.assertEqual((root.id, first, True, 1), (fork.parent_branch_id, fork.fork_message_id, fork.head, fork.message_count))
+
+    def test_list_for_negotiation__no_messages(self):
+        negotiation_id = self.negotiation_repository.create()
+
+        self.assertEqual([], self.repository.list_for_negotiation(negotiation_id))
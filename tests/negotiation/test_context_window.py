@@ -0,0 +1,136 @@
+import uuid
+from typing import cast, List
+from unittest import TestCase, mock
+from uuid import UUID
+
+from negotiator.negotiation.context_window import ContextWindow, TokenCounter, estimate_tokens, LLMSummarizer, \
+    summary_timeout_seconds
+from negotiator.negotiation.llm_resilience import Deadline, DeadlineExceeded
+from negotiator.negotiation.negotiation_repository import NegotiationRepository
+from negotiator.negotiation.negotiation_service import Negotiation, Message
+from negotiator.negotiation.summary_repository import SummaryRepository, SummaryRecord
+from tests.db_test_support import test_db_template
+
+
+def message(role: str, content: str) -> Message:
+    return Message(uuid.uuid4(), role, content)
+
+
+class TestContextWindow(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.db = test_db_template()
+        self.db.clear()
+
+        self.negotiation_id = cast(UUID, NegotiationRepository(self.db).create())
+        self.summary_repository = SummaryRepository(self.db)
+        self.summarize = mock.Mock(return_value='summary')
+        self.context_window = ContextWindow(
+            self.summary_repository,
+            self.summarize,
+            token_budget=50,
+            token_counter=TokenCounter(count_tokens=len),
+        )
+
+    def negotiation(self, messages: List[Message]) -> Negotiation:
+        return Negotiation(self.negotiation_id, messages)
+
+    def test_within_budget(self):
+        messages = [message('assistant', 'hi'), message('user', 'a' * 10), message('assistant', 'b' * 10)]
+
+        result = self.context_window.messages_dict(self.negotiation(messages))
+
+        self.assertEqual([{'role': m.role, 'content': m.content} for m in messages], result)
+        self.summarize.assert_not_called()
+
+    def test_over_budget(self):
+        opening = message('assistant', 'hi')
+        older = [message('user', 'a' * 10), message('assistant', 'b' * 10), message('user', 'c' * 10)]
+        recent = [message('assistant', 'd' * 10), message('user', 'e' * 10)]
+
+        result = self.context_window.messages_dict(self.negotiation([opening, *older, *recent]))
+
+        self.assertEqual([
+            {'role': 'assistant', 'content': 'hi'},
+            {'role': 'system', 'content': 'Summary of the earlier conversation: summary'},
+            {'role': 'assistant', 'content': 'd' * 10},
+            {'role': 'user', 'content': 'e' * 10},
+        ], result)
+        self.summarize.assert_called_once_with(None, older, summary_timeout_seconds)
+        self.assertEqual(
+            SummaryRecord(self.negotiation_id, 'summary', older[-1].id),
+            self.summary_repository.find(self.negotiation_id)
+        )
+
+    def test_reuses_summary_until_recent_turns_outgrow_budget(self):
+        opening = message('assistant', 'hi')
+        older = [message('user', 'a' * 10), message('assistant', 'b' * 10)]
+        self.summary_repository.save(SummaryRecord(self.negotiation_id, 'summary', older[-1].id))
+        recent = [message('user', 'c' * 10), message('assistant', 'd' * 10), message('user', 'e' * 10)]
+
+        result = self.context_window.messages_dict(self.negotiation([opening, *older, *recent]))
+
+        self.assertEqual(5, len(result))
+        self.summarize.assert_not_called()
+
+        newest = [message('assistant', 'f' * 10), message('user', 'g' * 10)]
+        self.summarize.return_value = 'updated'
+
+        result = self.context_window.messages_dict(self.negotiation([opening, *older, *recent, *newest]))
+
+        self.summarize.assert_called_once_with('summary', recent, summary_timeout_seconds)
+        self.assertEqual({'role': 'system', 'content': 'Summary of the earlier conversation: updated'}, result[1])
+        self.assertEqual(['f' * 10, 'g' * 10], [m['content'] for m in result[2:]])
+
+    def test_ignores_summary_of_truncated_messages(self):
+        self.summary_repository.save(SummaryRecord(self.negotiation_id, 'stale', uuid.uuid4()))
+        messages = [message('assistant', 'hi'), *[message('user', str(i) * 10) for i in range(5)]]
+
+        self.context_window.messages_dict(self.negotiation(messages))
+
+        self.summarize.assert_called_once_with(None, messages[1:4], summary_timeout_seconds)
+
+    def test_deadline(self):
+        now = [0.0]
+        deadline = Deadline(5, clock=lambda: now[0])
+        messages = [message('assistant', 'hi'), *[message('user', str(i) * 10) for i in range(5)]]
+
+        self.context_window.messages_dict(self.negotiation(messages), deadline)
+        self.assertEqual(5, self.summarize.call_args.args[2])
+
+        now[0] = 6
+        self.summarize.reset_mock()
+        with self.assertRaises(DeadlineExceeded):
+            self.context_window.messages_dict(self.negotiation([*messages, message('user', 'f' * 40)]), deadline)
+        self.summarize.assert_not_called()
+
+
+class TestTokenCounter(TestCase):
+    def test_count__cached_by_message(self):
+        count_tokens = mock.Mock(return_value=3)
+        counter = TokenCounter(count_tokens=count_tokens, cache_size=1)
+        first, second = message('user', 'first'), message('user', 'second')
+
+        self.assertEqual(6, counter.total([first, first]))
+        counter.count(second)
+        counter.count(first)
+
+        self.assertEqual(3, count_tokens.call_count)
+
+    def test_estimate_tokens(self):
+        self.assertEqual(6, estimate_tokens('12345678'))
+
+
+class TestLLMSummarizer(TestCase):
+    def test_summarize(self):
+        call_llm = mock.MagicMock()
+        call_llm.return_value.choices[0].message.content = 'new summary'
+
+        result = LLMSummarizer(call_llm, 'gpt-4o-mini')('old summary', [message('user', 'I offer 12000')], 5)
+
+        self.assertEqual('new summary', result)
+        arguments = call_llm.call_args.kwargs
+        self.assertEqual('gpt-4o-mini', arguments['model'])
+        self.assertEqual(5, arguments['timeout'])
+        self.assertIn('old summary', arguments['messages'][1]['content'])
+        self.assertIn('user: I offer 12000', arguments['messages'][1]['content'])
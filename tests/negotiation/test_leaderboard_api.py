@@ -0,0 +1,54 @@
+from typing import cast
+from unittest import TestCase
+from uuid import UUID
+
+from negotiator.negotiation.leaderboard_api import leaderboard_api
+from negotiator.negotiation.message_repository import MessageRepository
+from negotiator.negotiation.negotiation_repository import NegotiationRepository
+from negotiator.negotiation.negotiation_service import NegotiationService
+from negotiator.negotiation.resolution_repository import ResolutionRepository
+from tests.blueprint_test_support import test_client
+from tests.db_test_support import test_db_template
+
+
+class TestLeaderboardApi(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.db = test_db_template()
+        self.db.clear()
+
+        self.service = NegotiationService(
+            self.db, NegotiationRepository(self.db), MessageRepository(self.db), ResolutionRepository(self.db))
+        self.cheapest_id = cast(UUID, self.service.create())
+        self.service.resolve(self.cheapest_id, 12_000)
+        self.service.resolve(cast(UUID, self.service.create()), 15_000)
+
+        self.test_client = test_client(leaderboard_api(self.service))
+
+    def test_leaderboard(self):
+        response = self.test_client.get('/leaderboard?limit=1')
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([
+            {'negotiation_id': str(self.cheapest_id), 'final_price': 12_000, 'rank': 1},
+        ], response.json)
+
+    def test_leaderboard__archived(self):
+        self.db.query(
+            "insert into archived_negotiations (id, created_at, final_price, resolved_at, messages)"
+            " values (:id, now(), 11000, now(), '[]')",
+            id=UUID('768081d3-43d8-4280-bde0-5c4c187d3174'),
+        )
+
+        response = self.test_client.get('/leaderboard?limit=2')
+
+        self.assertEqual([
+            {'negotiation_id': '768081d3-43d8-4280-bde0-5c4c187d3174', 'final_price': 11_000, 'rank': 1},
+            {'negotiation_id': str(self.cheapest_id), 'final_price': 12_000, 'rank': 2},
+        ], response.json)
+
+    def test_leaderboard__invalid_limit(self):
+        response = self.test_client.get('/leaderboard?limit=zero')
+
+        self.assertEqual(400, response.status_code)
@@ -0,0 +1,213 @@
+import asyncio
+import threading
+import time
+from unittest import TestCase, mock, IsolatedAsyncioTestCase
+
+import httpx
+import openai
+
+from negotiator.negotiation.llm_resilience import CircuitBreaker, RetryPolicy, ResilientLLMCall, LLMUnavailable, \
+    CircuitOpen, Deadline, DeadlineExceeded, AsyncResilientLLMCall
+
+
+def connection_error() -> openai.APIConnectionError:
+    return openai.APIConnectionError(request=httpx.Request('POST', 'https://api.openai.com/v1/chat/completions'))
+
+
+class TestResilientLLMCall(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.call_llm = mock.Mock()
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+        self.policy = RetryPolicy(max_attempts=3, base_backoff_seconds=0.001, max_backoff_seconds=0.001)
+        self.resilient_call = ResilientLLMCall(self.call_llm, self.breaker, self.policy)
+
+    def test_call(self):
+        self.call_llm.return_value = 'completion'
+
+        self.assertEqual('completion', self.resilient_call(timeout=5, model='gpt-4o'))
+
+        self.assertEqual('gpt-4o', self.call_llm.call_args.kwargs['model'])
+        self.assertLessEqual(self.call_llm.call_args.kwargs['timeout'], 5)
+
+    def test_call__retries(self):
+        self.call_llm.side_effect = [connection_error(), 'completion']
+
+        self.assertEqual('completion', self.resilient_call(timeout=5))
+
+        self.assertEqual(2, self.call_llm.call_count)
+        self.assertFalse(self.breaker.is_open())
+
+    def test_call__gives_up(self):
+        self.call_llm.side_effect = connection_error()
+
+        with self.assertRaises(CircuitOpen):
+            self.resilient_call(timeout=5)
+
+        self.assertEqual(2, self.call_llm.call_count)
+        self.assertTrue(self.breaker.is_open())
+
+    def test_call__does_not_retry_bad_requests(self):
+        self.call_llm.side_effect = ValueError('bad request')
+
+        with self.assertRaises(ValueError):
+            self.resilient_call(timeout=5)
+
+        self.assertEqual(1, self.call_llm.call_count)
+
+    def test_call__half_open_trial_with_bad_request(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10, clock=lambda: now[0])
+        resilient_call = ResilientLLMCall(self.call_llm, breaker, RetryPolicy(max_attempts=1))
+        self.call_llm.side_effect = [connection_error(), ValueError('bad request'), 'completion']
+
+        with self.assertRaises(LLMUnavailable):
+            resilient_call(timeout=5)
+        now[0] = 10
+        with self.assertRaises(ValueError):
+            resilient_call(timeout=5)
+
+        self.assertEqual('completion', resilient_call(timeout=5))
+        self.assertFalse(breaker.is_open())
+
+    def test_call__stream_breaks_off(self):
+        def chunks():
+            yield 'chunk'
+            raise connection_error()
+
+        self.call_llm.return_value = chunks()
+        breaker = CircuitBreaker(failure_threshold=1)
+        stream = ResilientLLMCall(self.call_llm, breaker, self.policy)(timeout=5, stream=True)
+
+        self.assertEqual('chunk', next(stream))
+        with self.assertRaises(LLMUnavailable):
+            next(stream)
+        self.assertTrue(breaker.is_open())
+
+    def test_call__stream_deadline(self):
+        now = [0.0]
+        self.call_llm.return_value = iter(['first', 'second'])
+        resilient_call = ResilientLLMCall(self.call_llm, self.breaker, self.policy, clock=lambda: now[0])
+        stream = resilient_call(timeout=5, stream=True)
+
+        self.assertEqual('first', next(stream))
+        now[0] = 6
+        with self.assertRaises(DeadlineExceeded):
+            next(stream)
+
+    def test_call__exhausts_attempts(self):
+        resilient_call = ResilientLLMCall(self.call_llm, CircuitBreaker(failure_threshold=10), self.policy)
+        self.call_llm.side_effect = connection_error()
+
+        with self.assertRaises(LLMUnavailable):
+            resilient_call(timeout=5)
+
+        self.assertEqual(3, self.call_llm.call_count)
+
+    def test_call__hedges_slow_requests(self):
+        release = threading.Event()
+        calls = []
+
+        def call_llm(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                release.wait(5)
+                return 'slow'
+            return 'hedged'
+
+        resilient_call = ResilientLLMCall(call_llm, self.breaker, RetryPolicy(hedge_after_seconds=0.01))
+
+        self.assertEqual('hedged', resilient_call(timeout=5))
+        self.assertEqual(2, len(calls))
+        release.set()
+
+    def test_call__deadline(self):
+        resilient_call = ResilientLLMCall(
+            lambda **kwargs: time.sleep(1), self.breaker, RetryPolicy(hedge_after_seconds=0.01))
+
+        with self.assertRaises(DeadlineExceeded):
+            resilient_call(timeout=0.05)
+
+
+class TestCircuitBreaker(TestCase):
+    def test_half_open(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10, clock=lambda: now[0])
+        breaker.record_failure()
+
+        with self.assertRaises(CircuitOpen):
+            breaker.allow()
+
+        now[0] = 10
+        breaker.allow()
+        with self.assertRaises(CircuitOpen):
+            breaker.allow()
+
+        breaker.record_success()
+        breaker.allow()
+        self.assertFalse(breaker.is_open())
+
+
+class TestDeadline(TestCase):
+    def test_check(self):
+        now = [0.0]
+        deadline = Deadline(5, clock=lambda: now[0])
+
+        self.assertEqual(5, deadline.check())
+        now[0] = 6
+        self.assertEqual(0, deadline.remaining())
+        with self.assertRaises(DeadlineExceeded):
+            deadline.check()
+
+
+class TestAsyncResilientLLMCall(IsolatedAsyncioTestCase):
+    async def test_call__retries(self):
+        call_llm = mock.AsyncMock(side_effect=[connection_error(), 'completion'])
+        resilient_call = AsyncResilientLLMCall(
+            call_llm, CircuitBreaker(), RetryPolicy(base_backoff_seconds=0.001, max_backoff_seconds=0.001))
+
+        self.assertEqual('completion', await resilient_call(timeout=5))
+        self.assertEqual(2, call_llm.await_count)
+
+    async def test_call__stream_breaks_off(self):
+        async def chunks():
+            yield 'chunk'
+            raise connection_error()
+
+        breaker = CircuitBreaker(failure_threshold=1)
+        resilient_call = AsyncResilientLLMCall(mock.AsyncMock(return_value=chunks()), breaker, RetryPolicy())
+        stream = await resilient_call(timeout=5, stream=True)
+
+        self.assertEqual('chunk', await anext(stream))
+        with self.assertRaises(LLMUnavailable):
+            await anext(stream)
+        self.assertTrue(breaker.is_open())
+
+    async def test_call__half_open_trial_with_bad_request(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10, clock=lambda: now[0])
+        call_llm = mock.AsyncMock(side_effect=[connection_error(), ValueError('bad request'), 'completion'])
+        resilient_call = AsyncResilientLLMCall(call_llm, breaker, RetryPolicy(max_attempts=1))
+
+        with self.assertRaises(LLMUnavailable):
+            await resilient_call(timeout=5)
+        now[0] = 10
+        with self.assertRaises(ValueError):
+            await resilient_call(timeout=5)
+
+        self.assertEqual('completion', await resilient_call(timeout=5))
+        self.assertFalse(breaker.is_open())
+
+    async def test_call__hedges_slow_requests(self):
+        calls = []
+
+        async def call_llm(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                await asyncio.sleep(5)
+                return 'slow'
+            return 'hedged'
+
+        resilient_call = AsyncResilientLLMCall(call_llm, CircuitBreaker(), RetryPolicy(hedge_after_seconds=0.01))
+
+        self.assertEqual('hedged', await resilient_call(timeout=5))
@@ -3,19 +3,34 @@ import uuid
 from unittest import TestCase, mock
 from unittest.mock import MagicMock
 
-from freeplay.resources.prompts import FormattedPrompt, PromptInfo
+from freeplay.resources.prompts import PromptInfo, TemplatePrompt
+from freeplay.resources.sessions import Session
 from openai.types import CompletionUsage
-from openai.types.chat import ChatCompletion, ChatCompletionMessage, ChatCompletionMessageToolCall
+from openai.types.chat import ChatCompletion, ChatCompletionMessage, ChatCompletionMessageToolCall, ChatCompletionChunk
 from openai.types.chat.chat_completion import Choice
+from openai.types.chat.chat_completion_chunk import Choice as ChunkChoice, ChoiceDelta, ChoiceDeltaToolCall, \
+    ChoiceDeltaToolCallFunction
 from openai.types.chat.chat_completion_message_tool_call import Function
 from openai.types.completion_usage import CompletionTokensDetails
+from prometheus_client import REGISTRY
 
-from negotiator.negotiation.llm_service import LLMService, RESOLVE_NEGOTIATION_TOOL_NAME
+from negotiator.negotiation.context_window import ContextWindow
+from negotiator.negotiation.llm_resilience import CircuitOpen, LLMUnavailable
+from negotiator.negotiation.llm_service import LLMService, RESOLVE_NEGOTIATION_TOOL_NAME, ChatTurnDelta, \
+    ChatTurnReply, ResolvedNegotiation, unavailable_reply
 from negotiator.negotiation.message_repository import MessageRepository
 from negotiator.negotiation.negotiation_repository import NegotiationRepository
 from negotiator.negotiation.negotiation_service import NegotiationService, Message
+from negotiator.negotiation.resolution_repository import ResolutionRepository
+from negotiator.negotiation.response_cache import ResponseCache
+from negotiator.negotiation.summary_repository import SummaryRepository
+from negotiator.negotiation.prompt_template_cache import PromptTemplateCache
+from negotiator.recording.recording_outbox import RecordingOutbox
+from negotiator.recording.recording_repository import RecordingRepository
 from tests.db_test_support import test_db_template
 
+chat_turn_stages = ['prompt_fetch', 'context_window', 'session_restore', 'llm_call', 'db_write', 'freeplay_record']
+
 
 class TestNegotiationPage(TestCase):
     def setUp(self) -> None:
@@ -27,10 +42,11 @@ class TestNegotiationPage(TestCase):
         negotiation_repository = NegotiationRepository(self.db)
         message_repository = MessageRepository(self.db)
 
-        self.negotiation_service = NegotiationService(self.db, negotiation_repository, message_repository)
+        self.negotiation_service = NegotiationService(
+            self.db, negotiation_repository, message_repository, ResolutionRepository(self.db))
         self.project_id = str(uuid.uuid4())
         self.freeplay_mock = mock.Mock()
-        self.freeplay_mock.prompts.get_formatted.return_value = FormattedPrompt(
+        self.freeplay_mock.prompts.get.return_value = TemplatePrompt(
             prompt_info=PromptInfo(
                 str(uuid.uuid4()),
                 str(uuid.uuid4()),
@@ -43,14 +59,25 @@ class TestNegotiationPage(TestCase):
                 flavor_name='openai_chat',
                 project_id=str(uuid.uuid4())
             ),
-            messages=[],
-            formatted_prompt=[],
-            formatted_prompt_text=None
+            messages=[{'kind': 'history'}]
         )
-        freeplay_project_id = uuid.uuid4()
+        self.freeplay_mock.sessions.restore_session.side_effect = \
+            lambda session_id: Session(session_id, None, mock.Mock())
+        freeplay_project_id = str(uuid.uuid4())
+        self.recording_outbox = RecordingOutbox(RecordingRepository(self.db), self.freeplay_mock)
         self.mock_call_llm = MagicMock()
+        self.response_cache: ResponseCache = ResponseCache(cache_all_temperatures=True)
         self.llm_service = LLMService(
-            self.negotiation_service, self.freeplay_mock, self.mock_call_llm, freeplay_project_id)
+            self.db,
+            self.negotiation_service,
+            self.freeplay_mock,
+            PromptTemplateCache(self.freeplay_mock),
+            ContextWindow(SummaryRepository(self.db), mock.Mock()),
+            self.response_cache,
+            self.recording_outbox,
+            self.mock_call_llm,
+            freeplay_project_id
+        )
 
     def test_openai_response(self):
         # Create a simple dictionary that mimics the OpenAI response
@@ -66,13 +93,26 @@ class TestNegotiationPage(TestCase):
             content='A new message!'
         )
 
-        self.llm_service.call_and_record_negotiator_chat_turn(negotiation, new_message)
+        reply = self.llm_service.call_and_record_negotiator_chat_turn(negotiation, new_message)
 
         # Assertion
         updated_negotiation = self.negotiation_service.find(negotiation_id)
         self.assertEqual(3, len(updated_negotiation.messages))
         self.assertEqual('A new message!', updated_negotiation.messages[1].content)
         self.assertEqual('Assistant response', updated_negotiation.messages[2].content)
+        self.assertEqual(ChatTurnReply(updated_negotiation.messages[2].id, 'Assistant response'), reply)
+        self.assertEqual(
+            [{'role': 'assistant', 'content': negotiation.messages[0].content},
+             {'role': 'user', 'content': 'A new message!'}],
+            self.mock_call_llm.call_args.kwargs['messages']
+        )
+
+        self.freeplay_mock.recordings.create.assert_not_called()
+        self.assertEqual(1, len(self.db.query_to_dict("select id from freeplay_recordings")))
+
+        self.assertEqual(1, self.recording_outbox.drain_once())
+        self.freeplay_mock.recordings.create.assert_called_once()
+        self.assertEqual([], self.db.query_to_dict("select id from freeplay_recordings"))
 
     def test_resolve_negotiation(self):
         # Create a simple dictionary that mimics the OpenAI response
@@ -95,6 +135,212 @@ class TestNegotiationPage(TestCase):
         self.assertEqual(2, len(updated_negotiation.messages))
         self.assertEqual('Final user message', updated_negotiation.messages[1].content)
 
+    def test_metrics(self):
+        self.mock_call_llm.return_value = self.mock_openai_response_message('Assistant response')
+        negotiation = self.negotiation_service.find(self.negotiation_service.create())
+        before = self.metric_samples()
+
+        self.llm_service.call_and_record_negotiator_chat_turn(
+            negotiation, Message(id=uuid.uuid4(), role='user', content='A new message!'))
+        self.recording_outbox.drain_once()
+
+        after = self.metric_samples()
+        for stage in chat_turn_stages:
+            self.assertEqual(1, after[stage] - before[stage], stage)
+        self.assertEqual(421, after['prompt_tokens'] - before['prompt_tokens'])
+        self.assertEqual(40, after['completion_tokens'] - before['completion_tokens'])
+
+    def test_metrics__resolution_and_errors(self):
+        negotiation = self.negotiation_service.find(self.negotiation_service.create())
+        before = self.metric_samples()
+
+        self.mock_call_llm.side_effect = CircuitOpen('The language model is unavailable')
+        self.llm_service.call_and_record_negotiator_chat_turn(
+            negotiation, Message(id=uuid.uuid4(), role='user', content='Best price?'))
+        self.mock_call_llm.side_effect = None
+        self.mock_call_llm.return_value = self.mock_openai_tool_call(15_000)
+        self.llm_service.call_and_record_negotiator_chat_turn(
+            negotiation, Message(id=uuid.uuid4(), role='user', content='Deal'))
+
+        after = self.metric_samples()
+        self.assertEqual(1, after['llm_call_errors'] - before['llm_call_errors'])
+        self.assertEqual(1, after['resolved'] - before['resolved'])
+
+    def metric_samples(self) -> dict[str, float]:
+        def sample(name: str, **labels: str) -> float:
+            return REGISTRY.get_sample_value(name, labels) or 0.0
+
+        return {
+            **{
+                stage: sample('negotiator_chat_turn_stage_seconds_count', stage=stage, model='gpt-4o')
+                for stage in chat_turn_stages
+            },
+            'prompt_tokens': sample('negotiator_llm_tokens_total', model='gpt-4o', kind='prompt'),
+            'completion_tokens': sample('negotiator_llm_tokens_total', model='gpt-4o', kind='completion'),
+            'llm_call_errors': sample('negotiator_chat_turn_errors_total', stage='llm_call', model='gpt-4o'),
+            'resolved': sample('negotiator_negotiations_resolved_total', model='gpt-4o'),
+        }
+
+    def test_llm_unavailable(self):
+        self.mock_call_llm.side_effect = CircuitOpen('The language model is unavailable')
+        negotiation = self.negotiation_service.find(self.negotiation_service.create())
+
+        reply = self.llm_service.call_and_record_negotiator_chat_turn(
+            negotiation, Message(id=uuid.uuid4(), role='user', content='Best price?'))
+        events = list(self.llm_service.stream_negotiator_chat_turn(
+            negotiation, Message(id=uuid.uuid4(), role='user', content='Best price?')))
+
+        self.assertEqual(unavailable_reply, reply.content)
+        self.assertFalse(reply.resettable)
+        self.assertEqual(ChatTurnDelta(unavailable_reply), events[0])
+        self.assertEqual(unavailable_reply, events[1].content)
+        self.assertFalse(events[1].resettable)
+        self.assertLessEqual(self.mock_call_llm.call_args.kwargs['timeout'], 30)
+        self.assertEqual(1, len(self.negotiation_service.find(negotiation.id).messages))
+
+    def test_summary_unavailable(self):
+        self.llm_service.context_window = ContextWindow(
+            SummaryRepository(self.db), mock.Mock(side_effect=CircuitOpen('The language model is unavailable')), 1)
+        negotiation = self.negotiation_service.find(self.negotiation_service.create())
+        negotiation = negotiation.with_message(Message(id=uuid.uuid4(), role='user', content='Hello'))
+        negotiation = negotiation.with_message(Message(id=uuid.uuid4(), role='assistant', content='Hi'))
+
+        reply = self.llm_service.call_and_record_negotiator_chat_turn(
+            negotiation, Message(id=uuid.uuid4(), role='user', content='Best price?'))
+        events = list(self.llm_service.stream_negotiator_chat_turn(
+            negotiation, Message(id=uuid.uuid4(), role='user', content='Best price?')))
+
+        self.assertEqual(unavailable_reply, reply.content)
+        self.assertFalse(reply.resettable)
+        self.assertEqual(unavailable_reply, events[-1].content)
+        self.mock_call_llm.assert_not_called()
+
+    def test_stream_breaks_off(self):
+        def chunks():
+            yield self.mock_openai_chunk(ChoiceDelta(content='Assistant '))
+            raise LLMUnavailable('The language model stopped responding')
+
+        self.mock_call_llm.return_value = chunks()
+        negotiation = self.negotiation_service.find(self.negotiation_service.create())
+
+        events = list(self.llm_service.stream_negotiator_chat_turn(
+            negotiation, Message(id=uuid.uuid4(), role='user', content='Best price?')))
+
+        self.assertEqual(ChatTurnDelta('Assistant '), events[0])
+        self.assertEqual(ChatTurnReply, type(events[1]))
+        self.assertEqual(unavailable_reply, events[1].content)
+        self.assertFalse(events[1].resettable)
+        self.assertEqual(2, len(events))
+        self.assertEqual(1, len(self.negotiation_service.find(negotiation.id).messages))
+
+    def test_cached_response(self):
+        self.mock_call_llm.return_value = self.mock_openai_response_message('Assistant response')
+        negotiations = [self.negotiation_service.find(self.negotiation_service.create()) for _ in range(2)]
+
+        replies = [
+            self.llm_service.call_and_record_negotiator_chat_turn(
+                negotiation, Message(id=uuid.uuid4(), role='user', content='Best price?'))
+            for negotiation in negotiations
+        ]
+
+        self.assertEqual(['Assistant response', 'Assistant response'], [reply.content for reply in replies])
+        self.mock_call_llm.assert_called_once()
+        self.assertEqual(1, self.response_cache.stats().hits)
+        for negotiation in negotiations:
+            self.assertEqual(3, len(self.negotiation_service.find(negotiation.id).messages))
+        self.assertEqual(2, self.recording_outbox.drain_once())
+
+    def test_stream_cached_response(self):
+        self.mock_call_llm.return_value = self.mock_openai_response_message('Assistant response')
+        negotiation = self.negotiation_service.find(self.negotiation_service.create())
+        self.llm_service.call_and_record_negotiator_chat_turn(
+            negotiation, Message(id=uuid.uuid4(), role='user', content='Best price?'))
+        other_negotiation = self.negotiation_service.find(self.negotiation_service.create())
+
+        events = list(self.llm_service.stream_negotiator_chat_turn(
+            other_negotiation, Message(id=uuid.uuid4(), role='user', content='Best price?')))
+
+        self.assertEqual(ChatTurnDelta('Assistant response'), events[0])
+        self.assertEqual('Assistant response', events[1].content)
+        self.mock_call_llm.assert_called_once()
+        self.assertEqual(events[1].id, self.negotiation_service.find(other_negotiation.id).messages[2].id)
+
+    def test_stream_openai_response(self):
+        self.mock_call_llm.return_value = iter([
+            self.mock_openai_chunk(ChoiceDelta(role='assistant', content='')),
+            self.mock_openai_chunk(ChoiceDelta(content='Assistant ')),
+            self.mock_openai_chunk(ChoiceDelta(content='response')),
+            self.mock_openai_chunk(ChoiceDelta(), finish_reason='stop'),
+        ])
+        negotiation_id = self.negotiation_service.create()
+        negotiation = self.negotiation_service.find(negotiation_id)
+
+        new_message = Message(
+            id=uuid.uuid4(),
+            role='user',
+            content='A new message!'
+        )
+
+        events = list(self.llm_service.stream_negotiator_chat_turn(negotiation, new_message))
+
+        self.assertEqual([ChatTurnDelta('Assistant '), ChatTurnDelta('response')], events[:-1])
+        reply = events[-1]
+        self.assertIsInstance(reply, ChatTurnReply)
+        self.assertEqual('Assistant response', reply.content)
+        self.assertTrue(self.mock_call_llm.call_args.kwargs['stream'])
+
+        updated_negotiation = self.negotiation_service.find(negotiation_id)
+        self.assertEqual(3, len(updated_negotiation.messages))
+        self.assertEqual('A new message!', updated_negotiation.messages[1].content)
+        self.assertEqual(reply.id, updated_negotiation.messages[2].id)
+        self.assertEqual('Assistant response', updated_negotiation.messages[2].content)
+
+        self.recording_outbox.drain_once()
+        self.freeplay_mock.recordings.create.assert_called_once()
+
+    def test_stream_resolve_negotiation(self):
+        tool_call_id = "call_" + str(uuid.uuid4())
+        self.mock_call_llm.return_value = iter([
+            self.mock_openai_chunk(ChoiceDelta(role='assistant', tool_calls=[ChoiceDeltaToolCall(
+                index=0, id=tool_call_id, type='function',
+                function=ChoiceDeltaToolCallFunction(name=RESOLVE_NEGOTIATION_TOOL_NAME, arguments='')
+            )])),
+            self.mock_openai_chunk(ChoiceDelta(tool_calls=[ChoiceDeltaToolCall(
+                index=0, function=ChoiceDeltaToolCallFunction(arguments='{"final_price"')
+            )])),
+            self.mock_openai_chunk(ChoiceDelta(tool_calls=[ChoiceDeltaToolCall(
+                index=0, function=ChoiceDeltaToolCallFunction(arguments=': 15000}')
+            )])),
+            self.mock_openai_chunk(ChoiceDelta(), finish_reason='tool_calls'),
+        ])
+        negotiation_id = self.negotiation_service.create()
+        negotiation = self.negotiation_service.find(negotiation_id)
+
+        new_message = Message(
+            id=uuid.uuid4(),
+            role='user',
+            content='Final user message'
+        )
+
+        events = list(self.llm_service.stream_negotiator_chat_turn(negotiation, new_message))
+
+        self.assertEqual([ResolvedNegotiation(final_price=15_000, leaderboard_rank=1, total_negotiations=1)], events)
+
+        updated_negotiation = self.negotiation_service.find(negotiation_id)
+        self.assertEqual(2, len(updated_negotiation.messages))
+        self.assertEqual('Final user message', updated_negotiation.messages[1].content)
+
+    def mock_openai_chunk(self, delta: ChoiceDelta, finish_reason=None):
+        return ChatCompletionChunk(
+            id='chatcmpl-AAVY5zYwj6TXgZwqAwDno6EpuGfzy',
+            choices=[ChunkChoice(delta=delta, finish_reason=finish_reason, index=0, logprobs=None)],
+            created=1727067917,
+            model='gpt-4o-2024-08-06',
+            object='chat.completion.chunk',
+            service_tier=None,
+            system_fingerprint='fp_5050236cbd',
+        )
+
     def mock_openai_tool_call(self, final_price: int):
         return ChatCompletion(
             id='chatcmpl-AAVY5zYwj6TXgZwqAwDno6EpuGfzy',
@@ -1,10 +1,11 @@
 import uuid
-from unittest import TestCase
+from unittest import TestCase, IsolatedAsyncioTestCase
 from uuid import UUID
 
-from negotiator.negotiation.message_repository import MessageRepository, MessageRecord
+from negotiator.negotiation.message_repository import MessageRepository, MessageRecord, AsyncMessageRepository, \
+    NewMessage
 from negotiator.negotiation.negotiation_repository import NegotiationRepository
-from tests.db_test_support import test_db_template
+from tests.db_test_support import test_db_template, test_async_db_template
 
 
 class TestMessageRepository(TestCase):
@@ -35,6 +36,27 @@ class TestMessageRepository(TestCase):
             'content': 'some content'
         }], result)
 
+    def test_create_many(self):
+        negotiation_id = self.negotiation_repository.create()
+
+        message_ids = self.repository.create_many(negotiation_id, [
+            NewMessage(UUID('22222222-7981-4e69-b44e-c21b3f88213b'), 'user', 'user content'),
+            NewMessage(UUID('11111111-7981-4e69-b44e-c21b3f88213b'), 'assistant', 'assistant content'),
+        ])
+
+        result = self.repository.list_for_negotiation(negotiation_id)
+
+        self.assertEqual([
+            UUID('22222222-7981-4e69-b44e-c21b3f88213b'),
+            UUID('11111111-7981-4e69-b44e-c21b3f88213b'),
+        ], message_ids)
+        self.assertEqual(['user content', 'assistant content'], [record.content for record in result])
+
+    def test_create_many__empty(self):
+        negotiation_id = self.negotiation_repository.create()
+
+        self.assertEqual([], self.repository.create_many(negotiation_id, []))
+
     def test_list_for_negotiation(self):
         negotiation_id = self.negotiation_repository.create()
         other_negotiation_id = self.negotiation_repository.create()
@@ -72,32 +94,130 @@ class TestMessageRepository(TestCase):
             content='system content'
         )], result)
 
-    def test_truncate_for_negotiation(self):
+    def test_list_for_negotiation__after_reset(self):
         negotiation_id = self.negotiation_repository.create()
+        first, second = UUID('00000000-7981-4e69-b44e-c21b3f88213b'), UUID('11111111-7981-4e69-b44e-c21b3f88213b')
+        self.repository.create_many(negotiation_id, [
+            NewMessage(first, 'user', 'user content'),
+            NewMessage(second, 'assistant', 'assistant content'),
+        ])
 
-        self.repository.create(
-            id=UUID('00000000-7981-4e69-b44e-c21b3f88213b'),
+        self.negotiation_repository.move_head(negotiation_id, first)
+
+        self.assertEqual([MessageRecord(
+            id=first,
             negotiation_id=negotiation_id,
             role='user',
-            content='user content',
+            content='user content'
+        )], self.repository.list_for_negotiation(negotiation_id))
+        self.assertEqual(2, self.db.query_to_dict('select count(*) from messages')[0]['count'])
+
+    def test_create_many__after_reset(self):
+        negotiation_id = self.negotiation_repository.create()
+        first, second, third = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+        self.repository.create_many(negotiation_id, [
+            NewMessage(first, 'assistant', 'hi'),
+            NewMessage(second, 'user', 'original question'),
+        ])
+        original_branch = self.branch_of(second)
+
+        self.negotiation_repository.move_head(negotiation_id, first)
+        self.repository.create_many(negotiation_id, [NewMessage(third, 'user', 'new question')])
+        new_branch = self.branch_of(third)
+
+        self.assertNotEqual(original_branch, new_branch)
+        self.assertEqual(
+            ['hi', 'new question'],
+            [record.content for record in self.repository.list_for_negotiation(negotiation_id)],
         )
-        self.repository.create(
-            id=UUID('11111111-7981-4e69-b44e-c21b3f88213b'),
-            negotiation_id=negotiation_id,
-            role='assistant',
-            content='assistant content'
+        self.assertEqual(
+            ['hi', 'original question'],
+            [record.content for record in self.repository.list_for_branch(original_branch)],
+        )
+        self.assertEqual(
+            ['hi', 'new question'],
+            [record.content for record in self.repository.list_for_branch(new_branch)],
         )
 
-        self.repository.truncate_for_negotiation(
+    def test_create_many__after_reset_to_last_message(self):
+        negotiation_id = self.negotiation_repository.create()
+        first, second = uuid.uuid4(), uuid.uuid4()
+        self.repository.create(negotiation_id, first, 'assistant', 'hi')
+
+        self.negotiation_repository.move_head(negotiation_id, first)
+        self.repository.create(negotiation_id, second, 'user', 'question')
+
+        self.assertEqual(self.branch_of(first), self.branch_of(second))
+
+    def test_create_many__nested_branches(self):
+        negotiation_id = self.negotiation_repository.create()
+        ids = [uuid.uuid4() for _ in range(6)]
+        self.repository.create_many(negotiation_id, [NewMessage(id, 'user', str(i)) for i, id in enumerate(ids[:3])])
+        self.negotiation_repository.move_head(negotiation_id, ids[1])
+        self.repository.create_many(negotiation_id, [NewMessage(ids[3], 'user', '3'), NewMessage(ids[4], 'user', '4')])
+        self.negotiation_repository.move_head(negotiation_id, ids[3])
+        self.repository.create(negotiation_id, ids[5], 'user', '5')
+
+        self.assertEqual(['0', '1', '3', '5'], [r.content for r in self.repository.list_for_negotiation(negotiation_id)])
+
+        self.negotiation_repository.move_head(negotiation_id, ids[2])
+
+        self.assertEqual(['0', '1', '2'], [r.content for r in self.repository.list_for_negotiation(negotiation_id)])
+
+    def branch_of(self, message_id: UUID) -> UUID:
+        return self.db.query_to_dict('select branch_id from messages where id = :id', id=message_id)[0]['branch_id']
+
+
+class TestAsyncMessageRepository(IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.db = test_db_template()
+        self.db.clear()
+
+        self.negotiation_repository = NegotiationRepository(self.db)
+        self.repository = AsyncMessageRepository(test_async_db_template())
+
+    async def test_create_and_list_for_negotiation(self):
+        negotiation_id = self.negotiation_repository.create()
+
+        message_id = await self.repository.create(
+            id=UUID('11111111-7981-4e69-b44e-c21b3f88213b'),
             negotiation_id=negotiation_id,
-            at_message_id=UUID('00000000-7981-4e69-b44e-c21b3f88213b')
+            role='user',
+            content='some content'
         )
 
-        result = self.repository.list_for_negotiation(negotiation_id)
+        result = await self.repository.list_for_negotiation(negotiation_id)
 
         self.assertEqual([MessageRecord(
-            id=UUID('00000000-7981-4e69-b44e-c21b3f88213b'),
+            id=message_id,
             negotiation_id=negotiation_id,
             role='user',
-            content='user content'
+            content='some content'
         )], result)
+
+    async def test_create_many(self):
+        negotiation_id = self.negotiation_repository.create()
+
+        await self.repository.create_many(negotiation_id, [
+            NewMessage(UUID('22222222-7981-4e69-b44e-c21b3f88213b'), 'user', 'user content'),
+            NewMessage(UUID('11111111-7981-4e69-b44e-c21b3f88213b'), 'assistant', 'assistant content'),
+        ])
+
+        result = await self.repository.list_for_negotiation(negotiation_id)
+
+        self.assertEqual(['user content', 'assistant content'], [record.content for record in result])
+
+    async def test_create_many__after_reset(self):
+        negotiation_id = self.negotiation_repository.create()
+        first = UUID('00000000-7981-4e69-b44e-c21b3f88213b')
+        await self.repository.create_many(negotiation_id, [
+            NewMessage(first, 'user', 'user content'),
+            NewMessage(UUID('11111111-7981-4e69-b44e-c21b3f88213b'), 'assistant', 'assistant content'),
+        ])
+        self.negotiation_repository.move_head(negotiation_id, first)
+
+        await self.repository.create(negotiation_id, uuid.uuid4(), 'assistant', 'another reply')
+
+        result = await self.repository.list_for_negotiation(negotiation_id)
+        self.assertEqual(['user content', 'another reply'], [record.content for record in result])
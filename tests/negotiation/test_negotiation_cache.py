@@ -0,0 +1,297 @@
+import asyncio
+import time
+from typing import cast, Optional
+from unittest import TestCase, IsolatedAsyncioTestCase, mock
+from uuid import UUID
+
+from negotiator.negotiation.message_repository import MessageRepository, AsyncMessageRepository
+from negotiator.negotiation.negotiation_cache import NegotiationCache, CachedNegotiationService, \
+    NegotiationChangeListener, AsyncCachedNegotiationService
+from negotiator.negotiation.negotiation_repository import NegotiationRepository, AsyncNegotiationRepository
+from negotiator.negotiation.negotiation_service import NegotiationService, Negotiation, Message
+from negotiator.negotiation.resolution_repository import ResolutionRepository
+from tests.db_test_support import test_db_template, test_async_db_template
+
+test_database_url = 'postgresql://localhost:5432/negotiator_test?user=negotiator&password=negotiator'
+
+
+class TestNegotiationCache(TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = NegotiationCache(max_entries=2)
+        first = Negotiation(UUID('11111111-0b3f-430e-8b86-884a2c5d9bc9'), [])
+        second = Negotiation(UUID('22222222-0b3f-430e-8b86-884a2c5d9bc9'), [])
+        third = Negotiation(UUID('33333333-0b3f-430e-8b86-884a2c5d9bc9'), [])
+
+        cache.put(first)
+        cache.put(second)
+        cache.get(first.id)
+        cache.put(third)
+
+        self.assertEqual(first, cache.get(first.id))
+        self.assertIsNone(cache.get(second.id))
+        self.assertEqual(third, cache.get(third.id))
+
+    def test_append(self):
+        cache = NegotiationCache()
+        negotiation = Negotiation(UUID('11111111-0b3f-430e-8b86-884a2c5d9bc9'), [])
+        message = Message(UUID('22222222-0b3f-430e-8b86-884a2c5d9bc9'), 'user', 'hello')
+
+        cache.put(negotiation)
+        cache.append(negotiation.id, [message])
+        cache.append(UUID('33333333-0b3f-430e-8b86-884a2c5d9bc9'), [message])
+
+        self.assertEqual(Negotiation(negotiation.id, [message]), cache.get(negotiation.id))
+        self.assertEqual(1, len(cache))
+
+    def test_put__changed_since_read(self):
+        cache = NegotiationCache()
+        negotiation = Negotiation(UUID('11111111-0b3f-430e-8b86-884a2c5d9bc9'), [])
+
+        generation = cache.generation()
+        cache.invalidate(negotiation.id)
+        cache.put(negotiation, generation)
+
+        self.assertIsNone(cache.get(negotiation.id))
+
+        cache.put(negotiation, cache.generation())
+
+        self.assertEqual(negotiation, cache.get(negotiation.id))
+
+    def test_put__other_negotiation_changed_since_read(self):
+        cache = NegotiationCache()
+        negotiation = Negotiation(UUID('11111111-0b3f-430e-8b86-884a2c5d9bc9'), [])
+
+        generation = cache.generation()
+        cache.invalidate(UUID('22222222-0b3f-430e-8b86-884a2c5d9bc9'))
+        cache.put(negotiation, generation)
+
+        self.assertEqual(negotiation, cache.get(negotiation.id))
+
+    def test_put__change_no_longer_tracked(self):
+        cache = NegotiationCache(max_tracked_changes=1)
+        negotiation = Negotiation(UUID('11111111-0b3f-430e-8b86-884a2c5d9bc9'), [])
+
+        generation = cache.generation()
+        cache.invalidate(negotiation.id)
+        cache.invalidate(UUID('22222222-0b3f-430e-8b86-884a2c5d9bc9'))
+        cache.put(negotiation, generation)
+
+        self.assertIsNone(cache.get(negotiation.id))
+
+    def test_suspend(self):
+        cache = NegotiationCache()
+        negotiation = Negotiation(UUID('11111111-0b3f-430e-8b86-884a2c5d9bc9'), [])
+        cache.put(negotiation)
+        generation = cache.generation()
+
+        cache.suspend()
+        cache.put(negotiation)
+
+        self.assertTrue(cache.suspended)
+        self.assertIsNone(cache.get(negotiation.id))
+
+        cache.resume()
+        cache.put(negotiation, generation)
+
+        self.assertIsNone(cache.get(negotiation.id))
+
+        cache.put(negotiation, cache.generation())
+
+        self.assertEqual(negotiation, cache.get(negotiation.id))
+
+
+class TestCachedNegotiationService(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.db = test_db_template()
+        self.db.clear()
+
+        self.cache = NegotiationCache()
+        self.service = CachedNegotiationService(
+            self.db,
+            NegotiationRepository(self.db),
+            MessageRepository(self.db),
+            ResolutionRepository(self.db),
+            self.cache,
+        )
+        self.negotiation_id = cast(UUID, self.service.create())
+
+    def test_find__cached(self):
+        negotiation = self.service.find(self.negotiation_id)
+        self.db.query('delete from messages')
+
+        self.assertEqual(negotiation, self.service.find(self.negotiation_id))
+
+    def test_find__changed_during_read(self):
+        read = NegotiationService.find
+
+        def read_then_change(service: NegotiationService, negotiation_id: UUID) -> Optional[Negotiation]:
+            negotiation = read(service, negotiation_id)
+            self.cache.invalidate(negotiation_id)
+            return negotiation
+
+        with mock.patch.object(NegotiationService, 'find', read_then_change):
+            self.assertIsNotNone(self.service.find(self.negotiation_id))
+
+        self.assertIsNone(self.cache.get(self.negotiation_id))
+
+    def test_add_messages(self):
+        self.service.find(self.negotiation_id)
+        message = Message(UUID('11111111-0b3f-430e-8b86-884a2c5d9bc9'), 'user', 'user content')
+
+        self.service.add_messages(self.negotiation_id, [message])
+
+        cached = cast(Negotiation, self.cache.get(self.negotiation_id))
+        self.assertEqual(message, cached.messages[-1])
+        self.assertEqual(cached, self.service.find(self.negotiation_id))
+
+    def test_add_messages__in_transaction(self):
+        self.service.find(self.negotiation_id)
+        message = Message(UUID('11111111-0b3f-430e-8b86-884a2c5d9bc9'), 'user', 'user content')
+
+        with self.db.transaction() as connection:
+            self.service.add_messages(self.negotiation_id, [message], connection)
+            self.assertEqual(1, len(cast(Negotiation, self.cache.get(self.negotiation_id)).messages))
+
+        self.assertEqual(2, len(cast(Negotiation, self.cache.get(self.negotiation_id)).messages))
+
+    def test_add_messages__rolled_back(self):
+        self.service.find(self.negotiation_id)
+        message = Message(UUID('11111111-0b3f-430e-8b86-884a2c5d9bc9'), 'user', 'user content')
+
+        with self.assertRaises(Exception):
+            with self.db.transaction() as connection:
+                self.service.add_messages(self.negotiation_id, [message], connection)
+                raise Exception('Unable to record')
+
+        self.assertIsNone(self.cache.get(self.negotiation_id))
+        self.assertEqual(1, len(cast(Negotiation, self.service.find(self.negotiation_id)).messages))
+
+    def test_find__suspended(self):
+        self.service.find(self.negotiation_id)
+        self.cache.suspend()
+        self.db.query('delete from messages')
+
+        self.assertEqual([], cast(Negotiation, self.service.find(self.negotiation_id)).messages)
+        self.assertEqual(0, len(self.cache))
+
+    def test_truncate(self):
+        negotiation = cast(Negotiation, self.service.find(self.negotiation_id))
+
+        self.service.truncate(self.negotiation_id, negotiation.messages[0].id)
+
+        self.assertIsNone(self.cache.get(self.negotiation_id))
+
+
+class TestAsyncCachedNegotiationService(IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.db = test_db_template()
+        self.db.clear()
+        async_db = test_async_db_template()
+
+        self.cache = NegotiationCache()
+        self.service = AsyncCachedNegotiationService(
+            async_db,
+            AsyncNegotiationRepository(async_db),
+            AsyncMessageRepository(async_db),
+            self.cache,
+        )
+
+    async def test_find__cached(self):
+        negotiation_id = await self.service.create()
+        negotiation = await self.service.find(negotiation_id)
+        self.db.query('delete from messages')
+
+        self.assertEqual(negotiation, self.cache.get(cast(UUID, negotiation_id)))
+        self.assertEqual(negotiation, await self.service.find(negotiation_id))
+
+    async def test_add_messages(self):
+        negotiation_id = cast(UUID, await self.service.create())
+        await self.service.find(negotiation_id)
+        message = Message(UUID('11111111-0b3f-430e-8b86-884a2c5d9bc9'), 'user', 'user content')
+
+        await self.service.add_messages(negotiation_id, [message])
+
+        cached = cast(Negotiation, self.cache.get(negotiation_id))
+        self.assertEqual(message, cached.messages[-1])
+
+    async def test_truncate(self):
+        negotiation_id = cast(UUID, await self.service.create())
+        negotiation = cast(Negotiation, await self.service.find(negotiation_id))
+
+        await self.service.truncate(negotiation_id, negotiation.messages[0].id)
+
+        self.assertIsNone(self.cache.get(negotiation_id))
+
+
+class TestNegotiationChangeListener(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.db = test_db_template()
+        self.db.clear()
+
+        self.cache = NegotiationCache()
+        self.listener = NegotiationChangeListener(test_database_url, self.cache, poll_interval_seconds=0.1)
+        self.listener.start()
+        self.assertTrue(self.listener.wait_until_listening(5))
+
+    def tearDown(self) -> None:
+        self.listener.stop(5)
+        super().tearDown()
+
+    def test_invalidates_changes_from_other_workers(self):
+        other_cache = NegotiationCache()
+        other_service = CachedNegotiationService(
+            self.db,
+            NegotiationRepository(self.db),
+            MessageRepository(self.db),
+            ResolutionRepository(self.db),
+            other_cache,
+        )
+        negotiation = cast(Negotiation, other_service.find(cast(UUID, other_service.create())))
+        self.cache.put(negotiation)
+
+        other_service.add_messages(negotiation.id, [Message(UUID('11111111-0b3f-430e-8b86-884a2c5d9bc9'), 'user', 'hi')])
+
+        deadline = time.monotonic() + 5
+        while self.cache.get(negotiation.id) is not None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertIsNone(self.cache.get(negotiation.id))
+
+    def test_invalidates_async_resets_from_other_workers(self):
+        async_db = test_async_db_template()
+        other_service = AsyncCachedNegotiationService(
+            async_db,
+            AsyncNegotiationRepository(async_db),
+            AsyncMessageRepository(async_db),
+            NegotiationCache(),
+        )
+
+        async def create_and_reset() -> Negotiation:
+            negotiation = cast(Negotiation, await other_service.find(cast(UUID, await other_service.create())))
+            self.cache.put(negotiation)
+            await other_service.truncate(negotiation.id, negotiation.messages[0].id)
+            return negotiation
+
+        negotiation = asyncio.run(create_and_reset())
+
+        deadline = time.monotonic() + 5
+        while self.cache.get(negotiation.id) is not None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertIsNone(self.cache.get(negotiation.id))
+
+    def test_suspends_cache_when_stopped(self):
+        self.assertFalse(self.cache.suspended)
+
+        self.listener.stop(5)
+
+        self.assertTrue(self.cache.suspended)
+
+    def test_ignores_own_changes(self):
+        negotiation = Negotiation(UUID('11111111-0b3f-430e-8b86-884a2c5d9bc9'), [])
+        self.cache.put(negotiation)
+
+        self.listener.handle(f'{self.cache.source_id}:{negotiation.id}')
+
+        self.assertEqual(negotiation, self.cache.get(negotiation.id))
@@ -7,10 +7,13 @@ from uuid import UUID
 
 import responses
 
+from negotiator.negotiation.llm_service import ChatTurnDelta, ChatTurnReply, ResolvedNegotiation, \
+    unavailable_reply, unavailable_turn_reply
 from negotiator.negotiation.message_repository import MessageRepository
 from negotiator.negotiation.negotiation_repository import NegotiationRepository
 from negotiator.negotiation.negotiation_page import negotiation_page
-from negotiator.negotiation.negotiation_service import NegotiationService, Negotiation
+from negotiator.negotiation.negotiation_service import NegotiationService, Negotiation, NegotiationUnavailable
+from negotiator.negotiation.resolution_repository import ResolutionRepository
 from tests.blueprint_test_support import test_client
 from tests.db_test_support import test_db_template
 
@@ -25,11 +28,18 @@ class TestNegotiationPage(TestCase):
         negotiation_repository = NegotiationRepository(self.db)
         message_repository = MessageRepository(self.db)
 
-        service = NegotiationService(self.db, negotiation_repository, message_repository)
+        service = NegotiationService(
+            self.db, negotiation_repository, message_repository, ResolutionRepository(self.db))
         self.project_id = str(uuid.uuid4())
-        llm_service = mock.Mock()
-
-        llm_service.call_and_record_negotiator_chat_turn.return_value = "I sure will"
+        self.llm_service = llm_service = mock.Mock()
+
+        llm_service.call_and_record_negotiator_chat_turn.return_value = ChatTurnReply(
+            UUID('2c4c4cd8-a1b5-4f62-9d46-d7c4d5bd3b4b'), 'I sure will')
+        llm_service.stream_negotiator_chat_turn.return_value = iter([
+            ChatTurnDelta('I sure'),
+            ChatTurnDelta(' will'),
+            ChatTurnReply(UUID('2c4c4cd8-a1b5-4f62-9d46-d7c4d5bd3b4b'), 'I sure will'),
+        ])
         blueprint = negotiation_page(service, llm_service)
 
         self.test_client = test_client(blueprint)
@@ -71,9 +81,77 @@ class TestNegotiationPage(TestCase):
         )
 
         self.assertEqual(201, response.status_code)
-        self.assertIsNotNone(response.json['id'])
+        self.assertEqual('2c4c4cd8-a1b5-4f62-9d46-d7c4d5bd3b4b', response.json['id'])
         self.assertEqual('assistant', response.json['role'])
         self.assertEqual('I sure will', response.json['content'])
+        self.assertTrue(response.json['resettable'])
+
+    def test_new_message__llm_unavailable(self):
+        self.llm_service.call_and_record_negotiator_chat_turn.return_value = unavailable_turn_reply()
+
+        response = self.test_client.post(
+            f'/negotiation/{self.negotiation_id}/messages',
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps({
+                'content': 'Tell me more',
+                'id': '1914219c-7b81-4ac7-8edc-ee23114ac270',
+            }),
+        )
+
+        self.assertEqual(503, response.status_code)
+        self.assertEqual(unavailable_reply, response.json['content'])
+        self.assertFalse(response.json['resettable'])
+
+    def test_new_message__resolved(self):
+        self.llm_service.call_and_record_negotiator_chat_turn.return_value = ResolvedNegotiation(15_000, 1, 1)
+
+        response = self.test_client.post(
+            f'/negotiation/{self.negotiation_id}/messages',
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps({
+                'content': 'Deal',
+                'id': '1914219c-7b81-4ac7-8edc-ee23114ac270',
+            }),
+        )
+
+        self.assertEqual(201, response.status_code)
+        self.assertEqual(
+            {'final_price': 15_000, 'leaderboard_rank': 1, 'total_negotiations': 1},
+            response.json,
+        )
+
+    def test_new_message__archived(self):
+        self.db.query(
+            "insert into archived_negotiations (id, created_at, messages) values (:id, now(), '[]')",
+            id=UUID('f94a796d-d8a0-4bab-a986-98fce4348e06'),
+        )
+
+        response = self.test_client.post(
+            f'/negotiation/f94a796d-d8a0-4bab-a986-98fce4348e06/messages',
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps({
+                'content': 'Tell me more',
+                'id': '1914219c-7b81-4ac7-8edc-ee23114ac270',
+            }),
+        )
+
+        self.assertEqual(409, response.status_code)
+        self.assertEqual({'error': 'negotiation is archived'}, response.json)
+
+    def test_new_message__archived_during_turn(self):
+        self.llm_service.call_and_record_negotiator_chat_turn.side_effect = NegotiationUnavailable('archived')
+
+        response = self.test_client.post(
+            f'/negotiation/{self.negotiation_id}/messages',
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps({
+                'content': 'Tell me more',
+                'id': '1914219c-7b81-4ac7-8edc-ee23114ac270',
+            }),
+        )
+
+        self.assertEqual(409, response.status_code)
+        self.assertEqual({'error': 'negotiation is archived'}, response.json)
 
     @responses.activate
     def test_new_message__not_found(self):
@@ -89,6 +167,61 @@ class TestNegotiationPage(TestCase):
         self.assertEqual(302, response.status_code)
         self.assertEqual('/', response.headers['Location'])
 
+    def test_stream_message(self):
+        response = self.test_client.post(
+            f'/negotiation/{self.negotiation_id}/messages/stream',
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps({
+                'content': 'Tell me more',
+                'id': '1914219c-7b81-4ac7-8edc-ee23114ac270',
+            }),
+        )
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('text/event-stream', response.mimetype)
+        self.assertEqual(
+            'event: delta\ndata: {"content": "I sure"}\n\n'
+            'event: delta\ndata: {"content": " will"}\n\n'
+            'event: message\ndata: {"id": "2c4c4cd8-a1b5-4f62-9d46-d7c4d5bd3b4b", "role": "assistant", '
+            '"content": "I sure will", "resettable": true}\n\n',
+            response.text
+        )
+
+    def test_stream_message__archived_during_turn(self):
+        def archived_turn(*_):
+            yield ChatTurnDelta('I sure')
+            raise NegotiationUnavailable('archived')
+
+        self.llm_service.stream_negotiator_chat_turn.side_effect = archived_turn
+
+        response = self.test_client.post(
+            f'/negotiation/{self.negotiation_id}/messages/stream',
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps({
+                'content': 'Tell me more',
+                'id': '1914219c-7b81-4ac7-8edc-ee23114ac270',
+            }),
+        )
+
+        self.assertEqual(
+            'event: delta\ndata: {"content": "I sure"}\n\n'
+            'event: error\ndata: {"error": "negotiation is archived"}\n\n',
+            response.text
+        )
+
+    def test_stream_message__not_found(self):
+        response = self.test_client.post(
+            f'/negotiation/f94a796d-d8a0-4bab-a986-98fce4348e06/messages/stream',
+            headers={'Content-Type': 'application/json'},
+            data=json.dumps({
+                'content': 'Tell me more',
+                'id': '1914219c-7b81-4ac7-8edc-ee23114ac270',
+            }),
+        )
+
+        self.assertEqual(302, response.status_code)
+        self.assertEqual('/', response.headers['Location'])
+
     @responses.activate
     def test_reset(self):
         responses.post(
@@ -1,9 +1,11 @@
 from typing import cast
-from unittest import TestCase
+from unittest import TestCase, IsolatedAsyncioTestCase
 from uuid import UUID
 
-from negotiator.negotiation.negotiation_repository import NegotiationRepository, NegotiationRecord
-from tests.db_test_support import test_db_template
+from negotiator.negotiation.message_repository import MessageRepository, NewMessage, MessageRecord
+from negotiator.negotiation.negotiation_repository import NegotiationRepository, NegotiationRecord, \
+    AsyncNegotiationRepository, NegotiationWithMessagesRecord
+from tests.db_test_support import test_db_template, test_async_db_template
 
 
 class TestNegotiationRepository(TestCase):
@@ -39,3 +41,123 @@ class TestNegotiationRepository(TestCase):
         result = self.repository.find(UUID('768081d3-43d8-4280-bde0-5c4c187d3174'))
 
         self.assertIsNone(result)
+
+    def test_find_with_messages(self):
+        negotiation_id = self.repository.create()
+        MessageRepository(self.db).create_many(negotiation_id, [
+            NewMessage(UUID('22222222-7981-4e69-b44e-c21b3f88213b'), 'assistant', 'assistant content'),
+            NewMessage(UUID('11111111-7981-4e69-b44e-c21b3f88213b'), 'user', 'user content'),
+        ])
+
+        result = self.repository.find_with_messages(negotiation_id)
+
+        self.assertEqual(NegotiationWithMessagesRecord(negotiation_id, [
+            MessageRecord(UUID('22222222-7981-4e69-b44e-c21b3f88213b'), negotiation_id, 'assistant', 'assistant content'),
+            MessageRecord(UUID('11111111-7981-4e69-b44e-c21b3f88213b'), negotiation_id, 'user', 'user content'),
+        ]), result)
+
+    def test_find_with_messages__no_messages(self):
+        negotiation_id = self.repository.create()
+
+        result = self.repository.find_with_messages(negotiation_id)
+
+        self.assertEqual(NegotiationWithMessagesRecord(negotiation_id, []), result)
+
+    def test_find_with_messages__archived(self):
+        self.db.query(
+            "insert into archived_negotiations (id, created_at, messages) values (:id, now(), :messages)",
+            id=UUID('768081d3-43d8-4280-bde0-5c4c187d3174'),
+            messages='[{"id": "22222222-7981-4e69-b44e-c21b3f88213b", "role": "assistant", "content": "hi"},'
+                     ' {"id": "11111111-7981-4e69-b44e-c21b3f88213b", "role": "user", "content": "hello"}]',
+        )
+
+        result = self.repository.find_with_messages(UUID('768081d3-43d8-4280-bde0-5c4c187d3174'))
+
+        negotiation_id = UUID('768081d3-43d8-4280-bde0-5c4c187d3174')
+        self.assertEqual(NegotiationWithMessagesRecord(negotiation_id, [
+            MessageRecord(UUID('22222222-7981-4e69-b44e-c21b3f88213b'), negotiation_id, 'assistant', 'hi'),
+            MessageRecord(UUID('11111111-7981-4e69-b44e-c21b3f88213b'), negotiation_id, 'user', 'hello'),
+        ], archived=True), result)
+
+    def test_find_with_messages__not_found(self):
+        result = self.repository.find_with_messages(UUID('768081d3-43d8-4280-bde0-5c4c187d3174'))
+
+        self.assertIsNone(result)
+
+    def test_move_head(self):
+        negotiation_id = self.repository.create()
+        MessageRepository(self.db).create_many(negotiation_id, [
+            NewMessage(UUID('22222222-7981-4e69-b44e-c21b3f88213b'), 'assistant', 'assistant content'),
+            NewMessage(UUID('11111111-7981-4e69-b44e-c21b3f88213b'), 'user', 'user content'),
+        ])
+
+        self.repository.move_head(negotiation_id, UUID('22222222-7981-4e69-b44e-c21b3f88213b'))
+
+        self.assertEqual(NegotiationWithMessagesRecord(negotiation_id, [
+            MessageRecord(UUID('22222222-7981-4e69-b44e-c21b3f88213b'), negotiation_id, 'assistant', 'assistant content'),
+        ]), self.repository.find_with_messages(negotiation_id))
+        self.assertEqual(2, self.db.query_to_dict('select count(*) from messages')[0]['count'])
+
+    def test_move_head__other_negotiation(self):
+        negotiation_id = self.repository.create()
+        other_id = self.repository.create()
+        MessageRepository(self.db).create(other_id, UUID('22222222-7981-4e69-b44e-c21b3f88213b'), 'user', 'other')
+        MessageRepository(self.db).create(negotiation_id, UUID('11111111-7981-4e69-b44e-c21b3f88213b'), 'user', 'mine')
+
+        self.repository.move_head(negotiation_id, UUID('22222222-7981-4e69-b44e-c21b3f88213b'))
+
+        result = cast(NegotiationWithMessagesRecord, self.repository.find_with_messages(negotiation_id))
+        self.assertEqual(['mine'], [message.content for message in result.messages])
+
+
+class TestAsyncNegotiationRepository(IsolatedAsyncioTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.db = test_db_template()
+        self.db.clear()
+
+        self.repository = AsyncNegotiationRepository(test_async_db_template())
+
+    async def test_create(self):
+        returned_id = await self.repository.create()
+
+        result = self.db.query_to_dict("select id from negotiations")
+
+        self.assertIsNotNone(returned_id)
+        self.assertEqual(
+            [{'id': returned_id}],
+            result
+        )
+
+    async def test_find(self):
+        negotiation_id = await self.repository.create()
+
+        result = await self.repository.find(negotiation_id)
+
+        self.assertEqual(NegotiationRecord(negotiation_id), result)
+
+    async def test_find__not_found(self):
+        result = await self.repository.find(UUID('768081d3-43d8-4280-bde0-5c4c187d3174'))
+
+        self.assertIsNone(result)
+
+    async def test_find_with_messages__no_messages(self):
+        negotiation_id = await self.repository.create()
+
+        result = await self.repository.find_with_messages(negotiation_id)
+
+        self.assertEqual(NegotiationWithMessagesRecord(negotiation_id, []), result)
+
+    async def test_move_head(self):
+        negotiation_id = await self.repository.create()
+        MessageRepository(self.db).create_many(negotiation_id, [
+            NewMessage(UUID('22222222-7981-4e69-b44e-c21b3f88213b'), 'assistant', 'assistant content'),
+            NewMessage(UUID('11111111-7981-4e69-b44e-c21b3f88213b'), 'user', 'user content'),
+        ])
+
+        await self.repository.move_head(negotiation_id, UUID('22222222-7981-4e69-b44e-c21b3f88213b'))
+
+        self.assertEqual(NegotiationWithMessagesRecord(negotiation_id, [
+            MessageRecord(UUID('22222222-7981-4e69-b44e-c21b3f88213b'), negotiation_id, 'assistant', 'assistant content'),
+        ]), await self.repository.find_with_messages(negotiation_id))
@@ -1,11 +1,13 @@
 from typing import cast
-from unittest import TestCase
+from unittest import TestCase, IsolatedAsyncioTestCase
 from uuid import UUID
 
-from negotiator.negotiation.message_repository import MessageRepository
-from negotiator.negotiation.negotiation_repository import NegotiationRepository
-from negotiator.negotiation.negotiation_service import NegotiationService, Negotiation, Message
-from tests.db_test_support import test_db_template
+from negotiator.negotiation.message_repository import MessageRepository, AsyncMessageRepository
+from negotiator.negotiation.negotiation_repository import NegotiationRepository, AsyncNegotiationRepository
+from negotiator.negotiation.negotiation_service import NegotiationService, Negotiation, Message, \
+    AsyncNegotiationService, NegotiationUnavailable, Resolution
+from negotiator.negotiation.resolution_repository import ResolutionRepository, LeaderboardRank
+from tests.db_test_support import test_db_template, test_async_db_template
 
 
 class TestNegotiationService(TestCase):
@@ -17,7 +19,8 @@ class TestNegotiationService(TestCase):
         negotiation_repository = NegotiationRepository(self.db)
         message_repository = MessageRepository(self.db)
 
-        self.service = NegotiationService(self.db, negotiation_repository, message_repository)
+        self.service = NegotiationService(
+            self.db, negotiation_repository, message_repository, ResolutionRepository(self.db))
 
     def test_create(self):
         negotiation_id = self.service.create()
@@ -65,3 +68,90 @@ class TestNegotiationService(TestCase):
         self.assertEqual('user content', negotiation.messages[1].content)
         self.assertEqual('assistant', negotiation.messages[2].role)
         self.assertEqual('assistant content', negotiation.messages[2].content)
+
+    def test_add_messages__not_found(self):
+        with self.assertRaises(NegotiationUnavailable):
+            self.service.add_messages(UUID('9ed47ce6-6410-40ce-875a-aaad977259c2'), [
+                Message(UUID('11111111-0b3f-430e-8b86-884a2c5d9bc9'), 'user', 'user content'),
+            ])
+
+        self.assertEqual([], self.db.query_to_dict("select id from messages where role = 'user'"))
+
+    def test_resolve(self):
+        self.service.resolve(self.service.create(), 12_000)
+        negotiation_id = self.service.create()
+
+        resolution = self.service.resolve(negotiation_id, 15_000)
+
+        self.assertEqual(Resolution(15_000, LeaderboardRank(rank=2, total=2)), resolution)
+        self.assertEqual(
+            [{'final_price': 15_000}],
+            self.db.query_to_dict("select final_price from negotiations where id = :id", id=negotiation_id)
+        )
+
+    def test_resolve__already_resolved(self):
+        negotiation_id = self.service.create()
+        self.service.resolve(negotiation_id, 15_000)
+
+        resolution = self.service.resolve(negotiation_id, 12_000)
+
+        self.assertEqual(Resolution(15_000, LeaderboardRank(rank=1, total=1)), resolution)
+
+    def test_resolve__not_found(self):
+        with self.assertRaises(NegotiationUnavailable):
+            self.service.resolve(UUID('9ed47ce6-6410-40ce-875a-aaad977259c2'), 15_000)
+
+
+class TestAsyncNegotiationService(IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        test_db_template().clear()
+        db = test_async_db_template()
+
+        self.service = AsyncNegotiationService(db, AsyncNegotiationRepository(db), AsyncMessageRepository(db))
+
+    async def test_create_and_find(self):
+        negotiation_id = await self.service.create()
+
+        negotiation = cast(Negotiation, await self.service.find(negotiation_id))
+
+        self.assertEqual(negotiation_id, negotiation.id)
+        self.assertEqual(1, len(negotiation.messages))
+        self.assertEqual('assistant', negotiation.messages[0].role)
+
+    async def test_find__not_found(self):
+        result = await self.service.find(UUID('9ed47ce6-6410-40ce-875a-aaad977259c2'))
+
+        self.assertIsNone(result)
+
+    async def test_add_messages(self):
+        negotiation_id = await self.service.create()
+
+        await self.service.add_messages(negotiation_id, [
+            Message(UUID('11111111-0b3f-430e-8b86-884a2c5d9bc9'), 'user', 'user content'),
+            Message(UUID('22222222-0b3f-430e-8b86-884a2c5d9bc9'), 'assistant', 'assistant content'),
+        ])
+
+        negotiation = cast(Negotiation, await self.service.find(negotiation_id))
+
+        self.assertEqual(3, len(negotiation.messages))
+        self.assertEqual('user content', negotiation.messages[1].content)
+        self.assertEqual('assistant content', negotiation.messages[2].content)
+
+    async def test_add_messages__not_found(self):
+        with self.assertRaises(NegotiationUnavailable):
+            await self.service.add_messages(UUID('9ed47ce6-6410-40ce-875a-aaad977259c2'), [
+                Message(UUID('11111111-0b3f-430e-8b86-884a2c5d9bc9'), 'user', 'user content'),
+            ])
+
+    async def test_truncate(self):
+        negotiation_id = await self.service.create()
+        negotiation = cast(Negotiation, await self.service.find(negotiation_id))
+        await self.service.add_messages(negotiation_id, [
+            Message(UUID('11111111-0b3f-430e-8b86-884a2c5d9bc9'), 'user', 'user content'),
+        ])
+
+        await self.service.truncate(negotiation_id, negotiation.messages[0].id)
+
+        truncated = cast(Negotiation, await self.service.find(negotiation_id))
+        self.assertEqual(1, len(truncated.messages))
@@ -0,0 +1,190 @@
+import datetime
+import time
+import uuid
+from typing import cast
+from unittest import TestCase
+from uuid import UUID
+
+from sqlalchemy.exc import OperationalError
+
+from negotiator.negotiation.branch_repository import BranchRepository
+from negotiator.negotiation.message_repository import MessageRepository, NewMessage
+from negotiator.negotiation.negotiation_cache import NegotiationCache, NegotiationChangeListener
+from negotiator.negotiation.negotiation_repository import NegotiationRepository, NegotiationWithMessagesRecord
+from negotiator.negotiation.negotiation_service import NegotiationService, Negotiation, Message, \
+    NegotiationUnavailable
+from negotiator.negotiation.partition_maintenance import PartitionMaintenance, add_months
+from negotiator.negotiation.resolution_repository import ResolutionRepository
+from negotiator.negotiation.summary_repository import SummaryRepository, SummaryRecord
+from tests.db_test_support import test_db_template
+from tests.negotiation.test_negotiation_cache import test_database_url
+
+
+class TestPartitionMaintenance(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.db = test_db_template()
+        self.db.clear()
+
+        self.today = datetime.date.today()
+        self.current_month = self.today.replace(day=1)
+        self.old_month = add_months(self.current_month, -24)
+        self.negotiation_repository = NegotiationRepository(self.db)
+        self.message_repository = MessageRepository(self.db)
+        self.maintenance = PartitionMaintenance(self.db)
+
+        self.maintenance.create_partitions(self.old_month)
+        self.negotiation_id = UUID('11111111-0b3f-430e-8b86-884a2c5d9bc9')
+        self.db.query(
+            'insert into negotiations (id, created_at, final_price, resolved_at) '
+            'values (:id, :created_at, 14000, :created_at)',
+            id=self.negotiation_id,
+            created_at=datetime.datetime.combine(self.old_month, datetime.time(12)),
+        )
+        self.message_ids = [uuid.uuid4() for _ in range(3)]
+        self.message_repository.create_many(self.negotiation_id, [
+            NewMessage(self.message_ids[0], 'assistant', 'hi'),
+            NewMessage(self.message_ids[1], 'user', 'abandoned offer'),
+        ])
+        self.negotiation_repository.move_head(self.negotiation_id, self.message_ids[0])
+        self.message_repository.create(self.negotiation_id, self.message_ids[2], 'user', 'How about 14,000?')
+        SummaryRepository(self.db).save(SummaryRecord(self.negotiation_id, 'a summary', self.message_ids[0]))
+
+    def tearDown(self) -> None:
+        for month in self.maintenance.partitions():
+            if month < self.current_month or month > add_months(self.current_month, 3):
+                self.maintenance.drop(month)
+        super().tearDown()
+
+    def test_run__archives_old_months(self):
+        report = self.maintenance.run(self.today)
+
+        self.assertEqual({self.old_month: 1}, report.archived)
+        self.assertNotIn(self.old_month, self.maintenance.partitions())
+        self.assertEqual(
+            [{'count': 0}],
+            self.db.query_to_dict('select count(*) from messages where negotiation_id = :id', id=self.negotiation_id),
+        )
+        negotiation = cast(
+            NegotiationWithMessagesRecord, self.negotiation_repository.find_with_messages(self.negotiation_id))
+        self.assertTrue(negotiation.archived)
+        self.assertEqual(['hi', 'How about 14,000?'], [message.content for message in negotiation.messages])
+        self.assertEqual([self.message_ids[0], self.message_ids[2]], [message.id for message in negotiation.messages])
+
+    def test_archive__keeps_abandoned_branches(self):
+        self.maintenance.archive(self.old_month)
+
+        root, fork = BranchRepository(self.db).list_for_negotiation(self.negotiation_id)
+        self.assertEqual((None, False, 2), (root.parent_branch_id, root.head, root.message_count))
+        self.assertEqual((root.id, self.message_ids[0], True, 1),
+                         (fork.parent_branch_id, fork.fork_message_id, fork.head, fork.message_count))
+        self.assertEqual(
+            ['hi', 'abandoned offer'],
+            [message.content for message in self.message_repository.list_for_branch(root.id)],
+        )
+        self.assertEqual(
+            [self.message_ids[0], self.message_ids[2]],
+            [message.id for message in self.message_repository.list_for_branch(fork.id)],
+        )
+
+    def test_archive__invalidates_caches(self):
+        cache = NegotiationCache()
+        listener = NegotiationChangeListener(test_database_url, cache, poll_interval_seconds=0.1)
+        listener.start()
+        try:
+            self.assertTrue(listener.wait_until_listening(5))
+            cache.put(Negotiation(self.negotiation_id, []))
+
+            self.maintenance.archive(self.old_month)
+
+            deadline = time.monotonic() + 5
+            while cache.get(self.negotiation_id) is not None and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertIsNone(cache.get(self.negotiation_id))
+        finally:
+            listener.stop(5)
+
+    def test_archive__rejects_late_messages(self):
+        self.maintenance.archive(self.old_month)
+
+        with self.assertRaises(NegotiationUnavailable):
+            NegotiationService(
+                self.db, self.negotiation_repository, self.message_repository, ResolutionRepository(self.db)
+            ).add_messages(self.negotiation_id, [Message(uuid.uuid4(), 'user', 'Still there?')])
+
+    def test_archive__gives_up_while_the_month_is_written(self):
+        late_message_id = uuid.uuid4()
+        with self.db.transaction() as connection:
+            self.message_repository.create(
+                self.negotiation_id, late_message_id, 'assistant', 'How about 15,000?', connection)
+
+            with self.assertRaises(OperationalError):
+                self.maintenance.archive(self.old_month)
+
+        self.assertEqual(1, self.maintenance.archive(self.old_month))
+        archived = self.db.query_to_dict('select messages from archived_negotiations')
+        self.assertEqual('How about 15,000?', archived[0]['messages'][-1]['content'])
+
+    def test_run__keeps_recent_months(self):
+        report = PartitionMaintenance(self.db, archive_after_months=36).run(self.today)
+
+        self.assertEqual({}, report.archived)
+        self.assertIn(self.old_month, self.maintenance.partitions())
+        negotiation = cast(
+            NegotiationWithMessagesRecord, self.negotiation_repository.find_with_messages(self.negotiation_id))
+        self.assertFalse(negotiation.archived)
+
+    def test_run__creates_partitions_ahead(self):
+        report = PartitionMaintenance(self.db, months_ahead=5).run(self.today)
+
+        self.assertIn(add_months(self.current_month, 5), report.created)
+        self.assertIn(add_months(self.current_month, 5), self.maintenance.partitions())
+
+    def test_run__retention(self):
+        self.db.query(
+            "insert into archived_negotiations (id, created_at, messages) values (:id, :created_at, '[]')",
+            id=UUID('22222222-0b3f-430e-8b86-884a2c5d9bc9'),
+            created_at=datetime.datetime.combine(add_months(self.current_month, -13), datetime.time()),
+        )
+        self.db.query(
+            "insert into archived_negotiations (id, created_at, messages) values (:id, :created_at, '[]')",
+            id=UUID('33333333-0b3f-430e-8b86-884a2c5d9bc9'),
+            created_at=datetime.datetime.combine(add_months(self.current_month, -11), datetime.time()),
+        )
+
+        report = PartitionMaintenance(self.db, retention_months=12).run(self.today)
+
+        self.assertEqual([self.old_month], report.dropped)
+        self.assertEqual({}, report.archived)
+        self.assertEqual(1, report.expired)
+        self.assertIsNone(self.negotiation_repository.find_with_messages(self.negotiation_id))
+        self.assertEqual(
+            [{'id': UUID('33333333-0b3f-430e-8b86-884a2c5d9bc9')}],
+            self.db.query_to_dict('select id from archived_negotiations'),
+        )
+
+    def test_run__retention_leaves_leaderboard(self):
+        self.db.query("insert into final_price_counts (final_price, negotiations) values (14000, 2), (15000, 1)")
+        self.db.query(
+            "insert into archived_negotiations (id, created_at, final_price, messages) "
+            "values (:id, :created_at, 15000, '[]')",
+            id=UUID('22222222-0b3f-430e-8b86-884a2c5d9bc9'),
+            created_at=datetime.datetime.combine(add_months(self.current_month, -13), datetime.time()),
+        )
+
+        PartitionMaintenance(self.db, retention_months=12).run(self.today)
+
+        self.assertEqual(
+            [{'final_price': 14000, 'negotiations': 1}, {'final_price': 15000, 'negotiations': 0}],
+            self.db.query_to_dict('select final_price, negotiations from final_price_counts order by final_price'),
+        )
+
+    def test_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            PartitionMaintenance(self.db, archive_after_months=0)
+        with self.assertRaises(ValueError):
+            PartitionMaintenance(self.db, retention_months=-1)
+
+    def test_add_months(self):
+        self.assertEqual(datetime.date(2027, 2, 1), add_months(datetime.date(2026, 11, 1), 3))
+        self.assertEqual(datetime.date(2025, 12, 1), add_months(datetime.date(2026, 1, 1), -1))
@@ -0,0 +1,92 @@
+import uuid
+from unittest import TestCase, mock
+
+from freeplay.llm_parameters import LLMParameters
+from freeplay.resources.prompts import PromptInfo, TemplatePrompt
+
+from negotiator.negotiation.prompt_template_cache import PromptTemplateCache
+
+
+class TestPromptTemplateCache(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.now = 0.0
+        self.freeplay_mock = mock.Mock()
+        self.freeplay_mock.prompts.get.return_value = self.template('version-1', 'You sell cars')
+        self.cache = PromptTemplateCache(
+            self.freeplay_mock,
+            ttl_seconds=60,
+            clock=lambda: self.now,
+            refresh_in_background=False,
+        )
+
+    def test_get_formatted(self):
+        prompt = self.cache.get_formatted('project-id', 'negotiator', 'latest', {}, [
+            {'role': 'user', 'content': 'Hello'},
+        ])
+
+        self.assertEqual([
+            {'role': 'system', 'content': 'You sell cars'},
+            {'role': 'user', 'content': 'Hello'},
+        ], prompt.llm_prompt)
+        self.freeplay_mock.prompts.get.assert_called_once_with('project-id', 'negotiator', 'latest')
+
+    def test_get__cached(self):
+        self.cache.get('project-id', 'negotiator', 'latest')
+        self.now = 59
+        self.cache.get('project-id', 'negotiator', 'latest')
+
+        self.assertEqual(1, self.freeplay_mock.prompts.get.call_count)
+
+    def test_get__per_environment(self):
+        self.cache.get('project-id', 'negotiator', 'latest')
+        self.cache.get('project-id', 'negotiator', 'prod')
+
+        self.assertEqual(2, self.freeplay_mock.prompts.get.call_count)
+
+    def test_get__expired(self):
+        self.cache.get('project-id', 'negotiator', 'latest')
+        self.freeplay_mock.prompts.get.return_value = self.template('version-2', 'You sell trucks')
+        self.now = 60
+
+        stale = self.cache.get('project-id', 'negotiator', 'latest')
+        refreshed = self.cache.get('project-id', 'negotiator', 'latest')
+
+        self.assertEqual('version-1', stale.prompt_info.prompt_template_version_id)
+        self.assertEqual('version-2', refreshed.prompt_info.prompt_template_version_id)
+
+    def test_get__same_version(self):
+        original = self.cache.get('project-id', 'negotiator', 'latest')
+        self.freeplay_mock.prompts.get.return_value = self.template('version-1', 'You sell cars')
+        self.now = 60
+
+        self.cache.get('project-id', 'negotiator', 'latest')
+
+        self.assertIs(original, self.cache.get('project-id', 'negotiator', 'latest'))
+
+    def test_get__stale_on_error(self):
+        self.cache.get('project-id', 'negotiator', 'latest')
+        self.freeplay_mock.prompts.get.side_effect = Exception('Freeplay is down')
+        self.now = 60
+
+        template = self.cache.get('project-id', 'negotiator', 'latest')
+
+        self.assertEqual('version-1', template.prompt_info.prompt_template_version_id)
+        self.assertEqual(2, self.freeplay_mock.prompts.get.call_count)
+
+    def template(self, version_id: str, system_content: str) -> TemplatePrompt:
+        return TemplatePrompt(
+            prompt_info=PromptInfo(
+                str(uuid.uuid4()),
+                version_id,
+                'negotiator',
+                'latest',
+                model_parameters=LLMParameters({}),
+                provider_info=None,
+                provider='openai',
+                model='gpt-4o',
+                flavor_name='openai_chat',
+                project_id='project-id'
+            ),
+            messages=[{'role': 'system', 'content': system_content}, {'kind': 'history'}]
+        )
@@ -0,0 +1,92 @@
+from unittest import TestCase
+
+from negotiator.negotiation.negotiation_repository import NegotiationRepository
+from negotiator.negotiation.resolution_repository import ResolutionRepository, LeaderboardRank, ResolutionRecord
+from tests.db_test_support import test_db_template
+
+
+class TestResolutionRepository(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.db = test_db_template()
+        self.db.clear()
+
+        self.negotiation_repository = NegotiationRepository(self.db)
+        self.repository = ResolutionRepository(self.db)
+
+    def test_create(self):
+        negotiation_id = self.negotiation_repository.create()
+
+        created = self.repository.create(negotiation_id, 15_000)
+
+        self.assertTrue(created)
+        self.assertEqual(
+            [{'final_price': 15_000}],
+            self.db.query_to_dict("select final_price from negotiations where resolved_at is not null")
+        )
+        self.assertEqual(
+            [{'final_price': 15_000, 'negotiations': 1}],
+            self.db.query_to_dict("select final_price, negotiations from final_price_counts")
+        )
+
+    def test_create__already_resolved(self):
+        negotiation_id = self.negotiation_repository.create()
+        self.repository.create(negotiation_id, 15_000)
+
+        created = self.repository.create(negotiation_id, 12_000)
+
+        self.assertFalse(created)
+        self.assertEqual(
+            [{'final_price': 15_000, 'negotiations': 1}],
+            self.db.query_to_dict("select final_price, negotiations from final_price_counts")
+        )
+
+    def test_final_price(self):
+        negotiation_id = self.negotiation_repository.create()
+        self.assertIsNone(self.repository.final_price(negotiation_id))
+
+        self.repository.create(negotiation_id, 15_000)
+
+        self.assertEqual(15_000, self.repository.final_price(negotiation_id))
+
+    def test_rank(self):
+        for final_price in [12_000, 15_000, 15_000, 18_000]:
+            self.repository.create(self.negotiation_repository.create(), final_price)
+
+        self.assertEqual(LeaderboardRank(rank=1, total=4), self.repository.rank(12_000))
+        self.assertEqual(LeaderboardRank(rank=2, total=4), self.repository.rank(15_000))
+        self.assertEqual(LeaderboardRank(rank=4, total=4), self.repository.rank(18_000))
+
+    def test_rank__across_buckets(self):
+        for final_price in [11_999, 12_000, 12_500, 12_999, 13_000]:
+            self.repository.create(self.negotiation_repository.create(), final_price)
+
+        self.assertEqual(LeaderboardRank(rank=1, total=5), self.repository.rank(11_999))
+        self.assertEqual(LeaderboardRank(rank=2, total=5), self.repository.rank(12_000))
+        self.assertEqual(LeaderboardRank(rank=4, total=5), self.repository.rank(12_999))
+        self.assertEqual(LeaderboardRank(rank=5, total=5), self.repository.rank(13_000))
+        self.assertEqual(
+            [{'bucket': 11_000, 'negotiations': 1}, {'bucket': 12_000, 'negotiations': 3},
+             {'bucket': 13_000, 'negotiations': 1}],
+            self.db.query_to_dict('select bucket, negotiations from final_price_buckets order by bucket'),
+        )
+
+    def test_rank__empty(self):
+        self.assertEqual(LeaderboardRank(rank=1, total=0), self.repository.rank(15_000))
+
+    def test_top(self):
+        first = self.negotiation_repository.create()
+        second = self.negotiation_repository.create()
+        third = self.negotiation_repository.create()
+        self.negotiation_repository.create()
+        self.repository.create(first, 15_000)
+        self.repository.create(second, 12_000)
+        self.repository.create(third, 15_000)
+
+        result = self.repository.top(2)
+
+        self.assertEqual([
+            ResolutionRecord(second, 12_000, 1),
+            ResolutionRecord(first, 15_000, 2),
+        ], result)
@@ -0,0 +1,77 @@
+from unittest import TestCase
+
+from prometheus_client import REGISTRY
+
+from negotiator.negotiation.response_cache import ResponseCache, ResponseCacheStats
+
+
+class TestResponseCache(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.now = 0.0
+        self.cache: ResponseCache[str] = ResponseCache(max_entries=2, ttl_seconds=60, clock=lambda: self.now)
+
+    def test_key(self):
+        key = self.cache.key({'model': 'gpt-4o', 'messages': [{'role': 'user', 'content': 'hi'}], 'temperature': 0})
+
+        self.assertIsNotNone(key)
+        self.assertEqual(key, self.cache.key(
+            {'temperature': 0, 'messages': [{'role': 'user', 'content': 'hi'}], 'model': 'gpt-4o', 'stream': True}))
+        self.assertNotEqual(key, self.cache.key(
+            {'model': 'gpt-4o', 'messages': [{'role': 'user', 'content': 'hello'}], 'temperature': 0}))
+
+    def test_key__sampled(self):
+        self.assertIsNone(self.cache.key({'model': 'gpt-4o', 'temperature': 0.7}))
+        self.assertIsNone(self.cache.key({'model': 'gpt-4o'}))
+        self.assertIsNotNone(ResponseCache(cache_all_temperatures=True).key({'model': 'gpt-4o'}))
+
+    def test_key__disabled(self):
+        self.assertIsNone(ResponseCache(max_entries=0).key({'model': 'gpt-4o', 'temperature': 0}))
+
+    def test_get_and_put(self):
+        self.cache.put('first', 'first response')
+        self.cache.put('second', 'second response')
+        self.cache.get('first')
+        self.cache.put('third', 'third response')
+
+        self.assertEqual('first response', self.cache.get('first'))
+        self.assertIsNone(self.cache.get('second'))
+        self.assertEqual(ResponseCacheStats(hits=2, misses=1, size=2), self.cache.stats())
+
+    def test_get__expired(self):
+        self.cache.put('first', 'first response')
+        self.now = 60
+
+        self.assertIsNone(self.cache.get('first'))
+        self.assertEqual(0, self.cache.stats().size)
+
+    def test_hit_rate(self):
+        self.assertEqual(0.25, ResponseCacheStats(hits=1, misses=3).hit_rate)
+
+    def test_metrics(self):
+        before = self.__samples()
+
+        self.cache.put('first', 'first response')
+        self.cache.put('second', 'second response')
+        self.cache.put('third', 'third response')
+        self.cache.get('third')
+        self.cache.get('first')
+        self.now = 60
+        self.cache.get('third')
+
+        after = self.__samples()
+        self.assertEqual(
+            {'hits': 1, 'misses': 2, 'entries': 1},
+            {name: after[name] - before[name] for name in after},
+        )
+
+    @staticmethod
+    def __samples() -> dict[str, float]:
+        return {
+            name: REGISTRY.get_sample_value(metric) or 0.0
+            for name, metric in [
+                ('hits', 'negotiator_response_cache_hits_total'),
+                ('misses', 'negotiator_response_cache_misses_total'),
+                ('entries', 'negotiator_response_cache_entries'),
+            ]
+        }
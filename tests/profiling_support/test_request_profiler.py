@@ -0,0 +1,97 @@
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+from unittest import TestCase
+
+from flask import Blueprint, Flask, Response, stream_with_context
+
+from negotiator.profiling_support.request_profiler import request_profiler, ProfileSettings
+
+
+def slow_api() -> Blueprint:
+    api = Blueprint('slow_api', __name__)
+
+    @api.get('/slow')
+    def slow() -> str:
+        time.sleep(0.02)
+        return 'done'
+
+    @api.get('/slow/stream')
+    def slow_stream() -> Response:
+        def events():
+            yield 'first\n'
+            time.sleep(0.02)
+            yield 'second\n'
+
+        return Response(stream_with_context(events()))
+
+    return api
+
+
+class TestRequestProfiler(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def client(self, sample=random.random, **settings):
+        app = Flask(__name__)
+        app.register_blueprint(request_profiler(
+            ProfileSettings(directory=self.directory.name, interval_seconds=0.001, **settings), sample))
+        app.register_blueprint(slow_api())
+        return app.test_client()
+
+    def profiles(self) -> list[Path]:
+        return sorted(Path(self.directory.name).iterdir())
+
+    def test_token(self):
+        client = self.client(token='some-token')
+
+        client.get('/slow').close()
+        client.get('/slow', headers={'X-Profile-Token': 'wrong-token'}).close()
+        self.assertEqual([], self.profiles())
+
+        response = client.get('/slow', headers={'X-Profile-Token': 'some-token'})
+        response.close()
+
+        self.assertEqual('done', response.text)
+        [path] = self.profiles()
+        self.assertEqual(f'{response.headers["X-Profile-File"]}.speedscope.json', path.name)
+        self.assertIn('GET-slow', path.name)
+        document = json.loads(path.read_text())
+        self.assertEqual('GET /slow', document['name'])
+        wall = document['profiles'][0]
+        self.assertGreater(wall['endValue'], 10)
+        names = {frame['name'] for frame in document['shared']['frames']}
+        self.assertIn('slow_api.<locals>.slow', names)
+
+    def test_sample_rate(self):
+        client = self.client(sample=iter([0.4, 0.6]).__next__, sample_rate=0.5)
+
+        client.get('/slow').close()
+        client.get('/slow').close()
+
+        self.assertEqual(1, len(self.profiles()))
+
+    def test_stream(self):
+        client = self.client(token='some-token', format='collapsed')
+
+        response = client.get('/slow/stream', headers={'X-Profile-Token': 'some-token'})
+        self.assertEqual('first\nsecond\n', response.text)
+        response.close()
+
+        wall, cpu = sorted(self.profiles(), key=lambda path: path.name, reverse=True)
+        self.assertTrue(wall.name.endswith('.wall.collapsed'))
+        self.assertTrue(cpu.name.endswith('.cpu.collapsed'))
+        self.assertIn('slow_api.<locals>.slow_stream.<locals>.events', wall.read_text())
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            request_profiler(ProfileSettings(token='some-token', format='pstats'))
+
+    def test_enabled(self):
+        self.assertFalse(ProfileSettings().enabled)
+        self.assertTrue(ProfileSettings(token='some-token').enabled)
+        self.assertTrue(ProfileSettings(sample_rate=0.01).enabled)
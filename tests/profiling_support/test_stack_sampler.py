@@ -0,0 +1,136 @@
+import threading
+import time
+from unittest import TestCase, skipUnless
+
+from negotiator.profiling_support.stack_sampler import StackSampler, Profile, StackFrame
+
+
+def spin(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def wait(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+def functions(weights: dict) -> dict:
+    totals: dict = {}
+    for stack, seconds in weights.items():
+        for name in {frame.name for frame in stack}:
+            totals[name] = totals.get(name, 0.0) + seconds
+    return totals
+
+
+class Ticks:
+    def __init__(self, *values: float) -> None:
+        self.__values = iter(values)
+
+    def __call__(self) -> float:
+        return next(self.__values)
+
+
+class TestStackSampler(TestCase):
+    def test_sample(self):
+        main = StackFrame('main', 'app.py', 1)
+        query = StackFrame('query', 'db.py', 10)
+        encode = StackFrame('encode', 'json.py', 20)
+        stacks = iter([(main, query), (main, encode), (main, query), None])
+        sampler = StackSampler(
+            'some request',
+            0.001,
+            lambda: next(stacks),
+            cpu_clock=Ticks(1.000, 1.001, 1.011, 1.011),
+            wall_clock=Ticks(5.000, 5.030, 5.040, 5.060),
+        )
+
+        self.assertTrue(sampler.sample())
+        self.assertTrue(sampler.sample())
+        self.assertTrue(sampler.sample())
+        self.assertFalse(sampler.sample())
+        profile = sampler.stop()
+
+        self.assertEqual([(main, query), (main, encode)], list(profile.wall_seconds))
+        self.assertAlmostEqual(0.050, profile.wall_seconds[(main, query)])
+        self.assertAlmostEqual(0.010, profile.wall_seconds[(main, encode)])
+        self.assertAlmostEqual(0.001, profile.cpu_seconds[(main, query)])
+        self.assertAlmostEqual(0.010, profile.cpu_seconds[(main, encode)])
+
+    def test_sample__no_cpu_clock(self):
+        main = StackFrame('main', 'app.py', 1)
+        sampler = StackSampler('some request', 0.001, lambda: (main,), cpu_clock=None, wall_clock=Ticks(0.0, 0.5))
+
+        sampler.sample()
+        profile = sampler.stop()
+
+        self.assertFalse(profile.cpu_available)
+        self.assertEqual({(main,): 0.5}, profile.wall_seconds)
+        self.assertEqual({}, profile.cpu_seconds)
+
+    @skipUnless(hasattr(time, 'pthread_getcpuclockid'), 'needs per-thread CPU clocks')
+    def test_sample__current_thread(self):
+        sampler = StackSampler.for_current_thread('some request', 0.001).start()
+        spin(0.1)
+        wait(0.1)
+        profile = sampler.stop()
+
+        wall = functions(profile.wall_seconds)
+        self.assertIn('spin', wall)
+        self.assertIn('wait', wall)
+        self.assertIn('TestStackSampler.test_sample__current_thread', wall)
+
+        cpu = functions(profile.cpu_seconds)
+        self.assertGreater(cpu['spin'], cpu.get('wait', 0.0))
+
+    def test_sample__thread_exits(self):
+        thread = threading.Thread(target=wait, args=(0.05,))
+        thread.start()
+        assert thread.ident is not None
+        sampler = StackSampler.for_thread('some thread', thread.ident, 0.001).start()
+        thread.join()
+        time.sleep(0.01)
+
+        profile = sampler.stop()
+
+        self.assertIn('wait', functions(profile.wall_seconds))
+
+
+class TestProfile(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        main = StackFrame('main', 'app.py', 1)
+        query = StackFrame('query', 'db.py', 10)
+        encode = StackFrame('encode', 'json.py', 20)
+        self.profile = Profile('GET /negotiation')
+        self.profile.add((main, query), 0.030, 0.002)
+        self.profile.add((main, encode), 0.010, 0.010)
+        self.profile.add((main, query), 0.020, 0.0)
+
+    def test_totals(self):
+        self.assertAlmostEqual(0.060, self.profile.total_wall_seconds)
+        self.assertAlmostEqual(0.012, self.profile.total_cpu_seconds)
+
+    def test_speedscope(self):
+        document = self.profile.speedscope()
+
+        frames = [frame['name'] for frame in document['shared']['frames']]
+        self.assertEqual(['main', 'query', 'encode'], frames)
+        wall, cpu = document['profiles']
+        self.assertEqual('GET /negotiation wall clock', wall['name'])
+        self.assertEqual([[0, 1], [0, 2]], wall['samples'])
+        self.assertEqual([50, 10], [round(weight) for weight in wall['weights']])
+        self.assertEqual('GET /negotiation CPU', cpu['name'])
+        self.assertEqual([2, 10], [round(weight) for weight in cpu['weights']])
+
+    def test_speedscope__no_cpu_clock(self):
+        self.profile.cpu_available = False
+
+        self.assertEqual(1, len(self.profile.speedscope()['profiles']))
+
+    def test_collapsed(self):
+        self.assertEqual(
+            'main (app.py:1);query (db.py:10) 2000\n'
+            'main (app.py:1);encode (json.py:20) 10000\n',
+            Profile.collapsed(self.profile.cpu_seconds),
+        )
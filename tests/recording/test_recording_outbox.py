@@ -0,0 +1,171 @@
+import uuid
+from unittest import TestCase, mock
+
+from negotiator.recording.recording_outbox import RecordingOutbox, FreeplayRecording
+from negotiator.recording.recording_repository import RecordingRepository
+from tests.db_test_support import test_db_template
+
+
+class TestRecordingOutbox(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.db = test_db_template()
+        self.db.clear()
+
+        self.freeplay_mock = mock.Mock()
+        self.outbox = RecordingOutbox(
+            RecordingRepository(self.db),
+            self.freeplay_mock,
+            queue_size=1,
+            lease_seconds=0,
+            base_backoff_seconds=0,
+        )
+
+    def test_drain_once__queued(self):
+        self.outbox.enqueue(self.outbox.add(self.recording('queued reply')))
+
+        delivered = self.outbox.drain_once()
+
+        self.assertEqual(1, delivered)
+        payload = self.freeplay_mock.recordings.create.call_args.args[0]
+        self.assertEqual('queued reply', payload.all_messages[-1]['content'])
+        self.assertEqual('gpt-4o', payload.call_info.model)
+        self.freeplay_mock.sessions.restore_session.return_value.restore_trace.return_value \
+            .record_output.assert_called_once_with('project-id', 'queued reply')
+        self.assertEqual([], self.db.query_to_dict("select id from freeplay_recordings"))
+
+    def test_drain_once__from_table(self):
+        self.outbox.add(self.recording('unqueued reply'))
+
+        delivered = self.outbox.drain_once()
+
+        self.assertEqual(1, delivered)
+        self.assertEqual([], self.db.query_to_dict("select id from freeplay_recordings"))
+
+    def test_drain_once__queue_full(self):
+        self.outbox.enqueue(self.outbox.add(self.recording('first reply')))
+        self.outbox.enqueue(self.outbox.add(self.recording('second reply')))
+
+        self.assertEqual(1, self.outbox.drain_once())
+        self.assertEqual(1, self.outbox.drain_once())
+        self.assertEqual(2, self.freeplay_mock.recordings.create.call_count)
+
+    def test_drain_once__failure(self):
+        self.freeplay_mock.recordings.create.side_effect = Exception('Freeplay is down')
+        self.outbox.enqueue(self.outbox.add(self.recording('failing reply')))
+
+        delivered = self.outbox.drain_once()
+
+        self.assertEqual(0, delivered)
+        self.assertEqual(
+            [{'attempts': 1}],
+            self.db.query_to_dict("select attempts from freeplay_recordings")
+        )
+
+        self.freeplay_mock.recordings.create.side_effect = None
+        self.assertEqual(1, self.outbox.drain_once())
+
+    def test_drain_once__claimed_while_queued(self):
+        self.outbox.enqueue(self.outbox.add(self.recording('queued reply')))
+        RecordingRepository(self.db).claim_due(limit=10, max_attempts=10, lease_seconds=60)
+
+        delivered = self.outbox.drain_once()
+
+        self.assertEqual(0, delivered)
+        self.freeplay_mock.recordings.create.assert_not_called()
+
+    def test_drain_once__queued_keeps_attempts(self):
+        outbox = RecordingOutbox(RecordingRepository(self.db), self.freeplay_mock, base_backoff_seconds=1)
+        self.freeplay_mock.recordings.create.side_effect = Exception('Freeplay is down')
+        entry = outbox.add(self.recording('failing reply'))
+        self.db.query("update freeplay_recordings set attempts = 2 where id = :id", id=entry.id)
+        outbox.enqueue(entry)
+
+        with mock.patch('negotiator.recording.recording_outbox.random.uniform', return_value=0) as uniform:
+            outbox.drain_once()
+
+        uniform.assert_called_once_with(2, 4)
+        self.assertEqual(
+            [{'attempts': 3}],
+            self.db.query_to_dict("select attempts from freeplay_recordings")
+        )
+
+    def test_drain_once__batch(self):
+        for reply in ['first reply', 'second reply', 'third reply']:
+            self.outbox.add(self.recording(reply))
+        self.freeplay_mock.recordings.create.side_effect = [None, Exception('Freeplay is down'), None]
+
+        delivered = self.outbox.drain_once()
+
+        self.assertEqual(2, delivered)
+        self.assertEqual(3, self.freeplay_mock.recordings.create.call_count)
+        self.assertEqual(
+            [{'attempts': 1}],
+            self.db.query_to_dict("select attempts from freeplay_recordings")
+        )
+
+    def test_drain_once__output_fails_after_call_recorded(self):
+        record_output = self.freeplay_mock.sessions.restore_session.return_value.restore_trace.return_value \
+            .record_output
+        record_output.side_effect = Exception('Freeplay is down')
+        self.outbox.enqueue(self.outbox.add(self.recording('queued reply')))
+
+        self.assertEqual(0, self.outbox.drain_once())
+        self.assertEqual(
+            [{'attempts': 1, 'recorded': True}],
+            self.db.query_to_dict("select attempts, recorded_at is not null as recorded from freeplay_recordings")
+        )
+
+        record_output.side_effect = None
+        self.assertEqual(1, self.outbox.drain_once())
+        self.freeplay_mock.recordings.create.assert_called_once()
+        self.assertEqual(2, record_output.call_count)
+
+    def test_drain_once__gives_up(self):
+        outbox = RecordingOutbox(
+            RecordingRepository(self.db),
+            self.freeplay_mock,
+            lease_seconds=0,
+            max_attempts=2,
+            base_backoff_seconds=0,
+        )
+        self.freeplay_mock.recordings.create.side_effect = Exception('Freeplay is down')
+        outbox.add(self.recording('failing reply'))
+
+        self.assertEqual(0, outbox.drain_once())
+        with self.assertLogs('negotiator.recording.recording_outbox', 'ERROR') as logs:
+            self.assertEqual(0, outbox.drain_once())
+
+        self.assertIn('Giving up on recording', logs.output[0])
+        self.assertEqual([], self.db.query_to_dict("select id from freeplay_recordings"))
+
+    def recording(self, reply: str) -> FreeplayRecording:
+        return FreeplayRecording(
+            project_id='project-id',
+            session_id=str(uuid.uuid4()),
+            trace_id=str(uuid.uuid4()),
+            trace_input='user message',
+            output=reply,
+            all_messages=[{'role': 'user', 'content': 'user message'}, {'role': 'assistant', 'content': reply}],
+            inputs={'initial_assistant_message': 'Hi there'},
+            prompt_info={
+                'prompt_template_id': str(uuid.uuid4()),
+                'prompt_template_version_id': str(uuid.uuid4()),
+                'template_name': 'negotiator',
+                'environment': 'latest',
+                'model_parameters': {},
+                'provider_info': None,
+                'provider': 'openai',
+                'model': 'gpt-4o',
+                'flavor_name': 'openai_chat',
+                'project_id': 'project-id',
+            },
+            call_info={
+                'provider': 'openai',
+                'model': 'gpt-4o',
+                'start_time': 1.0,
+                'end_time': 2.0,
+                'model_parameters': {},
+                'provider_info': None,
+            },
+        )
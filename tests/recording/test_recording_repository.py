@@ -0,0 +1,114 @@
+import uuid
+from unittest import TestCase, IsolatedAsyncioTestCase
+
+from negotiator.recording.recording_repository import RecordingRepository, RecordingRecord, RecordingLease, \
+    AsyncRecordingRepository
+from tests.db_test_support import test_db_template, test_async_db_template
+
+
+class TestRecordingRepository(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.db = test_db_template()
+        self.db.clear()
+
+        self.repository = RecordingRepository(self.db)
+
+    def test_create(self):
+        recording_id = self.repository.create({'output': 'some output'})
+
+        result = self.db.query_to_dict("select id, payload, attempts from freeplay_recordings")
+
+        self.assertEqual([{
+            'id': recording_id,
+            'payload': {'output': 'some output'},
+            'attempts': 0,
+        }], result)
+
+    def test_claim_due(self):
+        due_id = self.repository.create({'output': 'due'})
+        self.repository.create({'output': 'leased'}, lease_seconds=60)
+
+        claimed = self.repository.claim_due(limit=10, max_attempts=3, lease_seconds=60)
+
+        self.assertEqual(
+            [RecordingRecord(id=due_id, payload={'output': 'due'}, attempts=0, lease_id=claimed[0].lease_id)],
+            claimed,
+        )
+        self.assertIsNotNone(claimed[0].lease_id)
+        self.assertEqual([], self.repository.claim_due(limit=10, max_attempts=3, lease_seconds=60))
+
+    def test_claim_due__exhausted(self):
+        recording_id = self.repository.create({'output': 'failing'})
+        self.repository.reschedule(recording_id, delay_seconds=0)
+
+        self.assertEqual([], self.repository.claim_due(limit=10, max_attempts=1, lease_seconds=60))
+
+    def test_renew_leases(self):
+        held_lease_id, taken_lease_id = uuid.uuid4(), uuid.uuid4()
+        held_id = self.repository.create({'output': 'held'}, lease_seconds=60, lease_id=held_lease_id)
+        taken_id = self.repository.create({'output': 'taken'}, lease_id=taken_lease_id)
+        self.db.query("update freeplay_recordings set attempts = 2 where id = :id", id=held_id)
+        self.repository.claim_due(limit=10, max_attempts=3, lease_seconds=60)
+
+        renewed = self.repository.renew_leases([held_id, taken_id], [held_lease_id, taken_lease_id], lease_seconds=60)
+
+        self.assertEqual([RecordingLease(id=held_id, lease_id=held_lease_id, attempts=2)], renewed)
+
+    def test_mark_recorded(self):
+        recording_id = self.repository.create({'output': 'recorded'}, lease_id=uuid.uuid4())
+        self.repository.create({'output': 'pending'})
+
+        self.repository.mark_recorded(recording_id)
+
+        claimed = self.repository.claim_due(limit=10, max_attempts=3, lease_seconds=60)
+        self.assertEqual(
+            [('recorded', True), ('pending', False)],
+            [(record.payload['output'], record.recorded) for record in claimed],
+        )
+        renewed = self.repository.renew_leases([recording_id], [claimed[0].lease_id], lease_seconds=60)
+        self.assertTrue(renewed[0].recorded)
+
+    def test_reschedule(self):
+        recording_id = self.repository.create({'output': 'failing'})
+
+        self.repository.reschedule(recording_id, delay_seconds=0)
+
+        claimed = self.repository.claim_due(limit=10, max_attempts=3, lease_seconds=60)
+        self.assertEqual(1, claimed[0].attempts)
+
+    def test_delete(self):
+        recording_id = self.repository.create({'output': 'delivered'})
+        other_id = self.repository.create({'output': 'pending'})
+
+        self.repository.delete([recording_id])
+
+        result = self.db.query_to_dict("select id from freeplay_recordings")
+        self.assertEqual([{'id': other_id}], result)
+
+    def test_reschedule_many(self):
+        first_id = self.repository.create({'output': 'first'})
+        second_id = self.repository.create({'output': 'second'})
+
+        self.repository.reschedule_many([first_id, second_id], [0, 60])
+
+        claimed = self.repository.claim_due(limit=10, max_attempts=3, lease_seconds=60)
+        self.assertEqual([(first_id, 1)], [(record.id, record.attempts) for record in claimed])
+
+
+class TestAsyncRecordingRepository(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+        self.db = test_db_template()
+        self.db.clear()
+
+        self.repository = AsyncRecordingRepository(test_async_db_template())
+
+    async def test_create(self):
+        lease_id = uuid.uuid4()
+
+        recording_id = await self.repository.create({'output': 'some output'}, lease_seconds=60, lease_id=lease_id)
+
+        result = self.db.query_to_dict("select id, payload, lease_id from freeplay_recordings")
+        self.assertEqual([{'id': recording_id, 'payload': {'output': 'some output'}, 'lease_id': lease_id}], result)
+        self.assertEqual([], RecordingRepository(self.db).claim_due(limit=10, max_attempts=3, lease_seconds=60))
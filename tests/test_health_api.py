@@ -0,0 +1,46 @@
+from unittest import TestCase
+
+from negotiator.health_api import health_api
+from negotiator.health_support.readiness import ReadinessMonitor, ReadinessCheck
+from negotiator.http_support.http_clients import ConnectionStats
+from tests.blueprint_test_support import test_client
+
+
+class TestHealthApi(TestCase):
+    def test_health(self):
+        client = test_client(health_api())
+
+        response = client.get('/health')
+
+        self.assertEqual({'status': 'UP'}, response.json)
+
+    def test_connections(self):
+        client = test_client(health_api(lambda: {'openai': ConnectionStats(requests=4, new_connections=1)}))
+
+        response = client.get('/health/connections')
+
+        self.assertEqual({
+            'openai': {'requests': 4, 'new_connections': 1, 'reused_connections': 3, 'reuse_ratio': 0.75},
+        }, response.json)
+
+    def test_ready(self):
+        client = test_client(health_api())
+
+        response = client.get('/ready')
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('READY', response.json['status'])
+
+    def test_ready__not_ready(self):
+        def failing() -> None:
+            raise ConnectionError('connection refused')
+
+        readiness = ReadinessMonitor([ReadinessCheck('database', failing)])
+        readiness.check_now()
+        client = test_client(health_api(readiness=readiness))
+
+        response = client.get('/ready')
+
+        self.assertEqual(503, response.status_code)
+        self.assertEqual('NOT_READY', response.json['status'])
+        self.assertEqual('DOWN', response.json['checks']['database']['status'])
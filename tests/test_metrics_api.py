@@ -0,0 +1,15 @@
+from unittest import TestCase
+
+from negotiator.metrics_api import metrics_api
+from tests.blueprint_test_support import test_client
+
+
+class TestMetricsApi(TestCase):
+    def test_metrics(self):
+        client = test_client(metrics_api())
+
+        response = client.get('/metrics')
+
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        self.assertIn('negotiator_db_pool_checkout_seconds_bucket', response.text)
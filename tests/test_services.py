@@ -0,0 +1,56 @@
+import uuid
+from unittest import TestCase, mock
+
+from negotiator.negotiation.negotiation_service import Negotiation, Message
+from negotiator.negotiation.response_cache import ResponseCache
+from negotiator.services import Services
+from tests.db_test_support import test_db_template
+
+
+class TestServices(TestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.db = test_db_template()
+        self.db.clear()
+
+        env = mock.Mock(
+            summary_model='gpt-4o-mini',
+            context_token_budget=1,
+            freeplay_project_id='project-id',
+            llm_turn_timeout_seconds=30.0,
+        )
+        self.services = Services(
+            env=env,
+            db_template=self.db,
+            openai_connections=mock.Mock(),
+            openai_http_client=mock.Mock(),
+            openai_client=mock.Mock(),
+            freeplay_session=mock.Mock(),
+            freeplay_client=mock.Mock(),
+            negotiation_cache=mock.Mock(),
+            negotiation_service=mock.Mock(),
+            prompt_templates=mock.Mock(),
+            llm_breaker=mock.Mock(),
+            llm_retry_policy=mock.Mock(),
+            call_llm=mock.Mock(),
+            context_window=mock.Mock(),
+            recording_outbox=mock.Mock(),
+            llm_service=mock.Mock(),
+        )
+
+    def test_llm_service_with__summarizes_through_the_given_call(self):
+        call_llm = mock.Mock()
+        call_llm.return_value.choices[0].message.content = 'a summary'
+        llm_service = self.services.llm_service_with(call_llm, ResponseCache(0), 'candidate')
+        negotiation = Negotiation(uuid.uuid4(), [
+            Message(uuid.uuid4(), 'assistant', 'Hi there'),
+            Message(uuid.uuid4(), 'user', 'What is your best price?'),
+            Message(uuid.uuid4(), 'assistant', 'I could do 16,000.'),
+            Message(uuid.uuid4(), 'user', 'How about 12,000?'),
+        ])
+
+        llm_service.context_window.messages_dict(negotiation)
+
+        self.assertEqual('gpt-4o-mini', call_llm.call_args.kwargs['model'])
+        self.services.call_llm.assert_not_called()
+        self.assertEqual('candidate', llm_service.prompt_environment)
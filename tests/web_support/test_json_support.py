@@ -0,0 +1,141 @@
+import dataclasses
+import datetime
+import json
+from dataclasses import dataclass, field
+from enum import Enum, IntEnum
+from typing import Any, Dict, List, NamedTuple, Optional
+from unittest import TestCase
+from uuid import UUID
+
+from negotiator.web_support import json_support
+from negotiator.web_support.json_support import EncoderWithDataClassSupport
+
+
+class Role(str, Enum):
+    USER = 'user'
+
+
+class Priority(IntEnum):
+    HIGH = 1
+
+
+class Point(NamedTuple):
+    x: int
+    y: float
+
+
+@dataclass
+class Message:
+    id: UUID
+    role: str
+    content: str
+
+
+@dataclass
+class Empty:
+    pass
+
+
+@dataclass
+class Transcript:
+    id: UUID
+    created_at: datetime.datetime
+    final_price: Optional[int]
+    score: float
+    resolved: bool
+    messages: List[Message]
+    tags: list[str] = field(default_factory=list)
+    metadata: Dict[Any, Any] = field(default_factory=dict)
+    parent: Optional['Transcript'] = None
+    anything: Any = None
+    empty: Empty = field(default_factory=Empty)
+
+
+@dataclass
+class Untyped:
+    value: 'NotAType'  # type: ignore[name-defined] # noqa: F821
+
+
+def reference(obj: Any) -> str:
+    return json.dumps(obj, cls=EncoderWithDataClassSupport)
+
+
+def transcript(messages: int = 3) -> Transcript:
+    return Transcript(
+        id=UUID('00000000-0000-0000-0000-000000000001'),
+        created_at=datetime.datetime(2024, 1, 2, 3, 4, 5, 678, tzinfo=datetime.timezone.utc),
+        final_price=12_000,
+        score=0.1,
+        resolved=False,
+        messages=[
+            Message(UUID(int=index), 'user' if index % 2 == 0 else 'assistant', f'Message "{index}" – café\n')
+            for index in range(messages)
+        ],
+        tags=['used', 'car'],
+        metadata={'a': [1, 2.5, None], 1: True, 2.5: 'x', None: {}, False: ()},
+    )
+
+
+class TestJsonSupport(TestCase):
+    def test_encode__matches_reference(self):
+        parent = transcript()
+        child = dataclasses.replace(
+            transcript(), parent=parent, final_price=None, anything=Point(1, float('inf')), score=float('nan'))
+        values: List[Any] = [
+            parent,
+            child,
+            [parent, Message(UUID(int=7), Role.USER, 'hi')],
+            {'negotiation': parent, 'count': Priority.HIGH, 'empty': []},
+            Empty(),
+            (1, 'two', None),
+            Untyped(UUID(int=1)),
+            'plain',
+            -0.0,
+            10 ** 30,
+            True,
+            None,
+        ]
+
+        for value in values:
+            self.assertEqual(reference(value), json_support.encode(value), value)
+
+    def test_encode__unexpected_field_types(self):
+        value = Transcript(
+            id='not-a-uuid',  # type: ignore[arg-type]
+            created_at=datetime.datetime(2024, 1, 1),
+            final_price=True,  # type: ignore[arg-type]
+            score=1,
+            resolved=1,  # type: ignore[arg-type]
+            messages=(Message(UUID(int=1), 'user', 'hi'),),  # type: ignore[arg-type]
+            tags=[UUID(int=2)],  # type: ignore[list-item]
+        )
+
+        self.assertEqual(reference(value), json_support.encode(value))
+
+    def test_encode__not_serializable(self):
+        with self.assertRaisesRegex(TypeError, 'Object of type object is not JSON serializable'):
+            json_support.encode(Message(UUID(int=1), 'user', object()))  # type: ignore[arg-type]
+        with self.assertRaisesRegex(TypeError, 'keys must be str, int, float, bool or None, not UUID'):
+            json_support.encode({UUID(int=1): 'x'})
+
+    def test_encoder_for(self):
+        encoder = json_support.encoder_for(Message)
+
+        self.assertIs(encoder, json_support.encoder_for(Message))
+        self.assertEqual(
+            '{"id": "00000000-0000-0000-0000-000000000001", "role": "user", "content": "hi"}',
+            encoder(Message(UUID(int=1), 'user', 'hi')),
+        )
+
+    def test_encode_chunks(self):
+        value = transcript(messages=1_000)
+
+        chunks = list(json_support.encode_chunks(value, chunk_size=1_024))
+
+        self.assertEqual(reference(value), ''.join(chunks))
+        self.assertGreater(len(chunks), 10)
+        self.assertTrue(all(len(chunk) >= 1_024 for chunk in chunks[:-1]))
+
+    def test_encode_chunks__small(self):
+        for value in [Empty(), [], {}, 'plain', transcript(messages=0)]:
+            self.assertEqual([reference(value)], list(json_support.encode_chunks(value)))
@@ -33,9 +33,14 @@ export class ChatMessagesComponent extends LitElement {
         'pending' in message
             ? html`
                     <div class="message ${message.role} pending">
-                        <flashing-dots></flashing-dots>
+                        ${message.content ? message.content : html`<flashing-dots></flashing-dots>`}
                     </div>`
-            : html`
+            : message.resettable === false
+                ? html`
+                    <div class="message ${message.role} unsaved">
+                        ${message.content}
+                    </div>`
+                : html`
                     <div class="message ${message.role}" @click=${this.handleReset(message.id)}>
                         ${message.content}
                     </div>`
@@ -2,15 +2,28 @@ import {customElement, property, state} from "lit/decorators.js";
 import {html, LitElement} from "lit";
 import {
     addMessage,
+    appendToPendingMessage,
     Message,
     Negotiation,
+    preventReset,
     removeLastMessage,
     removeLastPendingMessage, truncateAt
 } from "../negotiation/negotiation.ts";
+import {readEvents} from "../negotiation/event-stream.ts";
 import './negotiation-chat.css'
 import {AddMessage} from "../chat-input/chat-input.ts";
 import {ResetToMessage} from "../chat-messages/chat-messages.ts";
 
+type Resolution = {
+    final_price: number
+    leaderboard_rank: number
+    total_negotiations: number
+}
+
+const resolutionMessage = (resolution: Resolution): string =>
+    `Deal at $${resolution.final_price.toLocaleString()}. ` +
+    `That ranks ${resolution.leaderboard_rank} of ${resolution.total_negotiations} negotiations.`
+
 @customElement('negotiation-chat')
 export class NegotiationChatComponent extends LitElement {
 
@@ -27,14 +40,14 @@ export class NegotiationChatComponent extends LitElement {
         const message: Message = {id: crypto.randomUUID(), role: "user", content: e.detail.content};
         this.negotiation = addMessage(this.negotiation, message, {role: "assistant", pending: true})
 
-        const response = await fetch(`/negotiation/${this.negotiation.id}/messages`, {
+        const response = await fetch(`/negotiation/${this.negotiation.id}/messages/stream`, {
             method: "POST",
             headers: {"Content-Type": "application/json"},
             body: JSON.stringify(message),
         });
+        const reply = response.status === 200 ? await this.readReply(response, message.id) : undefined
 
-        if (response.status === 201) {
-            const reply = await response.json()
+        if (reply !== undefined) {
             this.negotiation = removeLastPendingMessage(this.negotiation)
             this.negotiation = addMessage(this.negotiation, reply)
         } else {
@@ -44,6 +57,31 @@ export class NegotiationChatComponent extends LitElement {
         }
     }
 
+    // Deltas fill in the pending reply as they arrive, the saved message or the resolution replaces them.
+    // A reply that was not saved means the user's message was not saved either, and the resolution is never saved.
+    private readReply = async (response: Response, userMessageId: string): Promise<Message | undefined> => {
+        for await (const {event, data} of readEvents(response)) {
+            if (event === 'delta') {
+                this.negotiation = appendToPendingMessage(this.negotiation, JSON.parse(data).content)
+            } else if (event === 'message') {
+                const reply: Message = JSON.parse(data)
+                if ('id' in reply && reply.resettable === false) {
+                    this.negotiation = preventReset(this.negotiation, userMessageId)
+                }
+                return reply
+            } else if (event === 'resolved') {
+                return {
+                    id: crypto.randomUUID(),
+                    role: 'assistant',
+                    content: resolutionMessage(JSON.parse(data)),
+                    resettable: false,
+                }
+            }
+        }
+
+        return undefined
+    }
+
     private handleReset = async (e: CustomEvent<ResetToMessage>) => {
         let messageId = e.detail.id;
         const response = await fetch(
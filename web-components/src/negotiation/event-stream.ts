@@ -0,0 +1,44 @@
+export type ServerSentEvent = {
+    event: string
+    data: string
+}
+
+// EventSource only sends GET requests, so the stream of a POST is read and split into events by hand
+export async function* readEvents(response: Response): AsyncGenerator<ServerSentEvent> {
+    if (response.body === null) {
+        return
+    }
+
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader()
+    let buffer = ''
+
+    while (true) {
+        const {done, value} = await reader.read()
+        if (done) {
+            return
+        }
+
+        buffer += value
+        let end = buffer.indexOf('\n\n')
+        while (end !== -1) {
+            yield parseEvent(buffer.slice(0, end))
+            buffer = buffer.slice(end + 2)
+            end = buffer.indexOf('\n\n')
+        }
+    }
+}
+
+const parseEvent = (block: string): ServerSentEvent => {
+    let event = 'message'
+    const data: string[] = []
+
+    for (const line of block.split('\n')) {
+        if (line.startsWith('event:')) {
+            event = line.slice('event:'.length).trim()
+        } else if (line.startsWith('data:')) {
+            data.push(line.slice('data:'.length).trimStart())
+        }
+    }
+
+    return {event, data: data.join('\n')}
+}
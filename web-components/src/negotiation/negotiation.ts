@@ -1,8 +1,8 @@
 export type Message = {
     role: 'user' | 'assistant'
 } & (
-    | { id: string, content: string }
-    | { pending: true }
+    | { id: string, content: string, resettable?: boolean }
+    | { pending: true, content?: string }
     )
 
 export type Negotiation = {
@@ -30,6 +30,22 @@ export const removeLastPendingMessage = (negotiation: Negotiation): Negotiation
     }
 }
 
+export const appendToPendingMessage = (negotiation: Negotiation, content: string): Negotiation => {
+    const lastMessage = negotiation.messages[negotiation.messages.length - 1]
+
+    if ('pending' in lastMessage) {
+        return ({
+            ...negotiation,
+            messages: [
+                ...negotiation.messages.slice(0, -1),
+                {...lastMessage, content: (lastMessage.content ?? '') + content},
+            ]
+        });
+    } else {
+        return negotiation
+    }
+}
+
 export const truncateAt = (negotiation: Negotiation, messageId: string): Negotiation => {
     const keepIndex = negotiation.messages.findIndex(message => 'id' in message && message.id === messageId)
 
@@ -42,3 +58,11 @@ export const truncateAt = (negotiation: Negotiation, messageId: string): Negotia
         messages: negotiation.messages.slice(0, keepIndex + 1)
     });
 }
+
+// Messages the server never saved have nothing to reset to
+export const preventReset = (negotiation: Negotiation, messageId: string): Negotiation => ({
+    ...negotiation,
+    messages: negotiation.messages.map(message =>
+        'id' in message && message.id === messageId ? {...message, resettable: false} : message
+    )
+})
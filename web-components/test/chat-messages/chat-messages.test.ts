@@ -38,4 +38,20 @@ describe('chat-messages', () => {
         const {detail} = await resetMessageListener;
         expect(detail).to.eql({'id': '11111111-7981-4e69-b44e-c21b3f88213b'})
     })
+
+    it('does not offer a reset on unsaved messages', async () => {
+        const element = await renderComponent(html`
+            <chat-messages .messages=${[
+                {role: 'assistant', content: 'come back later', id: '11111111-7981-4e69-b44e-c21b3f88213b', resettable: false},
+            ]}></chat-messages>
+        `)
+        let reset = false
+        element.addEventListener('reset-to-message', () => reset = true)
+
+        const assistantMessage = element.querySelector('.message.assistant') as HTMLElement;
+        assistantMessage.click()
+
+        expect(assistantMessage.classList.contains('unsaved')).to.equal(true)
+        expect(reset).to.equal(false)
+    })
 })
@@ -4,11 +4,17 @@ import {rest, setupWorker} from "msw";
 
 describe('negotiation-chat', () => {
     const worker = setupWorker(
-        rest.post('/negotiation/negotiation-1234/messages', (req, res, ctx) =>
-            res(ctx.status(201), ctx.json({
-                'role': 'assistant',
-                'content': 'assistant reply',
-            }))),
+        rest.post('/negotiation/negotiation-1234/messages/stream', (req, res, ctx) =>
+            res(
+                ctx.status(200),
+                ctx.set('Content-Type', 'text/event-stream'),
+                ctx.body(
+                    'event: delta\ndata: {"content": "assistant "}\n\n' +
+                    'event: delta\ndata: {"content": "reply"}\n\n' +
+                    'event: message\ndata: {"id": "33333333-7981-4e69-b44e-c21b3f88213b", ' +
+                    '"role": "assistant", "content": "assistant reply"}\n\n'
+                ),
+            )),
         rest.post('/negotiation/negotiation-1234/messages/11111111-7981-4e69-b44e-c21b3f88213b/reset', (req, res, ctx) =>
             res(ctx.status(204)))
     )
@@ -43,6 +49,89 @@ describe('negotiation-chat', () => {
         expect(element.textContent).to.contain('assistant reply')
     })
 
+    it('renders resolutions', async () => {
+        worker.use(
+            rest.post('/negotiation/negotiation-1234/messages/stream', (req, res, ctx) =>
+                res(
+                    ctx.status(200),
+                    ctx.set('Content-Type', 'text/event-stream'),
+                    ctx.body('event: resolved\ndata: ' +
+                        '{"final_price": 14000, "leaderboard_rank": 3, "total_negotiations": 10}\n\n'),
+                )),
+        )
+        const element = await renderComponent(html`
+            <negotiation-chat .negotiation=${
+                    {
+                        id: 'negotiation-1234', messages: [
+                            {role: 'assistant', content: 'hi there', id: '11111111-7981-4e69-b44e-c21b3f88213b'},
+                        ]
+                    }
+            }></negotiation-chat>
+        `)
+
+        element.querySelector('input').value = '14,000 it is'
+        element.querySelector('button').click()
+
+        await waitForPromiseToResolve();
+
+        expect(element.textContent).to.contain('14,000 it is')
+        expect(element.textContent).to.contain('ranks 3 of 10 negotiations')
+        expect(element.querySelectorAll('.message.unsaved').length).to.equal(1)
+    })
+
+    it('does not offer a reset on unsaved turns', async () => {
+        worker.use(
+            rest.post('/negotiation/negotiation-1234/messages/stream', (req, res, ctx) =>
+                res(
+                    ctx.status(200),
+                    ctx.set('Content-Type', 'text/event-stream'),
+                    ctx.body('event: message\ndata: {"id": "33333333-7981-4e69-b44e-c21b3f88213b", ' +
+                        '"role": "assistant", "content": "come back later", "resettable": false}\n\n'),
+                )),
+        )
+        const element = await renderComponent(html`
+            <negotiation-chat .negotiation=${
+                    {
+                        id: 'negotiation-1234', messages: [
+                            {role: 'assistant', content: 'hi there', id: '11111111-7981-4e69-b44e-c21b3f88213b'},
+                        ]
+                    }
+            }></negotiation-chat>
+        `)
+
+        element.querySelector('input').value = 'user message'
+        element.querySelector('button').click()
+
+        await waitForPromiseToResolve();
+
+        expect(element.textContent).to.contain('come back later')
+        expect(element.querySelectorAll('.message.unsaved').length).to.equal(2)
+    })
+
+        it('restores the message when the reply fails', async () => {
+        worker.use(
+            rest.post('/negotiation/negotiation-1234/messages/stream', (req, res, ctx) =>
+                res(ctx.status(409), ctx.json({'error': 'negotiation is archived'}))),
+        )
+        const element = await renderComponent(html`
+            <negotiation-chat .negotiation=${
+                    {
+                        id: 'negotiation-1234', messages: [
+                            {role: 'assistant', content: 'hi there', id: '11111111-7981-4e69-b44e-c21b3f88213b'},
+                        ]
+                    }
+            }></negotiation-chat>
+        `)
+
+        element.querySelector('input').value = 'user message'
+        element.querySelector('button').click()
+
+        await waitForPromiseToResolve();
+
+        expect(element.querySelector('input').value).to.equal('user message')
+        expect(element.querySelectorAll('.message').length).to.equal(1)
+    })
+
     it('resets', async () => {
         const element = await renderComponent(html`
             <negotiation-chat .negotiation=${
@@ -1,6 +1,8 @@
 import {
     addMessage,
+    appendToPendingMessage,
     Negotiation,
+    preventReset,
     removeLastMessage,
     removeLastPendingMessage,
     truncateAt
@@ -68,6 +70,14 @@ describe('negotiation', () => {
         })
     })
 
+    it('appendToPendingMessage', () => {
+        const pending = addMessage(negotiation, {role: 'assistant', pending: true})
+        const result = appendToPendingMessage(appendToPendingMessage(pending, 'how about '), '14,000?')
+
+        expect(result.messages[2]).to.deep.equal({role: 'assistant', pending: true, content: 'how about 14,000?'})
+        expect(appendToPendingMessage(negotiation, 'ignored')).to.deep.equal(negotiation)
+    })
+
     it('truncateAt', () => {
         expect(truncateAt(negotiation, '11111111-7981-4e69-b44e-c21b3f88213b')).to.deep.equal({
             id: '838711ba-d574-40b8-8988-433bdd320ad2',
@@ -92,4 +102,14 @@ describe('negotiation', () => {
             ]
         })
     }) ;
+
+    it('preventReset', () => {
+        expect(preventReset(negotiation, '22222222-7981-4e69-b44e-c21b3f88213b')).to.deep.equal({
+            id: '838711ba-d574-40b8-8988-433bdd320ad2',
+            messages: [
+                {role: 'assistant', content: 'how can I help you?', id: '11111111-7981-4e69-b44e-c21b3f88213b'},
+                {role: 'user', content: 'not sure', id: '22222222-7981-4e69-b44e-c21b3f88213b', resettable: false},
+            ]
+        })
+    })
 })